@@ -1,7 +1,9 @@
+from typing import Optional
+
 from sqlalchemy.orm import Session
 
 from . import schemas
-from .database import User, Load, Transaction, Company
+from .database import User, Load, LoadEvent, LoadPosting, Transaction, Company
 
 
 def get_user(db: Session, user_id: int):
@@ -24,14 +26,41 @@ def get_load(db: Session, load_id: int):
     return db.query(Load).filter(Load.id == load_id).first()
 
 
+def assign_load_driver(db: Session, load_id: int, driver_id: Optional[int]):
+    """Record the load's assigned driver (or carrier) user; None if the load does not exist."""
+    db_load = get_load(db, load_id)
+    if db_load is None:
+        return None
+    db_load.driver_id = driver_id
+    db.commit()
+    db.refresh(db_load)
+    return db_load
+
+
 def create_load(db: Session, load: schemas.LoadCreate):
     db_load = Load(status=load.status or "Pre-Loading", rate=load.rate)
     db.add(db_load)
+    db.flush()
+    db.add(LoadEvent(load_id=db_load.id, from_status=None, to_status=db_load.status))
     db.commit()
     db.refresh(db_load)
     return db_load
 
 
+def create_posted_load(db: Session, status: str, rate: float, posting: dict):
+    """Create a load together with its load-board posting in one commit."""
+    db_load = Load(status=status, rate=rate)
+    db.add(db_load)
+    db.flush()
+    db_posting = LoadPosting(load_id=db_load.id, **posting)
+    db.add(db_posting)
+    db.add(LoadEvent(load_id=db_load.id, from_status=None, to_status=status))
+    db.commit()
+    db.refresh(db_load)
+    db.refresh(db_posting)
+    return db_load, db_posting
+
+
 def update_load_status(db: Session, load_id: int, new_status: str):
     db_load = get_load(db, load_id)
     if not db_load:
@@ -1,20 +1,18 @@
 import os
 
 from dotenv import load_dotenv
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, Float, DateTime, Boolean, ForeignKey, Index, inspect, text
+from sqlalchemy.exc import SQLAlchemyError
 from sqlalchemy.orm import declarative_base, relationship, sessionmaker
-from sqlalchemy import create_engine
 from datetime import datetime
 
+from .db_pool import build_engine
+
 load_dotenv()
 
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./eusotrip.db")
 
-connect_args = {}
-if DATABASE_URL.startswith("sqlite"):
-    connect_args = {"check_same_thread": False}
-
-engine = create_engine(DATABASE_URL, connect_args=connect_args)
+engine = build_engine(DATABASE_URL)
 if DATABASE_URL.startswith("sqlite"):
     engine = engine.execution_options(schema_translate_map={"erg": None})
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
@@ -46,12 +44,64 @@ class Load(Base):
     status = Column(String, nullable=False, default="Pre-Loading")
     rate = Column(Float, nullable=False, default=0.0)
     managing_company_id = Column(Integer, ForeignKey("companies.id"), nullable=True)
+    # Assigned driver (or carrier) user: the payee when the load is settled
+    driver_id = Column(Integer, ForeignKey("users.id"), nullable=True, index=True)
 
     managing_company = relationship("Company")
 
 
+class LoadPosting(Base):
+    """Load-board attributes of a load (lane, equipment, freight, dates)."""
+
+    __tablename__ = "load_postings"
+
+    load_id = Column(Integer, ForeignKey("loads.id"), primary_key=True)
+    load_number = Column(String, nullable=True)
+    shipper_id = Column(String, nullable=True, index=True)
+    shipper_name = Column(String, nullable=True)
+    carrier_id = Column(String, nullable=True, index=True)
+    origin_city = Column(String, nullable=True)
+    origin_state = Column(String(2), nullable=True, index=True)
+    destination_city = Column(String, nullable=True)
+    destination_state = Column(String(2), nullable=True, index=True)
+    origin_lat = Column(Float, nullable=True)
+    origin_lng = Column(Float, nullable=True)
+    destination_lat = Column(Float, nullable=True)
+    destination_lng = Column(Float, nullable=True)
+    equipment_type = Column(String, nullable=True)
+    hazmat = Column(Boolean, nullable=False, default=False)
+    commodity = Column(String, nullable=True)
+    weight = Column(Float, nullable=True)
+    distance = Column(Float, nullable=True)
+    pickup_date = Column(String(10), nullable=True)  # ISO date
+    delivery_date = Column(String(10), nullable=True)
+    posted_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    load = relationship("Load")
+
+
+class LoadEvent(Base):
+    """Append-only log of load status changes (rows are never updated or deleted)."""
+
+    __tablename__ = "load_events"
+
+    id = Column(Integer, primary_key=True, index=True)
+    load_id = Column(Integer, ForeignKey("loads.id"), nullable=False, index=True)
+    from_status = Column(String, nullable=True)
+    to_status = Column(String, nullable=False)
+    actor_id = Column(Integer, ForeignKey("users.id"), nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
+
+
 class Transaction(Base):
     __tablename__ = "transactions"
+    # A load is paid at most once, however many settlement runs race on it
+    __table_args__ = (
+        Index(
+            "uq_transactions_commission_load", "type", "load_id", unique=True,
+            sqlite_where=text("type = 'COMMISSION'"), postgresql_where=text("type = 'COMMISSION'"),
+        ),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     type = Column(String, nullable=False)
@@ -64,6 +114,30 @@ class Transaction(Base):
     load = relationship("Load")
 
 
+def ensure_core_schema(engine):
+    """
+    Brings tables created before loads.driver_id and the unique COMMISSION index
+    up to date (create_all only creates missing tables). Raises RuntimeError at
+    startup when that is not possible, rather than failing settlements later.
+    """
+    columns = {c["name"] for c in inspect(engine).get_columns("loads")}
+    try:
+        with engine.begin() as conn:
+            if "driver_id" not in columns:
+                conn.execute(text("ALTER TABLE loads ADD COLUMN driver_id INTEGER REFERENCES users(id)"))
+            conn.execute(text("CREATE INDEX IF NOT EXISTS ix_loads_driver_id ON loads (driver_id)"))
+            conn.execute(text(
+                "CREATE UNIQUE INDEX IF NOT EXISTS uq_transactions_commission_load "
+                "ON transactions (type, load_id) WHERE type = 'COMMISSION'"
+            ))
+    except SQLAlchemyError as e:
+        raise RuntimeError(
+            "Database schema is out of date and could not be migrated: loads.driver_id and the unique "
+            "COMMISSION index on transactions (type, load_id) are required (duplicate COMMISSION rows "
+            f"for a load must be removed first): {e}"
+        ) from e
+
+
 def get_db():
     db = SessionLocal()
     try:
@@ -0,0 +1,200 @@
+"""
+Database engine factory.
+
+Builds SQLAlchemy engines with environment-driven pool sizing, pre-ping and
+recycle, applies WAL pragmas for local SQLite files, and keeps per-pool
+telemetry (checkouts, overflow, checkout wait histogram) for /metrics/db_pool.
+
+Environment:
+    DB_POOL_SIZE         persistent connections kept per process (default 5)
+    DB_MAX_OVERFLOW      extra connections allowed under burst (default 10)
+    DB_POOL_TIMEOUT      seconds to wait for a free connection (default 30)
+    DB_POOL_RECYCLE      seconds before a connection is replaced (default 1800)
+    DB_POOL_PRE_PING     test connections on checkout (default true)
+    DB_POOL_USE_LIFO     reuse the most recent connection first (default false)
+"""
+
+import os
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool
+
+
+# Upper bounds (ms) of the checkout wait histogram buckets; the last bucket is +Inf.
+WAIT_BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, str(default)))
+    except Exception:
+        return default
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    raw = os.getenv(name)
+    if raw is None or raw == "":
+        return default
+    return raw.strip().lower() in ("1", "true", "yes", "on")
+
+
+def _is_sqlite(url: str) -> bool:
+    return url.startswith("sqlite")
+
+
+def _is_sqlite_memory(url: str) -> bool:
+    return _is_sqlite(url) and (url.rstrip("/").endswith(":memory:") or url in ("sqlite://", "sqlite:///"))
+
+
+class PoolTelemetry:
+    """Thread-safe counters and checkout wait histogram for one connection pool."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.connects = 0
+        self.checkouts = 0
+        self.checkins = 0
+        self.invalidations = 0
+        self.timeouts = 0
+        self.wait_count = 0
+        self.wait_sum_ms = 0.0
+        self.wait_max_ms = 0.0
+        self._wait_buckets = [0] * (len(WAIT_BUCKETS_MS) + 1)
+
+    def incr(self, name: str) -> None:
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def observe_wait(self, seconds: float) -> None:
+        ms = seconds * 1000.0
+        idx = len(WAIT_BUCKETS_MS)
+        for i, bound in enumerate(WAIT_BUCKETS_MS):
+            if ms <= bound:
+                idx = i
+                break
+        with self._lock:
+            self.wait_count += 1
+            self.wait_sum_ms += ms
+            if ms > self.wait_max_ms:
+                self.wait_max_ms = ms
+            self._wait_buckets[idx] += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            cumulative = []
+            running = 0
+            for bound, n in zip(list(WAIT_BUCKETS_MS) + ["+Inf"], self._wait_buckets):
+                running += n
+                cumulative.append({"le_ms": bound, "count": running})
+            return {
+                "connects": self.connects,
+                "checkouts": self.checkouts,
+                "checkins": self.checkins,
+                "invalidations": self.invalidations,
+                "timeouts": self.timeouts,
+                "checkout_wait": {
+                    "count": self.wait_count,
+                    "sum_ms": round(self.wait_sum_ms, 3),
+                    "max_ms": round(self.wait_max_ms, 3),
+                    "avg_ms": round(self.wait_sum_ms / self.wait_count, 3) if self.wait_count else 0.0,
+                    "buckets": cumulative,
+                },
+            }
+
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool that records how long each checkout waited for a connection."""
+
+    telemetry: Optional[PoolTelemetry] = None
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            if self.telemetry is not None:
+                self.telemetry.incr("timeouts")
+            raise
+        finally:
+            if self.telemetry is not None:
+                self.telemetry.observe_wait(time.perf_counter() - start)
+
+    def recreate(self):
+        # engine.dispose() swaps in a fresh pool; keep counting into the same telemetry.
+        new_pool = super().recreate()
+        new_pool.telemetry = self.telemetry
+        return new_pool
+
+
+def _sqlite_wal_pragmas(dbapi_conn, _record) -> None:
+    cursor = dbapi_conn.cursor()
+    try:
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+    finally:
+        cursor.close()
+
+
+def build_engine(database_url: str) -> Engine:
+    """Create an engine for database_url using the DB_POOL_* environment settings."""
+    connect_args: Dict[str, Any] = {}
+    if _is_sqlite(database_url):
+        connect_args = {"check_same_thread": False}
+
+    kwargs: Dict[str, Any] = {
+        "connect_args": connect_args,
+        "pool_pre_ping": _env_bool("DB_POOL_PRE_PING", True),
+    }
+    # In-memory SQLite must stay on SQLAlchemy's single-connection pool, otherwise
+    # every checkout would see a different empty database.
+    if not _is_sqlite_memory(database_url):
+        kwargs.update(
+            poolclass=InstrumentedQueuePool,
+            pool_size=_env_int("DB_POOL_SIZE", 5),
+            max_overflow=_env_int("DB_MAX_OVERFLOW", 10),
+            pool_timeout=_env_int("DB_POOL_TIMEOUT", 30),
+            pool_recycle=_env_int("DB_POOL_RECYCLE", 1800),
+            pool_use_lifo=_env_bool("DB_POOL_USE_LIFO", False),
+        )
+
+    engine = create_engine(database_url, **kwargs)
+
+    telemetry = PoolTelemetry()
+    engine.pool.telemetry = telemetry
+    event.listen(engine, "connect", lambda *_: telemetry.incr("connects"))
+    event.listen(engine, "checkout", lambda *_: telemetry.incr("checkouts"))
+    event.listen(engine, "checkin", lambda *_: telemetry.incr("checkins"))
+    event.listen(engine, "invalidate", lambda *_: telemetry.incr("invalidations"))
+
+    if _is_sqlite(database_url) and not _is_sqlite_memory(database_url):
+        event.listen(engine, "connect", _sqlite_wal_pragmas)
+
+    return engine
+
+
+def pool_stats(engine: Engine) -> Dict[str, Any]:
+    """Current pool occupancy plus accumulated telemetry for engine."""
+    pool = engine.pool
+    stats: Dict[str, Any] = {
+        "pool_class": type(pool).__name__,
+        "dialect": engine.dialect.name,
+    }
+    if isinstance(pool, QueuePool):
+        stats.update(
+            size=pool.size(),
+            checked_in=pool.checkedin(),
+            checked_out=pool.checkedout(),
+            overflow=pool.overflow(),
+            max_overflow=pool._max_overflow,
+            timeout_s=pool.timeout(),
+            recycle_s=pool._recycle,
+        )
+    telemetry = getattr(pool, "telemetry", None)
+    if telemetry is not None:
+        stats.update(telemetry.snapshot())
+    return stats
@@ -0,0 +1,169 @@
+"""
+Geospatial grid index for load-board radius and corridor searches.
+
+Points are bucketed into fixed lat/lng cells (default 0.5 degree, roughly 35 x
+25 miles in the lower 48). A radius query only visits the cells overlapping
+the query's bounding box and then refines the candidates with a vectorized
+haversine, so cost scales with local density rather than board size.
+"""
+
+import math
+from typing import Dict, Iterable, Optional, Set, Tuple
+
+import numpy as np
+
+
+EARTH_RADIUS_MI = 3958.8
+MILES_PER_DEG_LAT = 69.05
+
+
+def haversine_miles(lat1, lng1, lat2, lng2):
+    """Great-circle distance in miles; broadcasts over NumPy arrays (degrees in)."""
+    lat1, lng1, lat2, lng2 = (np.radians(np.asarray(v, dtype=np.float64)) for v in (lat1, lng1, lat2, lng2))
+    a = np.sin((lat2 - lat1) / 2.0) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lng2 - lng1) / 2.0) ** 2
+    return 2.0 * EARTH_RADIUS_MI * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+def initial_bearing(lat1, lng1, lat2, lng2):
+    """Initial great-circle bearing in radians; broadcasts over NumPy arrays."""
+    lat1, lng1, lat2, lng2 = (np.radians(np.asarray(v, dtype=np.float64)) for v in (lat1, lng1, lat2, lng2))
+    dlng = lng2 - lng1
+    y = np.sin(dlng) * np.cos(lat2)
+    x = np.cos(lat1) * np.sin(lat2) - np.sin(lat1) * np.cos(lat2) * np.cos(dlng)
+    return np.arctan2(y, x)
+
+
+def segment_distance_miles(lat, lng, a_lat, a_lng, b_lat, b_lng) -> Tuple[np.ndarray, np.ndarray]:
+    """Distance from points to the great-circle segment A->B and their along-track
+    position on it (miles from A, clamped to [0, |AB|])."""
+    lat = np.asarray(lat, dtype=np.float64)
+    lng = np.asarray(lng, dtype=np.float64)
+    d_ab = float(haversine_miles(a_lat, a_lng, b_lat, b_lng))
+    d_ap = haversine_miles(a_lat, a_lng, lat, lng)
+    if d_ab < 1e-9:
+        return d_ap, np.zeros_like(d_ap)
+
+    theta = initial_bearing(a_lat, a_lng, lat, lng) - float(initial_bearing(a_lat, a_lng, b_lat, b_lng))
+    ang_ap = d_ap / EARTH_RADIUS_MI
+    xt = np.arcsin(np.clip(np.sin(ang_ap) * np.sin(theta), -1.0, 1.0))
+    cos_xt = np.maximum(np.cos(xt), 1e-12)
+    at = np.arccos(np.clip(np.cos(ang_ap) / cos_xt, -1.0, 1.0)) * EARTH_RADIUS_MI
+    at = np.where(np.cos(theta) < 0, -at, at)
+
+    dist = np.abs(xt) * EARTH_RADIUS_MI
+    before = at < 0
+    after = at > d_ab
+    dist = np.where(before, d_ap, dist)
+    dist = np.where(after, haversine_miles(b_lat, b_lng, lat, lng), dist)
+    return dist, np.clip(at, 0.0, d_ab)
+
+
+def segment_lat_range(a_lat: float, a_lng: float, b_lat: float, b_lng: float) -> Tuple[float, float]:
+    """Latitude range covered by the great-circle segment A->B. A long east-west
+    segment bulges poleward: when it climbs away from A and descends into B (or
+    the reverse), its vertex lies between them and bounds the range."""
+    lat_lo, lat_hi = min(a_lat, b_lat), max(a_lat, b_lat)
+    bearing_a = float(initial_bearing(a_lat, a_lng, b_lat, b_lng))
+    bearing_b = float(initial_bearing(b_lat, b_lng, a_lat, a_lng))
+    if math.cos(bearing_a) * math.cos(bearing_b) > 0:
+        vertex = math.degrees(math.acos(min(abs(math.sin(bearing_a) * math.cos(math.radians(a_lat))), 1.0)))
+        if math.cos(bearing_a) > 0:
+            lat_hi = max(lat_hi, vertex)
+        else:
+            lat_lo = min(lat_lo, -vertex)
+    return lat_lo, lat_hi
+
+
+class GeoGrid:
+    """Uniform lat/lng grid over integer slots, backed by growable NumPy coordinate arrays."""
+
+    def __init__(self, cell_deg: float = 0.5):
+        self.cell_deg = cell_deg
+        self._cells: Dict[Tuple[int, int], Set[int]] = {}
+        self._lat = np.full(0, np.nan)
+        self._lng = np.full(0, np.nan)
+
+    def _cell(self, lat: float, lng: float) -> Tuple[int, int]:
+        return int(math.floor(lat / self.cell_deg)), int(math.floor(lng / self.cell_deg))
+
+    def _ensure(self, slot: int) -> None:
+        if slot < len(self._lat):
+            return
+        size = max(1024, len(self._lat) * 2, slot + 1)
+        for name in ("_lat", "_lng"):
+            grown = np.full(size, np.nan)
+            old = getattr(self, name)
+            grown[: len(old)] = old
+            setattr(self, name, grown)
+
+    def put(self, slot: int, lat: Optional[float], lng: Optional[float]) -> None:
+        self.discard(slot)
+        if lat is None or lng is None:
+            return
+        self._ensure(slot)
+        self._lat[slot] = lat
+        self._lng[slot] = lng
+        self._cells.setdefault(self._cell(lat, lng), set()).add(slot)
+
+    def discard(self, slot: int) -> None:
+        if slot >= len(self._lat) or np.isnan(self._lat[slot]):
+            return
+        key = self._cell(self._lat[slot], self._lng[slot])
+        bucket = self._cells.get(key)
+        if bucket is not None:
+            bucket.discard(slot)
+            if not bucket:
+                del self._cells[key]
+        self._lat[slot] = np.nan
+        self._lng[slot] = np.nan
+
+    def coords(self, slots: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        return self._lat[slots], self._lng[slots]
+
+    def _bbox_slots(self, lat_lo: float, lat_hi: float, lng_lo: float, lng_hi: float) -> np.ndarray:
+        (r0, c0), (r1, c1) = self._cell(lat_lo, lng_lo), self._cell(lat_hi, lng_hi)
+        n_cells = (r1 - r0 + 1) * (c1 - c0 + 1)
+        if n_cells > len(self._cells):
+            # Query box is larger than the occupied grid: walk occupied cells instead.
+            buckets: Iterable[Set[int]] = (
+                b for (r, c), b in self._cells.items() if r0 <= r <= r1 and c0 <= c <= c1
+            )
+        else:
+            buckets = (
+                self._cells[(r, c)]
+                for r in range(r0, r1 + 1)
+                for c in range(c0, c1 + 1)
+                if (r, c) in self._cells
+            )
+        slots = [s for b in buckets for s in b]
+        return np.fromiter(slots, dtype=np.int64, count=len(slots))
+
+    def within(self, lat: float, lng: float, radius_mi: float) -> Tuple[np.ndarray, np.ndarray]:
+        """Slots within radius_mi of (lat, lng) and their distances, unordered."""
+        dlat = radius_mi / MILES_PER_DEG_LAT
+        coslat = max(math.cos(math.radians(min(abs(lat) + dlat, 89.9))), 1e-6)
+        dlng = min(radius_mi / (MILES_PER_DEG_LAT * coslat), 180.0)
+        slots = self._bbox_slots(lat - dlat, lat + dlat, lng - dlng, lng + dlng)
+        if not len(slots):
+            return slots, np.zeros(0)
+        dist = haversine_miles(lat, lng, self._lat[slots], self._lng[slots])
+        keep = dist <= radius_mi
+        return slots[keep], dist[keep]
+
+    def near_segment(
+        self, a_lat: float, a_lng: float, b_lat: float, b_lng: float, width_mi: float
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Slots within width_mi of segment A->B: (slots, offset distance, along-track miles)."""
+        lat_lo, lat_hi = segment_lat_range(a_lat, a_lng, b_lat, b_lng)
+        dlat = width_mi / MILES_PER_DEG_LAT
+        top = min(max(abs(lat_lo), abs(lat_hi)) + dlat, 89.9)
+        dlng = min(width_mi / (MILES_PER_DEG_LAT * max(math.cos(math.radians(top)), 1e-6)), 180.0)
+        slots = self._bbox_slots(
+            lat_lo - dlat, lat_hi + dlat,
+            min(a_lng, b_lng) - dlng, max(a_lng, b_lng) + dlng,
+        )
+        if not len(slots):
+            return slots, np.zeros(0), np.zeros(0)
+        dist, along = segment_distance_miles(self._lat[slots], self._lng[slots], a_lat, a_lng, b_lat, b_lng)
+        keep = dist <= width_mi
+        return slots[keep], dist[keep], along[keep]
@@ -0,0 +1,520 @@
+"""
+Load board search engine.
+
+Every indexed load occupies a slot. Categorical attributes (status, lanes,
+equipment, hazmat, shipper, carrier) are kept as per-value bitmaps over the
+slots (Python ints), so a multi-filter query is a handful of AND operations.
+Rate and pickup date are kept in sorted arrays that provide both range
+filtering and the result order for keyset pagination. Market statistics for
+posted loads are maintained incrementally on every insert, removal and status
+change, so /loads/board never aggregates at query time. Origin and destination
+coordinates live in two geo grids (geo_index.py) for radius, backhaul and
+corridor searches.
+
+The index is warmed from the database on startup and kept in sync by the load
+create route and the load lifecycle transition listener.
+"""
+
+import threading
+from bisect import bisect_left, bisect_right, insort
+from datetime import date, datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from .database import Load, LoadPosting
+from .geo_index import GeoGrid, haversine_miles, segment_distance_miles
+
+
+# Loads visible on the public board (posted, not yet being loaded).
+BOARD_STATUSES = frozenset({"Pre-Loading"})
+
+FACETS = ("status", "origin_state", "destination_state", "equipment", "hazmat", "shipper_id", "carrier_id")
+
+_INF = float("inf")
+
+
+def _norm_state(v: Any) -> Optional[str]:
+    return str(v).strip().upper() if v not in (None, "") else None
+
+
+def _norm_equipment(v: Any) -> Optional[str]:
+    return str(v).strip().lower().replace(" ", "_") if v not in (None, "") else None
+
+
+def _norm_id(v: Any) -> Optional[str]:
+    return str(v) if v not in (None, "") else None
+
+
+def _coord(v: Any) -> Optional[float]:
+    try:
+        return float(v) if v not in (None, "") else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _iso_date(v: Any) -> Optional[str]:
+    if v in (None, ""):
+        return None
+    if isinstance(v, (date, datetime)):
+        return v.isoformat()[:10]
+    return str(v)[:10]
+
+
+def _iter_bits(bitmap: int) -> Iterable[int]:
+    while bitmap:
+        low = bitmap & -bitmap
+        yield low.bit_length() - 1
+        bitmap ^= low
+
+
+def _bitmap_from_slots(slots: Iterable[int], nbits: int) -> int:
+    buf = bytearray((nbits >> 3) + 1)
+    for s in slots:
+        buf[s >> 3] |= 1 << (s & 7)
+    return int.from_bytes(buf, "little")
+
+
+def encode_cursor(sort_value: Any, load_id: int) -> str:
+    return f"{sort_value}~{load_id}"
+
+
+def decode_cursor(cursor: str, sort: str) -> Tuple[Any, int]:
+    value, _, load_id = cursor.rpartition("~")
+    if sort == "rate":
+        return float(value), int(load_id)
+    return value, int(load_id)
+
+
+class LoadBoardIndex:
+    """In-memory bitmap/sorted-array index over loads. Thread-safe."""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._reset()
+
+    def _reset(self) -> None:
+        self._records: List[Optional[Dict[str, Any]]] = []
+        self._slot_of: Dict[int, int] = {}
+        self._free: List[int] = []
+        self._live = 0
+        self._bitmaps: Dict[str, Dict[Any, int]] = {f: {} for f in FACETS}
+        # (value, load_id, slot) triples, ascending
+        self._by_rate: List[Tuple[float, int, int]] = []
+        self._by_pickup: List[Tuple[str, int, int]] = []
+        # (origin_state, equipment) -> [posted loads, sum rate/mile, loads with distance]
+        self._stats: Dict[Tuple[Optional[str], Optional[str]], List[float]] = {}
+        self._trucks: Dict[Tuple[Optional[str], Optional[str]], int] = {}
+        self._origins = GeoGrid()
+        self._destinations = GeoGrid()
+
+    # -- maintenance -------------------------------------------------------
+
+    def __len__(self) -> int:
+        return len(self._slot_of)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._reset()
+
+    def upsert(self, load_id: int, status: str, rate: float, posting: Dict[str, Any]) -> None:
+        """Index (or re-index) one load. posting holds the LoadPosting columns."""
+        with self._lock:
+            if load_id in self._slot_of:
+                self._remove(load_id)
+            slot = self._free.pop() if self._free else len(self._records)
+            if slot == len(self._records):
+                self._records.append(None)
+
+            rec = {
+                "load_id": load_id,
+                "slot": slot,
+                "status": status,
+                "rate": float(rate or 0.0),
+                "pickup": _iso_date(posting.get("pickup_date")) or "",
+                "origin_state": _norm_state(posting.get("origin_state")),
+                "destination_state": _norm_state(posting.get("destination_state")),
+                "equipment": _norm_equipment(posting.get("equipment_type")),
+                "hazmat": bool(posting.get("hazmat")),
+                "shipper_id": _norm_id(posting.get("shipper_id")),
+                "carrier_id": _norm_id(posting.get("carrier_id")),
+                "posting": dict(posting),
+            }
+            self._records[slot] = rec
+            self._slot_of[load_id] = slot
+            bit = 1 << slot
+            self._live |= bit
+            for facet in FACETS:
+                bucket = self._bitmaps[facet]
+                bucket[rec[facet]] = bucket.get(rec[facet], 0) | bit
+            insort(self._by_rate, (rec["rate"], load_id, slot))
+            self._origins.put(slot, _coord(posting.get("origin_lat")), _coord(posting.get("origin_lng")))
+            self._destinations.put(slot, _coord(posting.get("destination_lat")), _coord(posting.get("destination_lng")))
+            insort(self._by_pickup, (rec["pickup"], load_id, slot))
+            if status in BOARD_STATUSES:
+                self._add_stats(rec, +1)
+
+    def remove(self, load_id: int) -> None:
+        with self._lock:
+            if load_id in self._slot_of:
+                self._remove(load_id)
+
+    def _remove(self, load_id: int) -> None:
+        slot = self._slot_of.pop(load_id)
+        rec = self._records[slot]
+        mask = ~(1 << slot)
+        self._live &= mask
+        for facet in FACETS:
+            bucket = self._bitmaps[facet]
+            remaining = bucket.get(rec[facet], 0) & mask
+            if remaining:
+                bucket[rec[facet]] = remaining
+            else:
+                bucket.pop(rec[facet], None)
+        for arr, key in ((self._by_rate, rec["rate"]), (self._by_pickup, rec["pickup"])):
+            i = bisect_left(arr, (key, load_id, slot))
+            if i < len(arr) and arr[i] == (key, load_id, slot):
+                del arr[i]
+        if rec["status"] in BOARD_STATUSES:
+            self._add_stats(rec, -1)
+        self._origins.discard(slot)
+        self._destinations.discard(slot)
+        self._records[slot] = None
+        self._free.append(slot)
+
+    def set_status(self, load_id: int, new_status: str) -> None:
+        with self._lock:
+            slot = self._slot_of.get(load_id)
+            if slot is None:
+                return
+            rec = self._records[slot]
+            old_status = rec["status"]
+            if old_status == new_status:
+                return
+            bit = 1 << slot
+            bucket = self._bitmaps["status"]
+            remaining = bucket.get(old_status, 0) & ~bit
+            if remaining:
+                bucket[old_status] = remaining
+            else:
+                bucket.pop(old_status, None)
+            bucket[new_status] = bucket.get(new_status, 0) | bit
+            rec["status"] = new_status
+            was_posted, is_posted = old_status in BOARD_STATUSES, new_status in BOARD_STATUSES
+            if was_posted and not is_posted:
+                self._add_stats(rec, -1)
+            elif is_posted and not was_posted:
+                self._add_stats(rec, +1)
+
+    def on_transition(self, load_id: int, from_status: Optional[str], to_status: str) -> None:
+        """load_lifecycle transition listener."""
+        self.set_status(load_id, to_status)
+
+    def _add_stats(self, rec: Dict[str, Any], sign: int) -> None:
+        key = (rec["origin_state"], rec["equipment"])
+        agg = self._stats.setdefault(key, [0, 0.0, 0])
+        agg[0] += sign
+        distance = rec["posting"].get("distance") or 0
+        if distance > 0:
+            agg[1] += sign * rec["rate"] / distance
+            agg[2] += sign
+        if agg[0] == 0:
+            del self._stats[key]
+
+    def set_available_trucks(self, origin_state: Optional[str], equipment: Optional[str], count: int) -> None:
+        with self._lock:
+            self._trucks[(_norm_state(origin_state), _norm_equipment(equipment))] = max(0, int(count))
+
+    def load_from_db(self, db: Session) -> int:
+        """Rebuild the index from loads joined to their postings."""
+        rows = db.query(Load, LoadPosting).join(LoadPosting, LoadPosting.load_id == Load.id).all()
+        with self._lock:
+            self.clear()
+            for load, posting in rows:
+                self.upsert(load.id, load.status, load.rate, posting_columns(posting))
+        return len(rows)
+
+    # -- queries -----------------------------------------------------------
+
+    def _range_bitmap(self, arr: List[Tuple[Any, int, int]], lo: Any) -> int:
+        start = bisect_left(arr, (lo, -1, -1))
+        return _bitmap_from_slots((entry[2] for entry in arr[start:]), len(self._records))
+
+    def _filter_bitmap(self, filters: Dict[str, Any], min_rate: Optional[float], pickup_date_start: Optional[str]) -> int:
+        cand = self._live
+        for facet, value in filters.items():
+            if value is None:
+                continue
+            if facet in ("origin_state", "destination_state"):
+                value = _norm_state(value)
+            elif facet == "equipment":
+                value = _norm_equipment(value)
+            elif facet in ("shipper_id", "carrier_id"):
+                value = _norm_id(value)
+            cand &= self._bitmaps[facet].get(value, 0)
+            if not cand:
+                return 0
+        if min_rate is not None:
+            cand &= self._range_bitmap(self._by_rate, float(min_rate))
+        if pickup_date_start:
+            cand &= self._range_bitmap(self._by_pickup, _iso_date(pickup_date_start))
+        return cand
+
+    def search(
+        self,
+        filters: Dict[str, Any],
+        min_rate: Optional[float] = None,
+        pickup_date_start: Optional[str] = None,
+        sort: str = "pickup",
+        limit: int = 50,
+        offset: int = 0,
+        cursor: Optional[str] = None,
+    ) -> Tuple[List[Dict[str, Any]], int, Optional[str]]:
+        """Return (records, total_matches, next_cursor).
+
+        sort is "pickup" (earliest first) or "rate" (highest first). Pages after
+        the first are addressed by the opaque cursor of the previous page.
+        """
+        with self._lock:
+            cand = self._filter_bitmap(filters, min_rate, pickup_date_start)
+            total = cand.bit_count()
+            if not total:
+                return [], 0, None
+
+            arr = self._by_rate if sort == "rate" else self._by_pickup
+            descending = sort == "rate"
+            after = decode_cursor(cursor, sort) if cursor else None
+
+            def _key(rec):
+                return (rec["rate"], rec["load_id"]) if sort == "rate" else (rec["pickup"], rec["load_id"])
+
+            picked: List[Dict[str, Any]] = []
+            want = offset + limit + 1
+            if total <= 4 * want + 64:
+                # Few matches: materialize and sort them directly.
+                recs = sorted((self._records[s] for s in _iter_bits(cand)), key=_key, reverse=descending)
+                if after is not None:
+                    recs = [r for r in recs if (_key(r) < after if descending else _key(r) > after)]
+                picked = recs[:want]
+            else:
+                # Many matches: walk the sorted array from the cursor, testing membership.
+                if descending:
+                    start = bisect_left(arr, after) - 1 if after is not None else len(arr) - 1
+                    indices = range(start, -1, -1)
+                else:
+                    start = bisect_right(arr, (after[0], after[1], _INF)) if after is not None else 0
+                    indices = range(start, len(arr))
+                for i in indices:
+                    slot = arr[i][2]
+                    if (cand >> slot) & 1:
+                        picked.append(self._records[slot])
+                        if len(picked) >= want:
+                            break
+
+            page = picked[offset:offset + limit]
+            next_cursor = None
+            if len(picked) > offset + limit and page:
+                last = page[-1]
+                next_cursor = encode_cursor(*_key(last))
+            return page, total, next_cursor
+
+    def geo_search(
+        self,
+        filters: Dict[str, Any],
+        near: Optional[Tuple[float, float]] = None,
+        radius_mi: float = 100.0,
+        home: Optional[Tuple[float, float]] = None,
+        home_radius_mi: float = 100.0,
+        corridor: Optional[Tuple[Tuple[float, float], Tuple[float, float]]] = None,
+        corridor_width_mi: float = 50.0,
+        min_rate: Optional[float] = None,
+        pickup_date_start: Optional[str] = None,
+        sort: str = "deadhead",
+        limit: int = 50,
+    ) -> Tuple[List[Tuple[Dict[str, Any], Dict[str, Any]]], int]:
+        """Return ([(record, geo), ...], total_matches) for a geographic board query.
+
+        near       origin within radius_mi of the truck (deadhead = truck -> origin)
+        home       destination within home_radius_mi of home (backhaul)
+        corridor   origin and destination both within corridor_width_mi of the
+                   A->B lane, origin before destination along it (deadhead =
+                   lane -> origin offset when near is not given)
+
+        sort is "deadhead" (nearest first) or "rpm" (highest all-in rate per mile,
+        i.e. rate / (deadhead + loaded miles)). geo holds the computed distances.
+        """
+        if near is None and home is None and corridor is None:
+            raise ValueError("near, home or corridor is required")
+        with self._lock:
+            cand = self._filter_bitmap(filters, min_rate, pickup_date_start)
+            if not cand:
+                return [], 0
+            nbytes = (len(self._records) >> 3) + 1
+            allowed = np.unpackbits(
+                np.frombuffer(cand.to_bytes(nbytes, "little"), dtype=np.uint8), bitorder="little"
+            ).astype(bool)
+
+            # Primary lookup through the most selective grid, then refine.
+            along = None
+            if near is not None:
+                slots, deadhead = self._origins.within(near[0], near[1], radius_mi)
+            elif corridor is not None:
+                (a_lat, a_lng), (b_lat, b_lng) = corridor
+                slots, deadhead, along = self._origins.near_segment(a_lat, a_lng, b_lat, b_lng, corridor_width_mi)
+            else:
+                slots, _ = self._destinations.within(home[0], home[1], home_radius_mi)
+                deadhead = np.full(len(slots), np.nan)
+
+            keep = allowed[slots]
+            slots, deadhead = slots[keep], deadhead[keep]
+            if along is not None:
+                along = along[keep]
+
+            if corridor is not None and len(slots):
+                (a_lat, a_lng), (b_lat, b_lng) = corridor
+                if along is None:
+                    o_lat, o_lng = self._origins.coords(slots)
+                    _, along = segment_distance_miles(o_lat, o_lng, a_lat, a_lng, b_lat, b_lng)
+                d_lat, d_lng = self._destinations.coords(slots)
+                offset, d_along = segment_distance_miles(d_lat, d_lng, a_lat, a_lng, b_lat, b_lng)
+                keep = (offset <= corridor_width_mi) & (d_along > along)
+                slots, deadhead = slots[keep], deadhead[keep]
+
+            home_dist = None
+            if home is not None and len(slots):
+                d_lat, d_lng = self._destinations.coords(slots)
+                home_dist = haversine_miles(home[0], home[1], d_lat, d_lng)
+                keep = home_dist <= home_radius_mi  # NaN (no coordinates) drops out
+                slots, deadhead, home_dist = slots[keep], deadhead[keep], home_dist[keep]
+
+            total = len(slots)
+            if not total:
+                return [], 0
+
+            recs = [self._records[s] for s in slots.tolist()]
+            rates = np.fromiter((r["rate"] for r in recs), dtype=np.float64, count=total)
+            loaded = np.fromiter((r["posting"].get("distance") or np.nan for r in recs), dtype=np.float64, count=total)
+            o_lat, o_lng = self._origins.coords(slots)
+            d_lat, d_lng = self._destinations.coords(slots)
+            loaded = np.where(np.isnan(loaded), haversine_miles(o_lat, o_lng, d_lat, d_lng), loaded)
+            miles = np.nan_to_num(deadhead, nan=0.0) + loaded
+            with np.errstate(divide="ignore", invalid="ignore"):
+                all_in_rpm = np.where(miles > 0, rates / miles, np.nan)
+
+            ids = np.fromiter((r["load_id"] for r in recs), dtype=np.int64, count=total)
+            if sort == "rpm":
+                order = np.lexsort((ids, np.nan_to_num(deadhead, nan=np.inf), -np.nan_to_num(all_in_rpm, nan=-np.inf)))
+            else:
+                order = np.lexsort((ids, -np.nan_to_num(all_in_rpm, nan=-np.inf), np.nan_to_num(deadhead, nan=np.inf)))
+            order = order[:limit]
+
+            def _mi(v):
+                return None if np.isnan(v) else round(float(v), 1)
+
+            results = []
+            for i in order.tolist():
+                results.append((recs[i], {
+                    "deadheadMiles": _mi(deadhead[i]),
+                    "loadedMiles": _mi(loaded[i]),
+                    "homeDistanceMiles": _mi(home_dist[i]) if home_dist is not None else None,
+                    "allInRatePerMile": None if np.isnan(all_in_rpm[i]) else round(float(all_in_rpm[i]), 2),
+                }))
+            return results, total
+
+    def market_stats(self, origin_state: Optional[str] = None, equipment: Optional[str] = None) -> Dict[str, Any]:
+        origin_state, equipment = _norm_state(origin_state), _norm_equipment(equipment)
+        with self._lock:
+            loads, rpm_sum, rpm_n = 0, 0.0, 0
+            for (state, equip), agg in self._stats.items():
+                if origin_state is not None and state != origin_state:
+                    continue
+                if equipment is not None and equip != equipment:
+                    continue
+                loads += agg[0]
+                rpm_sum += agg[1]
+                rpm_n += agg[2]
+            trucks = sum(
+                n for (state, equip), n in self._trucks.items()
+                if (origin_state is None or state == origin_state) and (equipment is None or equip == equipment)
+            )
+        return {
+            "avgRate": round(rpm_sum / rpm_n, 2) if rpm_n else 0.0,
+            "totalLoads": int(loads),
+            "availableTrucks": trucks,
+            "loadToTruckRatio": round(loads / trucks, 2) if trucks else None,
+        }
+
+
+def posting_columns(posting: LoadPosting) -> Dict[str, Any]:
+    return {c.name: getattr(posting, c.name) for c in LoadPosting.__table__.columns}
+
+
+def posting_from_payload(data: Dict[str, Any]) -> Dict[str, Any]:
+    """Map the REST create-load payload onto LoadPosting columns."""
+    shipper = data.get("shipper") if isinstance(data.get("shipper"), dict) else {}
+    carrier = data.get("carrier") if isinstance(data.get("carrier"), dict) else {}
+    origin = data.get("origin") or {}
+    destination = data.get("destination") or {}
+    freight = data.get("freight") or {}
+    pickup = data.get("pickupDate") or (data.get("pickup") or {}).get("date")
+    delivery = data.get("deliveryDate") or (data.get("delivery") or {}).get("date")
+    return {
+        "load_number": data.get("loadNumber"),
+        "shipper_id": _norm_id(shipper.get("id") or data.get("shipperId")),
+        "shipper_name": shipper.get("name") or (data.get("shipper") if isinstance(data.get("shipper"), str) else None),
+        "carrier_id": _norm_id(carrier.get("id") or data.get("carrierId")),
+        "origin_city": origin.get("city"),
+        "origin_state": _norm_state(origin.get("state")),
+        "destination_city": destination.get("city"),
+        "destination_state": _norm_state(destination.get("state")),
+        "origin_lat": _coord(origin.get("lat", origin.get("latitude"))),
+        "origin_lng": _coord(origin.get("lng", origin.get("longitude"))),
+        "destination_lat": _coord(destination.get("lat", destination.get("latitude"))),
+        "destination_lng": _coord(destination.get("lng", destination.get("longitude"))),
+        "equipment_type": _norm_equipment(data.get("equipmentType") or data.get("equipment")),
+        "hazmat": bool(data.get("hazmat", freight.get("hazmat", False))),
+        "commodity": data.get("commodity") or freight.get("commodity"),
+        "weight": data.get("weight") or freight.get("weight"),
+        "distance": data.get("distance"),
+        "pickup_date": _iso_date(pickup),
+        "delivery_date": _iso_date(delivery),
+    }
+
+
+def board_view(rec: Dict[str, Any]) -> Dict[str, Any]:
+    """Public load-board representation of an indexed record."""
+    p = rec["posting"]
+    distance = p.get("distance")
+    posted_at = p.get("posted_at")
+    return {
+        "id": rec["load_id"],
+        "loadNumber": p.get("load_number") or f"LOAD-{rec['load_id']}",
+        "status": rec["status"],
+        "shipper": p.get("shipper_name"),
+        "origin": {
+            "city": p.get("origin_city"),
+            "state": rec["origin_state"],
+            "lat": p.get("origin_lat"),
+            "lng": p.get("origin_lng"),
+        },
+        "destination": {
+            "city": p.get("destination_city"),
+            "state": rec["destination_state"],
+            "lat": p.get("destination_lat"),
+            "lng": p.get("destination_lng"),
+        },
+        "distance": distance,
+        "pickupDate": rec["pickup"] or None,
+        "deliveryDate": _iso_date(p.get("delivery_date")),
+        "equipmentType": rec["equipment"],
+        "weight": p.get("weight"),
+        "commodity": p.get("commodity"),
+        "hazmat": rec["hazmat"],
+        "rate": rec["rate"],
+        "ratePerMile": round(rec["rate"] / distance, 2) if distance else None,
+        "postedAt": posted_at.isoformat() if isinstance(posted_at, datetime) else posted_at,
+    }
+
+
+board = LoadBoardIndex()
@@ -0,0 +1,256 @@
+"""
+Load lifecycle engine.
+
+The load status state machine is compiled once at import time. Status changes
+are compare-and-set updates (UPDATE ... WHERE status = :expected) so two
+dispatchers racing on the same load cannot both win, and every accepted change
+is appended to the load_events log in the same transaction.
+"""
+
+import logging
+from typing import Any, Callable, Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+from sqlalchemy import insert, select, update
+from sqlalchemy.orm import Session
+
+from .database import Load, LoadEvent
+
+logger = logging.getLogger("load_lifecycle")
+
+# State machine based on pre-loading-phase.txt, loading-phase.txt and transportation-phase.txt
+LOAD_TRANSITIONS: Dict[str, Tuple[str, ...]] = {
+    "Pre-Loading": ("Loading", "Cancelled"),
+    "Loading": ("In-Transit", "Cancelled"),
+    "In-Transit": ("Delivered", "Delayed"),
+    "Delayed": ("In-Transit", "Delivered"),
+    "Delivered": (),
+    "Cancelled": (),
+}
+
+LOAD_STATUSES: Tuple[str, ...] = tuple(LOAD_TRANSITIONS)
+
+# Compiled lookup tables
+ALLOWED_TRANSITIONS: FrozenSet[Tuple[str, str]] = frozenset(
+    (src, dst) for src, targets in LOAD_TRANSITIONS.items() for dst in targets
+)
+TERMINAL_STATUSES: FrozenSet[str] = frozenset(s for s, targets in LOAD_TRANSITIONS.items() if not targets)
+
+# Accept "in_transit", "IN-TRANSIT", "pre loading" etc. from the REST routers.
+_STATUS_ALIASES: Dict[str, str] = {
+    s.lower().replace("-", "_").replace(" ", "_"): s for s in LOAD_STATUSES
+}
+
+# Keep IN (...) lists well below SQLite's bound-parameter limit.
+_BULK_CHUNK = 500
+
+
+# Called as fn(load_id, from_status, to_status) after each committed transition.
+TransitionListener = Callable[[int, Optional[str], str], None]
+_listeners: List[TransitionListener] = []
+
+
+def add_transition_listener(fn: TransitionListener) -> None:
+    if fn not in _listeners:
+        _listeners.append(fn)
+
+
+def _notify(load_id: int, from_status: Optional[str], to_status: str) -> None:
+    for fn in _listeners:
+        try:
+            fn(load_id, from_status, to_status)
+        except Exception as e:
+            logger.error(f"Transition listener failed for load {load_id}: {e}")
+
+
+class LoadTransitionError(Exception):
+    """A rejected status change; status_code maps directly onto the HTTP response."""
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+def normalize_status(status: Optional[str]) -> str:
+    key = (status or "").strip().lower().replace("-", "_").replace(" ", "_")
+    canonical = _STATUS_ALIASES.get(key)
+    if canonical is None:
+        raise LoadTransitionError(400, f"Unknown load status: {status}")
+    return canonical
+
+
+def is_valid_transition(current_status: str, new_status: str) -> bool:
+    return (current_status, new_status) in ALLOWED_TRANSITIONS
+
+
+def _supports_update_returning(db: Session) -> bool:
+    return bool(getattr(db.get_bind().dialect, "update_returning", False))
+
+
+def _chunks(items: List[Any], size: int = _BULK_CHUNK) -> Iterable[List[Any]]:
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def transition_load(
+    db: Session,
+    load_id: int,
+    new_status: str,
+    expected_status: Optional[str] = None,
+    actor_id: Optional[int] = None,
+):
+    """Move one load to new_status.
+
+    When expected_status is supplied the current status is not read at all: the
+    transition is validated against it and the conditional UPDATE either applies
+    or reports a conflict. Returns a row with id, status and rate.
+    """
+    new_status = normalize_status(new_status)
+
+    if expected_status is None:
+        current = db.execute(select(Load.status).where(Load.id == load_id)).scalar_one_or_none()
+        if current is None:
+            raise LoadTransitionError(404, "Load not found")
+    else:
+        current = normalize_status(expected_status)
+
+    if not is_valid_transition(current, new_status):
+        raise LoadTransitionError(400, f"Invalid status transition from {current} to {new_status}")
+
+    stmt = (
+        update(Load)
+        .where(Load.id == load_id, Load.status == current)
+        .values(status=new_status)
+        .execution_options(synchronize_session=False)
+    )
+    if _supports_update_returning(db):
+        row = db.execute(stmt.returning(Load.id, Load.status, Load.rate)).first()
+    else:
+        row = None
+        if db.execute(stmt).rowcount:
+            row = db.execute(select(Load.id, Load.status, Load.rate).where(Load.id == load_id)).first()
+
+    if row is None:
+        db.rollback()
+        actual = db.execute(select(Load.status).where(Load.id == load_id)).scalar_one_or_none()
+        if actual is None:
+            raise LoadTransitionError(404, "Load not found")
+        raise LoadTransitionError(409, f"Load {load_id} is in status {actual}, expected {current}")
+
+    db.execute(
+        insert(LoadEvent).values(load_id=load_id, from_status=current, to_status=new_status, actor_id=actor_id)
+    )
+    db.commit()
+    _notify(load_id, current, new_status)
+    return row
+
+
+def bulk_transition(
+    db: Session,
+    items: List[Dict[str, Any]],
+    actor_id: Optional[int] = None,
+) -> List[Dict[str, Any]]:
+    """Apply many transitions with set-based statements and a single commit.
+
+    items are dicts with load_id, new_status and optional expected_status.
+    Loads sharing the same (from, to) pair are moved by one conditional UPDATE;
+    all events are written with one executemany INSERT. Returns one result per
+    input item, in input order.
+    """
+    results: List[Dict[str, Any]] = [
+        {"load_id": item.get("load_id"), "success": False} for item in items
+    ]
+    wanted: Dict[int, Tuple[str, Optional[str]]] = {}
+
+    for idx, item in enumerate(items):
+        load_id = item.get("load_id")
+        try:
+            new_status = normalize_status(item.get("new_status"))
+            expected = item.get("expected_status")
+            expected = normalize_status(expected) if expected is not None else None
+        except LoadTransitionError as e:
+            results[idx]["error"] = e.detail
+            continue
+        if load_id in wanted:
+            results[idx]["error"] = "Duplicate load in batch"
+            continue
+        wanted[load_id] = (new_status, expected)
+        results[idx]["to_status"] = new_status
+
+    # One read for every load whose current status was not supplied by the caller.
+    current_by_id: Dict[int, str] = {}
+    lookup = [lid for lid, (_, expected) in wanted.items() if expected is None]
+    for chunk in _chunks(lookup):
+        current_by_id.update(db.execute(select(Load.id, Load.status).where(Load.id.in_(chunk))).all())
+
+    groups: Dict[Tuple[str, str], List[int]] = {}
+    errors: Dict[int, str] = {}
+    for load_id, (new_status, expected) in wanted.items():
+        current = expected if expected is not None else current_by_id.get(load_id)
+        if current is None:
+            errors[load_id] = "Load not found"
+        elif not is_valid_transition(current, new_status):
+            errors[load_id] = f"Invalid status transition from {current} to {new_status}"
+        else:
+            groups.setdefault((current, new_status), []).append(load_id)
+
+    applied: Dict[int, str] = {}
+    returning = _supports_update_returning(db)
+    for (current, new_status), load_ids in groups.items():
+        for chunk in _chunks(load_ids):
+            stmt = (
+                update(Load)
+                .where(Load.id.in_(chunk), Load.status == current)
+                .values(status=new_status)
+                .execution_options(synchronize_session=False)
+            )
+            if returning:
+                moved = db.execute(stmt.returning(Load.id)).scalars().all()
+            else:
+                moved = []
+                for load_id in chunk:
+                    single = (
+                        update(Load)
+                        .where(Load.id == load_id, Load.status == current)
+                        .values(status=new_status)
+                        .execution_options(synchronize_session=False)
+                    )
+                    if db.execute(single).rowcount:
+                        moved.append(load_id)
+            for load_id in moved:
+                applied[load_id] = current
+            for load_id in set(chunk) - set(moved):
+                errors[load_id] = f"Load {load_id} is no longer in status {current}"
+
+    if applied:
+        db.execute(
+            insert(LoadEvent),
+            [
+                {"load_id": load_id, "from_status": current, "to_status": wanted[load_id][0], "actor_id": actor_id}
+                for load_id, current in applied.items()
+            ],
+        )
+    db.commit()
+    for load_id, current in applied.items():
+        _notify(load_id, current, wanted[load_id][0])
+
+    for result in results:
+        load_id = result["load_id"]
+        if "error" in result:
+            continue
+        if load_id in applied:
+            result["success"] = True
+            result["from_status"] = applied[load_id]
+        else:
+            result["error"] = errors.get(load_id, "Not applied")
+    return results
+
+
+def get_load_events(db: Session, load_id: int, limit: int = 100) -> List[LoadEvent]:
+    return (
+        db.query(LoadEvent)
+        .filter(LoadEvent.load_id == load_id)
+        .order_by(LoadEvent.id.asc())
+        .limit(limit)
+        .all()
+    )
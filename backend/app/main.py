@@ -1,12 +1,16 @@
 from fastapi import FastAPI, WebSocket, Depends, HTTPException
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from sqlalchemy import text as sql_text
+from sqlalchemy.exc import IntegrityError
 from typing import List, Dict, Optional, Any
 import json
 import os
 
-from . import crud, schemas
-from .database import SessionLocal, engine, Base, get_db, User, Load, Transaction
+from . import crud, schemas, load_lifecycle, settlement
+from .load_board import board as load_board
+from .database import SessionLocal, engine, Base, ensure_core_schema, get_db, User, Load, Transaction
+from .db_pool import pool_stats
 from .erg_models import ensure_erg_schema, ErgUnIndex, ErgGuideText, ErgSourceDocument
 from .erg_ingestion import ingest_from_extraction
 from .erg_module_seed import seed_erg_from_json
@@ -34,6 +38,12 @@ app = FastAPI(
 # Create database tables (only if they don't exist)
 ensure_erg_schema(engine)
 Base.metadata.create_all(bind=engine)
+ensure_core_schema(engine)
+
+# Warm the in-memory load board and keep it in sync with status changes
+with SessionLocal() as _db:
+    load_board.load_from_db(_db)
+load_lifecycle.add_transition_listener(load_board.on_transition)
 
 app.include_router(erg_api_router)
 
@@ -83,26 +93,34 @@ def read_load(load_id: int, db: Session = Depends(get_db)):
 
 @app.post("/loads/{load_id}/update_status", response_model=schemas.Load)
 def update_load_status(load_id: int, status_update: schemas.LoadUpdateStatus, db: Session = Depends(get_db)):
-    db_load = crud.get_load(db, load_id=load_id)
-    if not db_load:
-        raise HTTPException(status_code=404, detail="Load not found")
-
-    # State machine logic based on the text files (pre-loading-phase.txt, loading-phase.txt, transportation-phase.txt)
-    valid_transitions = {
-        'Pre-Loading': ['Loading', 'Cancelled'],
-        'Loading': ['In-Transit', 'Cancelled'],
-        'In-Transit': ['Delivered', 'Delayed'],
-        'Delivered': [],
-        'Delayed': ['In-Transit', 'Delivered']
-    }
-
-    current_status = db_load.status
-    new_status = status_update.new_status
-    
-    if new_status not in valid_transitions.get(current_status, []):
-        raise HTTPException(status_code=400, detail=f"Invalid status transition from {current_status} to {new_status}")
+    # State machine compiled in load_lifecycle (pre-loading-phase.txt, loading-phase.txt, transportation-phase.txt)
+    try:
+        return load_lifecycle.transition_load(
+            db,
+            load_id,
+            status_update.new_status,
+            expected_status=status_update.expected_status,
+            actor_id=status_update.actor_id,
+        )
+    except load_lifecycle.LoadTransitionError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+
+@app.post("/loads/bulk_transition")
+def bulk_transition_loads(payload: schemas.BulkLoadTransition, db: Session = Depends(get_db)):
+    """Move many loads at once (dispatch boards); each item succeeds or fails independently."""
+    if len(payload.transitions) > 5000:
+        raise HTTPException(status_code=400, detail="Max 5000 transitions per request")
+    results = load_lifecycle.bulk_transition(
+        db,
+        [t.dict() for t in payload.transitions],
+        actor_id=payload.actor_id,
+    )
+    applied = sum(1 for r in results if r["success"])
+    return {"applied": applied, "rejected": len(results) - applied, "results": results}
 
-    return crud.update_load_status(db, load_id, new_status)
+@app.get("/loads/{load_id}/events", response_model=List[schemas.LoadEvent])
+def read_load_events(load_id: int, limit: int = 100, db: Session = Depends(get_db)):
+    return load_lifecycle.get_load_events(db, load_id, limit=limit)
 
 # --- 3. FINTECH / EUROWALLET API (Mandate: eusotrip-fintech-architecture.md, stripe-integration-guide.md) ---
 
@@ -116,20 +134,56 @@ def calculate_commission(load_id: int, driver_id: int, db: Session = Depends(get
         raise HTTPException(status_code=404, detail="Load not found")
     if not db_driver or db_driver.role not in ['DRIVER', 'CATALYST']:
         raise HTTPException(status_code=400, detail="Driver not found or invalid role")
+    # Same rules as a settlement run: delivered loads only, paid to their assigned driver
+    error = settlement.payee_error(db_load.status, db_load.driver_id, driver_id)
+    if error:
+        raise HTTPException(status_code=409, detail=error)
     
-    commission_rate = 0.15 # 15% flat rate as per mock logic
-    driver_pay = db_load.rate * (1 - commission_rate)
+    # 15% flat rate as per mock logic, computed in exact cents
+    _gross, _commission, driver_pay = settlement.split_load_rate(db_load.rate)
     
     # Create the transaction record
     transaction_data = schemas.TransactionCreate(
         type="COMMISSION",
-        amount=round(driver_pay, 2),
+        amount=float(driver_pay),
         user_id=driver_id,
         load_id=load_id
     )
     
     # In a real system, this would trigger a Stripe/PCI-compliant transaction
-    return crud.create_transaction(db, transaction_data)
+    try:
+        return crud.create_transaction(db, transaction_data)
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(status_code=409, detail="Load already settled")
+
+@app.post("/fintech/settlement_run")
+def settlement_run(run: schemas.SettlementRunRequest, db: Session = Depends(get_db)):
+    """
+    Settle driver pay for many delivered loads in one run (end-of-week carrier settlement).
+    Streams NDJSON: a summary line first, then one line per load. Safe to retry.
+    """
+    if not run.loads and run.delivered_from is None and run.delivered_to is None:
+        raise HTTPException(status_code=400, detail="Provide loads or a delivered_from/delivered_to range")
+    if not (0 <= run.commission_rate < 1):
+        raise HTTPException(status_code=400, detail="commission_rate must be in [0, 1)")
+
+    summary, lines = settlement.run_settlement(
+        db,
+        pairs=[(item.load_id, item.driver_id) for item in run.loads] or None,
+        delivered_from=run.delivered_from,
+        delivered_to=run.delivered_to,
+        driver_id=run.driver_id,
+        commission_rate=run.commission_rate,
+        dry_run=run.dry_run,
+    )
+
+    def _ndjson():
+        yield json.dumps({"type": "summary", **summary}) + "\n"
+        for line in lines:
+            yield json.dumps({"type": "load", **line}) + "\n"
+
+    return StreamingResponse(_ndjson(), media_type="application/x-ndjson")
 
 # --- 4. COLLABORATIVE ECOSYSTEM API (Mandate: collaborative_api_routes.py, collaborative_business_engine.py) ---
 
@@ -231,6 +285,14 @@ def sync_external_data(
         raise HTTPException(status_code=400, detail="Unknown data source for integration")
 
 
+# --- 7. OBSERVABILITY (connection pool telemetry) ---
+
+@app.get("/metrics/db_pool")
+def db_pool_metrics():
+    """Connection pool occupancy, overflow and checkout wait histogram for this process."""
+    return {"engine": pool_stats(engine)}
+
+
 @app.get("/erg/status")
 def erg_status(db: Session = Depends(get_db)):
     latest = db.query(ErgSourceDocument).order_by(ErgSourceDocument.id.desc()).first()
@@ -3,97 +3,178 @@ LOADS ROUTER
 FastAPI routes for load management and load board
 """
 
-from fastapi import APIRouter, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+from sqlalchemy.orm import Session
 from typing import Optional
 from datetime import datetime
+import json
+
+from ..database import get_db
+from .. import crud, load_lifecycle
+from ..load_board import board as load_board, board_view, posting_columns, posting_from_payload
+from ..tracking import hub as tracking_hub, public_view
+
+# Idle streams send a keepalive so proxies don't drop them.
+TRACKING_KEEPALIVE_SECONDS = 15.0
 
 router = APIRouter(prefix="/loads", tags=["Loads"])
 
 
 @router.get("/")
-async def list_loads(
+def list_loads(
     status: Optional[str] = None,
     shipper_id: Optional[str] = None,
     carrier_id: Optional[str] = None,
     limit: int = Query(default=20, le=100),
-    offset: int = 0
+    offset: int = 0,
+    cursor: Optional[str] = None,
 ):
     """List all loads with optional filters"""
-    loads = [
-        {
-            "id": "load_001",
-            "loadNumber": "LOAD-45850",
-            "status": "in_transit",
-            "shipper": {"id": "ship_001", "name": "Shell Oil Company"},
-            "carrier": {"id": "carr_001", "name": "ABC Transport LLC"},
-            "origin": {"city": "Houston", "state": "TX"},
-            "destination": {"city": "Dallas", "state": "TX"},
-            "pickupDate": "2025-01-23",
-            "deliveryDate": "2025-01-23",
-            "commodity": "Unleaded Gasoline",
-            "weight": 58000,
-            "rate": 1250.00,
-            "equipment": "tanker",
-            "hazmat": True,
-        },
-        {
-            "id": "load_002",
-            "loadNumber": "LOAD-45845",
-            "status": "delivered",
-            "shipper": {"id": "ship_002", "name": "ExxonMobil"},
-            "carrier": {"id": "carr_001", "name": "ABC Transport LLC"},
-            "origin": {"city": "Houston", "state": "TX"},
-            "destination": {"city": "San Antonio", "state": "TX"},
-            "pickupDate": "2025-01-22",
-            "deliveryDate": "2025-01-22",
-            "commodity": "Diesel Fuel",
-            "weight": 56000,
-            "rate": 980.00,
-            "equipment": "tanker",
-            "hazmat": True,
-        },
-    ]
-    return {"loads": loads, "total": len(loads)}
+    try:
+        status = load_lifecycle.normalize_status(status) if status else None
+    except load_lifecycle.LoadTransitionError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
+    try:
+        records, total, next_cursor = load_board.search(
+            {"status": status, "shipper_id": shipper_id, "carrier_id": carrier_id},
+            limit=limit,
+            offset=offset,
+            cursor=cursor,
+        )
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return {"loads": [board_view(r) for r in records], "total": total, "nextCursor": next_cursor}
 
 
 @router.get("/board")
-async def search_load_board(
+def search_load_board(
     origin_state: str,
     destination_state: Optional[str] = None,
     equipment_type: Optional[str] = None,
     pickup_date_start: Optional[str] = None,
     min_rate: Optional[float] = None,
     hazmat: Optional[bool] = None,
-    limit: int = 50,
-    offset: int = 0
+    sort: str = "pickup",
+    limit: int = Query(default=50, le=200),
+    offset: int = 0,
+    cursor: Optional[str] = None,
 ):
-    """Search load board for available loads"""
-    loads = [
-        {
-            "id": "lb_001",
-            "loadNumber": "LB-2025-00456",
-            "shipper": "Shell Oil Company",
-            "origin": {"city": "Houston", "state": "TX"},
-            "destination": {"city": "Dallas", "state": "TX"},
-            "distance": 239,
-            "pickupDate": "2025-01-24",
-            "deliveryDate": "2025-01-24",
-            "equipmentType": "tanker",
-            "weight": 58000,
-            "commodity": "Unleaded Gasoline",
-            "hazmat": True,
-            "rate": 850,
-            "ratePerMile": 3.56,
-            "postedAt": "2025-01-23T08:00:00Z",
-        },
-    ]
+    """Search load board for available loads (sort: pickup | rate)"""
+    if sort not in ("pickup", "rate"):
+        raise HTTPException(status_code=400, detail="sort must be 'pickup' or 'rate'")
+    filters = {
+        "status": "Pre-Loading",
+        "origin_state": origin_state,
+        "destination_state": destination_state,
+        "equipment": equipment_type,
+        "hazmat": hazmat,
+    }
+    try:
+        records, total, next_cursor = load_board.search(
+            filters,
+            min_rate=min_rate,
+            pickup_date_start=pickup_date_start,
+            sort=sort,
+            limit=limit,
+            offset=offset,
+            cursor=cursor,
+        )
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
     return {
-        "loads": loads,
-        "total": len(loads),
-        "marketStats": {"avgRate": 3.40, "totalLoads": 156, "loadToTruckRatio": 1.8},
+        "loads": [board_view(r) for r in records],
+        "total": total,
+        "nextCursor": next_cursor,
+        "marketStats": load_board.market_stats(origin_state, equipment_type),
     }
 
 
+@router.get("/board/nearby")
+def search_load_board_nearby(
+    lat: Optional[float] = Query(default=None, ge=-90, le=90),
+    lng: Optional[float] = Query(default=None, ge=-180, le=180),
+    radius_miles: float = Query(default=100.0, gt=0, le=1000),
+    home_lat: Optional[float] = Query(default=None, ge=-90, le=90),
+    home_lng: Optional[float] = Query(default=None, ge=-180, le=180),
+    home_radius_miles: float = Query(default=100.0, gt=0, le=1000),
+    lane_from_lat: Optional[float] = Query(default=None, ge=-90, le=90),
+    lane_from_lng: Optional[float] = Query(default=None, ge=-180, le=180),
+    lane_to_lat: Optional[float] = Query(default=None, ge=-90, le=90),
+    lane_to_lng: Optional[float] = Query(default=None, ge=-180, le=180),
+    corridor_miles: float = Query(default=50.0, gt=0, le=500),
+    equipment_type: Optional[str] = None,
+    hazmat: Optional[bool] = None,
+    min_rate: Optional[float] = None,
+    pickup_date_start: Optional[str] = None,
+    sort: str = "deadhead",
+    limit: int = Query(default=50, le=200),
+):
+    """Loads near a truck (lat/lng), backhauls toward home (home_lat/home_lng) or along
+    a lane corridor (lane_from_*/lane_to_*), ranked by deadhead or all-in rate per mile"""
+    if sort not in ("deadhead", "rpm"):
+        raise HTTPException(status_code=400, detail="sort must be 'deadhead' or 'rpm'")
+
+    def _point(a, b, name):
+        if (a is None) != (b is None):
+            raise HTTPException(status_code=400, detail=f"{name} requires both latitude and longitude")
+        return (a, b) if a is not None else None
+
+    near = _point(lat, lng, "lat/lng")
+    home = _point(home_lat, home_lng, "home_lat/home_lng")
+    lane_from = _point(lane_from_lat, lane_from_lng, "lane_from")
+    lane_to = _point(lane_to_lat, lane_to_lng, "lane_to")
+    if (lane_from is None) != (lane_to is None):
+        raise HTTPException(status_code=400, detail="Corridor search requires lane_from and lane_to")
+    corridor = (lane_from, lane_to) if lane_from is not None else None
+    if near is None and home is None and corridor is None:
+        raise HTTPException(status_code=400, detail="Provide lat/lng, home_lat/home_lng or a lane corridor")
+
+    results, total = load_board.geo_search(
+        {"status": "Pre-Loading", "equipment": equipment_type, "hazmat": hazmat},
+        near=near,
+        radius_mi=radius_miles,
+        home=home,
+        home_radius_mi=home_radius_miles,
+        corridor=corridor,
+        corridor_width_mi=corridor_miles,
+        min_rate=min_rate,
+        pickup_date_start=pickup_date_start,
+        sort=sort,
+        limit=limit,
+    )
+    return {
+        "loads": [{**board_view(rec), **geo} for rec, geo in results],
+        "total": total,
+    }
+
+
+@router.put("/board/trucks")
+def report_available_trucks(capacity: dict):
+    """Report available truck capacity for a lane origin (drives loadToTruckRatio)"""
+    load_board.set_available_trucks(
+        capacity.get("originState"), capacity.get("equipmentType"), capacity.get("available", 0)
+    )
+    return {"success": True, "marketStats": load_board.market_stats(capacity.get("originState"), capacity.get("equipmentType"))}
+
+
+@router.post("/tracking/pings")
+async def ingest_tracking_pings(request: Request):
+    """Ingest a batch of GPS pings: {"pings": [...]}, a JSON array, or NDJSON (one ping per line)"""
+    body = await request.body()
+    try:
+        if request.headers.get("content-type", "").startswith("application/x-ndjson"):
+            pings = [json.loads(line) for line in body.splitlines() if line.strip()]
+        else:
+            payload = json.loads(body or b"[]")
+            pings = payload.get("pings", []) if isinstance(payload, dict) else payload
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Malformed ping batch")
+    if not isinstance(pings, list) or not all(isinstance(p, dict) for p in pings):
+        raise HTTPException(status_code=400, detail="pings must be a list of objects")
+    return tracking_hub.ingest(pings)
+
+
 @router.get("/{load_id}")
 async def get_load(load_id: str):
     """Get load details by ID"""
@@ -159,30 +240,49 @@ async def get_load(load_id: str):
 
 
 @router.post("/")
-async def create_load(load_data: dict):
-    """Create a new load"""
+def create_load(load_data: dict, db: Session = Depends(get_db)):
+    """Create a new load and post it to the load board"""
+    posting = posting_from_payload(load_data)
+    db_load, db_posting = crud.create_posted_load(
+        db, status="Pre-Loading", rate=float(load_data.get("rate") or 0.0), posting=posting
+    )
+    load_board.upsert(db_load.id, db_load.status, db_load.rate, posting_columns(db_posting))
     return {
-        "id": f"load_{datetime.now().timestamp()}",
-        "loadNumber": f"LOAD-{datetime.now().strftime('%H%M%S')}",
-        "status": "pending",
-        "createdAt": datetime.now().isoformat(),
+        "id": db_load.id,
+        "loadNumber": db_posting.load_number or f"LOAD-{db_load.id}",
+        "status": db_load.status,
+        "createdAt": db_posting.posted_at.isoformat(),
     }
 
 
 @router.put("/{load_id}/status")
-async def update_load_status(load_id: str, status_data: dict):
-    """Update load status"""
+def update_load_status(load_id: int, status_data: dict, db: Session = Depends(get_db)):
+    """Update load status through the lifecycle state machine"""
+    try:
+        row = load_lifecycle.transition_load(
+            db,
+            load_id,
+            status_data.get("status"),
+            expected_status=status_data.get("expectedStatus"),
+            actor_id=status_data.get("actorId"),
+        )
+    except load_lifecycle.LoadTransitionError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail)
     return {
         "success": True,
-        "loadId": load_id,
-        "newStatus": status_data.get("status"),
+        "loadId": row.id,
+        "newStatus": row.status,
         "updatedAt": datetime.now().isoformat(),
     }
 
 
 @router.post("/{load_id}/assign")
-async def assign_load(load_id: str, assignment_data: dict):
-    """Assign carrier/driver to load"""
+def assign_load(load_id: str, assignment_data: dict, db: Session = Depends(get_db)):
+    """Assign carrier/driver to load (a numeric driverId is recorded as the load's settlement payee)"""
+    payee = assignment_data.get("driverId") or assignment_data.get("carrierId")
+    if load_id.isdigit() and str(payee or "").isdigit():
+        if crud.assign_load_driver(db, int(load_id), int(payee)) is None:
+            raise HTTPException(status_code=404, detail="Load not found")
     return {
         "success": True,
         "loadId": load_id,
@@ -193,24 +293,67 @@ async def assign_load(load_id: str, assignment_data: dict):
 
 
 @router.get("/{load_id}/tracking")
-async def get_load_tracking(load_id: str):
-    """Get real-time load tracking"""
+async def get_load_tracking(load_id: int):
+    """Get the last known position of a load (poll); see /tracking/stream for push updates"""
+    position = tracking_hub.latest(load_id)
+    if position is None:
+        raise HTTPException(status_code=404, detail="No tracking data for load")
     return {
         "loadId": load_id,
-        "status": "in_transit",
         "currentLocation": {
-            "lat": 31.5493,
-            "lng": -97.1467,
-            "address": "I-35 N, Waco, TX",
-            "updatedAt": datetime.now().isoformat(),
+            "lat": position["lat"],
+            "lng": position["lng"],
+            "speed": position["speed"],
+            "heading": position["heading"],
+            "updatedAt": position["recordedAt"],
         },
-        "eta": "2025-01-23T15:30:00Z",
-        "milesRemaining": 85,
-        "milesCompleted": 154,
-        "driver": {"name": "Mike Johnson", "phone": "555-0100"},
+        "eta": position["eta"],
+        "milesRemaining": position["milesRemaining"],
     }
 
 
+@router.get("/{load_id}/tracking/stream")
+async def stream_load_tracking(load_id: int, request: Request):
+    """Server-Sent Events feed of meaningful position/ETA changes for a load"""
+
+    async def _events():
+        sub = tracking_hub.subscribe(load_id)
+        try:
+            yield "retry: 3000\n\n"
+            while not await request.is_disconnected():
+                update = await sub.next(timeout=TRACKING_KEEPALIVE_SECONDS)
+                if update is None:
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"id: {update['seq']}\nevent: position\ndata: {json.dumps(public_view(update))}\n\n"
+        finally:
+            tracking_hub.unsubscribe(sub)
+
+    return StreamingResponse(
+        _events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.websocket("/{load_id}/tracking/ws")
+async def load_tracking_websocket(websocket: WebSocket, load_id: int):
+    """WebSocket feed of the same updates as /tracking/stream"""
+    await websocket.accept()
+    sub = tracking_hub.subscribe(load_id)
+    try:
+        while True:
+            update = await sub.next(timeout=TRACKING_KEEPALIVE_SECONDS)
+            if update is None:
+                await websocket.send_json({"type": "keepalive"})
+                continue
+            await websocket.send_json({"type": "position", **public_view(update)})
+    except (WebSocketDisconnect, RuntimeError):
+        pass
+    finally:
+        tracking_hub.unsubscribe(sub)
+
+
 @router.get("/{load_id}/documents")
 async def get_load_documents(load_id: str):
     """Get load documents (BOL, POD, etc.)"""
@@ -1,5 +1,7 @@
 from pydantic import BaseModel
-from typing import Optional
+from typing import List, Optional
+from datetime import datetime
+from decimal import Decimal
 
 
 class UserBase(BaseModel):
@@ -37,6 +39,31 @@ class Load(LoadBase):
 
 class LoadUpdateStatus(BaseModel):
     new_status: str
+    expected_status: Optional[str] = None  # compare-and-set guard; skips the status read
+    actor_id: Optional[int] = None
+
+
+class LoadTransitionItem(BaseModel):
+    load_id: int
+    new_status: str
+    expected_status: Optional[str] = None
+
+
+class BulkLoadTransition(BaseModel):
+    transitions: List[LoadTransitionItem]
+    actor_id: Optional[int] = None
+
+
+class LoadEvent(BaseModel):
+    id: int
+    load_id: int
+    from_status: Optional[str] = None
+    to_status: str
+    actor_id: Optional[int] = None
+    created_at: datetime
+
+    class Config:
+        orm_mode = True
 
 
 class TransactionBase(BaseModel):
@@ -55,3 +82,18 @@ class Transaction(TransactionBase):
 
     class Config:
         orm_mode = True
+
+
+class SettlementItem(BaseModel):
+    load_id: int
+    driver_id: int
+
+
+class SettlementRunRequest(BaseModel):
+    # Either an explicit list of delivered loads, or a delivery date range [from, to).
+    loads: List[SettlementItem] = []
+    delivered_from: Optional[datetime] = None
+    delivered_to: Optional[datetime] = None
+    driver_id: Optional[int] = None
+    commission_rate: Decimal = Decimal("0.15")
+    dry_run: bool = False
@@ -0,0 +1,200 @@
+"""
+Batch settlement engine (eusotrip-fintech-architecture.md).
+
+Computes driver pay for many delivered loads in one run: a handful of
+set-based reads, exact Decimal money math, one bulk INSERT of COMMISSION
+transactions and a single commit. Each load pays its assigned driver (or
+carrier), Load.driver_id. Loads that already carry a COMMISSION transaction
+are skipped, and a unique index on COMMISSION (type, load_id) rejects the
+insert of a run that raced another one, so no load is ever paid twice.
+"""
+
+import uuid
+from datetime import datetime
+from decimal import ROUND_HALF_UP, Decimal
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import insert, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from .database import Load, LoadEvent, Transaction, User
+
+
+COMMISSION_RATE = Decimal("0.15")  # 15% flat platform commission
+CENT = Decimal("0.01")
+PAYABLE_ROLES = ("DRIVER", "CATALYST")
+
+_CHUNK = 500
+
+
+def _chunks(items: List[Any], size: int = _CHUNK) -> Iterable[List[Any]]:
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def payee_error(status: str, assigned_driver_id: Optional[int], payee: Optional[int]) -> Optional[str]:
+    """Why payee may not be paid for a load in this status and assignment; None if they may."""
+    if status != "Delivered":
+        return f"Load is {status}, not Delivered"
+    if assigned_driver_id is not None and payee != assigned_driver_id:
+        return "Driver is not assigned to this load"
+    if payee is None:
+        return "No driver assigned"
+    return None
+
+
+def to_money(value: Any) -> Decimal:
+    """Exact cents from a Float column value (str() keeps the literal the user entered)."""
+    return Decimal(str(value)).quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+def split_load_rate(rate: Any, commission_rate: Decimal = COMMISSION_RATE) -> Tuple[Decimal, Decimal, Decimal]:
+    """Return (gross, commission, driver_pay); commission + driver_pay == gross to the cent."""
+    gross = to_money(rate)
+    commission = (gross * commission_rate).quantize(CENT, rounding=ROUND_HALF_UP)
+    return gross, commission, gross - commission
+
+
+def _delivered_in_range(
+    db: Session,
+    delivered_from: Optional[datetime],
+    delivered_to: Optional[datetime],
+    driver_id: Optional[int],
+) -> List[Tuple[int, Optional[int]]]:
+    """(load_id, assigned driver_id) for loads delivered in [from, to), optionally only
+    those assigned to driver_id. Who recorded the delivery does not matter."""
+    q = (
+        select(LoadEvent.load_id, Load.driver_id)
+        .join(Load, Load.id == LoadEvent.load_id)
+        .where(LoadEvent.to_status == "Delivered")
+    )
+    if delivered_from is not None:
+        q = q.where(LoadEvent.created_at >= delivered_from)
+    if delivered_to is not None:
+        q = q.where(LoadEvent.created_at < delivered_to)
+    if driver_id is not None:
+        q = q.where(Load.driver_id == driver_id)
+    pairs: Dict[int, Optional[int]] = {}
+    for load_id, assigned in db.execute(q.order_by(LoadEvent.id.asc())).all():
+        pairs[load_id] = assigned
+    return list(pairs.items())
+
+
+def _insert_unpaid(
+    db: Session, tx_rows: List[Dict[str, Any]], lines: List[Dict[str, Any]], totals: Dict[str, Decimal]
+) -> List[Dict[str, Any]]:
+    """Insert each COMMISSION row on its own, marking loads another run already paid
+    as skipped. Returns the rows inserted."""
+    by_load = {line["load_id"]: line for line in lines if line["status"] == "paid"}
+    inserted = []
+    for row in tx_rows:
+        try:
+            db.execute(insert(Transaction), [row])
+            db.commit()
+            inserted.append(row)
+        except IntegrityError:
+            db.rollback()
+            line = by_load[row["load_id"]]
+            for key in totals:
+                totals[key] -= Decimal(line.pop(key))
+            line.update(status="skipped", reason="Already settled")
+    return inserted
+
+
+def run_settlement(
+    db: Session,
+    pairs: Optional[List[Tuple[int, int]]] = None,
+    delivered_from: Optional[datetime] = None,
+    delivered_to: Optional[datetime] = None,
+    driver_id: Optional[int] = None,
+    commission_rate: Decimal = COMMISSION_RATE,
+    dry_run: bool = False,
+) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+    """Settle explicit (load_id, driver_id) pairs, or every load delivered in the date range.
+
+    Returns (summary, lines) where lines holds the per-load breakdown.
+    """
+    if pairs is None:
+        pairs = _delivered_in_range(db, delivered_from, delivered_to, driver_id)
+
+    load_ids = list(dict.fromkeys(load_id for load_id, _ in pairs))
+    driver_ids = list({d for _, d in pairs if d is not None})
+
+    # Lock the loads for the duration of the run so two concurrent runs over the same
+    # loads serialize before the double-pay check below. SQLite ignores the lock; the
+    # unique COMMISSION index is what stops a racing run there.
+    loads: Dict[int, Tuple[Any, str, Optional[int]]] = {}
+    already_paid = set()
+    roles: Dict[int, str] = {}
+    for chunk in _chunks(load_ids):
+        loads.update(
+            (row.id, (row.rate, row.status, row.driver_id))
+            for row in db.execute(
+                select(Load.id, Load.rate, Load.status, Load.driver_id).where(Load.id.in_(chunk)).with_for_update()
+            )
+        )
+        already_paid.update(
+            db.execute(
+                select(Transaction.load_id).where(Transaction.type == "COMMISSION", Transaction.load_id.in_(chunk))
+            ).scalars()
+        )
+    for chunk in _chunks(driver_ids):
+        roles.update(db.execute(select(User.id, User.role).where(User.id.in_(chunk))).all())
+
+    lines: List[Dict[str, Any]] = []
+    tx_rows: List[Dict[str, Any]] = []
+    seen = set()
+    totals = {"gross": Decimal("0.00"), "commission": Decimal("0.00"), "driver_pay": Decimal("0.00")}
+
+    for load_id, payee in pairs:
+        line: Dict[str, Any] = {"load_id": load_id, "driver_id": payee}
+        load = loads.get(load_id)
+        if load_id in seen:
+            line.update(status="skipped", reason="Duplicate load in run")
+        elif load is None:
+            line.update(status="skipped", reason="Load not found")
+        elif (reason := payee_error(load[1], load[2], payee)) is not None:
+            line.update(status="skipped", reason=reason)
+        elif roles.get(payee) not in PAYABLE_ROLES:
+            line.update(status="skipped", reason="Driver not found or invalid role")
+        elif load_id in already_paid:
+            line.update(status="skipped", reason="Already settled")
+        else:
+            gross, commission, pay = split_load_rate(load[0], commission_rate)
+            line.update(
+                status="paid",
+                gross=str(gross),
+                commission=str(commission),
+                driver_pay=str(pay),
+            )
+            totals["gross"] += gross
+            totals["commission"] += commission
+            totals["driver_pay"] += pay
+            tx_rows.append({"type": "COMMISSION", "amount": float(pay), "user_id": payee, "load_id": load_id})
+        seen.add(load_id)
+        lines.append(line)
+
+    if tx_rows and not dry_run:
+        try:
+            db.execute(insert(Transaction), tx_rows)
+            db.commit()
+        except IntegrityError:
+            # A concurrent run paid some of these loads first: pay the rest one by one
+            db.rollback()
+            tx_rows = _insert_unpaid(db, tx_rows, lines, totals)
+    else:
+        db.rollback()
+
+    summary = {
+        "run_id": uuid.uuid4().hex,
+        "dry_run": dry_run,
+        "commission_rate": str(commission_rate),
+        "loads_considered": len(pairs),
+        "paid": len(tx_rows),
+        "skipped": len(lines) - len(tx_rows),
+        "total_gross": str(totals["gross"]),
+        "total_commission": str(totals["commission"]),
+        "total_driver_pay": str(totals["driver_pay"]),
+    }
+    return summary, lines
@@ -0,0 +1,222 @@
+"""
+Live load tracking.
+
+GPS pings arrive in batches and update an in-memory last-known-position store
+keyed by load. A ping is only published to subscribers when it moves the truck
+or its ETA meaningfully compared with the last published update, and each
+subscriber holds a single "latest" slot, so a slow client skips intermediate
+positions instead of queueing them.
+
+Environment:
+    TRACKING_MIN_MOVE_MILES   distance that triggers a push (default 0.1)
+    TRACKING_MIN_ETA_SECONDS  ETA change that triggers a push (default 60)
+"""
+
+import asyncio
+import os
+import threading
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+from .geo_index import haversine_miles
+
+
+MIN_MOVE_MILES = float(os.getenv("TRACKING_MIN_MOVE_MILES", "0.1"))
+MIN_ETA_SECONDS = float(os.getenv("TRACKING_MIN_ETA_SECONDS", "60"))
+# Epoch values above this are milliseconds (JS Date.now()); in seconds it is the year 5138.
+EPOCH_MS_THRESHOLD = 1e11
+
+
+def _parse_ts(v: Any) -> Optional[datetime]:
+    """ISO 8601 or epoch seconds / milliseconds; None when missing or unreadable."""
+    if v in (None, ""):
+        return None
+    if isinstance(v, datetime):
+        ts = v
+    elif isinstance(v, (int, float)):
+        seconds = float(v) / 1000.0 if abs(v) > EPOCH_MS_THRESHOLD else float(v)
+        try:
+            ts = datetime.fromtimestamp(seconds, tz=timezone.utc)
+        except (ValueError, OverflowError, OSError):
+            return None
+    else:
+        try:
+            ts = datetime.fromisoformat(str(v).replace("Z", "+00:00"))
+        except ValueError:
+            return None
+    return ts if ts.tzinfo else ts.replace(tzinfo=timezone.utc)
+
+
+def _iso(ts: Optional[datetime]) -> Optional[str]:
+    return ts.isoformat().replace("+00:00", "Z") if ts is not None else None
+
+
+class Subscription:
+    """One client's view of a load: a coalescing single-slot mailbox."""
+
+    def __init__(self, load_id: int):
+        self.load_id = load_id
+        self._loop = asyncio.get_running_loop()
+        self._event = asyncio.Event()
+        self._latest: Optional[Dict[str, Any]] = None
+        self.coalesced = 0
+
+    def offer(self, update: Dict[str, Any]) -> None:
+        # Safe from any thread; an unread update is simply replaced.
+        if self._latest is not None:
+            self.coalesced += 1
+        self._latest = update
+        self._loop.call_soon_threadsafe(self._event.set)
+
+    async def next(self, timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """Wait for the newest update; None on timeout (used for keepalives)."""
+        try:
+            await asyncio.wait_for(self._event.wait(), timeout)
+        except asyncio.TimeoutError:
+            return None
+        self._event.clear()
+        update, self._latest = self._latest, None
+        return update
+
+
+class TrackingHub:
+    """Last-known positions per load plus fan-out to live subscribers. Thread-safe."""
+
+    def __init__(self, min_move_miles: float = MIN_MOVE_MILES, min_eta_seconds: float = MIN_ETA_SECONDS):
+        self.min_move_miles = min_move_miles
+        self.min_eta_seconds = min_eta_seconds
+        self._lock = threading.Lock()
+        self._positions: Dict[int, Dict[str, Any]] = {}
+        self._published: Dict[int, Dict[str, Any]] = {}
+        self._subscribers: Dict[int, Set[Subscription]] = {}
+        self._seq = 0
+
+    def latest(self, load_id: int) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            pos = self._positions.get(load_id)
+            return dict(pos) if pos is not None else None
+
+    def subscribe(self, load_id: int) -> Subscription:
+        sub = Subscription(load_id)
+        with self._lock:
+            self._subscribers.setdefault(load_id, set()).add(sub)
+            current = self._published.get(load_id)
+        if current is not None:
+            sub.offer(current)
+        return sub
+
+    def unsubscribe(self, sub: Subscription) -> None:
+        with self._lock:
+            subs = self._subscribers.get(sub.load_id)
+            if subs is not None:
+                subs.discard(sub)
+                if not subs:
+                    del self._subscribers[sub.load_id]
+
+    def subscriber_count(self) -> int:
+        with self._lock:
+            return sum(len(s) for s in self._subscribers.values())
+
+    def ingest(self, pings: Iterable[Dict[str, Any]]) -> Dict[str, int]:
+        """Apply a batch of pings; returns accepted / stale / rejected / published counts.
+
+        A ping needs loadId, lat and lng; recordedAt and eta (ISO or epoch
+        seconds / milliseconds), speed, heading and milesRemaining are
+        optional; a recordedAt that cannot be read rejects the ping. Only
+        the newest ping per load in the batch is considered for publishing.
+        """
+        received_at = datetime.now(timezone.utc)
+        newest: Dict[int, Tuple[datetime, Dict[str, Any]]] = {}
+        rejected = 0
+        for ping in pings:
+            try:
+                load_id = int(ping.get("loadId", ping.get("load_id")))
+                lat, lng = float(ping["lat"]), float(ping["lng"])
+            except (TypeError, ValueError, KeyError):
+                rejected += 1
+                continue
+            if not (-90.0 <= lat <= 90.0 and -180.0 <= lng <= 180.0):
+                rejected += 1
+                continue
+            recorded_at = ping.get("recordedAt", ping.get("recorded_at"))
+            ts = _parse_ts(recorded_at)
+            if ts is None:
+                if recorded_at not in (None, ""):
+                    rejected += 1
+                    continue
+                ts = received_at
+            held = newest.get(load_id)
+            if held is None or ts >= held[0]:
+                newest[load_id] = (ts, {**ping, "lat": lat, "lng": lng})
+
+        accepted, stale = 0, 0
+        changed: List[Dict[str, Any]] = []
+        with self._lock:
+            fresh: List[Tuple[int, datetime, Dict[str, Any]]] = []
+            for load_id, (ts, ping) in newest.items():
+                prev = self._positions.get(load_id)
+                if prev is not None and ts < prev["_ts"]:
+                    stale += 1
+                    continue
+                fresh.append((load_id, ts, ping))
+            accepted = len(fresh)
+            if not fresh:
+                return {"accepted": 0, "stale": stale, "rejected": rejected, "published": 0}
+
+            # Distance from the last *published* fix, for the whole batch at once.
+            lat = np.fromiter((p["lat"] for _, _, p in fresh), dtype=np.float64, count=accepted)
+            lng = np.fromiter((p["lng"] for _, _, p in fresh), dtype=np.float64, count=accepted)
+            prev_lat = np.fromiter(
+                (self._published.get(lid, {}).get("lat", np.nan) for lid, _, _ in fresh), dtype=np.float64, count=accepted
+            )
+            prev_lng = np.fromiter(
+                (self._published.get(lid, {}).get("lng", np.nan) for lid, _, _ in fresh), dtype=np.float64, count=accepted
+            )
+            moved = haversine_miles(prev_lat, prev_lng, lat, lng)
+
+            for i, (load_id, ts, ping) in enumerate(fresh):
+                prev = self._positions.get(load_id, {})
+                eta = _parse_ts(ping.get("eta")) or prev.get("_eta")
+                position = {
+                    "_ts": ts,
+                    "_eta": eta,
+                    "loadId": load_id,
+                    "lat": ping["lat"],
+                    "lng": ping["lng"],
+                    "speed": ping.get("speed", prev.get("speed")),
+                    "heading": ping.get("heading", prev.get("heading")),
+                    "milesRemaining": ping.get("milesRemaining", prev.get("milesRemaining")),
+                    "eta": _iso(eta),
+                    "recordedAt": _iso(ts),
+                }
+                self._positions[load_id] = position
+
+                last = self._published.get(load_id)
+                if last is not None:
+                    eta_delta = (
+                        abs((eta - last["_eta"]).total_seconds())
+                        if eta is not None and last["_eta"] is not None
+                        else (0.0 if eta == last["_eta"] else float("inf"))
+                    )
+                    if not (moved[i] >= self.min_move_miles or eta_delta >= self.min_eta_seconds):
+                        continue
+                self._seq += 1
+                update = {**position, "seq": self._seq}
+                self._published[load_id] = update
+                changed.append(update)
+            targets = [(u, list(self._subscribers.get(u["loadId"], ()))) for u in changed]
+
+        for update, subs in targets:
+            for sub in subs:
+                sub.offer(update)
+        return {"accepted": accepted, "stale": stale, "rejected": rejected, "published": len(changed)}
+
+
+def public_view(position: Dict[str, Any]) -> Dict[str, Any]:
+    """Strip the internal (underscore) keys from a stored position."""
+    return {k: v for k, v in position.items() if not k.startswith("_")}
+
+
+hub = TrackingHub()
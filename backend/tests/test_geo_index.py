@@ -0,0 +1,43 @@
+"""
+Tests for the geospatial grid index — radius and corridor searches.
+"""
+
+import math
+
+from app.geo_index import GeoGrid, segment_lat_range
+
+SEATTLE = (47.6, -122.3)
+BOSTON = (42.36, -71.06)
+
+
+def great_circle_points(a, b, n):
+    """n points evenly spaced along the great circle from a to b (exclusive)."""
+    (lat1, lng1), (lat2, lng2) = (tuple(map(math.radians, p)) for p in (a, b))
+    ang = math.acos(math.sin(lat1) * math.sin(lat2) + math.cos(lat1) * math.cos(lat2) * math.cos(lng2 - lng1))
+    points = []
+    for i in range(1, n + 1):
+        f = i / (n + 1)
+        wa, wb = math.sin((1 - f) * ang) / math.sin(ang), math.sin(f * ang) / math.sin(ang)
+        x = wa * math.cos(lat1) * math.cos(lng1) + wb * math.cos(lat2) * math.cos(lng2)
+        y = wa * math.cos(lat1) * math.sin(lng1) + wb * math.cos(lat2) * math.sin(lng2)
+        z = wa * math.sin(lat1) + wb * math.sin(lat2)
+        points.append((math.degrees(math.atan2(z, math.hypot(x, y))), math.degrees(math.atan2(y, x))))
+    return points
+
+
+class TestNearSegment:
+    def test_lat_range_includes_the_poleward_bulge(self):
+        lo, hi = segment_lat_range(*SEATTLE, *BOSTON)
+        assert lo == BOSTON[0]
+        assert 48.5 < hi < 48.6
+        assert segment_lat_range(*BOSTON, *SEATTLE) == (lo, hi)
+        assert segment_lat_range(29.76, -95.37, 32.78, -96.80) == (29.76, 32.78)
+
+    def test_finds_every_point_along_a_long_east_west_lane(self):
+        grid = GeoGrid()
+        points = great_circle_points(SEATTLE, BOSTON, 19)
+        for slot, (lat, lng) in enumerate(points):
+            grid.put(slot, lat, lng)
+        slots, dist, along = grid.near_segment(*SEATTLE, *BOSTON, width_mi=5.0)
+        assert sorted(slots.tolist()) == list(range(19))
+        assert dist.max() < 0.01
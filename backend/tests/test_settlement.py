@@ -0,0 +1,49 @@
+"""
+Tests for settlement rules and the core schema migration.
+"""
+
+import pytest
+from sqlalchemy import create_engine, inspect, text
+
+from app.database import ensure_core_schema
+from app.settlement import payee_error
+
+
+class TestPayeeError:
+    def test_only_delivered_loads_pay_their_assigned_driver(self):
+        assert payee_error("Delivered", 7, 7) is None
+        assert payee_error("In-Transit", 7, 7) == "Load is In-Transit, not Delivered"
+        assert payee_error("Delivered", 7, 8) == "Driver is not assigned to this load"
+        assert payee_error("Delivered", None, None) == "No driver assigned"
+        # Loads from before assignment was recorded pay the driver named explicitly
+        assert payee_error("Delivered", None, 8) is None
+
+
+OLD_SCHEMA = [
+    "CREATE TABLE users (id INTEGER PRIMARY KEY, email TEXT, role TEXT)",
+    "CREATE TABLE loads (id INTEGER PRIMARY KEY, status TEXT, rate FLOAT, managing_company_id INTEGER)",
+    "CREATE TABLE transactions (id INTEGER PRIMARY KEY, type TEXT, amount FLOAT, user_id INTEGER, load_id INTEGER)",
+    "INSERT INTO transactions (type, amount, user_id, load_id) VALUES ('COMMISSION', 1.0, 1, 1)",
+]
+
+
+def old_database(tmp_path, *statements):
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    with engine.begin() as conn:
+        for statement in [*OLD_SCHEMA, *statements]:
+            conn.execute(text(statement))
+    return engine
+
+
+class TestEnsureCoreSchema:
+    def test_migrates_an_old_database(self, tmp_path):
+        engine = old_database(tmp_path)
+        ensure_core_schema(engine)
+        ensure_core_schema(engine)
+        assert "driver_id" in {c["name"] for c in inspect(engine).get_columns("loads")}
+        assert "uq_transactions_commission_load" in {i["name"] for i in inspect(engine).get_indexes("transactions")}
+
+    def test_fails_fast_on_double_paid_loads(self, tmp_path):
+        engine = old_database(tmp_path, OLD_SCHEMA[-1])
+        with pytest.raises(RuntimeError, match="duplicate COMMISSION"):
+            ensure_core_schema(engine)
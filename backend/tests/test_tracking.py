@@ -0,0 +1,35 @@
+"""
+Tests for live load tracking — ping ingestion and timestamp parsing.
+"""
+
+from datetime import datetime, timezone
+
+from app.tracking import TrackingHub, _parse_ts
+
+
+class TestParseTimestamp:
+    def test_epoch_seconds_and_milliseconds(self):
+        expected = datetime(2025, 10, 9, 8, 53, 20, tzinfo=timezone.utc)
+        assert _parse_ts(1760000000) == expected
+        assert _parse_ts(1760000000000) == expected
+        assert _parse_ts("2025-10-09T08:53:20Z") == expected
+
+    def test_unreadable_values(self):
+        assert _parse_ts(1e30) is None
+        assert _parse_ts(float("nan")) is None
+        assert _parse_ts("yesterday") is None
+        assert _parse_ts(None) is None
+
+
+class TestIngest:
+    def test_bad_timestamp_rejects_only_that_ping(self):
+        hub = TrackingHub()
+        result = hub.ingest([
+            {"loadId": 1, "lat": 29.76, "lng": -95.37, "recordedAt": 1760000000000, "eta": 1760003600000},
+            {"loadId": 2, "lat": 29.76, "lng": -95.37, "recordedAt": 1e30},
+            {"loadId": 3, "lat": 29.76, "lng": -95.37, "recordedAt": 1760000000, "eta": 1e30},
+        ])
+        assert result == {"accepted": 2, "stale": 0, "rejected": 1, "published": 2}
+        assert hub.latest(1)["recordedAt"] == "2025-10-09T08:53:20Z"
+        assert hub.latest(1)["eta"] == "2025-10-09T09:53:20Z"
+        assert hub.latest(3)["eta"] is None
@@ -0,0 +1 @@
+# AI Sidecar benchmarks
@@ -0,0 +1,201 @@
+"""
+BOL field extraction benchmark: the previous parse_bol_fields (a dozen
+re.search calls with inline patterns, a rescan of every line, and a
+BOLFields attribute assignment per field found) against the current one
+(the single anchored pass in core/bol_extractor.py, validated into
+BOLFields once). Both are timed as the /ocr/bol route calls them.
+
+Runs both over the regression corpus (tests/fixtures/bol_corpus.jsonl) plus
+synthetic BOLs from benchmarks/bol_fixtures.py, and reports throughput and
+field-level accuracy against the documents' true values: the share of
+expected fields extracted exactly, and fields returned that a document does
+not have.
+
+Run from frontend/server/ai-sidecar:
+
+    python -m benchmarks.bench_bol_extract [--synthetic 500] [--repeat 10]
+"""
+
+import argparse
+import json
+import os
+import re
+import time
+from typing import Callable, Optional
+
+import numpy as np
+
+from benchmarks.bol_fixtures import bol_document
+from core.bol_extractor import FIELDS
+from routers.ocr import BOLFields, parse_bol_fields
+
+CORPUS = os.path.join(os.path.dirname(__file__), "..", "tests", "fixtures", "bol_corpus.jsonl")
+
+
+def load_corpus(path: str = CORPUS) -> list[dict]:
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+# ---------------------------------------------------------------------------
+# Baseline: parse_bol_fields as it was before core/bol_extractor.py
+# ---------------------------------------------------------------------------
+
+def legacy_parse_bol_fields(text: str) -> BOLFields:
+    """Parse BOL fields from raw OCR text using regex patterns."""
+    fields = BOLFields()
+    upper = text.upper()
+    lines_list = text.split("\n")
+
+    # BOL Number
+    m = re.search(r"(?:BOL|B/L|BILL OF LADING)\s*(?:#|NO\.?|NUMBER)?\s*:?\s*([A-Z0-9\-]+)", upper)
+    if m:
+        fields.bol_number = m.group(1)
+
+    # Date
+    m = re.search(r"(?:DATE|SHIP DATE|PICKUP DATE)\s*:?\s*(\d{1,2}[/\-]\d{1,2}[/\-]\d{2,4})", upper)
+    if m:
+        fields.date = m.group(1)
+
+    # PO Number
+    m = re.search(r"(?:P\.?O\.?|PURCHASE ORDER)\s*(?:#|NO\.?)?\s*:?\s*([A-Z0-9\-]+)", upper)
+    if m:
+        fields.po_number = m.group(1)
+
+    # PRO Number
+    m = re.search(r"(?:PRO)\s*(?:#|NO\.?)?\s*:?\s*([A-Z0-9\-]+)", upper)
+    if m:
+        fields.pro_number = m.group(1)
+
+    # Weight
+    m = re.search(r"(?:WEIGHT|WT\.?|GROSS\s*WT)\s*:?\s*([\d,]+)\s*(?:LBS?|POUNDS?|KG)?", upper)
+    if m:
+        fields.weight = m.group(1).replace(",", "")
+
+    # Pieces / Quantity
+    m = re.search(r"(?:PIECES?|QTY|QUANTITY|UNITS?)\s*:?\s*(\d+)", upper)
+    if m:
+        fields.pieces = m.group(1)
+
+    # Hazmat class
+    m = re.search(r"(?:HAZMAT|HAZ\s*MAT|HAZARD)\s*(?:CLASS)?\s*:?\s*(\d+\.?\d*)", upper)
+    if m:
+        fields.hazmat_class = m.group(1)
+
+    # UN Number
+    m = re.search(r"UN\s*(\d{4})", upper)
+    if m:
+        fields.un_number = f"UN{m.group(1)}"
+
+    # Packing Group
+    m = re.search(r"(?:PACKING\s*GROUP|PG)\s*:?\s*(I{1,3}|[123])", upper)
+    if m:
+        fields.packing_group = m.group(1)
+
+    # Emergency phone
+    m = re.search(r"(?:EMERGENCY|CHEMTREC|24.?HR)\s*(?:PHONE|CONTACT|#)?\s*:?\s*([\d\-\(\)\s]{10,})", upper)
+    if m:
+        fields.emergency_phone = m.group(1).strip()
+
+    # Shipper / Consignee — look for labeled sections
+    for i, line in enumerate(lines_list):
+        line_upper = line.upper().strip()
+        if "SHIPPER" in line_upper or "SHIP FROM" in line_upper or "FROM:" in line_upper:
+            fields.shipper_name = _extract_next_name(lines_list, i)
+            fields.shipper_address = _extract_next_address(lines_list, i)
+        elif "CONSIGNEE" in line_upper or "SHIP TO" in line_upper or "DELIVER TO" in line_upper:
+            fields.consignee_name = _extract_next_name(lines_list, i)
+            fields.consignee_address = _extract_next_address(lines_list, i)
+        elif "CARRIER" in line_upper and "NAME" in line_upper:
+            fields.carrier_name = _extract_next_name(lines_list, i)
+
+    # Commodity — look near "DESCRIPTION" or "COMMODITY"
+    m = re.search(r"(?:DESCRIPTION|COMMODITY|PRODUCT)\s*(?:OF\s*GOODS?)?\s*:?\s*(.+)", upper)
+    if m:
+        fields.commodity = m.group(1).strip()[:200]
+
+    return fields
+
+
+def _extract_next_name(lines: list[str], idx: int) -> Optional[str]:
+    """Get the next non-empty line after a label as the name."""
+    for j in range(idx + 1, min(idx + 4, len(lines))):
+        stripped = lines[j].strip()
+        if stripped and len(stripped) > 2 and not stripped.upper().startswith(("CONSIGNEE", "CARRIER", "SHIPPER")):
+            return stripped
+    return None
+
+
+def _extract_next_address(lines: list[str], idx: int) -> Optional[str]:
+    """Get address lines after a name (look for city/state/zip pattern)."""
+    parts = []
+    for j in range(idx + 1, min(idx + 6, len(lines))):
+        stripped = lines[j].strip()
+        if stripped:
+            parts.append(stripped)
+            if re.search(r"\d{5}", stripped):  # ZIP code likely ends address
+                break
+    return ", ".join(parts[:3]) if parts else None
+
+
+# ---------------------------------------------------------------------------
+# Benchmark
+# ---------------------------------------------------------------------------
+
+def accuracy(extract: Callable[[str], BOLFields], documents: list[dict]) -> tuple[float, int]:
+    """(share of expected fields extracted exactly, fields returned that the document does not have)."""
+    correct = total = spurious = 0
+    for doc in documents:
+        got = extract(doc["text"]).model_dump()
+        for field in FIELDS:
+            expected = doc["expected"].get(field)
+            if expected is not None:
+                total += 1
+                correct += got.get(field) == expected
+            elif got.get(field) is not None:
+                spurious += 1
+    return correct / max(total, 1), spurious
+
+
+def throughput(extractors: dict[str, Callable[[str], BOLFields]], texts: list[str], repeat: int) -> dict[str, float]:
+    """Documents per second per extractor, best of repeat runs. Runs alternate
+    between extractors, so a slow patch of the machine does not favour one."""
+    best = dict.fromkeys(extractors, float("inf"))
+    for _ in range(repeat):
+        for name, extract in extractors.items():
+            start = time.perf_counter()
+            for text in texts:
+                extract(text)
+            best[name] = min(best[name], time.perf_counter() - start)
+    return {name: len(texts) / seconds for name, seconds in best.items()}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--synthetic", type=int, default=500, help="synthetic BOLs on top of the corpus")
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    corpus = load_corpus()
+    rng = np.random.default_rng(args.seed)
+    synthetic = []
+    for i in range(args.synthetic):
+        text, expected = bol_document(rng, ("form", "cells")[i % 2])
+        synthetic.append({"text": text, "expected": expected})
+    texts = [doc["text"] for doc in corpus + synthetic]
+    chars = sum(len(t) for t in texts)
+
+    print(f"{len(corpus)} corpus + {len(synthetic)} synthetic documents, {chars / len(texts):.0f} chars on average")
+    print(f"{'extractor':<12}{'docs/s':>10}{'us/doc':>9}{'corpus acc':>12}{'spurious':>10}{'synthetic acc':>15}")
+    extractors = {"legacy": legacy_parse_bol_fields, "anchors": parse_bol_fields}
+    rates = throughput(extractors, texts, args.repeat)
+    for name, extract in extractors.items():
+        rate = rates[name]
+        corpus_acc, spurious = accuracy(extract, corpus)
+        synthetic_acc, _ = accuracy(extract, synthetic)
+        print(f"{name:<12}{rate:>10,.0f}{1e6 / rate:>9.1f}{corpus_acc:>12.1%}{spurious:>10}{synthetic_acc:>15.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+OCR preprocessing benchmark: latency vs BOL field-extraction accuracy.
+
+Runs the synthetic BOL fixtures (benchmarks/bol_fixtures.py: flatbed scans,
+skewed scans, 12 MP phone photos, faint carbon copies) through run_paddle
+under each preprocessing profile, and reports per capture condition:
+
+    prep ms    decode + preprocessing (core/image_prep.py)
+    MP         megapixels handed to PaddleOCR
+    cropped    share of images where a page was found and cropped
+    ocr ms     PaddleOCR detection + classification + recognition
+    fields     share of expected BOL fields parse_bol_fields recovers exactly
+
+Without PaddleOCR installed only the preprocessing columns are measured.
+
+Run from frontend/server/ai-sidecar:
+
+    python -m benchmarks.bench_ocr_prep [--count 4] [--profiles none,bol,ratesheet]
+"""
+
+import argparse
+import time
+from collections import defaultdict
+
+import numpy as np
+
+from benchmarks.bol_fixtures import CONDITIONS, make_fixtures
+from core.image_prep import decode_image, get_profile, prepare
+
+
+def field_accuracy(expected: dict, got: dict) -> tuple[int, int]:
+    """(fields matching exactly, ignoring case and spacing; fields expected)."""
+    def norm(value):
+        return " ".join(str(value).upper().split()) if value is not None else None
+
+    return sum(norm(got.get(k)) == norm(v) for k, v in expected.items()), len(expected)
+
+
+def run(fixture: dict, profile: str, with_ocr: bool) -> dict:
+    start = time.perf_counter()
+    prepared = prepare(fixture["jpeg"], get_profile(profile))
+    prep_ms = (time.perf_counter() - start) * 1000
+    info = prepared.info if prepared else {}
+    size = info.get("size") or info.get("input_size")
+    if size is None:
+        height, width = decode_image(fixture["jpeg"]).shape[:2]
+        size = [width, height]
+    result = {"prep_ms": prep_ms if prepared else 0.0, "mp": size[0] * size[1] / 1e6,
+              "cropped": bool(info.get("cropped")), "ocr_ms": None, "correct": 0, "total": 0}
+    if with_ocr:
+        from routers.ocr import parse_bol_fields, run_paddle
+
+        # run_paddle preprocesses again: the OCR time is the end-to-end time minus preprocessing
+        start = time.perf_counter()
+        text, _, _ = run_paddle(fixture["jpeg"], "image/jpeg", profile)
+        result["ocr_ms"] = (time.perf_counter() - start) * 1000 - result["prep_ms"]
+        got = parse_bol_fields(text).model_dump()
+        result["correct"], result["total"] = field_accuracy(fixture["expected"], got)
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--count", type=int, default=4, help="BOLs per capture condition")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--profiles", default="none,bol,ratesheet")
+    args = parser.parse_args()
+
+    try:
+        import paddleocr  # noqa: F401
+        with_ocr = True
+    except ImportError:
+        with_ocr = False
+        print("PaddleOCR not installed: measuring preprocessing only\n")
+
+    profiles = args.profiles.split(",")
+    fixtures = make_fixtures(args.count, args.seed)
+    if with_ocr:
+        run(fixtures[0], profiles[0], True)  # load the model outside the timings
+
+    results = defaultdict(list)
+    for fixture in fixtures:
+        for profile in profiles:
+            results[(fixture["condition"], profile)].append(run(fixture, profile, with_ocr))
+
+    print(f"{len(fixtures)} fixtures ({args.count} per condition)")
+    print(f"{'condition':<10}{'profile':<11}{'MP':>6}{'cropped':>9}{'prep ms':>9}{'ocr ms':>9}{'fields':>9}")
+    for condition in CONDITIONS:
+        for profile in profiles:
+            runs = results[(condition, profile)]
+            row = (f"{condition:<10}{profile:<11}{np.mean([r['mp'] for r in runs]):>6.1f}"
+                   f"{np.mean([r['cropped'] for r in runs]):>9.0%}{np.mean([r['prep_ms'] for r in runs]):>9.0f}")
+            if with_ocr:
+                accuracy = sum(r["correct"] for r in runs) / max(sum(r["total"] for r in runs), 1)
+                row += f"{np.mean([r['ocr_ms'] for r in runs]):>9.0f}{accuracy:>9.1%}"
+            else:
+                row += f"{'-':>9}{'-':>9}"
+            print(row)
+
+
+if __name__ == "__main__":
+    main()
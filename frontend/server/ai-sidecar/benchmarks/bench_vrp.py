@@ -0,0 +1,113 @@
+"""
+VRP arc-cost benchmark: Python callbacks vs precomputed integer matrices.
+
+Builds random 200-stop instances around Houston (haversine distances at
+50 mph) and solves each under three cost registrations, in two phases:
+local-search descent from PATH_CHEAPEST_ARC to the first local optimum
+(time and solutions per second), then guided local search for a fixed
+budget as /route/optimize runs it (solutions per second and objective):
+
+    callback  per-arc Python callbacks over nested float lists (previous /route/optimize)
+    flat      Python callbacks over a flat int list (core.vrp fallback)
+    matrix    RegisterTransitMatrix, evaluated in C++ (core.vrp default)
+
+Run from frontend/server/ai-sidecar:
+
+    python -m benchmarks.bench_vrp [--stops 200] [--vehicles 10] [--instances 3] [--seconds 5]
+"""
+
+import argparse
+import time
+from typing import Optional
+
+import numpy as np
+from ortools.constraint_solver import pywrapcp, routing_enums_pb2
+
+from core.routing_client import haversine_matrix_m
+from core.vrp import integer_matrix, register_flat_callback, register_matrix
+
+HOUSTON = (29.76, -95.37)
+SPEED_MPS = 50 * 1609.344 / 3600
+
+
+def make_instance(n_stops: int, seed: int) -> tuple[np.ndarray, np.ndarray]:
+    rng = np.random.default_rng(seed)
+    coords = np.c_[HOUSTON[0] + rng.uniform(-0.5, 0.5, n_stops + 1),
+                   HOUSTON[1] + rng.uniform(-0.5, 0.5, n_stops + 1)]
+    distances = haversine_matrix_m(coords, coords)
+    return distances, distances / SPEED_MPS
+
+
+def solve(mode: str, distances: np.ndarray, durations: np.ndarray, vehicles: int,
+          seconds: Optional[float]) -> dict:
+    """seconds=None runs plain local search to a local optimum; otherwise GLS for that long."""
+    n = len(distances)
+    manager = pywrapcp.RoutingIndexManager(n, vehicles, 0)
+    routing = pywrapcp.RoutingModel(manager)
+
+    if mode == "callback":
+        dist_matrix, time_matrix = distances.tolist(), durations.tolist()
+
+        def distance_callback(from_idx, to_idx):
+            return int(dist_matrix[manager.IndexToNode(from_idx)][manager.IndexToNode(to_idx)])
+
+        def time_callback(from_idx, to_idx):
+            return int(time_matrix[manager.IndexToNode(from_idx)][manager.IndexToNode(to_idx)] / 60)
+
+        dist_cb = routing.RegisterTransitCallback(distance_callback)
+        time_cb = routing.RegisterTransitCallback(time_callback)
+    else:
+        dist, minutes = integer_matrix(distances), integer_matrix(durations, 60.0)
+        register = register_flat_callback if mode == "flat" else register_matrix
+        dist_cb = register(routing, manager, dist)
+        time_cb = register(routing, manager, minutes)
+
+    routing.SetArcCostEvaluatorOfAllVehicles(dist_cb)
+    routing.AddDimension(time_cb, 30, 660, True, "Time")
+
+    solutions = 0
+
+    def on_solution():
+        nonlocal solutions
+        solutions += 1
+
+    routing.AddAtSolutionCallback(on_solution)
+
+    params = pywrapcp.DefaultRoutingSearchParameters()
+    params.first_solution_strategy = routing_enums_pb2.FirstSolutionStrategy.PATH_CHEAPEST_ARC
+    if seconds is not None:
+        params.local_search_metaheuristic = routing_enums_pb2.LocalSearchMetaheuristic.GUIDED_LOCAL_SEARCH
+        params.time_limit.FromMilliseconds(int(seconds * 1000))
+
+    start = time.perf_counter()
+    solution = routing.SolveWithParameters(params)
+    elapsed = time.perf_counter() - start
+    return {
+        "solutions": solutions,
+        "elapsed": elapsed,
+        "objective": solution.ObjectiveValue() if solution else None,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--stops", type=int, default=200)
+    parser.add_argument("--vehicles", type=int, default=10)
+    parser.add_argument("--instances", type=int, default=3)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    args = parser.parse_args()
+
+    instances = [make_instance(args.stops, seed) for seed in range(args.instances)]
+    print(f"{args.instances} instances, {args.stops} stops, {args.vehicles} vehicles")
+    for title, seconds in (("descent to local optimum", None), (f"guided local search, {args.seconds:g}s", args.seconds)):
+        print(f"\n{title}")
+        print(f"{'mode':<10}{'mean time (s)':>15}{'solutions/s':>14}{'mean objective (m)':>22}")
+        for mode in ("callback", "flat", "matrix"):
+            runs = [solve(mode, *instance, args.vehicles, seconds) for instance in instances]
+            elapsed = sum(r["elapsed"] for r in runs)
+            rate = sum(r["solutions"] for r in runs) / elapsed
+            objective = np.mean([r["objective"] for r in runs if r["objective"] is not None])
+            print(f"{mode:<10}{elapsed / len(runs):>15.2f}{rate:>14.1f}{objective:>22,.0f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+"""
+Bill of lading field extraction from OCR text.
+
+Fields are read in one pass. A single precompiled pattern of every field
+label, matched only at word boundaries, records where each label occurs
+(its anchors); each field is then resolved by matching its precompiled
+value pattern right after its anchors, in document order. Shipper,
+consignee and carrier blocks are resolved from the line their anchor is on,
+reading only the few lines that follow it.
+
+Resolution rules:
+  - a label inside a longer word is not a label ("PRO" in "PROPANE", "PO"
+    in "PORT"), so it cannot produce a value
+  - a value may sit on the line after its label (OCR often splits a form's
+    label and value cells), but may not itself be a label: in
+    "BILL OF LADING\\nBOL# 12345" the number is 12345, not "BOL"
+  - BOL, PO and PRO numbers must contain a digit
+  - a block label only opens a block when it reads as a heading: alone on
+    its line, followed by "NAME", or by a colon and an inline name
+    ("CARRIER NAME: EUSO LOGISTICS"). "SHIPPER'S NO. 4412" and
+    "SHIPPER CERTIFICATION ..." boilerplate are not blocks, and the first
+    heading of each kind wins
+  - a block's name is its inline name, else the next non-empty line; its
+    address is the lines after the name up to the ZIP code, and neither
+    runs into the next labelled block
+"""
+
+import bisect
+import re
+from typing import Optional
+
+FIELDS = (
+    "shipper_name", "shipper_address", "consignee_name", "consignee_address", "carrier_name",
+    "bol_number", "date", "commodity", "weight", "pieces", "hazmat_class", "un_number",
+    "packing_group", "emergency_phone", "special_instructions", "po_number", "pro_number",
+)
+
+# Labels per anchor kind. Every label starts with a literal character; where
+# labels share a start, the first that matches at a position wins.
+_LABELS = (
+    ("bol_number", (r"BILL[ \t]+OF[ \t]+LADING", "BOL", "B/L")),
+    ("date", (r"SHIP[ \t]+DATE", r"PICKUP[ \t]+DATE", "DATE")),
+    ("po_number", (r"PURCHASE[ \t]+ORDER", r"P\.?O\.?")),
+    ("pro_number", ("PRO",)),
+    ("weight", (r"GROSS[ \t]*WT\.?", "WEIGHT", r"WT\.?")),
+    ("pieces", ("PIECES?", "QTY", "QUANTITY", "UNITS?")),
+    ("hazmat_class", ("HAZMAT", r"HAZ[ \t]*MAT", "HAZARD")),
+    ("packing_group", (r"PACKING[ \t]*GROUP", "PG")),
+    ("emergency_phone", ("EMERGENCY", "CHEMTREC", "24.?HR")),
+    ("commodity", ("DESCRIPTION", "COMMODITY", "PRODUCT")),
+    ("shipper", ("SHIPPER(?:'?S)?", r"SHIP[ \t]+FROM", "FROM(?=:)")),
+    ("consignee", ("CONSIGNEE", r"SHIP[ \t]+TO", r"DELIVER[ \t]+TO")),
+    ("carrier", ("CARRIER",)),
+    # "UN1203": the only label that runs straight into its value
+    ("un_number", (r"UN(?=\s*\d{4})",)),
+)
+# Block label kind -> (name field, address field)
+_BLOCKS = {
+    "shipper": ("shipper_name", "shipper_address"),
+    "consignee": ("consignee_name", "consignee_address"),
+    "carrier": ("carrier_name", None),
+}
+
+
+def _compile_anchors(labels) -> tuple[re.Pattern, list[str]]:
+    """
+    One pattern for every label, and the anchor kind of each group number.
+    A match is the separator in front of a label, then the label, so labels
+    only match at the start of a word and the regex engine can skip over
+    letters and digits without trying any label. Labels are grouped by first
+    character and each ends in an empty group, so m.lastindex says which
+    label matched.
+    """
+    by_first: dict[str, list[tuple[str, str]]] = {}
+    for kind, alternatives in labels:
+        for label in alternatives:
+            by_first.setdefault(label[0], []).append((kind, label[1:]))
+    kinds = [""]
+    branches = []
+    for first, rests in by_first.items():
+        alternatives = []
+        for kind, rest in rests:
+            word_end = "" if kind == "un_number" else "(?![A-Z0-9])"
+            alternatives.append(f"{rest}{word_end}()")
+            kinds.append(kind)
+        branches.append(f"{re.escape(first)}(?:{'|'.join(alternatives)})")
+    return re.compile(f"[^A-Z0-9](?:{'|'.join(branches)})"), kinds
+
+
+_ANCHORS, _KINDS = _compile_anchors(_LABELS)
+
+_ID = r"\s*(?:#|NO\.?|NUMBER)?\s*:?\s*(?=[A-Z\-]*\d)([A-Z0-9\-]+)"
+_VALUES = {
+    "bol_number": re.compile(_ID),
+    "po_number": re.compile(_ID),
+    "pro_number": re.compile(_ID),
+    "date": re.compile(r"\s*:?\s*(\d{1,2}[/\-]\d{1,2}[/\-]\d{2,4})"),
+    "weight": re.compile(r"\s*(?:\((?:LBS?|KGS?)\))?\s*:?\s*(\d[\d,]*)"),
+    "pieces": re.compile(r"\s*:?\s*(\d+)"),
+    "hazmat_class": re.compile(r"\s*(?:CLASS)?\s*:?\s*(\d+(?:\.\d+)?)"),
+    "un_number": re.compile(r"\s*(\d{4})"),
+    "packing_group": re.compile(r"\s*:?\s*(I{1,3}|[123])(?![A-Z0-9])"),
+    "emergency_phone": re.compile(r"\s*(?:RESPONSE)?\s*(?:PHONE|CONTACT|#|NUMBER)?\s*:?\s*([\d\-\(\) ]{10,})"),
+    "commodity": re.compile(r"\s*(?:OF\s*GOODS?)?\s*:?\s*(.+)"),
+}
+# What may follow a block label for it to head a block: nothing, "NAME", or a colon and an inline name
+_HEADING = re.compile(r"[ \t]*(?:NAME)?[ \t]*(?::[ \t]*(\S.*?)?)?[ \t]*(?=\n|\Z)")
+# Form-cell labels in front of a name or address line (VICS BOLs: "Name:", "City/State/Zip:")
+_CELL_LABELS = re.compile(r"^[ \t]*(?:NAME|ADDRESS|CITY[ \t/,]*STATE[ \t/,]*ZIP)[ \t]*:", re.I | re.M)
+_ZIP = re.compile(r"\d{5}")
+_NAME_WINDOW = 3
+_BLOCK_WINDOW = 5
+
+
+def _resolve_blocks(source: str, upper: str, anchors: list[tuple[str, int, int]], fields: dict) -> None:
+    """Names and addresses from the block label anchors. Lines are start
+    offsets into upper; names are sliced from source at the same offsets."""
+    # Every line with a block label ends the block above it; the first label
+    # of each kind that reads as a heading opens that kind's block
+    block_lines: set[int] = set()
+    headings: dict[str, tuple[int, Optional[str]]] = {}
+    for kind, start, end in anchors:
+        line = upper.rfind("\n", 0, start) + 1
+        block_lines.add(line)
+        if kind not in headings:
+            m = _HEADING.match(upper, end)
+            if m:
+                headings[kind] = (line, source[m.start(1):m.end(1)] if m.group(1) else None)
+
+    block_lines = sorted(block_lines)
+    for kind, (line, inline) in headings.items():
+        name_field, address_field = _BLOCKS[kind]
+        # The lines after the heading's, up to the next block's
+        first = upper.find("\n", line) + 1
+        following = bisect.bisect_right(block_lines, line)
+        end = block_lines[following] if following < len(block_lines) else len(upper)
+        window = "\n".join(source[first:end].split("\n", _BLOCK_WINDOW)[:_BLOCK_WINDOW]) if first else ""
+        if ":" in window:
+            window = _CELL_LABELS.sub("", window)
+        lines = [content.strip() for content in window.split("\n")]
+
+        name, rest = None, lines
+        if inline and len(inline) > 2:
+            name = inline
+        else:
+            for i, content in enumerate(lines[:_NAME_WINDOW]):
+                if len(content) > 2:
+                    name, rest = content, lines[i + 1:]
+                    break
+        fields[name_field] = name
+        if address_field is None:
+            continue
+        # Up to three lines, ending at the first with a ZIP code
+        parts = [content for content in rest if content][:3]
+        address = "\n".join(parts)
+        zip_code = _ZIP.search(address)
+        if zip_code:
+            parts = parts[:address.count("\n", 0, zip_code.start()) + 1]
+        fields[address_field] = ", ".join(parts) or None
+
+
+def extract_bol_fields(text: str) -> dict[str, Optional[str]]:
+    """BOL fields (FIELDS, None where not found) from raw OCR text."""
+    fields: dict[str, Optional[str]] = dict.fromkeys(FIELDS)
+    # A leading newline puts a separator in front of a label at the very start
+    upper = "\n" + text.upper()
+
+    # The single pass: every label occurrence, as (kind, start, end), in document order
+    anchors = [(_KINDS[m.lastindex], m.start() + 1, m.end()) for m in _ANCHORS.finditer(upper)]
+    if not anchors:
+        return fields
+    label_starts = {start for _, start, _ in anchors}
+
+    blocks = []
+    for kind, start, end in anchors:
+        pattern = _VALUES.get(kind)
+        if pattern is None:
+            blocks.append((kind, start, end))
+        elif fields[kind] is None:
+            m = pattern.match(upper, end)
+            if m and m.start(1) not in label_starts:
+                fields[kind] = m.group(1)
+    if fields["weight"]:
+        fields["weight"] = fields["weight"].replace(",", "")
+    if fields["un_number"]:
+        fields["un_number"] = "UN" + fields["un_number"]
+    if fields["emergency_phone"]:
+        fields["emergency_phone"] = fields["emergency_phone"].strip()
+    if fields["commodity"]:
+        fields["commodity"] = fields["commodity"].strip()[:200]
+
+    if blocks:
+        # Uppercasing can change the length of non-ASCII text: names then come from upper
+        source = "\n" + text if len(text) + 1 == len(upper) else upper
+        _resolve_blocks(source, upper, blocks, fields)
+    return fields
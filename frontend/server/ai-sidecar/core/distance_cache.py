@@ -0,0 +1,250 @@
+"""
+Pairwise distance/duration cache for /route/matrix and /route/optimize.
+
+Coordinates are snapped to a ~50 m grid (snap_m meters of latitude; cells get
+narrower east-west away from the equator) and each (profile, origin cell,
+destination cell) pair keeps OSRM's distance and duration. An in-memory LRU
+sits in front of an optional SQLite file, so depots, terminals and frequent
+customers survive restarts. cached_matrix assembles a full matrix from the
+cache and asks the routing backend only for the rows x columns that still
+have missing cells. Only OSRM answers are cached, never haversine estimates.
+
+Environment:
+    DISTANCE_CACHE_SIZE     pairs kept in memory (default 500000; 0 disables the cache)
+    DISTANCE_CACHE_PATH     SQLite file for persistence (default unset: memory only)
+    DISTANCE_CACHE_TTL_S    seconds a pair stays valid (default 604800, one week)
+    DISTANCE_CACHE_SNAP_M   snapping grid in meters (default 50)
+    DISTANCE_CACHE_MAX_LOCATIONS  larger matrices bypass the cache (default 250); per-pair
+                            bookkeeping costs ~3 us a cell, too much for regional 2000 x 2000 tables
+"""
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Iterable, Optional, Sequence
+
+import numpy as np
+
+logger = logging.getLogger("ai-sidecar.distance_cache")
+
+METERS_PER_DEG_LAT = 111320.0
+_CELL_OFFSET = 1 << 31  # keeps packed cell ids non-negative
+_SQL_CHUNK = 400  # pairs per SELECT (two bound parameters each)
+
+Pair = tuple[str, int, int]  # (profile, origin cell, destination cell)
+
+
+class DistanceCache:
+    """LRU of snapped pair -> (distance_m, duration_s, fetched_at), optionally persisted to SQLite."""
+
+    def __init__(self, capacity: int = 500_000, path: Optional[str] = None,
+                 ttl_s: float = 7 * 86400, snap_m: float = 50.0, max_locations: int = 250):
+        self.capacity = capacity
+        self.max_locations = max_locations
+        self.path = path
+        self.ttl_s = ttl_s
+        self.step_deg = snap_m / METERS_PER_DEG_LAT
+        self.hits = 0
+        self.misses = 0
+        self._lru: "OrderedDict[Pair, tuple[float, float, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS pair_distance ("
+                " profile TEXT NOT NULL, src INTEGER NOT NULL, dst INTEGER NOT NULL,"
+                " distance_m REAL NOT NULL, duration_s REAL NOT NULL, fetched_at REAL NOT NULL,"
+                " PRIMARY KEY (profile, src, dst)) WITHOUT ROWID"
+            )
+            self._db.commit()
+
+    @classmethod
+    def from_env(cls) -> "DistanceCache":
+        return cls(
+            capacity=int(os.getenv("DISTANCE_CACHE_SIZE", "500000")),
+            path=os.getenv("DISTANCE_CACHE_PATH") or None,
+            ttl_s=float(os.getenv("DISTANCE_CACHE_TTL_S", str(7 * 86400))),
+            snap_m=float(os.getenv("DISTANCE_CACHE_SNAP_M", "50")),
+            max_locations=int(os.getenv("DISTANCE_CACHE_MAX_LOCATIONS", "250")),
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.capacity > 0
+
+    def cells(self, coords: Sequence[tuple[float, float]]) -> np.ndarray:
+        """Packed int64 grid cell of each (lat, lng)."""
+        c = np.asarray(coords, dtype=np.float64).reshape(-1, 2)
+        lat = np.round(c[:, 0] / self.step_deg).astype(np.int64) + _CELL_OFFSET
+        lng = np.round(c[:, 1] / self.step_deg).astype(np.int64) + _CELL_OFFSET
+        return (lat << 32) | lng
+
+    def get_many(self, pairs: Iterable[Pair]) -> dict[Pair, tuple[float, float]]:
+        """Cached (distance_m, duration_s) for the pairs found; memory first, then SQLite."""
+        now = time.time()
+        found: dict[Pair, tuple[float, float]] = {}
+        missing: list[Pair] = []
+        with self._lock:
+            for key in pairs:
+                entry = self._lru.get(key)
+                if entry is not None and now - entry[2] < self.ttl_s:
+                    self._lru.move_to_end(key)
+                    found[key] = entry[:2]
+                else:
+                    missing.append(key)
+            if missing and self._db is not None:
+                for key, entry in self._load(missing, now - self.ttl_s).items():
+                    found[key] = entry[:2]
+                    self._remember(key, entry)
+        return found
+
+    def put_many(self, items: Iterable[tuple[Pair, float, float]]) -> None:
+        now = time.time()
+        rows = []
+        with self._lock:
+            for key, distance, duration in items:
+                self._remember(key, (distance, duration, now))
+                rows.append((*key, distance, duration, now))
+            if rows and self._db is not None:
+                self._db.executemany("INSERT OR REPLACE INTO pair_distance VALUES (?, ?, ?, ?, ?, ?)", rows)
+                self._db.commit()
+
+    def _remember(self, key: Pair, entry: tuple[float, float, float]) -> None:
+        self._lru[key] = entry
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.capacity:
+            self._lru.popitem(last=False)
+
+    def _load(self, keys: list[Pair], not_before: float) -> dict[Pair, tuple[float, float, float]]:
+        out: dict[Pair, tuple[float, float, float]] = {}
+        by_profile: dict[str, list[tuple[int, int]]] = {}
+        for profile, src, dst in keys:
+            by_profile.setdefault(profile, []).append((src, dst))
+        for profile, cells in by_profile.items():
+            for i in range(0, len(cells), _SQL_CHUNK):
+                chunk = cells[i:i + _SQL_CHUNK]
+                values = ",".join("(?, ?)" for _ in chunk)
+                rows = self._db.execute(
+                    f"SELECT src, dst, distance_m, duration_s, fetched_at FROM pair_distance"
+                    f" WHERE profile = ? AND fetched_at >= ? AND (src, dst) IN (VALUES {values})",
+                    [profile, not_before, *(v for pair in chunk for v in pair)],
+                ).fetchall()
+                for src, dst, distance, duration, fetched_at in rows:
+                    out[(profile, src, dst)] = (distance, duration, fetched_at)
+        return out
+
+    def record(self, hits: int, misses: int) -> None:
+        with self._lock:
+            self.hits += hits
+            self.misses += misses
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._lru),
+            "capacity": self.capacity,
+            "persistent": self._db is not None,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+        }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._lru.clear()
+            self.hits = self.misses = 0
+            if self._db is not None:
+                self._db.execute("DELETE FROM pair_distance")
+                self._db.commit()
+
+
+TableFn = Callable[..., Awaitable[dict]]
+
+
+def _gap_blocks(gaps: np.ndarray) -> list[tuple[list[int], list[int]]]:
+    """
+    Covers the missing cells with at most two source x destination blocks: rows
+    that are mostly missing (new locations) against their gap columns, then
+    whatever is left (known locations towards the new ones).
+    """
+    blocks = []
+    remaining = gaps.copy()
+    mostly_missing = np.flatnonzero(remaining.mean(axis=1) > 0.5)
+    if len(mostly_missing):
+        cols = np.flatnonzero(remaining[mostly_missing].any(axis=0))
+        blocks.append((mostly_missing.tolist(), cols.tolist()))
+        remaining[np.ix_(mostly_missing, cols)] = False
+    if remaining.any():
+        blocks.append((np.flatnonzero(remaining.any(axis=1)).tolist(),
+                       np.flatnonzero(remaining.any(axis=0)).tolist()))
+    return blocks
+
+
+async def cached_matrix(table: TableFn, cache: DistanceCache, coords: Sequence[tuple[float, float]],
+                        profile: str = "driving") -> dict:
+    """
+    Full n x n distance (m) / duration (s) matrix for coords. Cells are served
+    from the cache where possible; the rest come from table(coords, profile,
+    sources, destinations) calls over at most two blocks covering the gaps.
+    Returns {"code", "distances", "durations" (np.ndarray, NaN if unreachable),
+    "source", "cache": {"hits", "misses", "hit_ratio"}}.
+    """
+    n = len(coords)
+    use_cache = cache.enabled and n <= cache.max_locations
+    packed = cache.cells(coords)
+    cells = packed.tolist()
+    unique, inverse = np.unique(packed, return_inverse=True)
+    u = len(unique)
+    cell_d = np.full((u, u), np.nan)
+    cell_t = np.full((u, u), np.nan)
+    if use_cache:
+        position = {c: i for i, c in enumerate(unique.tolist())}
+        found = cache.get_many((profile, a, b) for a in position for b in position if a != b)
+        for (_, a, b), (d, t) in found.items():
+            cell_d[position[a], position[b]] = d
+            cell_t[position[a], position[b]] = t
+    np.fill_diagonal(cell_d, 0.0)  # same snapped cell -> 0
+    np.fill_diagonal(cell_t, 0.0)
+    distances = cell_d[np.ix_(inverse, inverse)]
+    durations = cell_t[np.ix_(inverse, inverse)]
+    same = inverse[:, None] == inverse[None, :]
+
+    gaps = np.isnan(distances)
+    n_cells = n * n - int(same.sum())
+    misses = int(gaps.sum())
+    source = "osrm"
+    for rows, cols in _gap_blocks(gaps):
+        everything = len(rows) == n and len(cols) == n
+        data = await table(coords, profile,
+                           None if everything else rows, None if everything else cols)
+        if data.get("code") != "Ok":
+            return {"code": data.get("code"), "message": data.get("message"), "source": data.get("source")}
+        if data.get("source", "osrm") != "osrm":
+            source = data["source"]
+        sub_d = np.array(data["distances"], dtype=np.float64)  # None (unreachable) -> nan
+        sub_t = np.array(data["durations"], dtype=np.float64)
+        block = np.ix_(rows, cols)
+        fill = gaps[block]
+        distances[block] = np.where(fill, sub_d, distances[block])
+        durations[block] = np.where(fill, sub_t, durations[block])
+        gaps[block] = False
+        if use_cache and data.get("source", "osrm") == "osrm":
+            ri, ci = np.nonzero(fill & ~np.isnan(sub_d) & ~np.isnan(sub_t))
+            cache.put_many(
+                ((profile, cells[rows[r]], cells[cols[c]]), float(sub_d[r, c]), float(sub_t[r, c]))
+                for r, c in zip(ri.tolist(), ci.tolist())
+            )
+    hits = n_cells - misses
+    cache.record(hits, misses)
+    return {
+        "code": "Ok",
+        "distances": distances,
+        "durations": durations,
+        "source": source,
+        "cache": {"hits": hits, "misses": misses, "hit_ratio": round(hits / n_cells, 4) if n_cells else 1.0},
+    }
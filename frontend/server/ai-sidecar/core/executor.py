@@ -0,0 +1,279 @@
+"""
+Off-loop execution pools for CPU-bound sidecar work.
+
+Every handler is async, but an OR-Tools solve, a PaddleOCR/Docling pass, a
+Darts/Prophet fit or a spaCy parse is seconds of synchronous CPU. Run inline,
+it stalls the event loop, and with a single uvicorn worker one OCR request
+freezes /health and every other endpoint. Each capability instead gets its
+own pool:
+
+  - process pools (spawned workers) for OCR, VRP and forecasting, with an
+    initializer that loads the capability's models once per worker, so they
+    stay warm between tasks
+  - a thread pool for spaCy, whose model already lives in app.state
+  - a bound on queued tasks: a full queue is rejected with 429 and a
+    Retry-After estimate, and a shut down or crashed pool with 503
+  - a per-task timeout (504). A task still queued is cancelled; a process
+    worker still running one is terminated and the pool restarted.
+
+Queue depth and wait/run latency percentiles per pool are reported on /health.
+
+Environment (CAP = OCR | VRP | FORECAST | NLP):
+    EXECUTOR_<CAP>_MODE         process | thread
+    EXECUTOR_<CAP>_WORKERS      concurrent tasks
+    EXECUTOR_<CAP>_QUEUE        tasks allowed to wait for a worker; more are rejected (429)
+    EXECUTOR_<CAP>_TIMEOUT_S    default per-task limit (504)
+    EXECUTOR_START_METHOD       multiprocessing start method (default spawn)
+"""
+
+import asyncio
+import importlib
+import logging
+import math
+import multiprocessing
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import BrokenExecutor, Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Optional, Sequence
+
+import numpy as np
+from fastapi import HTTPException
+
+logger = logging.getLogger("ai-sidecar.executor")
+
+# Per-capability defaults; "warm" entries are modules to import or "module:function" to call in each worker
+CAPABILITIES: dict[str, dict] = {
+    "ocr": {"mode": "process", "workers": 2, "max_queue": 16, "timeout_s": 120.0,
+            "warm": ("routers.ocr:warm_ocr_worker",)},
+    "vrp": {"mode": "process", "workers": 2, "max_queue": 8, "timeout_s": 60.0,
+            "warm": ("core.vrp", "ortools.constraint_solver.pywrapcp")},
+    "forecast": {"mode": "process", "workers": 2, "max_queue": 16, "timeout_s": 60.0,
+                 "warm": ("routers.forecast:warm_forecast_worker",)},
+    "nlp": {"mode": "thread", "workers": 4, "max_queue": 64, "timeout_s": 15.0, "warm": ()},
+}
+
+_LATENCY_SAMPLES = 512
+
+
+class ExecutorRejected(HTTPException):
+    """A task the executor would not or could not finish: 429 queue full, 503 unavailable, 504 timed out."""
+
+    def __init__(self, status_code: int, detail: str, retry_after: Optional[float] = None):
+        headers = {"Retry-After": str(max(1, math.ceil(retry_after)))} if retry_after else None
+        super().__init__(status_code=status_code, detail=detail, headers=headers)
+
+
+def _warm(specs: Sequence[str]) -> None:
+    """Worker initializer: import modules / call loaders so the first task finds its models loaded."""
+    for spec in specs:
+        module, _, attr = spec.partition(":")
+        try:
+            loaded = importlib.import_module(module)
+            if attr:
+                getattr(loaded, attr)()
+        except Exception as e:
+            logger.warning(f"Worker warm-up {spec} failed: {e}")
+
+
+def _timed(fn: Callable, args: tuple, kwargs: dict) -> tuple[Any, float, float]:
+    """Runs in the worker; returns (result, started, finished) wall-clock times."""
+    started = time.time()
+    result = fn(*args, **kwargs)
+    return result, started, time.time()
+
+
+def _noop() -> None:
+    return None
+
+
+def _percentiles(samples: deque) -> dict:
+    if not samples:
+        return {"p50": 0.0, "p95": 0.0}
+    p50, p95 = np.percentile(np.fromiter(samples, dtype=np.float64), [50, 95])
+    return {"p50": round(p50 * 1000, 1), "p95": round(p95 * 1000, 1)}
+
+
+class CapabilityPool:
+    """Bounded process or thread pool for one capability, with timeouts and latency metrics."""
+
+    def __init__(self, name: str, mode: str = "process", workers: int = 2, max_queue: int = 16,
+                 timeout_s: float = 60.0, warm: Sequence[str] = (), start_method: str = "spawn"):
+        if mode not in ("process", "thread"):
+            raise ValueError(f"Unknown executor mode for {name}: {mode}")
+        self.name = name
+        self.mode = mode
+        self.workers = workers
+        self.max_queue = max_queue
+        self.timeout_s = timeout_s
+        self.warm_specs = tuple(warm)
+        self.start_method = start_method
+        self.pending = 0  # submitted and not yet finished (queued + running)
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.restarts = 0
+        self._wait_s: deque = deque(maxlen=_LATENCY_SAMPLES)
+        self._run_s: deque = deque(maxlen=_LATENCY_SAMPLES)
+        self._pool: Optional[Executor] = None
+        self._closed = False
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, name: str, **defaults) -> "CapabilityPool":
+        prefix = f"EXECUTOR_{name.upper()}_"
+        return cls(
+            name,
+            mode=os.getenv(prefix + "MODE", defaults.get("mode", "process")),
+            workers=int(os.getenv(prefix + "WORKERS", str(defaults.get("workers", 2)))),
+            max_queue=int(os.getenv(prefix + "QUEUE", str(defaults.get("max_queue", 16)))),
+            timeout_s=float(os.getenv(prefix + "TIMEOUT_S", str(defaults.get("timeout_s", 60.0)))),
+            warm=defaults.get("warm", ()),
+            start_method=os.getenv("EXECUTOR_START_METHOD", "spawn"),
+        )
+
+    def _executor(self) -> Executor:
+        with self._lock:
+            if self._pool is None:
+                if self.mode == "process":
+                    self._pool = ProcessPoolExecutor(
+                        max_workers=self.workers,
+                        mp_context=multiprocessing.get_context(self.start_method),
+                        initializer=_warm, initargs=(self.warm_specs,),
+                    )
+                else:
+                    self._pool = ThreadPoolExecutor(
+                        max_workers=self.workers, thread_name_prefix=f"{self.name}-worker",
+                        initializer=_warm, initargs=(self.warm_specs,),
+                    )
+            return self._pool
+
+    def _retire(self, pool: Executor, terminate: bool) -> None:
+        """Drops a pool so the next task starts a fresh one; terminate kills its worker processes."""
+        with self._lock:
+            if self._pool is pool:
+                self._pool = None
+                self.restarts += 1
+        if terminate:
+            for process in list((getattr(pool, "_processes", None) or {}).values()):
+                process.terminate()
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def _finished(self, _future) -> None:
+        with self._lock:
+            self.pending -= 1
+
+    def _retry_after(self) -> float:
+        run_s = float(np.median(self._run_s)) if self._run_s else 1.0
+        return run_s * max(1, self.pending - self.workers + 1) / self.workers
+
+    async def run(self, fn: Callable, *args, timeout_s: Optional[float] = None, **kwargs) -> Any:
+        """
+        Runs fn(*args, **kwargs) on a worker and returns its result; fn and its
+        arguments must be picklable in process mode. Exceptions raised by fn
+        propagate unchanged; the executor's own failures raise ExecutorRejected.
+        """
+        if self._closed:
+            raise ExecutorRejected(503, f"{self.name} executor is shut down")
+        with self._lock:
+            if self.pending >= self.workers + self.max_queue:
+                self.rejected += 1
+                overloaded = True
+            else:
+                self.pending += 1
+                overloaded = False
+        if overloaded:
+            raise ExecutorRejected(429, f"{self.name} queue is full ({self.pending} tasks)",
+                                   retry_after=self._retry_after())
+
+        submitted = time.time()
+        try:
+            pool = self._executor()
+            future = pool.submit(_timed, fn, args, kwargs)
+        except (BrokenExecutor, RuntimeError) as e:
+            self._finished(None)
+            if self._pool is not None:
+                self._retire(self._pool, terminate=self.mode == "process")
+            raise ExecutorRejected(503, f"{self.name} executor unavailable: {e}")
+        future.add_done_callback(self._finished)
+
+        timeout = timeout_s or self.timeout_s
+        try:
+            result, started, finished = await asyncio.wait_for(asyncio.wrap_future(future), timeout)
+        except asyncio.TimeoutError:
+            self.timed_out += 1
+            if not future.cancel() and self.mode == "process":
+                # Still running: a worker process is the only thing that can stop it
+                logger.warning(f"{self.name} task exceeded {timeout:g}s; restarting its pool")
+                self._retire(pool, terminate=True)
+            raise ExecutorRejected(504, f"{self.name} task exceeded {timeout:g}s")
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BrokenExecutor as e:
+            self.failed += 1
+            self._retire(pool, terminate=True)
+            raise ExecutorRejected(503, f"{self.name} worker died: {e}")
+        except Exception:
+            self.failed += 1
+            raise
+        self.completed += 1
+        self._wait_s.append(max(0.0, started - submitted))
+        self._run_s.append(finished - started)
+        return result
+
+    async def warm(self) -> None:
+        """Starts every worker now (running its initializer) instead of on the first request."""
+        await asyncio.gather(*(self.run(_noop, timeout_s=max(self.timeout_s, 300.0))
+                               for _ in range(self.workers)), return_exceptions=True)
+
+    def stats(self) -> dict:
+        running = min(self.pending, self.workers)
+        return {
+            "mode": self.mode,
+            "workers": self.workers,
+            "max_queue": self.max_queue,
+            "running": running,
+            "queued": self.pending - running,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+            "restarts": self.restarts,
+            "queue_wait_ms": _percentiles(self._wait_s),
+            "run_ms": _percentiles(self._run_s),
+        }
+
+    def shutdown(self) -> None:
+        self._closed = True
+        if self._pool is not None:
+            self._retire(self._pool, terminate=self.mode == "process")
+
+
+class SidecarExecutor:
+    """The sidecar's capability pools; executor.run("ocr", run_paddle, path) and so on."""
+
+    def __init__(self, pools: dict[str, CapabilityPool]):
+        self.pools = pools
+
+    @classmethod
+    def from_env(cls) -> "SidecarExecutor":
+        return cls({name: CapabilityPool.from_env(name, **spec) for name, spec in CAPABILITIES.items()})
+
+    async def run(self, capability: str, fn: Callable, *args, timeout_s: Optional[float] = None, **kwargs) -> Any:
+        return await self.pools[capability].run(fn, *args, timeout_s=timeout_s, **kwargs)
+
+    async def warm(self) -> None:
+        await asyncio.gather(*(pool.warm() for pool in self.pools.values()))
+
+    def stats(self) -> dict:
+        return {name: pool.stats() for name, pool in self.pools.items()}
+
+    def shutdown(self) -> None:
+        for pool in self.pools.values():
+            pool.shutdown()
+
+
+executor = SidecarExecutor.from_env()
@@ -0,0 +1,252 @@
+"""
+Image preprocessing ahead of PaddleOCR.
+
+Phone photos of BOLs arrive at 12 megapixels, tilted and with a desk or truck
+seat around the page. PaddleOCR's detector shrinks its input to 960 px on the
+long side anyway, but recognition crops every text line from the full-size
+image, and the angle classifier then runs on every line. A profile per
+document type decides which of these steps run before OCR:
+
+  - crop: find the page quadrilateral (largest 4-corner contour) and warp
+    it flat, so the background costs nothing and the page fills the frame
+  - downscale: resample so the page is at most target_dpi over
+    page_long_in inches (a letter page at 200 dpi is 2200 px tall); images
+    are never upscaled
+  - deskew: estimate the residual rotation (within +/- max_skew_deg) from
+    the row-projection profile of the binarized text, then rotate it away
+  - binarize: adaptive threshold, for faint carbon copies (off by default,
+    because PaddleOCR's models are trained on natural images)
+  - angle_cls: whether PaddleOCR's per-line 180 degree classifier runs
+
+All steps compose into one 3x3 transform, so OCR boxes can be mapped back to
+the original image's coordinates. Steps need OpenCV, which PaddleOCR already
+depends on; without it images pass through unchanged.
+
+Environment:
+    OCR_PREP_PROFILES   JSON overrides per document type, merged over the
+                        built-in profiles, e.g. {"bol": {"binarize": true}}
+"""
+
+import hashlib
+import json
+import logging
+import os
+import time
+from typing import Optional, Union
+
+import numpy as np
+from pydantic import BaseModel
+
+logger = logging.getLogger("ai-sidecar.image_prep")
+
+# Working width for page detection and skew estimation
+_ANALYSIS_SIDE = 1000
+
+
+class PrepProfile(BaseModel):
+    enabled: bool = True
+    crop: bool = True
+    min_page_area: float = 0.25  # a detected page quadrilateral must cover this share of the image
+    target_dpi: int = 200
+    page_long_in: float = 11.0  # letter / BOL forms
+    deskew: bool = True
+    max_skew_deg: float = 10.0
+    binarize: bool = False
+    angle_cls: bool = True
+
+    def signature(self) -> str:
+        """Short stable hash of the settings (part of OCR cache keys)."""
+        settings = json.dumps(self.model_dump(), sort_keys=True, separators=(",", ":"))
+        return hashlib.sha256(settings.encode()).hexdigest()[:12]
+
+
+BUILTIN_PROFILES: dict[str, dict] = {
+    # Phone photos and scans of paper forms
+    "bol": {},
+    "generic": {},
+    # Mostly digital or flatbed: no page to find, small table print needs the resolution
+    "ratesheet": {"crop": False, "target_dpi": 250, "angle_cls": False},
+    # Already-rendered PDF pages (/ocr/batch): upright, at the requested dpi
+    "page": {"crop": False, "target_dpi": 300, "angle_cls": False},
+    "none": {"enabled": False, "angle_cls": True},
+}
+
+
+def load_profiles() -> dict[str, PrepProfile]:
+    overrides = json.loads(os.getenv("OCR_PREP_PROFILES") or "{}")
+    names = set(BUILTIN_PROFILES) | set(overrides)
+    return {name: PrepProfile(**{**BUILTIN_PROFILES.get(name, {}), **overrides.get(name, {})}) for name in names}
+
+
+PROFILES = load_profiles()
+
+
+def get_profile(name: Optional[str]) -> PrepProfile:
+    if name not in PROFILES:
+        raise ValueError(f"Unknown preprocessing profile: {name} (expected one of {', '.join(sorted(PROFILES))})")
+    return PROFILES[name]
+
+
+# ---------------------------------------------------------------------------
+# Steps: each returns (image, 3x3 transform from its input to its output)
+# ---------------------------------------------------------------------------
+
+def _analysis_copy(gray: np.ndarray):
+    import cv2
+
+    scale = min(1.0, _ANALYSIS_SIDE / max(gray.shape))
+    small = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA) if scale < 1 else gray
+    return small, scale
+
+
+def find_page(gray: np.ndarray, min_area: float) -> Optional[np.ndarray]:
+    """Corners (tl, tr, br, bl) of the largest page-like quadrilateral, or None."""
+    import cv2
+
+    small, scale = _analysis_copy(gray)
+    edges = cv2.Canny(cv2.GaussianBlur(small, (5, 5), 0), 50, 150)
+    edges = cv2.dilate(edges, np.ones((3, 3), np.uint8))
+    contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    area_min = min_area * small.shape[0] * small.shape[1]
+    for contour in sorted(contours, key=cv2.contourArea, reverse=True)[:5]:
+        if cv2.contourArea(contour) < area_min:
+            break
+        quad = cv2.approxPolyDP(contour, 0.02 * cv2.arcLength(contour, True), True)
+        if len(quad) == 4 and cv2.isContourConvex(quad):
+            pts = quad.reshape(4, 2).astype(np.float32) / scale
+            s, d = pts.sum(axis=1), np.diff(pts, axis=1).ravel()
+            return np.array([pts[s.argmin()], pts[d.argmin()], pts[s.argmax()], pts[d.argmax()]], np.float32)
+    return None
+
+
+def crop_page(image: np.ndarray, corners: np.ndarray, max_side: int) -> tuple[np.ndarray, np.ndarray]:
+    """Warps the page flat, downscaled to max_side in the same pass (one resample instead of two)."""
+    import cv2
+
+    tl, tr, br, bl = corners
+    width = max(np.linalg.norm(tr - tl), np.linalg.norm(br - bl))
+    height = max(np.linalg.norm(bl - tl), np.linalg.norm(br - tr))
+    scale = min(1.0, max_side / max(width, height))
+    width, height = max(1, int(width * scale)), max(1, int(height * scale))
+    target = np.array([[0, 0], [width - 1, 0], [width - 1, height - 1], [0, height - 1]], np.float32)
+    matrix = cv2.getPerspectiveTransform(corners, target)
+    return cv2.warpPerspective(image, matrix, (width, height), flags=cv2.INTER_LINEAR,
+                               borderMode=cv2.BORDER_REPLICATE), matrix
+
+
+def downscale(image: np.ndarray, max_side: int) -> tuple[np.ndarray, np.ndarray]:
+    import cv2
+
+    scale = max_side / max(image.shape[:2])
+    if scale >= 1:
+        return image, np.eye(3)
+    resized = cv2.resize(image, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+    return resized, np.diag([scale, scale, 1.0])
+
+
+def estimate_skew(gray: np.ndarray, max_deg: float) -> float:
+    """Rotation (degrees, counter-clockwise) that makes text rows horizontal."""
+    import cv2
+
+    small, _ = _analysis_copy(gray)
+    ink = cv2.threshold(small, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)[1]
+    h, w = ink.shape
+    center = (w / 2, h / 2)
+
+    def sharpness(angle: float) -> float:
+        rotated = cv2.warpAffine(ink, cv2.getRotationMatrix2D(center, angle, 1.0), (w, h),
+                                 flags=cv2.INTER_NEAREST)
+        rows = rotated.sum(axis=1, dtype=np.float64)
+        return float(np.square(np.diff(rows)).sum())
+
+    best = max(np.arange(-max_deg, max_deg + 1e-9, 1.0), key=sharpness)
+    return float(max(np.arange(best - 0.5, best + 0.5 + 1e-9, 0.1), key=sharpness))
+
+
+def rotate(image: np.ndarray, angle: float) -> tuple[np.ndarray, np.ndarray]:
+    import cv2
+
+    h, w = image.shape[:2]
+    affine = cv2.getRotationMatrix2D((w / 2, h / 2), angle, 1.0)
+    rotated = cv2.warpAffine(image, affine, (w, h), flags=cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE)
+    return rotated, np.vstack([affine, [0, 0, 1]])
+
+
+def binarize(image: np.ndarray) -> np.ndarray:
+    import cv2
+
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+    binary = cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 31, 15)
+    return cv2.cvtColor(binary, cv2.COLOR_GRAY2BGR)
+
+
+# ---------------------------------------------------------------------------
+# Pipeline
+# ---------------------------------------------------------------------------
+
+class Prepared:
+    """A preprocessed image, the transform that produced it, and what was done."""
+
+    def __init__(self, image, transform: np.ndarray, info: dict):
+        self.image = image
+        self.transform = transform
+        self.info = info
+
+    def to_original(self, points) -> list[list[int]]:
+        """Maps points in the prepared image back to the original image."""
+        pts = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        homogeneous = np.c_[pts, np.ones(len(pts))] @ np.linalg.inv(self.transform).T
+        return np.rint(homogeneous[:, :2] / homogeneous[:, 2:]).astype(int).tolist()
+
+
+def decode_image(source: Union[str, bytes]):
+    """BGR array from a path or encoded bytes, or None if OpenCV cannot read it."""
+    import cv2
+
+    if isinstance(source, str):
+        return cv2.imread(source, cv2.IMREAD_COLOR)
+    return cv2.imdecode(np.frombuffer(source, np.uint8), cv2.IMREAD_COLOR)
+
+
+def prepare(source: Union[str, bytes, np.ndarray], profile: PrepProfile) -> Optional[Prepared]:
+    """
+    Runs the profile's steps. Returns None when preprocessing does not apply
+    (disabled, OpenCV missing or the image unreadable), in which case the
+    source should be OCR'd as-is.
+    """
+    if not profile.enabled:
+        return None
+    try:
+        import cv2
+    except ImportError:
+        return None
+
+    started = time.perf_counter()
+    image = source if isinstance(source, np.ndarray) else decode_image(source)
+    if image is None:
+        return None
+    info = {"input_size": [int(image.shape[1]), int(image.shape[0])], "cropped": False, "skew_deg": 0.0}
+    transform = np.eye(3)
+
+    max_side = int(profile.target_dpi * profile.page_long_in)
+    corners = find_page(cv2.cvtColor(image, cv2.COLOR_BGR2GRAY), profile.min_page_area) if profile.crop else None
+    if corners is not None:
+        image, step = crop_page(image, corners, max_side)
+        info["cropped"] = True
+    else:
+        image, step = downscale(image, max_side)
+    transform = step @ transform
+
+    if profile.deskew:
+        angle = estimate_skew(cv2.cvtColor(image, cv2.COLOR_BGR2GRAY), profile.max_skew_deg)
+        if abs(angle) >= 0.2:
+            image, step = rotate(image, angle)
+            transform = step @ transform
+            info["skew_deg"] = round(angle, 1)
+
+    if profile.binarize:
+        image = binarize(image)
+
+    info["size"] = [int(image.shape[1]), int(image.shape[0])]
+    info["ms"] = round((time.perf_counter() - started) * 1000, 1)
+    return Prepared(image, transform, info)
@@ -0,0 +1,173 @@
+"""
+Content-addressed cache of OCR engine results.
+
+The same BOL or rate sheet is routinely uploaded several times (shipper,
+carrier, driver, client retries), and each upload would otherwise re-run
+Docling or PaddleOCR. Results are keyed by the SHA-256 of the decoded file
+bytes, the engine and the engine's version, so a model upgrade or a change
+to how results are post-processed never serves stale output. An in-memory
+LRU sits in front of an optional SQLite store that is bounded by total size
+and evicts the least recently used results first.
+
+Environment:
+    OCR_CACHE_SIZE      results kept in memory (default 256; 0 disables the cache)
+    OCR_CACHE_PATH      SQLite file for persistence (default unset: memory only)
+    OCR_CACHE_MAX_MB    size bound of the SQLite store (default 512)
+    OCR_CACHE_TTL_S     seconds a result stays valid (default 2592000, 30 days)
+"""
+
+import functools
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from importlib import metadata
+from typing import Any, Optional
+
+logger = logging.getLogger("ai-sidecar.ocr_cache")
+
+
+@functools.lru_cache(maxsize=None)
+def package_version(package: str) -> str:
+    """Installed version of a distribution, without importing it ("missing" if not installed)."""
+    try:
+        return metadata.version(package)
+    except metadata.PackageNotFoundError:
+        return "missing"
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+class OCRCache:
+    """LRU of (content hash, engine, version) -> JSON result, optionally persisted to a size-bounded SQLite file."""
+
+    def __init__(self, capacity: int = 256, path: Optional[str] = None,
+                 max_bytes: int = 512 * 1024 * 1024, ttl_s: float = 30 * 86400):
+        self.capacity = capacity
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl_s = ttl_s
+        self.hits = 0
+        self.misses = 0
+        self._lru: "OrderedDict[str, tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        self._disk_bytes = 0
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS ocr_result ("
+                " key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL,"
+                " created_at REAL NOT NULL, used_at REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS ocr_result_used ON ocr_result (used_at)")
+            self._db.commit()
+            self._disk_bytes = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM ocr_result").fetchone()[0]
+
+    @classmethod
+    def from_env(cls) -> "OCRCache":
+        return cls(
+            capacity=int(os.getenv("OCR_CACHE_SIZE", "256")),
+            path=os.getenv("OCR_CACHE_PATH") or None,
+            max_bytes=int(float(os.getenv("OCR_CACHE_MAX_MB", "512")) * 1024 * 1024),
+            ttl_s=float(os.getenv("OCR_CACHE_TTL_S", str(30 * 86400))),
+        )
+
+    @property
+    def enabled(self) -> bool:
+        return self.capacity > 0
+
+    @staticmethod
+    def key(digest: str, engine: str, version: str) -> str:
+        return f"{digest}:{engine}:{version}"
+
+    def get(self, key: str) -> Optional[Any]:
+        """The cached result (a fresh copy), memory first, then SQLite; None on a miss."""
+        if not self.enabled:
+            return None
+        now = time.time()
+        with self._lock:
+            entry = self._lru.get(key)
+            if entry is not None and now - entry[0] < self.ttl_s:
+                self._lru.move_to_end(key)
+                self.hits += 1
+                return json.loads(entry[1])
+            self._lru.pop(key, None)
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT value, created_at FROM ocr_result WHERE key = ? AND created_at >= ?",
+                    (key, now - self.ttl_s),
+                ).fetchone()
+                if row is not None:
+                    self._db.execute("UPDATE ocr_result SET used_at = ? WHERE key = ?", (now, key))
+                    self._db.commit()
+                    self._remember(key, (row[1], row[0]))
+                    self.hits += 1
+                    return json.loads(row[0])
+            self.misses += 1
+            return None
+
+    def put(self, key: str, value: Any) -> None:
+        if not self.enabled:
+            return
+        now = time.time()
+        payload = json.dumps(value, separators=(",", ":"))
+        with self._lock:
+            self._remember(key, (now, payload))
+            if self._db is not None:
+                size = len(payload.encode())
+                previous = self._db.execute("SELECT size FROM ocr_result WHERE key = ?", (key,)).fetchone()
+                self._db.execute("INSERT OR REPLACE INTO ocr_result VALUES (?, ?, ?, ?, ?)",
+                                 (key, payload, size, now, now))
+                self._disk_bytes += size - (previous[0] if previous else 0)
+                self._evict_disk()
+                self._db.commit()
+
+    def _remember(self, key: str, entry: tuple[float, str]) -> None:
+        # Results are held as JSON text: every get returns an independent copy
+        self._lru[key] = entry
+        self._lru.move_to_end(key)
+        while len(self._lru) > self.capacity:
+            self._lru.popitem(last=False)
+
+    def _evict_disk(self) -> None:
+        """Deletes least recently used rows until the store fits max_bytes."""
+        while self._disk_bytes > self.max_bytes:
+            rows = self._db.execute(
+                "SELECT key, size FROM ocr_result ORDER BY used_at LIMIT 64").fetchall()
+            if not rows:
+                self._disk_bytes = 0
+                return
+            for key, size in rows:
+                self._db.execute("DELETE FROM ocr_result WHERE key = ?", (key,))
+                self._disk_bytes -= size
+                if self._disk_bytes <= self.max_bytes:
+                    break
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._lru),
+            "capacity": self.capacity,
+            "persistent": self._db is not None,
+            "disk_bytes": self._disk_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+        }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._lru.clear()
+            self.hits = self.misses = 0
+            if self._db is not None:
+                self._db.execute("DELETE FROM ocr_result")
+                self._db.commit()
+                self._disk_bytes = 0
@@ -0,0 +1,104 @@
+"""
+Page splitting for batch OCR.
+
+PaddleOCR reads one image at a time, so a multi-page packet is first split
+into page images that OCR workers can process in parallel. PDFs are
+rendered with pypdfium2 (already pulled in by Docling), and multi-frame
+TIFFs are split with Pillow. Any other image is treated as a single page.
+"""
+
+import os
+
+PDF_POINTS_PER_INCH = 72
+# Types that may hold more than one page; anything else is one page as-is
+MULTIPAGE_TYPES = frozenset({"application/pdf", "image/tiff"})
+
+
+def split_pages(path: str, mime_type: str, out_dir: str, dpi: int = 200, max_pages: int = 200) -> list[str]:
+    """
+    Splits a document into page image files under out_dir and returns their
+    paths in page order. Raises ValueError if the document has more than
+    max_pages pages, and RuntimeError if the library needed to split it is
+    not installed.
+    """
+    if mime_type == "application/pdf":
+        return _split_pdf(path, out_dir, dpi, max_pages)
+    if mime_type == "image/tiff":
+        return _split_tiff(path, out_dir, max_pages)
+    return [path]
+
+
+def count_pages(path: str, mime_type: str) -> int:
+    """
+    Number of pages split_pages would return for the document, read without
+    rendering any of them. Raises like split_pages.
+    """
+    if mime_type == "application/pdf":
+        try:
+            import pypdfium2
+        except ImportError:
+            raise RuntimeError("pypdfium2 not installed; cannot split PDF pages")
+        pdf = pypdfium2.PdfDocument(path)
+        try:
+            return len(pdf)
+        finally:
+            pdf.close()
+    if mime_type == "image/tiff":
+        try:
+            from PIL import Image
+        except ImportError:
+            raise RuntimeError("Pillow not installed; cannot split TIFF pages")
+        with Image.open(path) as tiff:
+            return getattr(tiff, "n_frames", 1)
+    return 1
+
+
+def _page_path(path: str, out_dir: str, page: int) -> str:
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return os.path.join(out_dir, f"{stem}.p{page:04d}.png")
+
+
+def _check_count(count: int, max_pages: int) -> None:
+    if count > max_pages:
+        raise ValueError(f"Document has {count} pages; the limit is {max_pages}")
+
+
+def _split_pdf(path: str, out_dir: str, dpi: int, max_pages: int) -> list[str]:
+    try:
+        import pypdfium2
+    except ImportError:
+        raise RuntimeError("pypdfium2 not installed; cannot split PDF pages")
+
+    pdf = pypdfium2.PdfDocument(path)
+    try:
+        _check_count(len(pdf), max_pages)
+        pages = []
+        for i in range(len(pdf)):
+            page = pdf[i]
+            image = page.render(scale=dpi / PDF_POINTS_PER_INCH).to_pil()
+            out = _page_path(path, out_dir, i + 1)
+            image.save(out, "PNG")
+            page.close()
+            pages.append(out)
+        return pages
+    finally:
+        pdf.close()
+
+
+def _split_tiff(path: str, out_dir: str, max_pages: int) -> list[str]:
+    try:
+        from PIL import Image, ImageSequence
+    except ImportError:
+        raise RuntimeError("Pillow not installed; cannot split TIFF pages")
+
+    with Image.open(path) as tiff:
+        frames = getattr(tiff, "n_frames", 1)
+        _check_count(frames, max_pages)
+        if frames == 1:
+            return [path]
+        pages = []
+        for i, frame in enumerate(ImageSequence.Iterator(tiff)):
+            out = _page_path(path, out_dir, i + 1)
+            frame.convert("RGB").save(out, "PNG")
+            pages.append(out)
+        return pages
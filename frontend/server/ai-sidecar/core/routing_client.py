@@ -0,0 +1,400 @@
+"""
+Routing client shared by the /route endpoints.
+
+OSRMBackend talks to an OSRM server through one pooled httpx.AsyncClient
+(keep-alive, bounded connections) with a cap on in-flight requests, retries
+with full-jitter backoff on transport errors / 429 / 5xx, and a circuit
+breaker that fails fast while the server is down. HaversineBackend is the
+in-process stand-in: great-circle distance at an average truck speed, shaped
+like OSRM's responses. RoutingClient tries OSRM first and falls back to the
+stand-in where the caller accepts an estimate.
+
+Environment:
+    OSRM_URL                    OSRM base URL (default http://localhost:5000, a self-hosted osrm-routed)
+    ROUTING_BACKEND             "osrm" (default) or "haversine" to skip OSRM entirely
+    ROUTING_MAX_CONNECTIONS     pooled connections to OSRM (default 32)
+    ROUTING_MAX_CONCURRENCY     in-flight OSRM requests (default 16)
+    ROUTING_RETRIES             retries after the first attempt (default 2)
+    ROUTING_TIMEOUT_S           per-attempt timeout in seconds (default 10)
+    ROUTING_BREAKER_THRESHOLD   consecutive failed requests that open the breaker (default 5)
+    ROUTING_BREAKER_RESET_S     seconds the breaker stays open before a probe (default 30)
+    ROUTING_FALLBACK_SPEED_MPH  average speed of the haversine stand-in (default 50)
+    ROUTING_TABLE_MAX_LOCATIONS coordinates per OSRM table request (default 100, osrm-routed --max-table-size)
+    ROUTING_TILE_CONCURRENCY    table tiles of one matrix fetched at once (default 8)
+"""
+
+import asyncio
+import logging
+import os
+import random
+import time
+from typing import Callable, Optional, Sequence
+
+import httpx
+import numpy as np
+
+logger = logging.getLogger("ai-sidecar.routing")
+
+EARTH_RADIUS_M = 6371000.0
+METERS_PER_MILE = 1609.344
+
+Coord = tuple[float, float]  # (lat, lng)
+
+
+class RoutingUnavailable(Exception):
+    """OSRM could not answer: transport error or 5xx/429 after retries, open breaker, or saturation."""
+
+
+# ---------------------------------------------------------------------------
+# Geometry helpers
+# ---------------------------------------------------------------------------
+
+def haversine_matrix_m(src: Sequence[Coord], dst: Sequence[Coord]) -> np.ndarray:
+    """(len(src), len(dst)) great-circle distances in meters."""
+    a = np.radians(np.asarray(src, dtype=np.float64).reshape(-1, 2))
+    b = np.radians(np.asarray(dst, dtype=np.float64).reshape(-1, 2))
+    dlat = b[None, :, 0] - a[:, None, 0]
+    dlng = b[None, :, 1] - a[:, None, 1]
+    h = np.sin(dlat / 2) ** 2 + np.cos(a[:, None, 0]) * np.cos(b[None, :, 0]) * np.sin(dlng / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.minimum(h, 1.0)))
+
+
+def encode_polyline(coords: Sequence[Coord], precision: int = 5) -> str:
+    """Google/OSRM encoded polyline of (lat, lng) pairs."""
+    factor = 10 ** precision
+    out = []
+    prev_lat = prev_lng = 0
+    for lat, lng in coords:
+        ilat, ilng = round(lat * factor), round(lng * factor)
+        for delta in (ilat - prev_lat, ilng - prev_lng):
+            value = ~(delta << 1) if delta < 0 else delta << 1
+            while value >= 0x20:
+                out.append(chr((0x20 | (value & 0x1F)) + 63))
+                value >>= 5
+            out.append(chr(value + 63))
+        prev_lat, prev_lng = ilat, ilng
+    return "".join(out)
+
+
+def _coord_path(coords: Sequence[Coord]) -> str:
+    return ";".join(f"{lng:.6f},{lat:.6f}" for lat, lng in coords)
+
+
+# ---------------------------------------------------------------------------
+# Circuit breaker
+# ---------------------------------------------------------------------------
+
+class CircuitBreaker:
+    """
+    closed -> open after `threshold` consecutive failures; open -> half_open
+    once `reset_after` seconds pass, letting one probe through; the probe's
+    outcome closes or re-opens it.
+    """
+
+    def __init__(self, threshold: int = 5, reset_after: float = 30.0,
+                 clock: Callable[[], float] = time.monotonic):
+        self.threshold = threshold
+        self.reset_after = reset_after
+        self._clock = clock
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._probe_at: Optional[float] = None
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if self._clock() - self._opened_at < self.reset_after:
+            return "open"
+        return "half_open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        # One probe at a time; a probe that never reported back expires after reset_after.
+        now = self._clock()
+        if state == "half_open" and (self._probe_at is None or now - self._probe_at >= self.reset_after):
+            self._probe_at = now
+            return True
+        return False
+
+    def success(self) -> None:
+        self._failures = 0
+        self._opened_at = None
+        self._probe_at = None
+
+    def failure(self) -> None:
+        self._failures += 1
+        if self._probe_at is not None or self._failures >= self.threshold:
+            if self._opened_at is None:
+                logger.warning(f"OSRM circuit opened after {self._failures} consecutive failures")
+            self._opened_at = self._clock()
+            self._probe_at = None
+
+
+# ---------------------------------------------------------------------------
+# Backends
+# ---------------------------------------------------------------------------
+
+class OSRMBackend:
+    """Async OSRM HTTP backend with pooling, a concurrency cap, retries and a circuit breaker."""
+
+    name = "osrm"
+
+    def __init__(self, base_url: str, max_connections: int = 32, max_concurrency: int = 16,
+                 retries: int = 2, timeout: float = 10.0, backoff_base: float = 0.2,
+                 backoff_cap: float = 2.0, breaker: Optional[CircuitBreaker] = None,
+                 transport: Optional[httpx.AsyncBaseTransport] = None):
+        self.base_url = base_url.rstrip("/")
+        self.max_connections = max_connections
+        self.max_concurrency = max_concurrency
+        self.retries = retries
+        self.timeout = timeout
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.breaker = breaker or CircuitBreaker()
+        self._transport = transport
+        self._client: Optional[httpx.AsyncClient] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _session(self) -> tuple[httpx.AsyncClient, asyncio.Semaphore]:
+        # The pool and semaphore belong to one event loop; rebuild if called from another.
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._loop is not loop:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                transport=self._transport,
+                timeout=httpx.Timeout(self.timeout, connect=min(self.timeout, 3.0)),
+                limits=httpx.Limits(max_connections=self.max_connections,
+                                    max_keepalive_connections=self.max_connections),
+            )
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self._loop = loop
+        return self._client, self._semaphore
+
+    async def _get(self, path: str, params: dict) -> dict:
+        client, semaphore = self._session()
+        try:
+            await asyncio.wait_for(semaphore.acquire(), timeout=self.timeout)
+        except asyncio.TimeoutError:
+            raise RoutingUnavailable(f"OSRM concurrency limit ({self.max_concurrency}) saturated")
+        try:
+            if not self.breaker.allow():
+                raise RoutingUnavailable("OSRM circuit open")
+            last_error: object = None
+            for attempt in range(self.retries + 1):
+                if attempt:
+                    await asyncio.sleep(random.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** attempt)))
+                try:
+                    resp = await client.get(path, params=params)
+                except httpx.TransportError as e:
+                    last_error = e
+                    continue
+                if resp.status_code == 429 or resp.status_code >= 500:
+                    last_error = f"HTTP {resp.status_code}"
+                    continue
+                # OSRM reports NoRoute / InvalidQuery as 4xx JSON bodies; those are answers, not outages.
+                self.breaker.success()
+                try:
+                    return resp.json()
+                except ValueError:
+                    raise RoutingUnavailable(f"OSRM returned a non-JSON response (HTTP {resp.status_code})")
+            self.breaker.failure()
+            raise RoutingUnavailable(f"{last_error} after {self.retries + 1} attempts")
+        finally:
+            semaphore.release()
+
+    async def route(self, coords: Sequence[Coord], profile: str = "driving",
+                    alternatives: bool = False, steps: bool = False) -> dict:
+        return await self._get(f"/route/v1/{profile}/{_coord_path(coords)}", {
+            "overview": "full",
+            "geometries": "polyline",
+            "alternatives": str(alternatives).lower(),
+            "steps": str(steps).lower(),
+        })
+
+    async def table(self, coords: Sequence[Coord], profile: str = "driving",
+                    sources: Optional[Sequence[int]] = None,
+                    destinations: Optional[Sequence[int]] = None) -> dict:
+        params = {"annotations": "distance,duration"}
+        if sources is not None:
+            params["sources"] = ";".join(map(str, sources))
+        if destinations is not None:
+            params["destinations"] = ";".join(map(str, destinations))
+        return await self._get(f"/table/v1/{profile}/{_coord_path(coords)}", params)
+
+    async def close(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+class HaversineBackend:
+    """In-process stand-in for OSRM: straight-line distance at a fixed average speed."""
+
+    name = "haversine"
+
+    def __init__(self, speed_mph: float = 50.0):
+        self.speed_mps = speed_mph * METERS_PER_MILE / 3600.0
+
+    async def route(self, coords: Sequence[Coord], profile: str = "driving",
+                    alternatives: bool = False, steps: bool = False) -> dict:
+        legs = [float(haversine_matrix_m([a], [b])[0, 0]) for a, b in zip(coords, coords[1:])]
+        distance = sum(legs)
+        return {
+            "code": "Ok",
+            "routes": [{
+                "distance": distance,
+                "duration": distance / self.speed_mps,
+                "geometry": encode_polyline(coords),
+                "legs": [{"distance": d, "duration": d / self.speed_mps, "steps": []} for d in legs],
+            }],
+        }
+
+    def matrix(self, src: Sequence[Coord], dst: Sequence[Coord]) -> tuple[np.ndarray, np.ndarray]:
+        """Vectorised (distance_m, duration_s) arrays for src x dst."""
+        distances = haversine_matrix_m(src, dst)
+        return distances, distances / self.speed_mps
+
+    async def table(self, coords: Sequence[Coord], profile: str = "driving",
+                    sources: Optional[Sequence[int]] = None,
+                    destinations: Optional[Sequence[int]] = None) -> dict:
+        src = [coords[i] for i in sources] if sources is not None else coords
+        dst = [coords[i] for i in destinations] if destinations is not None else coords
+        distances, durations = self.matrix(src, dst)
+        return {"code": "Ok", "distances": distances.tolist(), "durations": durations.tolist()}
+
+    async def close(self) -> None:
+        return None
+
+
+# ---------------------------------------------------------------------------
+# Client
+# ---------------------------------------------------------------------------
+
+class RoutingClient:
+    """
+    OSRM with the haversine stand-in behind it. Responses carry "source" naming
+    the backend that answered. Directions do not fall back by default (a
+    straight-line geometry is not a route); tables do.
+    """
+
+    def __init__(self, primary: Optional[OSRMBackend], fallback: Optional[HaversineBackend] = None,
+                 max_table_size: int = 100, tile_concurrency: int = 8):
+        self.primary = primary
+        self.fallback = fallback or HaversineBackend()
+        self.max_table_size = max(2, max_table_size)
+        self.tile_concurrency = tile_concurrency
+
+    @classmethod
+    def from_env(cls) -> "RoutingClient":
+        fallback = HaversineBackend(float(os.getenv("ROUTING_FALLBACK_SPEED_MPH", "50")))
+        tiling = {
+            "max_table_size": int(os.getenv("ROUTING_TABLE_MAX_LOCATIONS", "100")),
+            "tile_concurrency": int(os.getenv("ROUTING_TILE_CONCURRENCY", "8")),
+        }
+        if os.getenv("ROUTING_BACKEND", "osrm").lower() == "haversine":
+            return cls(None, fallback, **tiling)
+        primary = OSRMBackend(
+            os.getenv("OSRM_URL", "http://localhost:5000"),
+            max_connections=int(os.getenv("ROUTING_MAX_CONNECTIONS", "32")),
+            max_concurrency=int(os.getenv("ROUTING_MAX_CONCURRENCY", "16")),
+            retries=int(os.getenv("ROUTING_RETRIES", "2")),
+            timeout=float(os.getenv("ROUTING_TIMEOUT_S", "10")),
+            breaker=CircuitBreaker(int(os.getenv("ROUTING_BREAKER_THRESHOLD", "5")),
+                                   float(os.getenv("ROUTING_BREAKER_RESET_S", "30"))),
+        )
+        return cls(primary, fallback, **tiling)
+
+    async def _call(self, op: str, allow_fallback: bool, *args, **kwargs) -> dict:
+        if self.primary is not None:
+            try:
+                data = await getattr(self.primary, op)(*args, **kwargs)
+                data["source"] = self.primary.name
+                return data
+            except RoutingUnavailable as e:
+                if not allow_fallback:
+                    raise
+                logger.warning(f"OSRM {op} unavailable, using {self.fallback.name} estimate: {e}")
+        data = await getattr(self.fallback, op)(*args, **kwargs)
+        data["source"] = self.fallback.name
+        return data
+
+    async def route(self, coords: Sequence[Coord], profile: str = "driving", alternatives: bool = False,
+                    steps: bool = False, allow_fallback: bool = False) -> dict:
+        return await self._call("route", allow_fallback, coords, profile, alternatives, steps)
+
+    async def table(self, coords: Sequence[Coord], profile: str = "driving",
+                    sources: Optional[Sequence[int]] = None, destinations: Optional[Sequence[int]] = None,
+                    allow_fallback: bool = True) -> dict:
+        return await self._call("table", allow_fallback, coords, profile, sources, destinations)
+
+    def _tile_shape(self, n_rows: int, n_cols: int) -> tuple[int, int]:
+        """Rows x columns per tile so that sources + destinations fit one table request."""
+        cap = self.max_table_size
+        if n_rows + n_cols <= cap:
+            return n_rows, n_cols
+        if n_rows <= cap // 2:
+            return n_rows, cap - n_rows
+        if n_cols <= cap // 2:
+            return cap - n_cols, n_cols
+        return cap // 2, cap - cap // 2
+
+    async def matrix(self, coords: Sequence[Coord], profile: str = "driving",
+                     sources: Optional[Sequence[int]] = None, destinations: Optional[Sequence[int]] = None,
+                     allow_fallback: bool = True) -> dict:
+        """
+        Distance (m) / duration (s) NumPy arrays for sources x destinations of any
+        size. The request is split into tiles that each send only their own
+        coordinates (at most max_table_size), fetched concurrently up to
+        tile_concurrency and stitched together; unreachable pairs are NaN.
+        "source" is "osrm", "haversine" or "mixed" when some tiles fell back.
+        """
+        rows = list(range(len(coords))) if sources is None else list(sources)
+        cols = list(range(len(coords))) if destinations is None else list(destinations)
+        if self.primary is None:
+            distances, durations = self.fallback.matrix([coords[i] for i in rows], [coords[j] for j in cols])
+            return {"code": "Ok", "distances": distances, "durations": durations, "source": self.fallback.name}
+
+        distances = np.full((len(rows), len(cols)), np.nan)
+        durations = np.full((len(rows), len(cols)), np.nan)
+        row_step, col_step = self._tile_shape(len(rows), len(cols))
+        budget = asyncio.Semaphore(self.tile_concurrency)
+
+        async def fetch(r0: int, c0: int) -> dict:
+            tile_rows, tile_cols = rows[r0:r0 + row_step], cols[c0:c0 + col_step]
+            tile_coords = [coords[i] for i in tile_rows] + [coords[j] for j in tile_cols]
+            async with budget:
+                data = await self.table(tile_coords, profile, range(len(tile_rows)),
+                                        range(len(tile_rows), len(tile_coords)), allow_fallback)
+            if data.get("code") == "Ok":
+                block = (slice(r0, r0 + len(tile_rows)), slice(c0, c0 + len(tile_cols)))
+                distances[block] = np.array(data["distances"], dtype=np.float64)  # None -> NaN
+                durations[block] = np.array(data["durations"], dtype=np.float64)
+            return data
+
+        results = await asyncio.gather(*(
+            fetch(r0, c0) for r0 in range(0, len(rows), row_step) for c0 in range(0, len(cols), col_step)
+        ))
+        failed = next((d for d in results if d.get("code") != "Ok"), None)
+        if failed is not None:
+            return failed
+        sources_used = {d.get("source") for d in results}
+        return {
+            "code": "Ok",
+            "distances": distances,
+            "durations": durations,
+            "source": sources_used.pop() if len(sources_used) == 1 else "mixed",
+            "tiles": len(results),
+        }
+
+    def status(self) -> dict:
+        if self.primary is None:
+            return {"backend": self.fallback.name}
+        return {"backend": self.primary.name, "url": self.primary.base_url, "circuit": self.primary.breaker.state}
+
+    async def close(self) -> None:
+        if self.primary is not None:
+            await self.primary.close()
@@ -0,0 +1,262 @@
+"""
+Document uploads for the OCR endpoints.
+
+The JSON endpoints carry documents as base64 (a third larger on the wire,
+decoded into a second in-memory copy), and used to write them to a temp file
+before any model read them. The upload endpoints instead stream the request
+body (raw bytes, or the first file part of a multipart form) into a
+SpooledBody. It hashes as it receives, keeps the bytes in memory up to a
+spill threshold and moves larger documents to a temp file, and rejects
+anything over the size limit with 413 without reading the rest.
+
+Either way the result is an Upload. Engines get its bytes directly when it
+is in memory and a path when it is on disk; a temp file is only written for
+consumers that need a path (page splitting, PaddleOCR on PDFs).
+
+Environment:
+    OCR_UPLOAD_MAX_MB      largest accepted document (default 50)
+    OCR_UPLOAD_SPILL_MB    uploads larger than this are spooled to a temp file (default 8)
+"""
+
+import hashlib
+import os
+import tempfile
+from typing import AsyncIterator, Optional, Union
+
+from fastapi import HTTPException, Request
+
+EXTENSIONS = {
+    "application/pdf": ".pdf",
+    "image/png": ".png",
+    "image/jpeg": ".jpg",
+    "image/jpg": ".jpg",
+    "image/tiff": ".tiff",
+}
+# Request bytes allowed on top of the document for multipart framing and other fields
+_MULTIPART_OVERHEAD = 64 * 1024
+
+
+class UploadTooLarge(HTTPException):
+    def __init__(self, max_bytes: int):
+        super().__init__(status_code=413, detail=f"Document exceeds {max_bytes // (1024 * 1024)} MB")
+
+
+class UploadLimits:
+    def __init__(self, max_bytes: int = 50 * 1024 * 1024, spill_bytes: int = 8 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.spill_bytes = spill_bytes
+
+    @classmethod
+    def from_env(cls) -> "UploadLimits":
+        mb = 1024 * 1024
+        return cls(
+            max_bytes=int(float(os.getenv("OCR_UPLOAD_MAX_MB", "50")) * mb),
+            spill_bytes=int(float(os.getenv("OCR_UPLOAD_SPILL_MB", "8")) * mb),
+        )
+
+
+def write_tempfile(data: bytes, mime_type: str, dir: Optional[str] = None) -> str:
+    """Write bytes to a temp file (in dir, if given) named for mime_type, return path."""
+    tmp = tempfile.NamedTemporaryFile(suffix=EXTENSIONS.get(mime_type, ".bin"), delete=False, dir=dir)
+    tmp.write(data)
+    tmp.close()
+    return tmp.name
+
+
+class SpooledBody:
+    """Bytes received in chunks: hashed on arrival, held in memory up to spill_bytes, then in a temp file."""
+
+    def __init__(self, limits: UploadLimits, suffix: str = "", dir: Optional[str] = None):
+        self.limits = limits
+        self.suffix = suffix
+        self.dir = dir
+        self.size = 0
+        self.path: Optional[str] = None
+        self._chunks: list[bytes] = []
+        self._file = None
+        self._sha = hashlib.sha256()
+
+    def write(self, chunk: bytes) -> None:
+        self.size += len(chunk)
+        if self.size > self.limits.max_bytes:
+            self.discard()
+            raise UploadTooLarge(self.limits.max_bytes)
+        self._sha.update(chunk)
+        if self._file is None and self.size > self.limits.spill_bytes:
+            self._file = tempfile.NamedTemporaryFile(suffix=self.suffix, delete=False, dir=self.dir)
+            self.path = self._file.name
+            self._file.writelines(self._chunks)
+            self._chunks = []
+        if self._file is not None:
+            self._file.write(chunk)
+        else:
+            self._chunks.append(bytes(chunk))
+
+    def finish(self) -> tuple[Optional[bytes], Optional[str], str]:
+        """(bytes, None) if held in memory or (None, path) if spilled, plus the SHA-256."""
+        if self._file is not None:
+            self._file.close()
+            return None, self.path, self._sha.hexdigest()
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data, None, self._sha.hexdigest()
+
+    def discard(self) -> None:
+        self._chunks = []
+        if self._file is not None:
+            self._file.close()
+            os.unlink(self.path)
+            self._file = None
+
+
+class Upload:
+    """A document's bytes (in memory or in a file) and their SHA-256."""
+
+    def __init__(self, mime_type: str, sha256: str, data: Optional[bytes] = None, path: Optional[str] = None,
+                 owns_path: bool = False, dir: Optional[str] = None):
+        self.mime_type = mime_type
+        self.sha256 = sha256
+        self.data = data
+        self.path = path
+        self.dir = dir
+        self._owns_path = owns_path
+
+    @classmethod
+    def from_bytes(cls, data: bytes, mime_type: str, limits: Optional[UploadLimits] = None,
+                   dir: Optional[str] = None) -> "Upload":
+        if limits is not None and len(data) > limits.max_bytes:
+            raise UploadTooLarge(limits.max_bytes)
+        return cls(mime_type, hashlib.sha256(data).hexdigest(), data=data, dir=dir)
+
+    @classmethod
+    def from_file(cls, path: str, mime_type: str) -> "Upload":
+        sha = hashlib.sha256()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                sha.update(chunk)
+        return cls(mime_type, sha.hexdigest(), path=path)
+
+    @classmethod
+    def from_body(cls, body: SpooledBody, mime_type: str) -> "Upload":
+        data, path, sha256 = body.finish()
+        return cls(mime_type, sha256, data=data, path=path, owns_path=path is not None, dir=body.dir)
+
+    @property
+    def size(self) -> int:
+        return len(self.data) if self.data is not None else os.path.getsize(self.path)
+
+    def source(self) -> Union[bytes, str]:
+        """What an engine should read: the path if the document is on disk, else its bytes."""
+        return self.path if self.path is not None else self.data
+
+    def file(self) -> str:
+        """A path to the document, written to a temp file on first use if it is only in memory."""
+        if self.path is None:
+            self.path = write_tempfile(self.data, self.mime_type, self.dir)
+            self._owns_path = True
+        return self.path
+
+    def cleanup(self) -> None:
+        if self._owns_path and self.path and os.path.exists(self.path):
+            os.unlink(self.path)
+
+
+async def _limited(stream: AsyncIterator[bytes], max_bytes: int) -> AsyncIterator[bytes]:
+    received = 0
+    async for chunk in stream:
+        received += len(chunk)
+        if received > max_bytes:
+            raise UploadTooLarge(max_bytes - _MULTIPART_OVERHEAD)
+        yield chunk
+
+
+async def receive_upload(request: Request, limits: UploadLimits, mime_type: Optional[str] = None,
+                         dir: Optional[str] = None) -> Upload:
+    """
+    Streams a document upload into an Upload. The body is either the raw file
+    (its type from mime_type or the Content-Type header) or multipart/form-data,
+    whose part named "file" (else the first part with a filename) is the
+    document. Raises 400 for an empty or missing file and 413 if it is too large.
+    """
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    if content_type == "multipart/form-data":
+        body, part_type = await _receive_multipart(request, limits, dir)
+        mime_type = mime_type or part_type
+    else:
+        mime_type = mime_type or content_type or "application/octet-stream"
+        declared = request.headers.get("content-length")
+        if declared and declared.isdigit() and int(declared) > limits.max_bytes:
+            raise UploadTooLarge(limits.max_bytes)
+        body = SpooledBody(limits, EXTENSIONS.get(mime_type, ".bin"), dir)
+        async for chunk in request.stream():
+            body.write(chunk)
+    if body.size == 0:
+        body.discard()
+        raise HTTPException(400, "Empty upload")
+    return Upload.from_body(body, mime_type)
+
+
+async def _receive_multipart(request: Request, limits: UploadLimits,
+                             dir: Optional[str]) -> tuple[SpooledBody, str]:
+    from python_multipart.exceptions import MultipartParseError
+    from python_multipart.multipart import MultipartParser, parse_options_header
+
+    _, params = parse_options_header(request.headers["content-type"])
+    boundary = params.get(b"boundary")
+    if not boundary:
+        raise HTTPException(400, "Missing multipart boundary")
+
+    state = {"field": b"", "value": b"", "headers": {}, "target": None, "done": False, "type": ""}
+    body = SpooledBody(limits, dir=dir)
+
+    def on_part_begin():
+        state["headers"] = {}
+
+    def on_header_field(data, start, end):
+        state["field"] += data[start:end]
+
+    def on_header_value(data, start, end):
+        state["value"] += data[start:end]
+
+    def on_header_end():
+        state["headers"][state["field"].lower()] = state["value"]
+        state["field"] = state["value"] = b""
+
+    def on_headers_finished():
+        _, disposition = parse_options_header(state["headers"].get(b"content-disposition", b""))
+        is_file = disposition.get(b"name") == b"file" or b"filename" in disposition
+        state["target"] = body if is_file and not state["done"] else None
+        if state["target"] is not None:
+            part_type = state["headers"].get(b"content-type", b"application/octet-stream").decode("latin-1")
+            state["type"] = part_type.split(";")[0].strip().lower()
+            body.suffix = EXTENSIONS.get(state["type"], ".bin")
+
+    def on_part_data(data, start, end):
+        if state["target"] is not None:
+            state["target"].write(data[start:end])
+
+    def on_part_end():
+        if state["target"] is not None:
+            state["done"] = True
+        state["target"] = None
+
+    parser = MultipartParser(boundary, {
+        "on_part_begin": on_part_begin, "on_header_field": on_header_field,
+        "on_header_value": on_header_value, "on_header_end": on_header_end,
+        "on_headers_finished": on_headers_finished, "on_part_data": on_part_data,
+        "on_part_end": on_part_end,
+    })
+    try:
+        async for chunk in _limited(request.stream(), limits.max_bytes + _MULTIPART_OVERHEAD):
+            parser.write(chunk)
+        parser.finalize()
+    except HTTPException:
+        body.discard()
+        raise
+    except MultipartParseError as e:
+        body.discard()
+        raise HTTPException(400, f"Malformed multipart upload: {e}")
+    if not state["done"]:
+        body.discard()
+        raise HTTPException(400, "No file part in the upload")
+    return body, state["type"]
@@ -0,0 +1,275 @@
+"""
+OR-Tools vehicle routing model for /route/optimize.
+
+Distance and time costs are converted once, with NumPy, into integer node x
+node matrices (meters, minutes) and registered as matrix-backed transit
+callbacks (RoutingModel.RegisterTransitMatrix / RegisterUnaryTransitVector),
+so the solver evaluates arcs in C++ without calling back into Python. OR-Tools
+builds without those methods get a Python callback over a flat list indexed
+by a precomputed index -> node table, which still avoids per-arc
+IndexToNode, nested list indexing and float conversion.
+
+The model is a dispatch plan: vehicles start and end at their own depots,
+stops carry time windows and service times on the "Time" dimension, long
+duty periods get HOS rest breaks, and stops that cannot fit are dropped
+(reported as unassigned) rather than failing the whole plan. A previous plan
+can seed the search (ReadAssignmentFromRoutes), and PlanCache keeps solved
+plans by a hash of the problem.
+
+Environment:
+    VRP_PLAN_CACHE_SIZE     solved plans kept in memory (default 256; 0 disables the cache)
+    VRP_PLAN_CACHE_TTL_S    seconds a cached plan is served (default 900)
+"""
+
+import copy
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional, Sequence
+
+import numpy as np
+
+logger = logging.getLogger("ai-sidecar.vrp")
+
+# Cost of an arc nobody could route (NaN in the matrix); large, but far below int64 overflow
+UNREACHABLE = 10 ** 9
+# Penalty (meters) for leaving a stop unassigned: only infeasible stops are ever dropped
+DROP_PENALTY = 10 ** 8
+
+
+def integer_matrix(values: np.ndarray, divisor: float = 1.0) -> np.ndarray:
+    """Rounded int64 copy of values / divisor; NaN (unreachable) becomes UNREACHABLE."""
+    scaled = np.asarray(values, dtype=np.float64) / divisor
+    return np.where(np.isnan(scaled), UNREACHABLE, np.rint(scaled)).astype(np.int64)
+
+
+def register_matrix(routing, manager, matrix: np.ndarray) -> int:
+    """Registers an n x n integer node matrix as a transit callback and returns its index."""
+    if hasattr(routing, "RegisterTransitMatrix"):
+        return routing.RegisterTransitMatrix(matrix.tolist())
+    return register_flat_callback(routing, manager, matrix)
+
+
+def register_flat_callback(routing, manager, matrix: np.ndarray) -> int:
+    """Python transit callback over a flat list; the fallback when RegisterTransitMatrix is missing."""
+    n = matrix.shape[0]
+    flat = matrix.ravel().tolist()
+    offset = [manager.IndexToNode(i) * n for i in range(routing.Size() + routing.vehicles())]
+    node = [o // n for o in offset]
+    return routing.RegisterTransitCallback(lambda i, j: flat[offset[i] + node[j]])
+
+
+def register_vector(routing, manager, values: Sequence[int]) -> int:
+    """Registers a per-node integer vector (e.g. demands) as a unary transit callback."""
+    if hasattr(routing, "RegisterUnaryTransitVector"):
+        return routing.RegisterUnaryTransitVector([int(v) for v in values])
+    by_index = [int(values[manager.IndexToNode(i)]) for i in range(routing.Size() + routing.vehicles())]
+    return routing.RegisterUnaryTransitCallback(lambda i: by_index[i])
+
+
+def solve_vrp(distances_m: np.ndarray, durations_s: np.ndarray, num_vehicles: int = 1,
+              max_route_minutes: int = 660, demands: Optional[Sequence[int]] = None,
+              vehicle_capacity: int = 1000, time_limit_s: float = 5.0,
+              starts: Optional[Sequence[int]] = None, ends: Optional[Sequence[int]] = None,
+              time_windows: Optional[dict[int, tuple[int, int]]] = None,
+              service_minutes: Optional[Sequence[int]] = None,
+              break_after_minutes: Optional[int] = None, break_minutes: int = 30,
+              initial_routes: Optional[Sequence[Sequence[int]]] = None,
+              optional_nodes: Sequence[int] = ()) -> Optional[dict]:
+    """
+    Solves a VRP minimising distance. Vehicle v leaves node starts[v] and
+    returns to ends[v] (default node 0 for all); every other depot-free node
+    is a stop. time_windows maps node -> (earliest, latest) arrival minute,
+    service_minutes[node] is time spent at the node, and each route's duty
+    span is capped at max_route_minutes. With break_after_minutes set, a
+    break of break_minutes is required at least every break_after_minutes.
+    initial_routes (node lists per vehicle, stops only) seed the search.
+    optional_nodes may be skipped at no cost and are never reported dropped.
+
+    Returns {"routes": [{"vehicle", "nodes", "arrivals", "start_minute",
+    "end_minute", "breaks": [(start, duration)]}], "dropped", "objective",
+    "status", "warm_started"}, or None if no solution was found in time.
+    """
+    from ortools.constraint_solver import pywrapcp, routing_enums_pb2
+
+    n = len(distances_m)
+    starts = list(starts) if starts is not None else [0] * num_vehicles
+    ends = list(ends) if ends is not None else [0] * num_vehicles
+    depots = set(starts) | set(ends)
+    service = np.zeros(n, dtype=np.int64)
+    if service_minutes is not None:
+        service[:len(service_minutes)] = service_minutes
+    time_windows = time_windows or {}
+
+    dist = integer_matrix(distances_m)  # meters
+    # Time to leave i for j: service at i, then driving
+    minutes = integer_matrix(durations_s, 60.0) + service[:, None]
+    horizon = max([max_route_minutes] + [late for _, late in time_windows.values()]) + max_route_minutes
+
+    manager = pywrapcp.RoutingIndexManager(n, num_vehicles, starts, ends)
+    routing = pywrapcp.RoutingModel(manager)
+
+    routing.SetArcCostEvaluatorOfAllVehicles(register_matrix(routing, manager, dist))
+
+    # Time dimension: waiting allowed up to the horizon, duty span capped (HOS)
+    routing.AddDimension(register_matrix(routing, manager, minutes), horizon, horizon, False, "Time")
+    time_dim = routing.GetDimensionOrDie("Time")
+    # One meter per minute of duty: keeps schedules tight without trading distance for time
+    time_dim.SetSpanCostCoefficientForAllVehicles(1)
+    for node, (early, late) in time_windows.items():
+        if node not in depots:
+            time_dim.CumulVar(manager.NodeToIndex(node)).SetRange(int(early), int(late))
+    for v in range(num_vehicles):
+        time_dim.SetSpanUpperBoundForVehicle(max_route_minutes, v)
+        routing.AddVariableMaximizedByFinalizer(time_dim.CumulVar(routing.Start(v)))
+        routing.AddVariableMinimizedByFinalizer(time_dim.CumulVar(routing.End(v)))
+
+    break_owner: dict[str, int] = {}
+    if break_after_minutes and break_after_minutes < max_route_minutes:
+        # HOS rest breaks, placed between visits (never during service)
+        visit_transits = [int(service[manager.IndexToNode(i)]) for i in range(routing.Size() + routing.vehicles())]
+        solver = routing.solver()
+        per_vehicle = max_route_minutes // break_after_minutes
+        for v in range(num_vehicles):
+            breaks = [solver.FixedDurationIntervalVar(0, horizon, break_minutes, True, f"break {v}.{k}")
+                      for k in range(per_vehicle)]
+            break_owner.update((b.Name(), v) for b in breaks)
+            time_dim.SetBreakIntervalsOfVehicle(breaks, v, visit_transits)
+            time_dim.SetBreakDistanceDurationOfVehicle(break_after_minutes, break_minutes, v)
+
+    if demands:
+        routing.AddDimensionWithVehicleCapacity(
+            register_vector(routing, manager, demands), 0, [vehicle_capacity] * num_vehicles, True, "Capacity")
+
+    optional = set(optional_nodes)
+    for node in range(n):
+        if node not in depots:
+            # Optional nodes (e.g. depots no vehicle uses) cost nothing to skip; stops only when they cannot fit
+            routing.AddDisjunction([manager.NodeToIndex(node)], 0 if node in optional else DROP_PENALTY)
+
+    params = pywrapcp.DefaultRoutingSearchParameters()
+    params.first_solution_strategy = routing_enums_pb2.FirstSolutionStrategy.PATH_CHEAPEST_ARC
+    params.local_search_metaheuristic = routing_enums_pb2.LocalSearchMetaheuristic.GUIDED_LOCAL_SEARCH
+    params.time_limit.FromMilliseconds(int(time_limit_s * 1000))
+
+    initial = None
+    if initial_routes:
+        initial = routing.ReadAssignmentFromRoutes(
+            [[manager.NodeToIndex(node) for node in route if node not in depots] for route in initial_routes],
+            True,
+        )
+        if initial is None:
+            logger.info("Previous plan does not fit the new problem; solving from scratch")
+    # Returns the best solution found within the time limit
+    if initial is not None:
+        solution = routing.SolveFromAssignmentWithParameters(initial, params)
+    else:
+        solution = routing.SolveWithParameters(params)
+    if not solution:
+        return None
+
+    performed_breaks: dict[int, list[tuple[int, int]]] = {}
+    intervals = solution.IntervalVarContainer()
+    for i in range(intervals.Size()):
+        element = intervals.Element(i)
+        if element.PerformedValue():
+            v = break_owner[element.Var().Name()]
+            performed_breaks.setdefault(v, []).append((element.StartValue(), element.DurationValue()))
+
+    routes, visited = [], set()
+    for v in range(num_vehicles):
+        nodes, arrivals = [], []
+        idx = solution.Value(routing.NextVar(routing.Start(v)))
+        while not routing.IsEnd(idx):
+            nodes.append(manager.IndexToNode(idx))
+            arrivals.append(solution.Min(time_dim.CumulVar(idx)))
+            idx = solution.Value(routing.NextVar(idx))
+        visited.update(nodes)
+        routes.append({
+            "vehicle": v,
+            "nodes": nodes,
+            "arrivals": arrivals,
+            "start_minute": solution.Min(time_dim.CumulVar(routing.Start(v))),
+            "end_minute": solution.Min(time_dim.CumulVar(routing.End(v))),
+            "breaks": sorted(performed_breaks.get(v, [])),
+        })
+    return {
+        "routes": routes,
+        "dropped": [node for node in range(n) if node not in depots | optional and node not in visited],
+        "objective": solution.ObjectiveValue(),
+        "status": _status_name(routing.status()),
+        "warm_started": initial is not None,
+    }
+
+
+def _status_name(status: int) -> str:
+    from ortools.constraint_solver import routing_enums_pb2
+
+    try:
+        return routing_enums_pb2.RoutingSearchStatus.Value.Name(status)
+    except (AttributeError, ValueError):
+        return str(status)
+
+
+def problem_key(problem: dict) -> str:
+    """Stable SHA-256 of a JSON-serialisable problem description."""
+    payload = json.dumps(problem, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class PlanCache:
+    """LRU of problem_key -> solved plan, each served for ttl_s seconds."""
+
+    def __init__(self, capacity: int = 256, ttl_s: float = 900.0):
+        self.capacity = capacity
+        self.ttl_s = ttl_s
+        self.hits = 0
+        self.misses = 0
+        self._plans: "OrderedDict[str, tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls) -> "PlanCache":
+        return cls(
+            capacity=int(os.getenv("VRP_PLAN_CACHE_SIZE", "256")),
+            ttl_s=float(os.getenv("VRP_PLAN_CACHE_TTL_S", "900")),
+        )
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._plans.get(key)
+            if entry is None or time.time() - entry[0] >= self.ttl_s:
+                self._plans.pop(key, None)
+                self.misses += 1
+                return None
+            self._plans.move_to_end(key)
+            self.hits += 1
+            return copy.deepcopy(entry[1])
+
+    def put(self, key: str, plan: Any) -> None:
+        if self.capacity <= 0:
+            return
+        with self._lock:
+            self._plans[key] = (time.time(), copy.deepcopy(plan))
+            self._plans.move_to_end(key)
+            while len(self._plans) > self.capacity:
+                self._plans.popitem(last=False)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "entries": len(self._plans),
+            "capacity": self.capacity,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+        }
+
+    def clear(self) -> None:
+        with self._lock:
+            self._plans.clear()
+            self.hits = self.misses = 0
@@ -17,10 +17,12 @@ from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
+from core.executor import executor
 from routers import ocr, route, nlp, forecast, analytics
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(name)s] %(message)s")
 logger = logging.getLogger("ai-sidecar")
+logging.getLogger("httpx").setLevel(logging.WARNING)  # one INFO line per OSRM tile request otherwise
 
 # ---------------------------------------------------------------------------
 # Lazy model loading on startup
@@ -49,8 +51,14 @@ async def lifespan(app: FastAPI):
     models["docling"] = None
 
     app.state.models = models
+
+    # Start the OCR / VRP / forecast worker processes so their models load before traffic
+    await executor.warm()
+
     logger.info("AI Sidecar ready on port %s", os.getenv("AI_SIDECAR_PORT", "8091"))
     yield
+    executor.shutdown()
+    await route.routing.close()
     logger.info("AI Sidecar shutting down")
 
 
@@ -98,7 +106,11 @@ async def health():
         "ortools": _check("ortools"),
         "duckdb": _check("duckdb"),
     }
-    return {"status": "ok", "service": "eusotrip-ai-sidecar", "models": available}
+    return {
+        "status": "ok", "service": "eusotrip-ai-sidecar", "models": available,
+        "executor": executor.stats(),
+        "ocr_cache": ocr.ocr_cache.stats(),
+    }
 
 
 if __name__ == "__main__":
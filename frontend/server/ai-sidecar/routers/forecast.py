@@ -10,6 +10,8 @@ import numpy as np
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 
+from core.executor import ExecutorRejected, executor
+
 logger = logging.getLogger("ai-sidecar.forecast")
 router = APIRouter()
 
@@ -107,6 +109,14 @@ def check_prophet():
     return _prophet_available
 
 
+def warm_forecast_worker():
+    """Executor initializer: import the forecasting libraries once per worker process."""
+    if check_darts():
+        import darts.models  # noqa: F401
+    if check_prophet():
+        import prophet  # noqa: F401
+
+
 def forecast_with_darts(dates: list[str], values: list[float], horizon: int) -> tuple[list[ForecastPoint], str]:
     """Use Darts ExponentialSmoothing for quick, reliable forecasting."""
     from darts import TimeSeries
@@ -258,7 +268,7 @@ async def forecast_demand(req: DemandForecastRequest):
     try:
         # Try Darts first
         if check_darts():
-            forecast, model = forecast_with_darts(dates, values, req.horizon_weeks)
+            forecast, model = await executor.run("forecast", forecast_with_darts, dates, values, req.horizon_weeks)
             return DemandForecastResponse(
                 success=True, lane=req.lane, forecast=forecast,
                 trend=trend, seasonal_factor=seasonal, model_used=model,
@@ -266,7 +276,7 @@ async def forecast_demand(req: DemandForecastRequest):
 
         # Try Prophet
         if check_prophet():
-            forecast, model = forecast_with_prophet(dates, values, req.horizon_weeks)
+            forecast, model = await executor.run("forecast", forecast_with_prophet, dates, values, req.horizon_weeks)
             return DemandForecastResponse(
                 success=True, lane=req.lane, forecast=forecast,
                 trend=trend, seasonal_factor=seasonal, model_used=model,
@@ -278,6 +288,8 @@ async def forecast_demand(req: DemandForecastRequest):
             success=True, lane=req.lane, forecast=forecast,
             trend=trend, seasonal_factor=seasonal, model_used="exponential-smoothing-builtin",
         )
+    except ExecutorRejected:
+        raise
     except Exception as e:
         logger.error(f"Demand forecast error: {e}")
         # Always fall back to simple
@@ -307,9 +319,9 @@ async def forecast_rates(req: RateForecastRequest):
 
     try:
         if check_darts():
-            forecast, model = forecast_with_darts(dates, values, req.horizon_weeks)
+            forecast, model = await executor.run("forecast", forecast_with_darts, dates, values, req.horizon_weeks)
         elif check_prophet():
-            forecast, model = forecast_with_prophet(dates, values, req.horizon_weeks)
+            forecast, model = await executor.run("forecast", forecast_with_prophet, dates, values, req.horizon_weeks)
         else:
             forecast = forecast_simple(values, req.horizon_weeks)
             model = "exponential-smoothing-builtin"
@@ -318,6 +330,8 @@ async def forecast_rates(req: RateForecastRequest):
             success=True, lane=req.lane, forecast=forecast,
             trend=trend, volatility=volatility, model_used=model,
         )
+    except ExecutorRejected:
+        raise
     except Exception as e:
         logger.error(f"Rate forecast error: {e}")
         forecast = forecast_simple(values, req.horizon_weeks)
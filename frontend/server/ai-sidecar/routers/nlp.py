@@ -9,6 +9,8 @@ from typing import Optional
 from fastapi import APIRouter, Request, HTTPException
 from pydantic import BaseModel
 
+from core.executor import executor
+
 logger = logging.getLogger("ai-sidecar.nlp")
 router = APIRouter()
 
@@ -121,7 +123,7 @@ async def extract_entities(req: EntityRequest, request: Request):
     """
     try:
         nlp = get_spacy(request)
-        doc = nlp(req.text[:10000])
+        doc = await executor.run("nlp", nlp, req.text[:10000])
 
         entities = []
         for ent in doc.ents:
@@ -153,7 +155,7 @@ async def parse_load_query(req: ParseLoadRequest, request: Request):
     """
     try:
         nlp = get_spacy(request)
-        doc = nlp(req.query)
+        doc = await executor.run("nlp", nlp, req.query)
 
         parsed = ParsedLoadQuery()
         entities = []
@@ -283,7 +285,7 @@ async def classify_text(req: ClassifyRequest, request: Request):
     """
     try:
         nlp = get_spacy(request)
-        doc = nlp(req.text[:5000])
+        doc = await executor.run("nlp", nlp, req.text[:5000])
 
         # Default categories for support tickets
         categories = req.categories or [
@@ -3,18 +3,30 @@ OCR & Document Processing Router
 Docling (structured extraction) + PaddleOCR (raw OCR) + specialized extractors.
 """
 
+import asyncio
 import base64
 import io
 import json
 import logging
 import re
+import shutil
 import tempfile
+import threading
+import time
 import os
-from typing import Optional
+from typing import Callable, Literal, Optional, Union
 
 from fastapi import APIRouter, Request, HTTPException
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 
+from core.bol_extractor import extract_bol_fields
+from core.executor import ExecutorRejected, executor
+from core.image_prep import PROFILES, get_profile, prepare
+from core.ocr_cache import OCRCache, package_version
+from core.pages import MULTIPAGE_TYPES, count_pages, split_pages
+from core.uploads import EXTENSIONS, Upload, UploadLimits, UploadTooLarge, receive_upload, write_tempfile
+
 logger = logging.getLogger("ai-sidecar.ocr")
 router = APIRouter()
 
@@ -28,16 +40,19 @@ class OCRRequest(BaseModel):
     mime_type: str = "image/png"
     engine: str = "auto"  # "auto" | "docling" | "paddle"
     extract_tables: bool = True
+    preprocess: str = "generic"  # image preprocessing profile ahead of PaddleOCR (core/image_prep.py)
 
 
 class BOLExtractRequest(BaseModel):
     image_base64: str
     mime_type: str = "image/png"
+    preprocess: str = "bol"
 
 
 class RateSheetExtractRequest(BaseModel):
     file_base64: str
     mime_type: str = "application/pdf"
+    preprocess: str = "ratesheet"  # applies to the PaddleOCR fallback
 
 
 class OCRLine(BaseModel):
@@ -53,6 +68,7 @@ class OCRResponse(BaseModel):
     lines: list[OCRLine]
     tables: list[dict] = []
     avg_confidence: float = 0.0
+    cached: bool = False  # served from the OCR result cache
     error: Optional[str] = None
 
 
@@ -81,6 +97,7 @@ class BOLResponse(BaseModel):
     fields: BOLFields
     raw_text: str
     confidence: float
+    cached: bool = False
     error: Optional[str] = None
 
 
@@ -90,72 +107,153 @@ class RateSheetResponse(BaseModel):
     surcharges: dict
     metadata: dict
     raw_text: str
+    cached: bool = False
     error: Optional[str] = None
 
 
+class BatchDocument(BaseModel):
+    file_base64: str
+    mime_type: str = "application/pdf"
+    document_id: Optional[str] = None  # echoed on every result; defaults to "doc-<index>"
+
+
+class BatchOCRRequest(BaseModel):
+    documents: list[BatchDocument]
+    dpi: int = 200  # PDF render resolution
+    ordered: bool = False  # emit results in (document, page) order instead of as they complete
+    preprocess: Optional[str] = None  # default: "page" for rendered PDF/TIFF pages, "generic" for images
+
+
+class BatchDocumentEvent(BaseModel):
+    type: Literal["document"] = "document"
+    document_index: int
+    document_id: str
+    sha256: str
+    mime_type: str
+    page_count: int
+    error: Optional[str] = None
+
+
+class BatchPageEvent(BaseModel):
+    type: Literal["page"] = "page"
+    document_index: int
+    document_id: str
+    page: int  # 1-based
+    page_count: int
+    success: bool
+    engine: str = "paddleocr"
+    text: str = ""
+    lines: list[OCRLine] = []
+    avg_confidence: float = 0.0
+    cached: bool = False
+    elapsed_ms: float = 0.0
+    error: Optional[str] = None
+
+
+class BatchSummaryEvent(BaseModel):
+    type: Literal["summary"] = "summary"
+    documents: int
+    pages: int
+    pages_failed: int
+    elapsed_ms: float
+
+
 # ---------------------------------------------------------------------------
 # Lazy model loaders
 # ---------------------------------------------------------------------------
 
 _paddle_ocr = None
 _docling_converter = None
+# Thread-mode OCR pools (EXECUTOR_OCR_MODE=thread) share these singletons:
+# load each model once, and run one PaddleOCR inference at a time (its
+# predictors are not thread-safe). Process workers never contend for them.
+_load_lock = threading.Lock()
+_paddle_lock = threading.Lock()
 
 
 def get_paddle_ocr():
     global _paddle_ocr
     if _paddle_ocr is None:
-        try:
-            from paddleocr import PaddleOCR
-            _paddle_ocr = PaddleOCR(use_angle_cls=True, lang="en", show_log=False)
-            logger.info("PaddleOCR loaded")
-        except ImportError:
-            logger.warning("PaddleOCR not installed")
-            raise HTTPException(503, "PaddleOCR not available")
+        with _load_lock:
+            if _paddle_ocr is None:
+                try:
+                    from paddleocr import PaddleOCR
+                    _paddle_ocr = PaddleOCR(use_angle_cls=True, lang="en", show_log=False)
+                    logger.info("PaddleOCR loaded")
+                except ImportError:
+                    logger.warning("PaddleOCR not installed")
+                    raise HTTPException(503, "PaddleOCR not available")
     return _paddle_ocr
 
 
 def get_docling():
     global _docling_converter
     if _docling_converter is None:
-        try:
-            from docling.document_converter import DocumentConverter
-            _docling_converter = DocumentConverter()
-            logger.info("Docling DocumentConverter loaded")
-        except ImportError:
-            logger.warning("Docling not installed")
-            raise HTTPException(503, "Docling not available")
+        with _load_lock:
+            if _docling_converter is None:
+                try:
+                    from docling.document_converter import DocumentConverter
+                    _docling_converter = DocumentConverter()
+                    logger.info("Docling DocumentConverter loaded")
+                except ImportError:
+                    logger.warning("Docling not installed")
+                    raise HTTPException(503, "Docling not available")
     return _docling_converter
 
 
+def warm_ocr_worker():
+    """Executor initializer: load PaddleOCR once in each OCR worker process."""
+    try:
+        get_paddle_ocr()
+    except HTTPException:
+        pass
+
+
 # ---------------------------------------------------------------------------
 # Helpers
 # ---------------------------------------------------------------------------
 
-def decode_to_tempfile(b64_data: str, mime_type: str) -> str:
-    """Decode base64 to a temp file, return path."""
+def decode_base64(b64_data: str) -> bytes:
+    """Decode base64, with or without a data URI prefix."""
     raw = b64_data
     if "," in raw:
         raw = raw.split(",", 1)[1]
-    data = base64.b64decode(raw)
-
-    ext_map = {
-        "application/pdf": ".pdf",
-        "image/png": ".png",
-        "image/jpeg": ".jpg",
-        "image/jpg": ".jpg",
-        "image/tiff": ".tiff",
-    }
-    ext = ext_map.get(mime_type, ".bin")
-    tmp = tempfile.NamedTemporaryFile(suffix=ext, delete=False)
-    tmp.write(data)
-    tmp.close()
-    return tmp.name
-
-
-def run_paddle(file_path: str) -> tuple[str, list[OCRLine], float]:
-    """Run PaddleOCR on a file, return (full_text, lines, avg_confidence)."""
+    return base64.b64decode(raw)
+
+
+def _is_pdf(source: Union[str, bytes], mime_type: str) -> bool:
+    if mime_type == "application/pdf":
+        return True
+    if isinstance(source, bytes):
+        return source[:4] == b"%PDF"
+    return source.lower().endswith(".pdf")
+
+
+def run_paddle(source: Union[str, bytes], mime_type: str = "",
+               profile: str = "generic") -> tuple[str, list[OCRLine], float]:
+    """
+    Run PaddleOCR on a file path or in-memory image bytes, return (full_text, lines, avg_confidence).
+    Images are first preprocessed with the named profile (see core/image_prep.py); bounding
+    boxes are always in the original image's coordinates.
+    """
     ocr = get_paddle_ocr()
-    result = ocr.ocr(file_path, cls=True)
+    settings = get_profile(profile)
+    tmp_path = None
+    prepared = None
+    if _is_pdf(source, mime_type):
+        if isinstance(source, bytes):
+            # PaddleOCR decodes image bytes itself but only reads PDFs from a path
+            source = tmp_path = write_tempfile(source, "application/pdf")
+    else:
+        prepared = prepare(source, settings)
+    try:
+        with _paddle_lock:
+            result = ocr.ocr(prepared.image if prepared else source, cls=settings.angle_cls)
+    finally:
+        if tmp_path:
+            os.unlink(tmp_path)
+    if prepared:
+        logger.debug(f"Preprocessed ({profile}): {prepared.info}")
 
     lines = []
     text_parts = []
@@ -167,7 +265,7 @@ def run_paddle(file_path: str) -> tuple[str, list[OCRLine], float]:
             lines.append(OCRLine(
                 text=txt,
                 confidence=round(conf, 4),
-                bbox=[[int(p[0]), int(p[1])] for p in bbox],
+                bbox=prepared.to_original(bbox) if prepared else [[int(p[0]), int(p[1])] for p in bbox],
             ))
             text_parts.append(txt)
 
@@ -176,12 +274,15 @@ def run_paddle(file_path: str) -> tuple[str, list[OCRLine], float]:
     return full_text, lines, round(avg_conf, 4)
 
 
-def run_docling(file_path: str) -> tuple[str, list[dict], float]:
-    """Run Docling on a file, return (markdown_text, tables, confidence).
+def run_docling(source: Union[str, bytes], mime_type: str = "application/pdf") -> tuple[str, list[dict], float]:
+    """Run Docling on a file path or in-memory bytes, return (markdown_text, tables, confidence).
     Docling performs structural PDF parsing (not pixel-based OCR), so confidence
     is computed from extraction quality: text density and table completeness."""
     converter = get_docling()
-    result = converter.convert(file_path)
+    if isinstance(source, bytes):
+        from docling.datamodel.base_models import DocumentStream
+        source = DocumentStream(name="upload" + EXTENSIONS.get(mime_type, ".pdf"), stream=io.BytesIO(source))
+    result = converter.convert(source)
     md_text = result.document.export_to_markdown()
 
     tables = []
@@ -209,6 +310,64 @@ def run_docling(file_path: str) -> tuple[str, list[dict], float]:
     return md_text, tables, confidence
 
 
+# ---------------------------------------------------------------------------
+# Cached engine runs
+# ---------------------------------------------------------------------------
+
+# Part of every cache key: bump when run_paddle / run_docling change their output for the same file
+RESULT_FORMAT = 2
+
+ocr_cache = OCRCache.from_env()
+
+
+def engine_version(engine: str) -> str:
+    return f"{package_version(engine)}+r{RESULT_FORMAT}"
+
+
+upload_limits = UploadLimits.from_env()
+
+
+def upload_from_base64(b64_data: str, mime_type: str, dir: Optional[str] = None) -> Upload:
+    """Decodes a JSON endpoint's base64 document, rejecting oversized ones (413) before decoding."""
+    if len(b64_data) * 3 // 4 > upload_limits.max_bytes + 3:
+        raise UploadTooLarge(upload_limits.max_bytes)
+    return Upload.from_bytes(decode_base64(b64_data), mime_type, upload_limits, dir)
+
+
+def check_profile(name: str) -> str:
+    """Validates a request's preprocessing profile name (400 if unknown)."""
+    if name not in PROFILES:
+        raise HTTPException(400, f"Unknown preprocess profile: {name} (expected one of {', '.join(sorted(PROFILES))})")
+    return name
+
+
+def paddle_cache_key(digest: str, profile: str = "generic") -> str:
+    # Keyed by the profile's settings, not its name: profiles that preprocess alike share results
+    return OCRCache.key(digest, "paddleocr", f"{engine_version('paddleocr')}+p{get_profile(profile).signature()}")
+
+
+async def paddle_cached(upload: Upload, profile: str = "generic") -> tuple[str, list[OCRLine], float, bool]:
+    """run_paddle on the OCR pool unless this content was OCR'd before; the last item is True on a cache hit."""
+    key = paddle_cache_key(upload.sha256, profile)
+    hit = ocr_cache.get(key)
+    if hit is not None:
+        return hit["text"], [OCRLine(**l) for l in hit["lines"]], hit["avg_confidence"], True
+    text, lines, avg_conf = await executor.run("ocr", run_paddle, upload.source(), upload.mime_type, profile)
+    ocr_cache.put(key, {"text": text, "lines": [l.model_dump() for l in lines], "avg_confidence": avg_conf})
+    return text, lines, avg_conf, False
+
+
+async def docling_cached(upload: Upload) -> tuple[str, list[dict], float, bool]:
+    """run_docling on the OCR pool unless this content was converted before; the last item is True on a cache hit."""
+    key = OCRCache.key(upload.sha256, "docling", engine_version("docling"))
+    hit = ocr_cache.get(key)
+    if hit is not None:
+        return hit["text"], hit["tables"], hit["confidence"], True
+    md_text, tables, confidence = await executor.run("ocr", run_docling, upload.source(), upload.mime_type)
+    ocr_cache.put(key, {"text": md_text, "tables": tables, "confidence": confidence})
+    return md_text, tables, confidence, False
+
+
 # ---------------------------------------------------------------------------
 # Endpoints
 # ---------------------------------------------------------------------------
@@ -219,47 +378,64 @@ async def extract_text(req: OCRRequest):
     Extract text from a document image/PDF.
     Engine: 'auto' tries Docling first (structured), falls back to PaddleOCR.
     """
-    tmp_path = None
+    check_profile(req.preprocess)
+    return await _extract_text(lambda: upload_from_base64(req.image_base64, req.mime_type),
+                               req.engine, req.preprocess)
+
+
+@router.post("/extract/upload", response_model=OCRResponse)
+async def extract_text_upload(request: Request, engine: str = "auto", mime_type: Optional[str] = None,
+                              preprocess: str = "generic"):
+    """/ocr/extract for a raw or multipart file upload, streamed instead of base64-encoded."""
+    check_profile(preprocess)
+    upload = await receive_upload(request, upload_limits, mime_type)
+    return await _extract_text(lambda: upload, engine, preprocess)
+
+
+async def _extract_text(open_upload: Callable[[], Upload], engine: str, preprocess: str) -> OCRResponse:
+    upload = None
     try:
-        tmp_path = decode_to_tempfile(req.image_base64, req.mime_type)
+        upload = open_upload()
 
         # Auto: try Docling for PDFs, PaddleOCR for images
-        if req.engine == "auto":
-            if req.mime_type == "application/pdf":
+        if engine == "auto":
+            if upload.mime_type == "application/pdf":
                 try:
-                    md_text, tables, doc_conf = run_docling(tmp_path)
+                    md_text, tables, doc_conf, cached = await docling_cached(upload)
                     lines = [OCRLine(text=l, confidence=doc_conf) for l in md_text.split("\n") if l.strip()]
                     return OCRResponse(
                         success=True, engine="docling", text=md_text,
-                        lines=lines, tables=tables, avg_confidence=doc_conf,
+                        lines=lines, tables=tables, avg_confidence=doc_conf, cached=cached,
                     )
+                except ExecutorRejected:
+                    raise
                 except Exception as e:
                     logger.warning(f"Docling failed, falling back to PaddleOCR: {e}")
 
             # Fallback / images: PaddleOCR
-            text, lines, avg_conf = run_paddle(tmp_path)
+            text, lines, avg_conf, cached = await paddle_cached(upload, preprocess)
             return OCRResponse(
                 success=True, engine="paddleocr", text=text,
-                lines=lines, avg_confidence=avg_conf,
+                lines=lines, avg_confidence=avg_conf, cached=cached,
             )
 
-        elif req.engine == "docling":
-            md_text, tables, doc_conf = run_docling(tmp_path)
+        elif engine == "docling":
+            md_text, tables, doc_conf, cached = await docling_cached(upload)
             lines = [OCRLine(text=l, confidence=doc_conf) for l in md_text.split("\n") if l.strip()]
             return OCRResponse(
                 success=True, engine="docling", text=md_text,
-                lines=lines, tables=tables, avg_confidence=doc_conf,
+                lines=lines, tables=tables, avg_confidence=doc_conf, cached=cached,
             )
 
-        elif req.engine == "paddle":
-            text, lines, avg_conf = run_paddle(tmp_path)
+        elif engine == "paddle":
+            text, lines, avg_conf, cached = await paddle_cached(upload, preprocess)
             return OCRResponse(
                 success=True, engine="paddleocr", text=text,
-                lines=lines, avg_confidence=avg_conf,
+                lines=lines, avg_confidence=avg_conf, cached=cached,
             )
 
         else:
-            raise HTTPException(400, f"Unknown engine: {req.engine}")
+            raise HTTPException(400, f"Unknown engine: {engine}")
 
     except HTTPException:
         raise
@@ -267,8 +443,8 @@ async def extract_text(req: OCRRequest):
         logger.error(f"OCR extract error: {e}")
         return OCRResponse(success=False, engine="none", text="", lines=[], error=str(e))
     finally:
-        if tmp_path and os.path.exists(tmp_path):
-            os.unlink(tmp_path)
+        if upload:
+            upload.cleanup()
 
 
 @router.post("/bol", response_model=BOLResponse)
@@ -277,23 +453,39 @@ async def extract_bol(req: BOLExtractRequest):
     Extract structured BOL fields from a scanned Bill of Lading.
     Uses PaddleOCR for text extraction, then regex/NLP for field parsing.
     """
-    tmp_path = None
+    check_profile(req.preprocess)
+    return await _extract_bol(lambda: upload_from_base64(req.image_base64, req.mime_type), req.preprocess)
+
+
+@router.post("/bol/upload", response_model=BOLResponse)
+async def extract_bol_upload(request: Request, mime_type: Optional[str] = None, preprocess: str = "bol"):
+    """/ocr/bol for a raw or multipart file upload, streamed instead of base64-encoded."""
+    check_profile(preprocess)
+    upload = await receive_upload(request, upload_limits, mime_type)
+    return await _extract_bol(lambda: upload, preprocess)
+
+
+async def _extract_bol(open_upload: Callable[[], Upload], preprocess: str) -> BOLResponse:
+    upload = None
     try:
-        tmp_path = decode_to_tempfile(req.image_base64, req.mime_type)
-        text, lines, avg_conf = run_paddle(tmp_path)
+        upload = open_upload()
+        text, lines, avg_conf, cached = await paddle_cached(upload, preprocess)
 
         if not text.strip():
-            return BOLResponse(success=False, fields=BOLFields(), raw_text="", confidence=0, error="No text extracted")
+            return BOLResponse(success=False, fields=BOLFields(), raw_text="", confidence=0,
+                               cached=cached, error="No text extracted")
 
         fields = parse_bol_fields(text)
-        return BOLResponse(success=True, fields=fields, raw_text=text, confidence=avg_conf)
+        return BOLResponse(success=True, fields=fields, raw_text=text, confidence=avg_conf, cached=cached)
 
+    except (ExecutorRejected, UploadTooLarge):
+        raise
     except Exception as e:
         logger.error(f"BOL extract error: {e}")
         return BOLResponse(success=False, fields=BOLFields(), raw_text="", confidence=0, error=str(e))
     finally:
-        if tmp_path and os.path.exists(tmp_path):
-            os.unlink(tmp_path)
+        if upload:
+            upload.cleanup()
 
 
 @router.post("/ratesheet", response_model=RateSheetResponse)
@@ -302,29 +494,47 @@ async def extract_ratesheet(req: RateSheetExtractRequest):
     Extract structured rate tiers from a rate sheet PDF/image.
     Uses Docling for table extraction, falls back to PaddleOCR + regex.
     """
-    tmp_path = None
+    check_profile(req.preprocess)
+    return await _extract_ratesheet(lambda: upload_from_base64(req.file_base64, req.mime_type), req.preprocess)
+
+
+@router.post("/ratesheet/upload", response_model=RateSheetResponse)
+async def extract_ratesheet_upload(request: Request, mime_type: Optional[str] = None,
+                                   preprocess: str = "ratesheet"):
+    """/ocr/ratesheet for a raw or multipart file upload, streamed instead of base64-encoded."""
+    check_profile(preprocess)
+    upload = await receive_upload(request, upload_limits, mime_type)
+    return await _extract_ratesheet(lambda: upload, preprocess)
+
+
+async def _extract_ratesheet(open_upload: Callable[[], Upload], preprocess: str) -> RateSheetResponse:
+    upload = None
     try:
-        tmp_path = decode_to_tempfile(req.file_base64, req.mime_type)
+        upload = open_upload()
 
         tables = []
         raw_text = ""
 
         # Try Docling first for structured table extraction
         try:
-            md_text, doc_tables, _conf = run_docling(tmp_path)
+            md_text, doc_tables, _conf, cached = await docling_cached(upload)
             raw_text = md_text
             tables = doc_tables
+        except ExecutorRejected:
+            raise
         except Exception:
             # Fallback to PaddleOCR
-            text, _, _ = run_paddle(tmp_path)
+            text, _, _, cached = await paddle_cached(upload, preprocess)
             raw_text = text
 
         rate_tiers, surcharges, metadata = parse_rate_sheet(raw_text, tables)
         return RateSheetResponse(
             success=True, rate_tiers=rate_tiers, surcharges=surcharges,
-            metadata=metadata, raw_text=raw_text[:3000],
+            metadata=metadata, raw_text=raw_text[:3000], cached=cached,
         )
 
+    except (ExecutorRejected, UploadTooLarge):
+        raise
     except Exception as e:
         logger.error(f"Rate sheet extract error: {e}")
         return RateSheetResponse(
@@ -332,8 +542,162 @@ async def extract_ratesheet(req: RateSheetExtractRequest):
             metadata={}, raw_text="", error=str(e),
         )
     finally:
-        if tmp_path and os.path.exists(tmp_path):
-            os.unlink(tmp_path)
+        if upload:
+            upload.cleanup()
+
+
+# ---------------------------------------------------------------------------
+# Batch OCR
+# ---------------------------------------------------------------------------
+
+BATCH_MAX_DOCUMENTS = int(os.getenv("OCR_BATCH_MAX_DOCUMENTS", "20"))
+BATCH_MAX_PAGES = int(os.getenv("OCR_BATCH_MAX_PAGES", "200"))
+# Pages in flight per batch; 0 = twice the OCR pool's workers, which keeps
+# every worker busy without filling the pool's queue for other requests
+BATCH_CONCURRENCY = int(os.getenv("OCR_BATCH_CONCURRENCY", "0"))
+BATCH_TASK_ATTEMPTS = 3
+
+
+class PageOrder:
+    """
+    Re-sequences batch events into (document, page) order: each document's
+    event, then its pages. add() returns the events that became releasable.
+    """
+
+    def __init__(self):
+        self.page_counts: dict[int, int] = {}
+        self.held: dict[tuple[int, int], BaseModel] = {}
+        self.doc = 0
+        self.pos = 0  # 0 = the document event, k = page k
+
+    def add(self, event) -> list:
+        if event.type == "document":
+            self.page_counts[event.document_index] = event.page_count
+            self.held[(event.document_index, 0)] = event
+        else:
+            self.held[(event.document_index, event.page)] = event
+        ready = []
+        while (self.doc, self.pos) in self.held:
+            ready.append(self.held.pop((self.doc, self.pos)))
+            self.pos += 1
+            if self.pos > self.page_counts[self.doc]:
+                self.doc, self.pos = self.doc + 1, 0
+        return ready
+
+
+async def _retry_rejected(fn, *args):
+    """Awaits fn(*args), an OCR pool call, waiting out 429s caused by other traffic."""
+    for attempt in range(BATCH_TASK_ATTEMPTS):
+        try:
+            return await fn(*args)
+        except ExecutorRejected as e:
+            if e.status_code != 429 or attempt == BATCH_TASK_ATTEMPTS - 1:
+                raise
+            await asyncio.sleep(float((e.headers or {}).get("Retry-After", 1)))
+
+
+def _error_detail(e: Exception) -> str:
+    return str(e.detail) if isinstance(e, HTTPException) else str(e)
+
+
+async def _batch_events(req: BatchOCRRequest):
+    """Yields NDJSON lines: document events, page events, then a summary."""
+    started = time.time()
+    work_dir = tempfile.mkdtemp(prefix="ocr-batch-")
+    events: asyncio.Queue = asyncio.Queue()
+    slots = asyncio.Semaphore(BATCH_CONCURRENCY or executor.pools["ocr"].workers * 2)
+    budget = {"pages": BATCH_MAX_PAGES}
+
+    async def run_page(doc: BatchDocumentEvent, page: int, path: str) -> None:
+        profile = req.preprocess or ("page" if doc.mime_type in MULTIPAGE_TYPES else "generic")
+        async with slots:
+            t0 = time.time()
+            try:
+                upload = Upload.from_file(path, "image/png")
+                text, lines, avg_conf, cached = await _retry_rejected(paddle_cached, upload, profile)
+                result = dict(success=True, text=text, lines=lines, avg_confidence=avg_conf, cached=cached)
+            except Exception as e:
+                result = dict(success=False, error=_error_detail(e))
+        await events.put(BatchPageEvent(
+            document_index=doc.document_index, document_id=doc.document_id,
+            page=page, page_count=doc.page_count,
+            elapsed_ms=round((time.time() - t0) * 1000, 1), **result,
+        ))
+
+    async def run_document(index: int, document: BatchDocument) -> None:
+        doc = BatchDocumentEvent(
+            document_index=index, document_id=document.document_id or f"doc-{index}",
+            sha256="", mime_type=document.mime_type, page_count=0,
+        )
+        pages, reserved = [], 0
+        try:
+            upload = upload_from_base64(document.file_base64, document.mime_type, dir=work_dir)
+            doc.sha256 = upload.sha256
+            path = upload.file()
+            multipage = document.mime_type in MULTIPAGE_TYPES
+            count = await _retry_rejected(executor.run, "ocr", count_pages, path, document.mime_type) if multipage else 1
+            # Reserve the pages before rendering any: no await between the check and
+            # the reservation, so concurrent documents never render past the budget
+            if count > budget["pages"]:
+                raise ValueError(f"Batch page limit ({BATCH_MAX_PAGES}) reached")
+            budget["pages"] -= count
+            reserved = count
+            if multipage:
+                async with slots:
+                    pages = await _retry_rejected(
+                        executor.run, "ocr", split_pages, path, document.mime_type, work_dir, req.dpi, count)
+            else:
+                pages = [path]
+            doc.page_count = len(pages)
+        except Exception as e:
+            pages, doc.error = [], _error_detail(e)
+        # Hand back what was reserved but not rendered
+        budget["pages"] += reserved - len(pages)
+        await events.put(doc)
+        await asyncio.gather(*(run_page(doc, i + 1, page) for i, page in enumerate(pages)))
+
+    tasks = asyncio.gather(*(run_document(i, d) for i, d in enumerate(req.documents)))
+    tasks.add_done_callback(lambda _: events.put_nowait(None))
+    order = PageOrder() if req.ordered else None
+    pages = failed = 0
+    try:
+        while (event := await events.get()) is not None:
+            if event.type == "page":
+                pages += 1
+                failed += not event.success
+            for ready in order.add(event) if order else [event]:
+                yield ready.model_dump_json() + "\n"
+        yield BatchSummaryEvent(
+            documents=len(req.documents), pages=pages, pages_failed=failed,
+            elapsed_ms=round((time.time() - started) * 1000, 1),
+        ).model_dump_json() + "\n"
+    finally:
+        tasks.cancel()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+@router.post("/batch")
+async def extract_batch(req: BatchOCRRequest):
+    """
+    OCR many documents and multi-page PDFs/TIFFs at once. Documents are split
+    into pages and the pages OCR'd in parallel on the OCR pool. The response
+    is NDJSON: one "document" line per document once split (page count,
+    SHA-256), one "page" line per page as it completes (or in page order
+    with ordered=true), each tagged with its document and page, and a final
+    "summary" line.
+    """
+    if not req.documents:
+        raise HTTPException(400, "No documents provided")
+    if len(req.documents) > BATCH_MAX_DOCUMENTS:
+        raise HTTPException(400, f"At most {BATCH_MAX_DOCUMENTS} documents per batch")
+    for i, document in enumerate(req.documents):
+        if not document.file_base64:
+            raise HTTPException(400, f"Document {i} is empty")
+    if not 72 <= req.dpi <= 600:
+        raise HTTPException(400, "dpi must be between 72 and 600")
+    if req.preprocess is not None:
+        check_profile(req.preprocess)
+    return StreamingResponse(_batch_events(req), media_type="application/x-ndjson")
 
 
 # ---------------------------------------------------------------------------
@@ -342,100 +706,8 @@ async def extract_ratesheet(req: RateSheetExtractRequest):
 
 
 def parse_bol_fields(text: str) -> BOLFields:
-    """Parse BOL fields from raw OCR text using regex patterns."""
-    fields = BOLFields()
-    upper = text.upper()
-    lines_list = text.split("\n")
-
-    # BOL Number
-    m = re.search(r"(?:BOL|B/L|BILL OF LADING)\s*(?:#|NO\.?|NUMBER)?\s*:?\s*([A-Z0-9\-]+)", upper)
-    if m:
-        fields.bol_number = m.group(1)
-
-    # Date
-    m = re.search(r"(?:DATE|SHIP DATE|PICKUP DATE)\s*:?\s*(\d{1,2}[/\-]\d{1,2}[/\-]\d{2,4})", upper)
-    if m:
-        fields.date = m.group(1)
-
-    # PO Number
-    m = re.search(r"(?:P\.?O\.?|PURCHASE ORDER)\s*(?:#|NO\.?)?\s*:?\s*([A-Z0-9\-]+)", upper)
-    if m:
-        fields.po_number = m.group(1)
-
-    # PRO Number
-    m = re.search(r"(?:PRO)\s*(?:#|NO\.?)?\s*:?\s*([A-Z0-9\-]+)", upper)
-    if m:
-        fields.pro_number = m.group(1)
-
-    # Weight
-    m = re.search(r"(?:WEIGHT|WT\.?|GROSS\s*WT)\s*:?\s*([\d,]+)\s*(?:LBS?|POUNDS?|KG)?", upper)
-    if m:
-        fields.weight = m.group(1).replace(",", "")
-
-    # Pieces / Quantity
-    m = re.search(r"(?:PIECES?|QTY|QUANTITY|UNITS?)\s*:?\s*(\d+)", upper)
-    if m:
-        fields.pieces = m.group(1)
-
-    # Hazmat class
-    m = re.search(r"(?:HAZMAT|HAZ\s*MAT|HAZARD)\s*(?:CLASS)?\s*:?\s*(\d+\.?\d*)", upper)
-    if m:
-        fields.hazmat_class = m.group(1)
-
-    # UN Number
-    m = re.search(r"UN\s*(\d{4})", upper)
-    if m:
-        fields.un_number = f"UN{m.group(1)}"
-
-    # Packing Group
-    m = re.search(r"(?:PACKING\s*GROUP|PG)\s*:?\s*(I{1,3}|[123])", upper)
-    if m:
-        fields.packing_group = m.group(1)
-
-    # Emergency phone
-    m = re.search(r"(?:EMERGENCY|CHEMTREC|24.?HR)\s*(?:PHONE|CONTACT|#)?\s*:?\s*([\d\-\(\)\s]{10,})", upper)
-    if m:
-        fields.emergency_phone = m.group(1).strip()
-
-    # Shipper / Consignee — look for labeled sections
-    for i, line in enumerate(lines_list):
-        line_upper = line.upper().strip()
-        if "SHIPPER" in line_upper or "SHIP FROM" in line_upper or "FROM:" in line_upper:
-            fields.shipper_name = _extract_next_name(lines_list, i)
-            fields.shipper_address = _extract_next_address(lines_list, i)
-        elif "CONSIGNEE" in line_upper or "SHIP TO" in line_upper or "DELIVER TO" in line_upper:
-            fields.consignee_name = _extract_next_name(lines_list, i)
-            fields.consignee_address = _extract_next_address(lines_list, i)
-        elif "CARRIER" in line_upper and "NAME" in line_upper:
-            fields.carrier_name = _extract_next_name(lines_list, i)
-
-    # Commodity — look near "DESCRIPTION" or "COMMODITY"
-    m = re.search(r"(?:DESCRIPTION|COMMODITY|PRODUCT)\s*(?:OF\s*GOODS?)?\s*:?\s*(.+)", upper)
-    if m:
-        fields.commodity = m.group(1).strip()[:200]
-
-    return fields
-
-
-def _extract_next_name(lines: list[str], idx: int) -> Optional[str]:
-    """Get the next non-empty line after a label as the name."""
-    for j in range(idx + 1, min(idx + 4, len(lines))):
-        stripped = lines[j].strip()
-        if stripped and len(stripped) > 2 and not stripped.upper().startswith(("CONSIGNEE", "CARRIER", "SHIPPER")):
-            return stripped
-    return None
-
-
-def _extract_next_address(lines: list[str], idx: int) -> Optional[str]:
-    """Get address lines after a name (look for city/state/zip pattern)."""
-    parts = []
-    for j in range(idx + 1, min(idx + 6, len(lines))):
-        stripped = lines[j].strip()
-        if stripped:
-            parts.append(stripped)
-            if re.search(r"\d{5}", stripped):  # ZIP code likely ends address
-                break
-    return ", ".join(parts[:3]) if parts else None
+    """Parse BOL fields from raw OCR text (single-pass anchor extraction, see core/bol_extractor.py)."""
+    return BOLFields(**extract_bol_fields(text))
 
 
 def parse_rate_sheet(text: str, tables: list[dict]) -> tuple[list[dict], dict, dict]:
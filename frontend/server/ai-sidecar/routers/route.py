@@ -3,19 +3,43 @@ Route Optimization Router
 OSRM for real routing + OR-Tools for VRP optimization.
 """
 
+import base64
 import logging
 import os
 from typing import Optional
 
-import requests
+import numpy as np
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 
+from core.distance_cache import DistanceCache, cached_matrix
+from core.executor import executor
+from core.routing_client import RoutingClient, RoutingUnavailable
+from core.vrp import PlanCache, problem_key, solve_vrp
+
 logger = logging.getLogger("ai-sidecar.route")
 router = APIRouter()
 
-# OSRM public demo server (self-host for production)
-OSRM_BASE = os.getenv("OSRM_URL", "https://router.project-osrm.org")
+# Pooled async OSRM client (OSRM_URL, self-hosted) with an in-process haversine fallback
+routing = RoutingClient.from_env()
+
+# Snapped pairwise distance/duration cache shared by /matrix and /optimize
+distance_cache = DistanceCache.from_env()
+
+# Larger matrices are split into OSRM table tiles (ROUTING_TABLE_MAX_LOCATIONS each)
+MATRIX_MAX_LOCATIONS = int(os.getenv("MATRIX_MAX_LOCATIONS", "2000"))
+MATRIX_ENCODINGS = ("json", "float32", "int32")
+
+# Guided local search budget per /optimize call (requests may ask for up to VRP_MAX_TIME_LIMIT_S);
+# the best plan found when the budget runs out is returned
+VRP_TIME_LIMIT_S = float(os.getenv("VRP_TIME_LIMIT_S", "5"))
+VRP_MAX_TIME_LIMIT_S = float(os.getenv("VRP_MAX_TIME_LIMIT_S", "30"))
+VRP_BUILD_MARGIN_S = 30.0
+# Share of the new stops a previous plan must already route to be used as a warm start
+VRP_WARM_START_MIN_OVERLAP = float(os.getenv("VRP_WARM_START_MIN_OVERLAP", "0.5"))
+
+# Solved /optimize plans by problem hash (warm starts and repeat requests)
+plan_cache = PlanCache.from_env()
 
 
 # ---------------------------------------------------------------------------
@@ -44,18 +68,26 @@ class DirectionsResponse(BaseModel):
     geometry: Optional[str] = None
     steps: list[dict] = []
     alternatives: list[dict] = []
+    source: Optional[str] = None  # "osrm" | "haversine"
     error: Optional[str] = None
 
 
 class MatrixRequest(BaseModel):
     locations: list[Waypoint]
     profile: str = "driving"
+    encoding: str = "json"  # json (miles/minutes lists) | float32 | int32 (base64 meters/seconds)
 
 
 class MatrixResponse(BaseModel):
     success: bool
-    distances: list[list[float]] = []  # miles
-    durations: list[list[float]] = []  # minutes
+    distances: list[list[float]] = []  # miles (encoding=json)
+    durations: list[list[float]] = []  # minutes (encoding=json)
+    encoding: str = "json"
+    shape: list[int] = []
+    distances_b64: Optional[str] = None  # little-endian row-major meters; NaN / -1 = unreachable
+    durations_b64: Optional[str] = None  # little-endian row-major seconds; NaN / -1 = unreachable
+    source: Optional[str] = None  # "osrm" | "haversine" (estimate when OSRM is unavailable) | "mixed" (some tiles)
+    cache: Optional[dict] = None  # {hits, misses, hit_ratio} for this matrix
     error: Optional[str] = None
 
 
@@ -64,9 +96,17 @@ class OptimizeRequest(BaseModel):
     stops: list[Waypoint]
     vehicle_capacity: int = 1000
     stop_demands: list[int] = []
-    time_windows: list[tuple[int, int]] = []  # (earliest_min, latest_min)
+    time_windows: list[tuple[int, int]] = []  # per stop (earliest_min, latest_min) from plan start
+    service_minutes: list[int] = []  # per stop time on site (loading, paperwork)
     max_vehicles: int = 1
     max_route_time_minutes: int = 660  # 11-hour HOS limit
+    depots: list[Waypoint] = []  # extra depots; depot ids are 0 = depot, 1.. = depots
+    vehicle_start_depots: list[int] = []  # depot id per vehicle (default 0)
+    vehicle_end_depots: list[int] = []  # depot id per vehicle (default: its start depot)
+    break_after_minutes: Optional[int] = 480  # HOS: 30-minute break after 8 hours on duty; None disables
+    break_minutes: int = 30
+    time_limit_seconds: Optional[float] = None  # search budget (default VRP_TIME_LIMIT_S)
+    previous_plan_id: Optional[str] = None  # warm start from this earlier plan's routes
 
 
 class OptimizeResponse(BaseModel):
@@ -75,6 +115,11 @@ class OptimizeResponse(BaseModel):
     total_distance_miles: float = 0.0
     total_duration_hours: float = 0.0
     unassigned_stops: list[int] = []
+    plan_id: Optional[str] = None  # hash of the problem; pass back as previous_plan_id
+    cached: bool = False  # served from the plan cache
+    warm_started: bool = False  # search seeded from previous_plan_id
+    status: Optional[str] = None  # OR-Tools search status
+    cache: Optional[dict] = None  # distance cache {hits, misses, hit_ratio}
     error: Optional[str] = None
 
 
@@ -95,30 +140,28 @@ class IsochroneResponse(BaseModel):
 # OSRM helpers
 # ---------------------------------------------------------------------------
 
-def osrm_route(origin: Waypoint, dest: Waypoint, profile: str = "driving",
-               alternatives: bool = False, steps: bool = False) -> dict:
+async def osrm_route(origin: Waypoint, dest: Waypoint, profile: str = "driving",
+                     alternatives: bool = False, steps: bool = False) -> dict:
     """Call OSRM route service."""
-    coords = f"{origin.lng},{origin.lat};{dest.lng},{dest.lat}"
-    url = f"{OSRM_BASE}/route/v1/{profile}/{coords}"
-    params = {
-        "overview": "full",
-        "geometries": "polyline",
-        "alternatives": str(alternatives).lower(),
-        "steps": str(steps).lower(),
-    }
-    resp = requests.get(url, params=params, timeout=15)
-    resp.raise_for_status()
-    return resp.json()
-
-
-def osrm_table(locations: list[Waypoint], profile: str = "driving") -> dict:
-    """Call OSRM table (matrix) service."""
-    coords = ";".join(f"{w.lng},{w.lat}" for w in locations)
-    url = f"{OSRM_BASE}/table/v1/{profile}/{coords}"
-    params = {"annotations": "distance,duration"}
-    resp = requests.get(url, params=params, timeout=30)
-    resp.raise_for_status()
-    return resp.json()
+    return await routing.route([(origin.lat, origin.lng), (dest.lat, dest.lng)],
+                               profile, alternatives, steps)
+
+
+async def osrm_table(locations: list[Waypoint], profile: str = "driving") -> dict:
+    """
+    Distance (m) / duration (s) matrix as NumPy arrays (NaN = unreachable): cached pairs
+    first, the remaining rows x columns from OSRM (haversine estimate if OSRM is unavailable).
+    """
+    return await cached_matrix(routing.matrix, distance_cache, [(w.lat, w.lng) for w in locations], profile)
+
+
+def encode_matrix(values: np.ndarray, encoding: str) -> str:
+    """Base64 of a row-major little-endian float32 (NaN kept) or int32 (rounded, NaN -> -1) matrix."""
+    if encoding == "int32":
+        raw = np.where(np.isnan(values), -1, np.rint(values)).astype("<i4")
+    else:
+        raw = values.astype("<f4")
+    return base64.b64encode(raw.tobytes()).decode("ascii")
 
 
 # ---------------------------------------------------------------------------
@@ -132,7 +175,7 @@ async def get_directions(req: DirectionsRequest):
     Returns distance in miles, duration in hours, and optional turn-by-turn steps.
     """
     try:
-        data = osrm_route(req.origin, req.destination, req.profile,
+        data = await osrm_route(req.origin, req.destination, req.profile,
                           req.alternatives, req.steps)
 
         if data.get("code") != "Ok" or not data.get("routes"):
@@ -164,9 +207,9 @@ async def get_directions(req: DirectionsRequest):
         return DirectionsResponse(
             success=True, distance_miles=dist_miles, duration_hours=dur_hours,
             duration_minutes=dur_minutes, geometry=route.get("geometry"),
-            steps=steps_list, alternatives=alts,
+            steps=steps_list, alternatives=alts, source=data.get("source"),
         )
-    except requests.RequestException as e:
+    except RoutingUnavailable as e:
         logger.error(f"OSRM directions error: {e}")
         return DirectionsResponse(success=False, error=f"OSRM unavailable: {e}")
     except Exception as e:
@@ -179,26 +222,36 @@ async def get_distance_matrix(req: MatrixRequest):
     """
     Get distance/duration matrix between all location pairs.
     Used for multi-stop optimization and carrier proximity scoring.
+    Large requests are fetched as concurrent OSRM table tiles; encoding=float32|int32
+    returns compact base64 matrices in meters/seconds instead of nested lists.
     """
     if len(req.locations) < 2:
         raise HTTPException(400, "Need at least 2 locations")
-    if len(req.locations) > 100:
-        raise HTTPException(400, "Max 100 locations per matrix request")
+    if len(req.locations) > MATRIX_MAX_LOCATIONS:
+        raise HTTPException(400, f"Max {MATRIX_MAX_LOCATIONS} locations per matrix request")
+    if req.encoding not in MATRIX_ENCODINGS:
+        raise HTTPException(400, f"encoding must be one of {', '.join(MATRIX_ENCODINGS)}")
 
     try:
-        data = osrm_table(req.locations, req.profile)
+        data = await osrm_table(req.locations, req.profile)
         if data.get("code") != "Ok":
             return MatrixResponse(success=False, error=data.get("message", "Matrix failed"))
 
-        # Convert meters → miles, seconds → minutes
-        distances = []
-        durations = []
-        for row_d, row_t in zip(data["distances"], data["durations"]):
-            distances.append([round(d / 1609.344, 1) if d else 0 for d in row_d])
-            durations.append([round(t / 60, 1) if t else 0 for t in row_t])
-
-        return MatrixResponse(success=True, distances=distances, durations=durations)
-    except requests.RequestException as e:
+        if req.encoding != "json":
+            return MatrixResponse(
+                success=True, encoding=req.encoding, shape=list(data["distances"].shape),
+                distances_b64=encode_matrix(data["distances"], req.encoding),
+                durations_b64=encode_matrix(data["durations"], req.encoding),
+                source=data.get("source"), cache=data.get("cache"),
+            )
+
+        # Convert meters → miles, seconds → minutes (unreachable → 0)
+        distances = np.nan_to_num(np.round(data["distances"] / 1609.344, 1)).tolist()
+        durations = np.nan_to_num(np.round(data["durations"] / 60, 1)).tolist()
+
+        return MatrixResponse(success=True, distances=distances, durations=durations,
+                              source=data.get("source"), cache=data.get("cache"))
+    except RoutingUnavailable as e:
         logger.error(f"OSRM matrix error: {e}")
         return MatrixResponse(success=False, error=f"OSRM unavailable: {e}")
     except Exception as e:
@@ -206,127 +259,149 @@ async def get_distance_matrix(req: MatrixRequest):
         return MatrixResponse(success=False, error=str(e))
 
 
+def stop_key(stop: Waypoint) -> str:
+    """Identity of a stop across plans (warm start)."""
+    return f"{stop.name or ''}@{stop.lat:.5f},{stop.lng:.5f}"
+
+
 @router.post("/optimize", response_model=OptimizeResponse)
 async def optimize_route(req: OptimizeRequest):
     """
     Solve Vehicle Routing Problem using OR-Tools.
-    Finds optimal stop ordering with capacity and time window constraints.
+    Finds the shortest dispatch plan under capacity, time window, service time,
+    multi-depot and HOS break constraints; stops that cannot fit are returned
+    as unassigned_stops. Identical problems are served from the plan cache, and
+    previous_plan_id seeds the search with an earlier plan's routes.
     """
     try:
-        from ortools.constraint_solver import routing_enums_pb2, pywrapcp
+        import ortools  # noqa: F401
     except ImportError:
         raise HTTPException(503, "OR-Tools not available")
 
     if len(req.stops) < 1:
         raise HTTPException(400, "Need at least 1 stop")
+    if req.max_vehicles < 1:
+        raise HTTPException(400, "Need at least 1 vehicle")
+    n_depots = 1 + len(req.depots)
+    starts = req.vehicle_start_depots or [0] * req.max_vehicles
+    ends = req.vehicle_end_depots or starts
+    if len(starts) != req.max_vehicles or len(ends) != req.max_vehicles:
+        raise HTTPException(400, "vehicle_start_depots / vehicle_end_depots need one depot id per vehicle")
+    if any(not 0 <= d < n_depots for d in [*starts, *ends]):
+        raise HTTPException(400, f"Depot ids must be between 0 and {n_depots - 1}")
+    if any(early > late for early, late in req.time_windows):
+        raise HTTPException(400, "Time window earliest must not be after latest")
+    if req.time_limit_seconds is not None and req.time_limit_seconds <= 0:
+        raise HTTPException(400, "time_limit_seconds must be positive")
+
+    plan_id = problem_key(req.model_dump(exclude={"time_limit_seconds", "previous_plan_id"}))
+    cached_plan = plan_cache.get(plan_id)
+    # A plan solved on haversine estimates is not served again: OSRM may be back.
+    # It still warm-starts the next solve via previous_plan_id.
+    if cached_plan is not None and not cached_plan["estimated"]:
+        # No distance lookups were made for this response
+        return OptimizeResponse(**{**cached_plan["response"], "cached": True, "warm_started": False, "cache": None})
 
     try:
-        # Build all locations: depot + stops
-        all_locs = [req.depot] + req.stops
-        n = len(all_locs)
-
-        # Get real distance matrix from OSRM
-        try:
-            matrix_data = osrm_table(all_locs)
-            if matrix_data.get("code") == "Ok":
-                dist_matrix = matrix_data["distances"]  # meters
-                time_matrix = matrix_data["durations"]  # seconds
-            else:
-                raise Exception("OSRM matrix failed")
-        except Exception:
-            # Fallback: haversine
-            import math
-            def haversine(a, b):
-                R = 6371000
-                dlat = math.radians(b.lat - a.lat)
-                dlng = math.radians(b.lng - a.lng)
-                x = math.sin(dlat/2)**2 + math.cos(math.radians(a.lat)) * math.cos(math.radians(b.lat)) * math.sin(dlng/2)**2
-                return R * 2 * math.atan2(math.sqrt(x), math.sqrt(1 - x))
-
-            dist_matrix = [[haversine(all_locs[i], all_locs[j]) for j in range(n)] for i in range(n)]
-            time_matrix = [[d / 22.352 for d in row] for row in dist_matrix]  # ~50mph avg
-
-        # OR-Tools solver
-        manager = pywrapcp.RoutingIndexManager(n, req.max_vehicles, 0)
-        routing = pywrapcp.RoutingModel(manager)
-
-        def distance_callback(from_idx, to_idx):
-            from_node = manager.IndexToNode(from_idx)
-            to_node = manager.IndexToNode(to_idx)
-            return int(dist_matrix[from_node][to_node])
-
-        transit_cb = routing.RegisterTransitCallback(distance_callback)
-        routing.SetArcCostEvaluatorOfAllVehicles(transit_cb)
-
-        # Time dimension (HOS constraint)
-        def time_callback(from_idx, to_idx):
-            from_node = manager.IndexToNode(from_idx)
-            to_node = manager.IndexToNode(to_idx)
-            return int(time_matrix[from_node][to_node] / 60)  # minutes
-
-        time_cb = routing.RegisterTransitCallback(time_callback)
-        routing.AddDimension(time_cb, 30, req.max_route_time_minutes, True, "Time")
-
-        # Capacity dimension
-        if req.stop_demands:
-            demands = [0] + req.stop_demands[:len(req.stops)]
-            def demand_callback(idx):
-                return demands[manager.IndexToNode(idx)]
-            demand_cb = routing.RegisterUnaryTransitCallback(demand_callback)
-            routing.AddDimensionWithVehicleCapacity(demand_cb, 0, [req.vehicle_capacity] * req.max_vehicles, True, "Capacity")
-
-        # Solve
-        search_params = pywrapcp.DefaultRoutingSearchParameters()
-        search_params.first_solution_strategy = routing_enums_pb2.FirstSolutionStrategy.PATH_CHEAPEST_ARC
-        search_params.local_search_metaheuristic = routing_enums_pb2.LocalSearchMetaheuristic.GUIDED_LOCAL_SEARCH
-        search_params.time_limit.seconds = 5
-
-        solution = routing.SolveWithParameters(search_params)
-
-        if not solution:
-            return OptimizeResponse(success=False, error="No feasible solution found")
+        # Build all locations: depots, then stops
+        all_locs = [req.depot, *req.depots, *req.stops]
+
+        # Get real distance matrix from OSRM (the client falls back to haversine at ~50 mph)
+        matrix_data = await osrm_table(all_locs)
+        estimate = None
+        if matrix_data.get("code") != "Ok" or np.isnan(matrix_data["distances"]).any():
+            estimate = await routing.fallback.table([(w.lat, w.lng) for w in all_locs])
+        # Haversine anywhere in the matrix: the routing client's fallback, or the estimate below
+        estimated = estimate is not None or matrix_data.get("source", "osrm") != "osrm"
+        if matrix_data.get("code") != "Ok":
+            matrix_data = {"distances": np.array(estimate["distances"]), "durations": np.array(estimate["durations"])}
+        elif estimate is not None:
+            # Pairs OSRM could not route get the haversine estimate
+            for key in ("distances", "durations"):
+                matrix_data[key] = np.where(np.isnan(matrix_data[key]), estimate[key], matrix_data[key])
+        dist_matrix = matrix_data["distances"]  # meters
+        time_matrix = matrix_data["durations"]  # seconds
+
+        # Warm start: earlier routes mapped onto this problem's stop nodes
+        initial_routes = None
+        previous = plan_cache.get(req.previous_plan_id) if req.previous_plan_id else None
+        if previous is not None:
+            node_of = {stop_key(stop): n_depots + i for i, stop in enumerate(req.stops)}
+            initial_routes = [[node_of[k] for k in keys if k in node_of]
+                              for keys in previous["routes"][:req.max_vehicles]]
+            if sum(map(len, initial_routes)) < VRP_WARM_START_MIN_OVERLAP * len(req.stops):
+                initial_routes = None  # too much changed; a fresh search does better
+
+        # OR-Tools solver over precomputed integer matrices (core/vrp.py)
+        demands = [0] * n_depots + req.stop_demands[:len(req.stops)] if req.stop_demands else None
+        time_windows = {n_depots + i: tuple(w) for i, w in enumerate(req.time_windows[:len(req.stops)])}
+        service = [0] * n_depots + req.service_minutes[:len(req.stops)] if req.service_minutes else None
+        time_limit = min(req.time_limit_seconds or VRP_TIME_LIMIT_S, VRP_MAX_TIME_LIMIT_S)
+        # Solved in the VRP process pool; the timeout leaves room for model building
+        plan = await executor.run(
+            "vrp", solve_vrp, dist_matrix, time_matrix, req.max_vehicles, req.max_route_time_minutes,
+            demands, req.vehicle_capacity, time_limit, timeout_s=time_limit + VRP_BUILD_MARGIN_S,
+            starts=starts, ends=ends, time_windows=time_windows, service_minutes=service,
+            break_after_minutes=req.break_after_minutes, break_minutes=req.break_minutes,
+            initial_routes=initial_routes,
+            optional_nodes=[d for d in range(n_depots) if d not in starts and d not in ends],
+        )
+
+        if plan is None:
+            return OptimizeResponse(success=False, plan_id=plan_id, error="No feasible solution found")
 
         routes = []
         total_dist = 0
         total_time = 0
 
-        for v in range(req.max_vehicles):
+        for vehicle_route in plan["routes"]:
+            v, nodes = vehicle_route["vehicle"], vehicle_route["nodes"]
             route_stops = []
-            idx = routing.Start(v)
-            route_dist = 0
-            route_time = 0
-
-            while not routing.IsEnd(idx):
-                node = manager.IndexToNode(idx)
-                next_idx = solution.Value(routing.NextVar(idx))
-                next_node = manager.IndexToNode(next_idx)
-                route_dist += dist_matrix[node][next_node]
-                route_time += time_matrix[node][next_node]
-
-                if node > 0:  # skip depot
-                    stop = req.stops[node - 1]
-                    route_stops.append({
-                        "index": node - 1,
-                        "name": stop.name or f"Stop {node}",
-                        "lat": stop.lat, "lng": stop.lng,
-                    })
-                idx = next_idx
+            path = [starts[v], *nodes, ends[v]]
+            route_dist = float(dist_matrix[path[:-1], path[1:]].sum())
+            route_time = float(time_matrix[path[:-1], path[1:]].sum())
+
+            for node, arrival in zip(nodes, vehicle_route["arrivals"]):
+                stop = req.stops[node - n_depots]
+                route_stops.append({
+                    "index": node - n_depots,
+                    "name": stop.name or f"Stop {node - n_depots + 1}",
+                    "lat": stop.lat, "lng": stop.lng,
+                    "arrival_minute": arrival,
+                })
 
             if route_stops:
                 routes.append({
                     "vehicle": v,
+                    "start_depot": starts[v],
+                    "end_depot": ends[v],
                     "stops": route_stops,
                     "distance_miles": round(route_dist / 1609.344, 1),
                     "duration_hours": round(route_time / 3600, 2),
+                    "start_minute": vehicle_route["start_minute"],
+                    "end_minute": vehicle_route["end_minute"],
+                    "breaks": [{"start_minute": start, "duration_minutes": duration}
+                               for start, duration in vehicle_route["breaks"]],
                 })
                 total_dist += route_dist
                 total_time += route_time
 
-        return OptimizeResponse(
+        response = OptimizeResponse(
             success=True, routes=routes,
             total_distance_miles=round(total_dist / 1609.344, 1),
             total_duration_hours=round(total_time / 3600, 2),
+            unassigned_stops=[node - n_depots for node in plan["dropped"]],
+            plan_id=plan_id,
+            warm_started=plan["warm_started"],
+            status=plan["status"],
+            cache=matrix_data.get("cache"),
         )
+        plan_cache.put(plan_id, {
+            "response": response.model_dump(),
+            "routes": [[stop_key(req.stops[node - n_depots]) for node in r["nodes"]] for r in plan["routes"]],
+            "estimated": estimated,
+        })
+        return response
     except HTTPException:
         raise
     except Exception as e:
@@ -0,0 +1,53 @@
+"""
+Local mock OSRM server for tests and offline development.
+
+Implements the subset of the OSRM HTTP API the sidecar uses (/route/v1 and
+/table/v1, including sources/destinations) with haversine distances at 50 mph.
+Tests mount it in-process through httpx.ASGITransport; for manual runs:
+
+    uvicorn tests.mock_osrm:app --port 5000
+"""
+
+from typing import Optional
+
+from fastapi import FastAPI
+from fastapi.responses import JSONResponse
+
+from core.routing_client import HaversineBackend
+
+app = FastAPI(title="Mock OSRM")
+backend = HaversineBackend(speed_mph=50.0)
+
+
+def _parse(coords: str) -> Optional[list[tuple[float, float]]]:
+    try:
+        pairs = [tuple(map(float, c.split(","))) for c in coords.split(";")]
+    except ValueError:
+        return None
+    if len(pairs) < 2 or any(len(p) != 2 for p in pairs):
+        return None
+    return [(lat, lng) for lng, lat in pairs]
+
+
+def _invalid() -> JSONResponse:
+    return JSONResponse({"code": "InvalidQuery", "message": "Query string malformed"}, status_code=400)
+
+
+@app.get("/route/v1/{profile}/{coords}")
+async def route(profile: str, coords: str, alternatives: str = "false", steps: str = "false"):
+    points = _parse(coords)
+    if points is None:
+        return _invalid()
+    data = await backend.route(points, profile)
+    return {"code": "Ok", "routes": data["routes"], "waypoints": [{"location": [lng, lat]} for lat, lng in points]}
+
+
+@app.get("/table/v1/{profile}/{coords}")
+async def table(profile: str, coords: str, sources: Optional[str] = None, destinations: Optional[str] = None):
+    points = _parse(coords)
+    if points is None:
+        return _invalid()
+    src = [int(i) for i in sources.split(";")] if sources else None
+    dst = [int(i) for i in destinations.split(";")] if destinations else None
+    data = await backend.table(points, profile, src, dst)
+    return {"code": "Ok", "distances": data["distances"], "durations": data["durations"]}
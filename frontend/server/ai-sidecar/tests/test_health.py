@@ -2,8 +2,14 @@
 Tests for the health check and main app startup.
 """
 
+import asyncio
+import threading
+import time
+
+import pytest
 from fastapi.testclient import TestClient
 from main import app
+from core.executor import CapabilityPool, ExecutorRejected
 
 client = TestClient(app)
 
@@ -26,7 +32,85 @@ class TestHealth:
             assert key in models
             assert isinstance(models[key], bool)
 
+    def test_health_reports_executor_pools(self):
+        data = client.get("/health").json()
+        for name in ["ocr", "vrp", "forecast", "nlp"]:
+            pool = data["executor"][name]
+            for key in ["running", "queued", "completed", "rejected", "timed_out", "queue_wait_ms", "run_ms"]:
+                assert key in pool
+
     def test_root_404(self):
         """No root endpoint — should 404 or redirect."""
         resp = client.get("/")
         assert resp.status_code in [404, 405, 200]
+
+
+# ---------------------------------------------------------------------------
+# core.executor
+# ---------------------------------------------------------------------------
+
+class TestExecutor:
+    def test_thread_pool_runs_and_records_latency(self):
+        pool = CapabilityPool("test", mode="thread", workers=2, max_queue=4)
+        assert asyncio.run(pool.run(sum, [1, 2, 3])) == 6
+        stats = pool.stats()
+        assert stats["completed"] == 1 and stats["queued"] == 0
+        assert stats["run_ms"]["p50"] >= 0
+        pool.shutdown()
+
+    def test_full_queue_is_rejected_with_429(self):
+        pool = CapabilityPool("test", mode="thread", workers=1, max_queue=0)
+        release = threading.Event()
+
+        async def scenario():
+            busy = asyncio.ensure_future(pool.run(release.wait, 5))
+            await asyncio.sleep(0.05)
+            with pytest.raises(ExecutorRejected) as rejected:
+                await pool.run(sum, [1])
+            release.set()
+            await busy
+            return rejected.value
+
+        err = asyncio.run(scenario())
+        assert err.status_code == 429
+        assert "Retry-After" in err.headers
+        assert pool.stats()["rejected"] == 1
+        pool.shutdown()
+
+    def test_timeout_returns_504(self):
+        pool = CapabilityPool("test", mode="thread", workers=1, max_queue=1, timeout_s=0.1)
+        with pytest.raises(ExecutorRejected) as err:
+            asyncio.run(pool.run(time.sleep, 1))
+        assert err.value.status_code == 504
+        assert pool.stats()["timed_out"] == 1
+        pool.shutdown()
+
+    def test_process_pool_keeps_event_loop_responsive(self):
+        pool = CapabilityPool("test", mode="process", workers=1, max_queue=1, timeout_s=30)
+
+        async def scenario():
+            await pool.run(abs, -1)  # spawn the worker first
+            ticks = 0
+            task = asyncio.ensure_future(pool.run(time.sleep, 0.5))
+            while not task.done():
+                await asyncio.sleep(0.01)
+                ticks += 1
+            await task
+            return ticks
+
+        assert asyncio.run(scenario()) >= 20
+        pool.shutdown()
+
+    def test_process_task_past_timeout_restarts_pool(self):
+        pool = CapabilityPool("test", mode="process", workers=1, max_queue=1, timeout_s=30)
+
+        async def scenario():
+            await pool.run(abs, -1)
+            with pytest.raises(ExecutorRejected) as err:
+                await pool.run(time.sleep, 10, timeout_s=0.2)
+            assert err.value.status_code == 504
+            return await pool.run(abs, -2)  # served by a fresh worker
+
+        assert asyncio.run(scenario()) == 2
+        assert pool.stats()["restarts"] == 1
+        pool.shutdown()
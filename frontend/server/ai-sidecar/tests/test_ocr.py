@@ -5,6 +5,7 @@ Uses FastAPI TestClient with mocked OCR engines.
 
 import base64
 import json
+import os
 from unittest.mock import MagicMock, patch
 
 import pytest
@@ -123,3 +124,427 @@ class TestOCRRateSheet:
         assert "surcharges" in data
         assert "metadata" in data
         assert "raw_text" in data
+
+
+# ---------------------------------------------------------------------------
+# /ocr/batch
+# ---------------------------------------------------------------------------
+
+def read_ndjson(resp) -> list[dict]:
+    return [json.loads(line) for line in resp.text.splitlines() if line.strip()]
+
+
+class TestOCRBatch:
+    def test_batch_requires_documents(self):
+        resp = client.post("/ocr/batch", json={"documents": []})
+        assert resp.status_code == 400
+
+    def test_batch_rejects_empty_document(self):
+        resp = client.post("/ocr/batch", json={"documents": [
+            {"file_base64": make_b64_image(), "mime_type": "image/png"},
+            {"file_base64": "", "mime_type": "image/png"},
+        ]})
+        assert resp.status_code == 400
+
+    def test_batch_streams_page_results_with_provenance(self):
+        resp = client.post("/ocr/batch", json={"ordered": True, "documents": [
+            {"file_base64": make_b64_image(), "mime_type": "image/png", "document_id": "bol-1"},
+            {"file_base64": make_b64_image(), "mime_type": "image/png"},
+        ]})
+        assert resp.status_code == 200
+        assert resp.headers["content-type"].startswith("application/x-ndjson")
+        events = read_ndjson(resp)
+
+        assert [(e["type"], e.get("document_index")) for e in events] == [
+            ("document", 0), ("page", 0), ("document", 1), ("page", 1), ("summary", None),
+        ]
+        doc, page = events[0], events[1]
+        assert doc["document_id"] == "bol-1"
+        assert doc["page_count"] == 1
+        assert len(doc["sha256"]) == 64
+        assert page["document_id"] == "bol-1"
+        assert page["page"] == 1 and page["page_count"] == 1
+        # Succeeds with PaddleOCR installed, reports the engine error without it
+        assert page["success"] or page["error"]
+        assert events[2]["document_id"] == "doc-1"
+        assert events[-1]["documents"] == 2 and events[-1]["pages"] == 2
+
+    def test_batch_reports_unsplittable_document(self):
+        resp = client.post("/ocr/batch", json={"documents": [
+            {"file_base64": base64.b64encode(b"not a pdf").decode(), "mime_type": "application/pdf"},
+        ]})
+        events = read_ndjson(resp)
+        assert events[0]["type"] == "document"
+        assert events[0]["page_count"] == 0
+        assert events[0]["error"]
+        assert events[-1]["type"] == "summary"
+        assert events[-1]["pages"] == 0
+
+    def test_batch_reserves_pages_before_rendering(self, monkeypatch):
+        pytest.importorskip("PIL")
+        import io
+
+        from PIL import Image
+        from routers import ocr
+
+        def tiff(pages: int) -> str:
+            buf = io.BytesIO()
+            frames = [Image.new("RGB", (8, 8), "white") for _ in range(pages)]
+            frames[0].save(buf, "TIFF", save_all=True, append_images=frames[1:])
+            return base64.b64encode(buf.getvalue()).decode()
+
+        monkeypatch.setattr(ocr, "BATCH_MAX_PAGES", 3)
+        resp = client.post("/ocr/batch", json={"documents": [
+            {"file_base64": tiff(2), "mime_type": "image/tiff"},
+            {"file_base64": tiff(2), "mime_type": "image/tiff"},
+            {"file_base64": make_b64_image(), "mime_type": "image/png"},
+        ]})
+        docs = [e for e in read_ndjson(resp) if e["type"] == "document"]
+        # One TIFF fits; the other is refused before rendering, leaving room for the PNG
+        assert sorted(d["page_count"] for d in docs) == [0, 1, 2]
+        assert [d["error"] for d in docs if d["page_count"] == 0] == ["Batch page limit (3) reached"]
+        assert read_ndjson(resp)[-1]["pages"] == 3
+
+
+class TestPageOrder:
+    def test_releases_events_in_document_page_order(self):
+        from routers.ocr import BatchDocumentEvent, BatchPageEvent, PageOrder
+
+        def doc(i, pages):
+            return BatchDocumentEvent(document_index=i, document_id=f"d{i}", sha256="",
+                                      mime_type="application/pdf", page_count=pages)
+
+        def page(i, p, pages):
+            return BatchPageEvent(document_index=i, document_id=f"d{i}", page=p, page_count=pages, success=True)
+
+        order = PageOrder()
+        released = []
+        for event in [doc(1, 1), doc(0, 2), page(0, 2, 2), page(1, 1, 1), page(0, 1, 2)]:
+            released += [(e.type, e.document_index, getattr(e, "page", 0)) for e in order.add(event)]
+        assert released == [
+            ("document", 0, 0), ("page", 0, 1), ("page", 0, 2), ("document", 1, 0), ("page", 1, 1),
+        ]
+
+    def test_document_without_pages_does_not_block(self):
+        from routers.ocr import BatchDocumentEvent, PageOrder
+
+        order = PageOrder()
+        assert order.add(BatchDocumentEvent(document_index=1, document_id="b", sha256="",
+                                            mime_type="image/png", page_count=0)) == []
+        ready = order.add(BatchDocumentEvent(document_index=0, document_id="a", sha256="",
+                                             mime_type="image/png", page_count=0, error="bad"))
+        assert [e.document_index for e in ready] == [0, 1]
+
+
+# ---------------------------------------------------------------------------
+# OCR result cache
+# ---------------------------------------------------------------------------
+
+@pytest.fixture
+def fresh_cache(monkeypatch):
+    from core.ocr_cache import OCRCache
+    from routers import ocr
+
+    cache = OCRCache()
+    monkeypatch.setattr(ocr, "ocr_cache", cache)
+    return cache
+
+
+def seed_paddle_result(cache, b64_data: str, text: str, profile: str = "generic"):
+    """Stores a PaddleOCR result for b64_data as if an earlier request had run the engine."""
+    from core.ocr_cache import content_hash
+    from routers.ocr import decode_base64, paddle_cache_key
+
+    key = paddle_cache_key(content_hash(decode_base64(b64_data)), profile)
+    cache.put(key, {"text": text, "lines": [{"text": line, "confidence": 0.9, "bbox": None}
+                                            for line in text.split("\n")], "avg_confidence": 0.9})
+
+
+class TestOCRCacheEndpoints:
+    def test_extract_served_from_cache(self, fresh_cache):
+        image = make_b64_image()
+        seed_paddle_result(fresh_cache, image, "BILL OF LADING\nBOL# 12345")
+        data = client.post("/ocr/extract", json={
+            "image_base64": image, "mime_type": "image/png", "engine": "paddle",
+        }).json()
+        assert data["success"] is True
+        assert data["cached"] is True
+        assert data["text"] == "BILL OF LADING\nBOL# 12345"
+        assert data["lines"][1]["text"] == "BOL# 12345"
+
+    def test_bol_shares_cached_paddle_result(self, fresh_cache):
+        image = make_b64_image()
+        seed_paddle_result(fresh_cache, image, "BILL OF LADING\nCARRIER: EUSO LOGISTICS")
+        data = client.post("/ocr/bol", json={"image_base64": image, "mime_type": "image/png"}).json()
+        assert data["success"] is True
+        assert data["cached"] is True
+        assert data["raw_text"] == "BILL OF LADING\nCARRIER: EUSO LOGISTICS"
+
+    def test_different_bytes_miss(self, fresh_cache):
+        seed_paddle_result(fresh_cache, make_b64_image(), "cached")
+        other = base64.b64encode(base64.b64decode(make_b64_image()) + b"\x00").decode()
+        data = client.post("/ocr/extract", json={
+            "image_base64": other, "mime_type": "image/png", "engine": "paddle",
+        }).json()
+        # Runs the engine (an engine error without PaddleOCR installed)
+        assert not data.get("cached")
+        assert fresh_cache.stats()["misses"] == 1
+
+
+class TestOCRCache:
+    def test_lru_and_copies(self):
+        from core.ocr_cache import OCRCache
+
+        cache = OCRCache(capacity=2)
+        cache.put("a", {"text": "A"})
+        cache.put("b", {"text": "B"})
+        got = cache.get("a")
+        got["text"] = "changed"
+        assert cache.get("a") == {"text": "A"}
+        cache.put("c", {"text": "C"})  # evicts b, the least recently used
+        assert cache.get("b") is None
+        assert cache.stats()["hits"] == 2
+
+    def test_disabled_and_expired(self):
+        from core.ocr_cache import OCRCache
+
+        disabled = OCRCache(capacity=0)
+        disabled.put("a", {"text": "A"})
+        assert disabled.get("a") is None
+        cache = OCRCache(ttl_s=0)
+        cache.put("a", {"text": "A"})
+        assert cache.get("a") is None
+
+    def test_persists_to_sqlite_within_size_bound(self, tmp_path):
+        from core.ocr_cache import OCRCache
+
+        path = str(tmp_path / "ocr.db")
+        cache = OCRCache(path=path, max_bytes=300)
+        for i in range(5):
+            cache.put(f"doc{i}", {"text": f"{i}" * 100})
+        assert cache.stats()["disk_bytes"] <= 300
+
+        reopened = OCRCache(path=path, max_bytes=300)
+        assert reopened.get("doc4") == {"text": "4" * 100}
+        assert reopened.get("doc0") is None  # evicted from disk
+
+
+# ---------------------------------------------------------------------------
+# Streaming uploads
+# ---------------------------------------------------------------------------
+
+class TestOCRUpload:
+    def test_raw_body_upload(self, fresh_cache):
+        image = make_b64_image()
+        seed_paddle_result(fresh_cache, image, "BILL OF LADING")
+        resp = client.post("/ocr/extract/upload?engine=paddle", content=base64.b64decode(image),
+                           headers={"Content-Type": "image/png"})
+        data = resp.json()
+        assert data["success"] is True
+        assert data["cached"] is True
+        assert data["text"] == "BILL OF LADING"
+
+    def test_multipart_upload(self, fresh_cache):
+        image = make_b64_image()
+        seed_paddle_result(fresh_cache, image, "BILL OF LADING\nCARRIER: EUSO LOGISTICS")
+        resp = client.post("/ocr/bol/upload", data={"note": "driver copy"},
+                           files={"file": ("bol.png", base64.b64decode(image), "image/png")})
+        data = resp.json()
+        assert data["success"] is True
+        assert data["cached"] is True
+
+    def test_empty_upload_rejected(self):
+        resp = client.post("/ocr/extract/upload", content=b"", headers={"Content-Type": "image/png"})
+        assert resp.status_code == 400
+
+    def test_multipart_without_file_rejected(self):
+        resp = client.post("/ocr/ratesheet/upload", data={"note": "no file"},
+                           files={"other": (None, "x")})
+        assert resp.status_code == 400
+
+    def test_oversized_uploads_rejected(self, monkeypatch):
+        from core.uploads import UploadLimits
+        from routers import ocr
+
+        monkeypatch.setattr(ocr, "upload_limits", UploadLimits(max_bytes=32, spill_bytes=16))
+        raw = client.post("/ocr/extract/upload", content=b"x" * 64, headers={"Content-Type": "image/png"})
+        assert raw.status_code == 413
+        multipart = client.post("/ocr/bol/upload", files={"file": ("bol.png", b"x" * 100_000, "image/png")})
+        assert multipart.status_code == 413
+        as_json = client.post("/ocr/bol", json={"image_base64": base64.b64encode(b"x" * 64).decode()})
+        assert as_json.status_code == 413
+
+
+class TestSpooledBody:
+    def test_small_body_stays_in_memory(self):
+        import hashlib
+        from core.uploads import SpooledBody, UploadLimits
+
+        body = SpooledBody(UploadLimits(max_bytes=100, spill_bytes=10))
+        body.write(b"12345")
+        body.write(b"678")
+        data, path, sha = body.finish()
+        assert (data, path) == (b"12345678", None)
+        assert sha == hashlib.sha256(b"12345678").hexdigest()
+
+    def test_large_body_spills_to_file(self):
+        import hashlib
+        import os
+        from core.uploads import SpooledBody, Upload, UploadLimits
+
+        body = SpooledBody(UploadLimits(max_bytes=100, spill_bytes=10), suffix=".pdf")
+        for chunk in (b"%PDF-", b"0123456789", b"abc"):
+            body.write(chunk)
+        upload = Upload.from_body(body, "application/pdf")
+        assert upload.data is None
+        assert upload.source() == upload.path and upload.path.endswith(".pdf")
+        with open(upload.path, "rb") as f:
+            assert f.read() == b"%PDF-0123456789abc"
+        assert upload.sha256 == hashlib.sha256(b"%PDF-0123456789abc").hexdigest()
+        upload.cleanup()
+        assert not os.path.exists(upload.path)
+
+    def test_in_memory_upload_writes_file_only_on_demand(self):
+        import os
+        from core.uploads import Upload
+
+        upload = Upload.from_bytes(b"\x89PNG data", "image/png")
+        assert upload.source() == b"\x89PNG data"
+        path = upload.file()
+        assert path.endswith(".png") and os.path.exists(path)
+        upload.cleanup()
+        assert not os.path.exists(path)
+
+
+# ---------------------------------------------------------------------------
+# Image preprocessing
+# ---------------------------------------------------------------------------
+
+def make_text_page(width: int = 1700, height: int = 2200):
+    """A white page with rows of black text."""
+    cv2 = pytest.importorskip("cv2")
+    import numpy as np
+
+    page = np.full((height, width, 3), 255, np.uint8)
+    for i in range(30):
+        cv2.putText(page, f"SHIPPER CONSIGNEE BOL {i:03d} WEIGHT 4,000 LBS", (100, 120 + i * 65),
+                    cv2.FONT_HERSHEY_SIMPLEX, 1.1, (0, 0, 0), 2)
+    return page
+
+
+class TestImagePrep:
+    def test_photo_is_cropped_and_boxes_map_back(self):
+        cv2 = pytest.importorskip("cv2")
+        import numpy as np
+        from core.image_prep import get_profile, prepare
+
+        photo = np.full((4000, 3000, 3), 60, np.uint8)
+        affine = cv2.getRotationMatrix2D((850, 1100), 5, 1.4)
+        affine[:, 2] += [650, 850]
+        cv2.warpAffine(make_text_page(), affine, (3000, 4000), dst=photo, borderMode=cv2.BORDER_TRANSPARENT)
+
+        prepared = prepare(photo, get_profile("bol"))
+        assert prepared.info["cropped"] is True
+        assert max(prepared.info["size"]) <= 2200
+        h, w = prepared.image.shape[:2]
+        page_corners = cv2.transform(np.array([[[0, 0]], [[1700, 0]], [[1700, 2200]], [[0, 2200]]], float), affine)
+        mapped = np.array(prepared.to_original([[0, 0], [w - 1, 0], [w - 1, h - 1], [0, h - 1]]))
+        assert np.abs(mapped - page_corners.reshape(4, 2)).max() < 10
+
+    def test_skew_is_removed(self):
+        cv2 = pytest.importorskip("cv2")
+        from core.image_prep import get_profile, prepare
+
+        page = make_text_page()
+        tilted = cv2.warpAffine(page, cv2.getRotationMatrix2D((850, 1100), -4, 1.0), (1700, 2200),
+                                borderValue=(255, 255, 255))
+        prepared = prepare(cv2.imencode(".png", tilted)[1].tobytes(), get_profile("ratesheet"))
+        assert prepared.info["cropped"] is False
+        assert abs(prepared.info["skew_deg"] - 4.0) <= 0.3
+
+    def test_disabled_and_unreadable_pass_through(self):
+        from core.image_prep import get_profile, prepare
+
+        assert prepare(base64.b64decode(make_b64_image()), get_profile("none")) is None
+        pytest.importorskip("cv2")
+        assert prepare(b"not an image", get_profile("generic")) is None
+
+    def test_profile_overrides_from_env(self, monkeypatch):
+        from core.image_prep import load_profiles
+
+        monkeypatch.setenv("OCR_PREP_PROFILES", '{"bol": {"binarize": true}, "pod": {"crop": false}}')
+        profiles = load_profiles()
+        assert profiles["bol"].binarize is True and profiles["bol"].crop is True
+        assert profiles["pod"].crop is False
+        assert profiles["bol"].signature() != profiles["generic"].signature()
+
+    def test_cache_keys_follow_profile_settings(self):
+        from routers.ocr import paddle_cache_key
+
+        assert paddle_cache_key("abc", "bol") == paddle_cache_key("abc", "generic")
+        assert paddle_cache_key("abc", "ratesheet") != paddle_cache_key("abc", "generic")
+
+    def test_unknown_profile_rejected(self):
+        resp = client.post("/ocr/bol", json={"image_base64": make_b64_image(), "preprocess": "sepia"})
+        assert resp.status_code == 400
+        resp = client.post("/ocr/extract/upload?preprocess=sepia", content=base64.b64decode(make_b64_image()),
+                           headers={"Content-Type": "image/png"})
+        assert resp.status_code == 400
+
+
+# ---------------------------------------------------------------------------
+# BOL field extraction (core/bol_extractor.py)
+# ---------------------------------------------------------------------------
+
+BOL_CORPUS = os.path.join(os.path.dirname(__file__), "fixtures", "bol_corpus.jsonl")
+
+
+def load_bol_corpus() -> list[dict]:
+    with open(BOL_CORPUS) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+class TestBOLExtractor:
+    @pytest.mark.parametrize("doc", load_bol_corpus(), ids=lambda doc: doc["id"])
+    def test_corpus_fields(self, doc):
+        from core.bol_extractor import FIELDS, extract_bol_fields
+
+        got = extract_bol_fields(doc["text"])
+        for field in FIELDS:
+            if field not in doc["known_misses"]:
+                assert got[field] == doc["expected"].get(field), field
+
+    def test_corpus_accuracy_floor(self):
+        from core.bol_extractor import extract_bol_fields
+
+        correct = total = 0
+        for doc in load_bol_corpus():
+            got = extract_bol_fields(doc["text"])
+            total += len(doc["expected"])
+            correct += sum(got[field] == value for field, value in doc["expected"].items())
+        assert correct / total >= 0.95
+
+    def test_labels_only_match_whole_words(self):
+        from routers.ocr import parse_bol_fields
+
+        fields = parse_bol_fields("PROPANE, PORT ARTHUR TERMINAL\nPRO# 7734021\nPO: 55120")
+        assert fields.pro_number == "7734021"
+        assert fields.po_number == "55120"
+        assert fields.commodity is None
+
+    def test_value_on_next_line_is_not_a_label(self):
+        from routers.ocr import parse_bol_fields
+
+        fields = parse_bol_fields("BILL OF LADING\nBOL# EB-20431\nSHIP DATE\n04/02/2026")
+        assert fields.bol_number == "EB-20431"
+        assert fields.date == "04/02/2026"
+
+    def test_blocks_stop_at_the_next_block(self):
+        from routers.ocr import parse_bol_fields
+
+        fields = parse_bol_fields("SHIPPER\nGULF COAST CHEMICAL LLC\nCONSIGNEE: Lone Star Refining Co\n"
+                                  "455 Refinery Rd\nBeaumont TX 77701\nSHIPPER CERTIFICATION: properly classified")
+        assert fields.shipper_name == "GULF COAST CHEMICAL LLC"
+        assert fields.shipper_address is None
+        assert fields.consignee_name == "Lone Star Refining Co"
+        assert fields.consignee_address == "455 Refinery Rd, Beaumont TX 77701"
@@ -2,15 +2,61 @@
 Tests for the Route Optimization router — OSRM directions, matrix, OR-Tools VRP.
 """
 
+import asyncio
+import base64
+
+import httpx
+import numpy as np
 import pytest
 from unittest.mock import patch, MagicMock
 from fastapi.testclient import TestClient
 
 from main import app
+from core.distance_cache import DistanceCache, cached_matrix
+from core.routing_client import (
+    CircuitBreaker, HaversineBackend, OSRMBackend, RoutingClient, RoutingUnavailable, haversine_matrix_m,
+)
+from core.vrp import (
+    PlanCache, UNREACHABLE, integer_matrix, problem_key, register_flat_callback, register_matrix, solve_vrp,
+)
+from routers import route
+from tests import mock_osrm
 
 client = TestClient(app)
 
 
+def _client_for(transport, retries=0, breaker=None, max_table_size=100) -> RoutingClient:
+    return RoutingClient(
+        OSRMBackend("http://osrm.test", retries=retries, backoff_base=0.0, timeout=2.0,
+                    breaker=breaker, transport=transport),
+        HaversineBackend(),
+        max_table_size=max_table_size,
+    )
+
+
+def _refuse(request):
+    raise httpx.ConnectError("Connection refused", request=request)
+
+
+@pytest.fixture
+def osrm(monkeypatch):
+    """Route the sidecar at the in-process mock OSRM server."""
+    rc = _client_for(httpx.ASGITransport(app=mock_osrm.app))
+    monkeypatch.setattr(route, "routing", rc)
+    monkeypatch.setattr(route, "distance_cache", DistanceCache())
+    monkeypatch.setattr(route, "plan_cache", PlanCache())
+    return rc
+
+
+@pytest.fixture
+def osrm_down(monkeypatch):
+    rc = _client_for(httpx.MockTransport(_refuse))
+    monkeypatch.setattr(route, "routing", rc)
+    monkeypatch.setattr(route, "distance_cache", DistanceCache())
+    monkeypatch.setattr(route, "plan_cache", PlanCache())
+    return rc
+
+
 # ---------------------------------------------------------------------------
 # /route/directions
 # ---------------------------------------------------------------------------
@@ -53,16 +99,25 @@ class TestDirections:
         data = resp.json()
         assert "success" in data
 
-    @patch("routers.route.requests.get")
-    def test_directions_osrm_unavailable(self, mock_get):
-        mock_get.side_effect = Exception("Connection refused")
+    def test_directions_osrm_unavailable(self, osrm_down):
         resp = client.post("/route/directions", json={
             "origin": {"lat": 29.7604, "lng": -95.3698},
             "destination": {"lat": 32.7767, "lng": -96.7970},
         })
         data = resp.json()
         assert data["success"] is False
-        assert "error" in data
+        assert "OSRM unavailable" in data["error"]
+
+    def test_directions_via_mock_osrm(self, osrm):
+        resp = client.post("/route/directions", json={
+            "origin": {"lat": 29.7604, "lng": -95.3698},
+            "destination": {"lat": 32.7767, "lng": -96.7970},
+        })
+        data = resp.json()
+        assert data["success"] is True
+        assert data["source"] == "osrm"
+        assert 220 < data["distance_miles"] < 240  # great-circle Houston -> Dallas
+        assert data["geometry"]
 
 
 # ---------------------------------------------------------------------------
@@ -86,6 +141,31 @@ class TestMatrix:
             assert len(data["distances"]) == 3
             assert len(data["durations"]) == 3
 
+    def test_matrix_via_mock_osrm(self, osrm):
+        resp = client.post("/route/matrix", json={
+            "locations": [
+                {"lat": 29.7604, "lng": -95.3698},
+                {"lat": 32.7767, "lng": -96.7970},
+            ]
+        })
+        data = resp.json()
+        assert data["success"] is True
+        assert data["source"] == "osrm"
+        assert data["distances"][0][0] == 0
+        assert data["distances"][0][1] == data["distances"][1][0] > 0
+
+    def test_matrix_falls_back_to_haversine(self, osrm_down):
+        resp = client.post("/route/matrix", json={
+            "locations": [
+                {"lat": 29.7604, "lng": -95.3698},
+                {"lat": 32.7767, "lng": -96.7970},
+            ]
+        })
+        data = resp.json()
+        assert data["success"] is True
+        assert data["source"] == "haversine"
+        assert data["distances"][0][1] > 0
+
     def test_matrix_too_few_locations(self):
         resp = client.post("/route/matrix", json={
             "locations": [{"lat": 29.7604, "lng": -95.3698}]
@@ -93,10 +173,36 @@ class TestMatrix:
         assert resp.status_code == 400
 
     def test_matrix_too_many_locations(self):
-        locs = [{"lat": 29.0 + i * 0.01, "lng": -95.0} for i in range(101)]
+        locs = [{"lat": 29.0 + i * 0.001, "lng": -95.0} for i in range(route.MATRIX_MAX_LOCATIONS + 1)]
         resp = client.post("/route/matrix", json={"locations": locs})
         assert resp.status_code == 400
 
+    def test_matrix_beyond_single_table_is_tiled(self, osrm, monkeypatch):
+        osrm.max_table_size = 40
+        locs = [{"lat": 29.0 + i * 0.01, "lng": -95.0 + (i % 7) * 0.01} for i in range(150)]
+        data = client.post("/route/matrix", json={"locations": locs}).json()
+        assert data["success"] is True
+        assert len(data["distances"]) == 150
+        assert all(len(row) == 150 for row in data["distances"])
+
+    def test_matrix_binary_encodings(self, osrm):
+        locs = [{"lat": 29.0 + i * 0.05, "lng": -95.0} for i in range(12)]
+        plain = client.post("/route/matrix", json={"locations": locs}).json()
+        f32 = client.post("/route/matrix", json={"locations": locs, "encoding": "float32"}).json()
+        i32 = client.post("/route/matrix", json={"locations": locs, "encoding": "int32"}).json()
+        assert f32["shape"] == [12, 12] and f32["distances"] == []
+        meters = np.frombuffer(base64.b64decode(f32["distances_b64"]), dtype="<f4").reshape(12, 12)
+        seconds = np.frombuffer(base64.b64decode(i32["durations_b64"]), dtype="<i4").reshape(12, 12)
+        np.testing.assert_allclose(meters / 1609.344, plain["distances"], atol=0.06)
+        np.testing.assert_allclose(seconds / 60, plain["durations"], atol=0.06)
+
+    def test_matrix_unknown_encoding(self):
+        resp = client.post("/route/matrix", json={
+            "locations": [{"lat": 29.7604, "lng": -95.3698}, {"lat": 32.7767, "lng": -96.7970}],
+            "encoding": "msgpack",
+        })
+        assert resp.status_code == 400
+
 
 # ---------------------------------------------------------------------------
 # /route/optimize
@@ -139,3 +245,340 @@ class TestOptimize:
         })
         data = resp.json()
         assert "success" in data
+
+
+    def test_optimize_visits_every_stop_once(self, osrm, monkeypatch):
+        monkeypatch.setattr(route, "VRP_TIME_LIMIT_S", 1.0)
+        stops = [{"lat": 29.76 + 0.05 * (i % 5), "lng": -95.37 + 0.05 * (i // 5), "name": f"S{i}"}
+                 for i in range(20)]
+        resp = client.post("/route/optimize", json={
+            "depot": {"lat": 29.7604, "lng": -95.3698},
+            "stops": stops,
+            "max_vehicles": 3,
+        })
+        data = resp.json()
+        assert data["success"] is True
+        visited = sorted(s["index"] for r in data["routes"] for s in r["stops"])
+        assert visited == list(range(20))
+        assert data["total_distance_miles"] == pytest.approx(
+            sum(r["distance_miles"] for r in data["routes"]), abs=0.1 * len(data["routes"]))
+
+    # Houston-area stops ~5-15 minutes apart at the mock's 50 mph
+    DEPOT = {"lat": 29.7604, "lng": -95.3698}
+    STOPS = [{"lat": 29.76 + 0.03 * (i % 3), "lng": -95.37 + 0.04 * (i // 3), "name": f"S{i}"} for i in range(6)]
+
+    def test_optimize_enforces_time_windows(self, osrm):
+        windows = [[0, 600]] * 6
+        windows[4] = [0, 20]  # S4 early
+        windows[0] = [240, 300]  # S0 not before minute 240
+        resp = client.post("/route/optimize", json={
+            "depot": self.DEPOT, "stops": self.STOPS, "time_windows": windows,
+            "service_minutes": [15] * 6, "time_limit_seconds": 1,
+        })
+        data = resp.json()
+        assert data["success"] is True
+        stops = data["routes"][0]["stops"]
+        assert data["unassigned_stops"] == []
+        assert stops[-1]["index"] == 0  # the only stop open after minute 240
+        for stop in stops:
+            early, late = windows[stop["index"]]
+            assert early <= stop["arrival_minute"] <= late
+        # Service time separates consecutive arrivals
+        arrivals = [s["arrival_minute"] for s in stops]
+        assert all(b - a >= 15 for a, b in zip(arrivals, arrivals[1:]))
+
+    def test_optimize_drops_stops_that_cannot_fit(self, osrm):
+        windows = [[0, 600]] * 6
+        windows[2] = [0, 0]  # cannot be reached at minute 0
+        resp = client.post("/route/optimize", json={
+            "depot": self.DEPOT, "stops": self.STOPS, "time_windows": windows, "time_limit_seconds": 1,
+        })
+        data = resp.json()
+        assert data["success"] is True
+        assert data["unassigned_stops"] == [2]
+
+    def test_optimize_multi_depot(self, osrm):
+        far_depot = {"lat": 30.2672, "lng": -97.7431, "name": "Austin yard"}
+        austin_stops = [{"lat": 30.27 + 0.02 * i, "lng": -97.74, "name": f"A{i}"} for i in range(3)]
+        resp = client.post("/route/optimize", json={
+            "depot": self.DEPOT, "depots": [far_depot],
+            "stops": self.STOPS[:3] + austin_stops,
+            "max_vehicles": 2, "vehicle_start_depots": [0, 1],
+            "time_limit_seconds": 1,
+        })
+        data = resp.json()
+        assert data["success"] is True
+        by_vehicle = {r["vehicle"]: r for r in data["routes"]}
+        assert {s["name"] for s in by_vehicle[1]["stops"]} == {"A0", "A1", "A2"}
+        assert by_vehicle[1]["start_depot"] == by_vehicle[1]["end_depot"] == 1
+
+    def test_optimize_schedules_hos_break(self, osrm):
+        # ~5.5 h each way to Dallas and back: one 30-minute break needed within 8 h
+        resp = client.post("/route/optimize", json={
+            "depot": self.DEPOT,
+            "stops": [{"lat": 32.7767, "lng": -96.7970, "name": "Dallas"}],
+            "max_route_time_minutes": 840, "time_limit_seconds": 1,
+        })
+        data = resp.json()
+        assert data["success"] is True
+        route_plan = data["routes"][0]
+        assert route_plan["breaks"] and route_plan["breaks"][0]["duration_minutes"] == 30
+        assert route_plan["end_minute"] - route_plan["start_minute"] >= data["total_duration_hours"] * 60 + 30 - 1
+
+    def test_optimize_caches_plans_and_warm_starts(self, osrm):
+        body = {"depot": self.DEPOT, "stops": self.STOPS, "max_vehicles": 2, "time_limit_seconds": 1}
+        first = client.post("/route/optimize", json=body).json()
+        assert first["success"] is True and first["cached"] is False
+        again = client.post("/route/optimize", json=body).json()
+        assert again["cached"] is True
+        assert again["plan_id"] == first["plan_id"]
+        assert again["routes"] == first["routes"]
+
+        extra = {"lat": 29.80, "lng": -95.30, "name": "S6"}
+        changed = client.post("/route/optimize", json={
+            **body, "stops": self.STOPS + [extra], "previous_plan_id": first["plan_id"],
+        }).json()
+        assert changed["success"] is True
+        assert changed["cached"] is False and changed["warm_started"] is True
+        assert changed["plan_id"] != first["plan_id"]
+        assert sorted(s["index"] for r in changed["routes"] for s in r["stops"]) == list(range(7))
+
+    def test_optimize_does_not_serve_estimated_plans_from_cache(self, osrm_down, monkeypatch):
+        body = {"depot": self.DEPOT, "stops": self.STOPS, "max_vehicles": 2, "time_limit_seconds": 1}
+        first = client.post("/route/optimize", json=body).json()
+        assert first["success"] is True and first["cached"] is False
+
+        # OSRM is back: the estimated plan is solved again, not served from cache
+        monkeypatch.setattr(route, "routing", _client_for(httpx.ASGITransport(app=mock_osrm.app)))
+        again = client.post("/route/optimize", json=body).json()
+        assert again["cached"] is False
+        assert again["plan_id"] == first["plan_id"]
+
+        cached = client.post("/route/optimize", json=body).json()
+        assert cached["cached"] is True
+        assert cached["cache"] is None
+
+    def test_optimize_rejects_unknown_depot(self):
+        resp = client.post("/route/optimize", json={
+            "depot": self.DEPOT, "stops": self.STOPS, "max_vehicles": 2, "vehicle_start_depots": [0, 3],
+        })
+        assert resp.status_code == 400
+
+
+# ---------------------------------------------------------------------------
+# core.vrp
+# ---------------------------------------------------------------------------
+
+class TestVrp:
+    def test_integer_matrix_rounds_and_marks_unreachable(self):
+        m = integer_matrix(np.array([[0.0, 119.6], [np.nan, 30.0]]), 60.0)
+        assert m.dtype == np.int64
+        assert m.tolist() == [[0, 2], [UNREACHABLE, 0]]
+
+    def test_flat_callback_matches_transit_matrix(self):
+        from ortools.constraint_solver import pywrapcp
+
+        rng = np.random.default_rng(7)
+        costs = rng.integers(1, 1000, (12, 12))
+        np.fill_diagonal(costs, 0)
+
+        def objective(register):
+            manager = pywrapcp.RoutingIndexManager(12, 2, 0)
+            model = pywrapcp.RoutingModel(manager)
+            model.SetArcCostEvaluatorOfAllVehicles(register(model, manager, costs))
+            return model.SolveWithParameters(pywrapcp.DefaultRoutingSearchParameters()).ObjectiveValue()
+
+        assert objective(register_flat_callback) == objective(register_matrix)
+
+    def test_solve_vrp_respects_capacity(self):
+        coords = [(29.76, -95.37), (29.80, -95.37), (29.76, -95.30), (29.70, -95.40)]
+        distances = haversine_matrix_m(coords, coords)
+        plan = solve_vrp(distances, distances / 22.0, num_vehicles=3, demands=[0, 6, 6, 6],
+                         vehicle_capacity=10, time_limit_s=1)
+        routes = [r["nodes"] for r in plan["routes"]]
+        assert sorted(len(r) for r in routes) == [1, 1, 1]
+        assert sorted(n for r in routes for n in r) == [1, 2, 3]
+        assert plan["dropped"] == []
+
+    def test_plan_cache_expires_and_copies(self):
+        cache = PlanCache(capacity=2, ttl_s=60)
+        key = problem_key({"stops": [1, 2]})
+        assert key == problem_key({"stops": [1, 2]})
+        cache.put(key, {"routes": [[1]]})
+        got = cache.get(key)
+        got["routes"].append([2])
+        assert cache.get(key) == {"routes": [[1]]}
+        cache.ttl_s = 0
+        assert cache.get(key) is None
+
+
+# ---------------------------------------------------------------------------
+# core.routing_client
+# ---------------------------------------------------------------------------
+
+class TestRoutingClient:
+    COORDS = [(29.7604, -95.3698), (32.7767, -96.7970)]
+
+    def test_retries_transient_errors(self):
+        calls = []
+
+        def flaky(request):
+            calls.append(request)
+            if len(calls) < 3:
+                return httpx.Response(503)
+            return httpx.Response(200, json={"code": "Ok", "routes": []})
+
+        rc = _client_for(httpx.MockTransport(flaky), retries=2)
+        data = asyncio.run(rc.route(self.COORDS))
+        assert data["code"] == "Ok"
+        assert data["source"] == "osrm"
+        assert len(calls) == 3
+
+    def test_no_route_is_not_retried(self):
+        calls = []
+
+        def no_route(request):
+            calls.append(request)
+            return httpx.Response(400, json={"code": "NoRoute", "message": "Impossible route"})
+
+        rc = _client_for(httpx.MockTransport(no_route), retries=2)
+        data = asyncio.run(rc.route(self.COORDS))
+        assert data["code"] == "NoRoute"
+        assert len(calls) == 1
+        assert rc.primary.breaker.state == "closed"
+
+    def test_circuit_opens_and_fails_fast(self):
+        calls = []
+
+        def down(request):
+            calls.append(request)
+            raise httpx.ConnectError("Connection refused", request=request)
+
+        now = [0.0]
+        breaker = CircuitBreaker(threshold=2, reset_after=30.0, clock=lambda: now[0])
+        rc = _client_for(httpx.MockTransport(down), breaker=breaker)
+        for _ in range(2):
+            with pytest.raises(RoutingUnavailable):
+                asyncio.run(rc.route(self.COORDS))
+        assert breaker.state == "open"
+        with pytest.raises(RoutingUnavailable, match="circuit open"):
+            asyncio.run(rc.route(self.COORDS))
+        assert len(calls) == 2
+
+        # Tables still answer from the haversine fallback while the circuit is open.
+        data = asyncio.run(rc.table(self.COORDS))
+        assert data["source"] == "haversine"
+        assert len(calls) == 2
+
+        now[0] = 31.0
+        assert breaker.state == "half_open"
+        with pytest.raises(RoutingUnavailable):
+            asyncio.run(rc.route(self.COORDS))
+        assert breaker.state == "open"
+        assert len(calls) == 3
+
+    def test_table_sources_destinations(self, osrm):
+        coords = self.COORDS + [(30.2672, -97.7431)]
+        data = asyncio.run(osrm.table(coords, sources=[0], destinations=[1, 2]))
+        assert data["source"] == "osrm"
+        assert len(data["distances"]) == 1
+        assert len(data["distances"][0]) == 2
+
+    def test_tiled_matrix_matches_single_table(self):
+        calls = []
+
+        async def counting(request):
+            calls.append(request)
+            return await httpx.ASGITransport(app=mock_osrm.app).handle_async_request(request)
+
+        class CountingTransport(httpx.AsyncBaseTransport):
+            async def handle_async_request(self, request):
+                return await counting(request)
+
+        rc = _client_for(CountingTransport(), max_table_size=10)
+        rng = np.random.default_rng(3)
+        coords = [tuple(p) for p in np.c_[rng.uniform(29, 33, 23), rng.uniform(-98, -94, 23)].tolist()]
+        data = asyncio.run(rc.matrix(coords, sources=range(23), destinations=range(3, 20)))
+        assert data["source"] == "osrm"
+        assert data["distances"].shape == (23, 17)
+        assert data["tiles"] == len(calls) == 5 * 4  # 5 x 5 tiles: 5 row groups x 4 column groups
+        assert all(len(c.url.path.split(";")) <= 10 for c in calls)
+        expected, _ = HaversineBackend().matrix(coords, coords[3:20])
+        np.testing.assert_allclose(data["distances"], expected, atol=1.0)  # coords travel at 6 decimals
+
+    def test_haversine_backend_only(self, monkeypatch):
+        monkeypatch.setenv("ROUTING_BACKEND", "haversine")
+        rc = RoutingClient.from_env()
+        data = asyncio.run(rc.route(self.COORDS))
+        assert data["source"] == "haversine"
+        assert data["routes"][0]["duration"] > 0
+
+
+# ---------------------------------------------------------------------------
+# core.distance_cache
+# ---------------------------------------------------------------------------
+
+class TestDistanceCache:
+    HOUSTON, DALLAS, AUSTIN = (29.7604, -95.3698), (32.7767, -96.7970), (30.2672, -97.7431)
+
+    @staticmethod
+    def _recording_table(calls):
+        backend = HaversineBackend()
+
+        async def table(coords, profile="driving", sources=None, destinations=None):
+            calls.append((sources, destinations))
+            data = await backend.table(coords, profile, sources, destinations)
+            data["source"] = "osrm"
+            return data
+        return table
+
+    def test_repeat_matrix_is_served_from_cache(self, osrm):
+        body = {"locations": [{"lat": 29.7604, "lng": -95.3698}, {"lat": 32.7767, "lng": -96.7970}]}
+        first = client.post("/route/matrix", json=body).json()
+        second = client.post("/route/matrix", json=body).json()
+        assert first["cache"]["hit_ratio"] == 0.0
+        assert second["cache"] == {"hits": 2, "misses": 0, "hit_ratio": 1.0}
+        assert second["distances"] == first["distances"]
+
+    def test_fetches_only_missing_cells(self):
+        calls = []
+        cache = DistanceCache()
+        table = self._recording_table(calls)
+        asyncio.run(cached_matrix(table, cache, [self.HOUSTON, self.DALLAS]))
+        assert calls == [(None, None)]
+        result = asyncio.run(cached_matrix(table, cache, [self.HOUSTON, self.DALLAS, self.AUSTIN]))
+        # New Austin row against everything, then the known rows towards Austin.
+        assert calls[1:] == [([2], [0, 1]), ([0, 1], [2])]
+        assert result["cache"] == {"hits": 2, "misses": 4, "hit_ratio": 0.3333}
+        again = asyncio.run(cached_matrix(table, cache, [self.AUSTIN, self.HOUSTON, self.HOUSTON]))
+        assert len(calls) == 3
+        assert again["cache"]["hit_ratio"] == 1.0
+        assert again["distances"][1, 2] == 0.0
+
+    def test_nearby_coordinates_snap_to_the_same_cell(self):
+        calls = []
+        cache = DistanceCache(snap_m=50.0)
+        table = self._recording_table(calls)
+        step = cache.step_deg
+        center = (round(self.HOUSTON[0] / step) * step, round(self.HOUSTON[1] / step) * step)
+        nudged = (center[0] + 0.3 * step, center[1] - 0.3 * step)  # ~20 m away, same cell
+        asyncio.run(cached_matrix(table, cache, [center, self.DALLAS]))
+        result = asyncio.run(cached_matrix(table, cache, [nudged, self.DALLAS]))
+        assert len(calls) == 1
+        assert result["cache"]["hit_ratio"] == 1.0
+
+    def test_haversine_estimates_are_not_cached(self, osrm_down):
+        body = {"locations": [{"lat": 29.7604, "lng": -95.3698}, {"lat": 32.7767, "lng": -96.7970}]}
+        client.post("/route/matrix", json=body)
+        data = client.post("/route/matrix", json=body).json()
+        assert data["source"] == "haversine"
+        assert data["cache"]["hits"] == 0
+
+    def test_sqlite_persistence(self, tmp_path):
+        calls = []
+        path = str(tmp_path / "distances.db")
+        table = self._recording_table(calls)
+        asyncio.run(cached_matrix(table, DistanceCache(path=path), [self.HOUSTON, self.DALLAS]))
+        result = asyncio.run(cached_matrix(table, DistanceCache(path=path), [self.HOUSTON, self.DALLAS]))
+        assert len(calls) == 1
+        assert result["cache"]["hit_ratio"] == 1.0
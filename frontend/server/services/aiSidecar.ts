@@ -45,6 +45,31 @@ async function sidecarPost<T>(path: string, body: unknown): Promise<T | null> {
   }
 }
 
+/** POST a document's raw bytes (no base64) to one of the /ocr/*/upload endpoints. */
+async function sidecarUpload<T>(path: string, data: Uint8Array, mimeType: string): Promise<T | null> {
+  try {
+    const controller = new AbortController();
+    const timer = setTimeout(() => controller.abort(), TIMEOUT_MS);
+    const res = await fetch(`${SIDECAR_URL}${path}`, {
+      method: "POST",
+      headers: { "Content-Type": mimeType },
+      body: data,
+      signal: controller.signal,
+    });
+    clearTimeout(timer);
+    if (!res.ok) {
+      logger.warn(`[AISidecar] ${path} returned ${res.status}`);
+      return null;
+    }
+    return (await res.json()) as T;
+  } catch (err: any) {
+    if (err?.name !== "AbortError") {
+      logger.warn(`[AISidecar] ${path} unavailable:`, err?.message || err);
+    }
+    return null;
+  }
+}
+
 async function sidecarGet<T>(path: string): Promise<T | null> {
   try {
     const controller = new AbortController();
@@ -94,6 +119,7 @@ export interface OCRResult {
   lines: OCRLine[];
   tables: Array<{ headers: string[]; rows: any[][]; num_rows: number }>;
   avg_confidence: number;
+  cached?: boolean;
   error?: string;
 }
 
@@ -140,6 +166,7 @@ export interface BOLExtractResult {
   fields: BOLFields;
   raw_text: string;
   confidence: number;
+  cached?: boolean;
   error?: string;
 }
 
@@ -157,6 +184,7 @@ export interface RateSheetExtractResult {
   surcharges: Record<string, number>;
   metadata: Record<string, string>;
   raw_text: string;
+  cached?: boolean;
   error?: string;
 }
 
@@ -168,6 +196,112 @@ export async function ocrExtractRateSheet(fileBase64: string, mimeType = "applic
   });
 }
 
+/** ocrExtract for a file already in memory (e.g. a multer buffer); streams the raw bytes instead of base64. */
+export async function ocrExtractFile(data: Uint8Array, mimeType = "image/png", engine = "auto"): Promise<OCRResult | null> {
+  return sidecarUpload<OCRResult>(`/ocr/extract/upload?engine=${encodeURIComponent(engine)}`, data, mimeType);
+}
+
+/** ocrExtractBOL for raw file bytes. */
+export async function ocrExtractBOLFile(data: Uint8Array, mimeType = "image/png"): Promise<BOLExtractResult | null> {
+  return sidecarUpload<BOLExtractResult>("/ocr/bol/upload", data, mimeType);
+}
+
+/** ocrExtractRateSheet for raw file bytes. */
+export async function ocrExtractRateSheetFile(data: Uint8Array, mimeType = "application/pdf"): Promise<RateSheetExtractResult | null> {
+  return sidecarUpload<RateSheetExtractResult>("/ocr/ratesheet/upload", data, mimeType);
+}
+
+export interface OCRBatchDocument {
+  file_base64: string;
+  mime_type: string;
+  document_id?: string;
+}
+
+export interface OCRBatchDocumentEvent {
+  type: "document";
+  document_index: number;
+  document_id: string;
+  sha256: string;
+  mime_type: string;
+  page_count: number;
+  error?: string | null;
+}
+
+export interface OCRBatchPageEvent {
+  type: "page";
+  document_index: number;
+  document_id: string;
+  page: number;
+  page_count: number;
+  success: boolean;
+  engine: string;
+  text: string;
+  lines: Array<{ text: string; confidence: number; bbox?: number[][] }>;
+  avg_confidence: number;
+  cached: boolean;
+  elapsed_ms: number;
+  error?: string | null;
+}
+
+export interface OCRBatchSummary {
+  type: "summary";
+  documents: number;
+  pages: number;
+  pages_failed: number;
+  elapsed_ms: number;
+}
+
+export type OCRBatchEvent = OCRBatchDocumentEvent | OCRBatchPageEvent | OCRBatchSummary;
+
+const BATCH_TIMEOUT_MS = 10 * 60_000;
+
+/**
+ * OCR many documents / multi-page PDFs page by page in parallel.
+ * onEvent receives each document and page result as the sidecar streams it
+ * (in page order with ordered=true). Resolves to the final summary, or null on failure.
+ */
+export async function ocrBatch(
+  documents: OCRBatchDocument[],
+  onEvent: (event: OCRBatchEvent) => void,
+  options: { ordered?: boolean; dpi?: number } = {},
+): Promise<OCRBatchSummary | null> {
+  try {
+    const controller = new AbortController();
+    const timer = setTimeout(() => controller.abort(), BATCH_TIMEOUT_MS);
+    const res = await fetch(`${SIDECAR_URL}/ocr/batch`, {
+      method: "POST",
+      headers: { "Content-Type": "application/json" },
+      body: JSON.stringify({ documents, ordered: options.ordered ?? false, dpi: options.dpi ?? 200 }),
+      signal: controller.signal,
+    });
+    if (!res.ok || !res.body) {
+      clearTimeout(timer);
+      logger.warn(`[AISidecar] /ocr/batch returned ${res.status}`);
+      return null;
+    }
+    const decoder = new TextDecoder();
+    let buffered = "";
+    let summary: OCRBatchSummary | null = null;
+    for await (const chunk of res.body as any as AsyncIterable<Uint8Array>) {
+      buffered += decoder.decode(chunk, { stream: true });
+      let newline: number;
+      while ((newline = buffered.indexOf("\n")) >= 0) {
+        const line = buffered.slice(0, newline).trim();
+        buffered = buffered.slice(newline + 1);
+        if (!line) continue;
+        const event = JSON.parse(line) as OCRBatchEvent;
+        if (event.type === "summary") summary = event;
+        onEvent(event);
+      }
+    }
+    clearTimeout(timer);
+    return summary;
+  } catch (err: any) {
+    logger.warn(`[AISidecar] /ocr/batch unavailable:`, err?.message || err);
+    return null;
+  }
+}
+
 // ═══════════════════════════════════════════════════════════════════════════
 // ROUTE OPTIMIZATION
 // ═══════════════════════════════════════════════════════════════════════════
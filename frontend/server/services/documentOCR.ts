@@ -53,6 +53,9 @@ export interface DigitizeResult {
 // ---------------------------------------------------------------------------
 // 1. PaddleOCR (Python subprocess)
 // ---------------------------------------------------------------------------
+// paddleOCR.py reads the same setting and answers a few seconds before this limit
+const PADDLE_OCR_TIMEOUT_MS = (Number(process.env.PADDLE_OCR_TIMEOUT_S) || 60) * 1000;
+
 async function runPaddleOCR(base64Data: string): Promise<OCRResult | null> {
   const scriptPath = join(__dirname, "paddleOCR.py");  // ESM-safe __dirname defined above
   if (!existsSync(scriptPath)) return null;
@@ -65,7 +68,7 @@ async function runPaddleOCR(base64Data: string): Promise<OCRResult | null> {
     execFile(
       "python3",
       [scriptPath, tmpFile],
-      { timeout: 60000, maxBuffer: 10 * 1024 * 1024 },
+      { timeout: PADDLE_OCR_TIMEOUT_MS, maxBuffer: 10 * 1024 * 1024 },
       (error, stdout, stderr) => {
         // Cleanup
         try { unlinkSync(tmpFile); } catch {}
@@ -5,8 +5,21 @@ Extracts text from document images using PaddleOCR.
 Called from Node.js via child_process.
 
 Usage: python3 paddleOCR.py <base64_image_path>
+       python3 paddleOCR.py --health
 Output: JSON with extracted text lines and confidence scores.
 
+This is a thin client: the model lives in paddleOCRServer.py's long-lived
+workers, reached over a Unix socket and started here on first use. If the
+server cannot be reached or started, OCR runs in this process instead (with
+a full model load, as before).
+
+Environment:
+  PADDLE_OCR_SOCKET           server socket (default /tmp/eusotrip-paddleocr.sock)
+  PADDLE_OCR_AUTOSTART        start the server when it is not running (default 1)
+  PADDLE_OCR_START_TIMEOUT_S  wait this long for a started server's socket (default 20)
+  PADDLE_OCR_TIMEOUT_S        per-document limit (default 60); also documentOCR.ts's
+                              limit for this process, so replies come before it
+
 Install deps: pip3 install paddlepaddle paddleocr
 """
 
@@ -14,54 +27,96 @@ import sys
 import json
 import os
 import base64
+import socket
+import subprocess
 import tempfile
+import time
+from typing import Optional
+
+SERVICES_DIR = os.path.dirname(os.path.abspath(__file__))
+SOCKET_PATH = os.getenv("PADDLE_OCR_SOCKET", "/tmp/eusotrip-paddleocr.sock")
+AUTOSTART = os.getenv("PADDLE_OCR_AUTOSTART", "1") not in ("0", "false", "no")
+START_TIMEOUT_S = float(os.getenv("PADDLE_OCR_START_TIMEOUT_S", "20"))
+# documentOCR.ts kills this process after PADDLE_OCR_TIMEOUT_S: answer (with an
+# error if need be) a little before that, whatever the server is doing
+TIMEOUT_MARGIN_S = 5.0
+DEADLINE = time.monotonic() + max(float(os.getenv("PADDLE_OCR_TIMEOUT_S", "60")) - TIMEOUT_MARGIN_S, 1.0)
+
+
+def remaining_s() -> float:
+    return max(DEADLINE - time.monotonic(), 0.01)
+
+
+def _error(message: str) -> dict:
+    return {"success": False, "error": message, "text": "", "lines": []}
 
-def run_ocr(image_path: str) -> dict:
-    try:
-        from paddleocr import PaddleOCR
-    except ImportError:
-        return {
-            "success": False,
-            "error": "PaddleOCR not installed. Run: pip3 install paddlepaddle paddleocr",
-            "text": "",
-            "lines": [],
-        }
 
+def request_server(request: dict, timeout: Optional[float] = None):
+    """
+    Sends one JSON-lines request; returns the reply, or None if no server is
+    listening. Waits at most timeout seconds in all (default: until DEADLINE).
+    """
+    end = time.monotonic() + min(timeout or remaining_s(), remaining_s())
     try:
-        ocr = PaddleOCR(use_angle_cls=True, lang="en", show_log=False)
-        result = ocr.ocr(image_path, cls=True)
-
-        lines = []
-        full_text_parts = []
-
-        if result and result[0]:
-            for line in result[0]:
-                bbox = line[0]
-                text = line[1][0]
-                confidence = float(line[1][1])
-                lines.append({
-                    "text": text,
-                    "confidence": round(confidence, 4),
-                    "bbox": [[int(p[0]), int(p[1])] for p in bbox],
-                })
-                full_text_parts.append(text)
-
-        return {
-            "success": True,
-            "text": "\n".join(full_text_parts),
-            "lines": lines,
-            "lineCount": len(lines),
-            "avgConfidence": round(
-                sum(l["confidence"] for l in lines) / len(lines), 4
-            ) if lines else 0,
-        }
-    except Exception as e:
-        return {
-            "success": False,
-            "error": str(e),
-            "text": "",
-            "lines": [],
-        }
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(end - time.monotonic())
+            sock.connect(SOCKET_PATH)
+            sock.sendall(json.dumps(request).encode() + b"\n")
+            buffer = b""
+            while not buffer.endswith(b"\n"):
+                left = end - time.monotonic()
+                if left <= 0:
+                    raise socket.timeout("timed out")
+                sock.settimeout(left)
+                chunk = sock.recv(65536)
+                if not chunk:
+                    break
+                buffer += chunk
+    except (FileNotFoundError, ConnectionRefusedError):
+        return None
+    except OSError as e:
+        return _error(f"PaddleOCR server error: {e}")
+    if not buffer:
+        return None
+    try:
+        reply = json.loads(buffer)
+    except json.JSONDecodeError:
+        # The server died or the wait ran out mid-reply
+        return _error("PaddleOCR server error: incomplete reply")
+    reply.pop("id", None)
+    return reply
+
+
+def start_server() -> bool:
+    """Starts paddleOCRServer.py in the background and waits for its socket."""
+    # The server keeps its own copy of the log descriptor
+    with open(os.path.join(tempfile.gettempdir(), "eusotrip-paddleocr-server.log"), "a") as log:
+        subprocess.Popen(
+            [sys.executable, os.path.join(SERVICES_DIR, "paddleOCRServer.py"), "--socket", SOCKET_PATH],
+            stdin=subprocess.DEVNULL, stdout=log, stderr=log, start_new_session=True,
+        )
+    deadline = min(time.monotonic() + START_TIMEOUT_S, DEADLINE)
+    while time.monotonic() < deadline:
+        if request_server({"op": "health"}, timeout=5) is not None:
+            return True
+        time.sleep(0.1)
+    return False
+
+
+def run_ocr(image_path: str) -> dict:
+    result = request_server({"image_path": image_path})
+    if result is None and AUTOSTART and start_server():
+        result = request_server({"image_path": image_path})
+    if result is not None:
+        return result
+
+    # No server: load the model for this one document
+    from paddleOCRServer import load_model, ocr_image
+
+    ocr, error = load_model()
+    if ocr is None:
+        return _error(error)
+    return ocr_image(ocr, image_path)
 
 
 def main():
@@ -71,6 +126,11 @@ def main():
 
     input_arg = sys.argv[1]
 
+    if input_arg == "--health":
+        health = request_server({"op": "health"}, timeout=5)
+        print(json.dumps(health or {"success": False, "error": f"No PaddleOCR server on {SOCKET_PATH}"}))
+        sys.exit(0 if health else 1)
+
     # If input is a file path to a base64-encoded file, decode it first
     if input_arg.endswith(".b64"):
         with open(input_arg, "r") as f:
@@ -90,10 +150,12 @@ def main():
         tmp = tempfile.NamedTemporaryFile(suffix=ext, delete=False)
         tmp.write(raw)
         tmp.close()
+        # The server's workers open the file by path
+        os.chmod(tmp.name, 0o644)
         result = run_ocr(tmp.name)
         os.unlink(tmp.name)
     else:
-        result = run_ocr(input_arg)
+        result = run_ocr(os.path.abspath(input_arg))
 
     print(json.dumps(result))
 
@@ -0,0 +1,348 @@
+#!/usr/bin/env python3
+"""
+PaddleOCR Worker Service for EusoTrip Document Center
+Keeps N worker processes alive, each with a loaded PaddleOCR model, behind a
+Unix socket, so a document costs one inference instead of a model load.
+
+Usage: python3 paddleOCRServer.py [--socket PATH] [--workers N]
+Clients: paddleOCR.py (starts this service on demand), or anything that can
+write JSON lines to a Unix socket.
+
+Protocol: one JSON object per line in each direction; replies carry the
+request's "id" and may arrive out of order on a pipelined connection.
+  {"id": 1, "image_path": "/tmp/scan.png"}  -> same JSON as paddleOCR.py
+  {"id": 2, "op": "health"}                 -> {"success": true, "workers": [...], "queued": 0, ...}
+
+Each worker runs one document at a time; requests wait in a bounded queue
+and get {"success": false, "busy": true} when it is full. A worker that
+crashes, stops answering health pings or exceeds the per-document timeout
+is killed and replaced.
+
+Environment:
+  PADDLE_OCR_SOCKET      socket path (default /tmp/eusotrip-paddleocr.sock)
+  PADDLE_OCR_WORKERS     worker processes (default 2)
+  PADDLE_OCR_QUEUE       documents allowed to wait for a worker (default 32)
+  PADDLE_OCR_TIMEOUT_S   per-document limit (default 60)
+  PADDLE_OCR_IDLE_EXIT_S exit after this long without requests (default 0 = never)
+
+Install deps: pip3 install paddlepaddle paddleocr
+"""
+
+import argparse
+import asyncio
+import fcntl
+import json
+import logging
+import multiprocessing
+import os
+import signal
+import sys
+import time
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s [paddleocr-server] %(message)s")
+logger = logging.getLogger("paddleocr-server")
+
+DEFAULT_SOCKET = "/tmp/eusotrip-paddleocr.sock"
+HEALTH_INTERVAL_S = 15.0
+PING_TIMEOUT_S = 5.0
+
+
+# ---------------------------------------------------------------------------
+# OCR (runs inside worker processes)
+# ---------------------------------------------------------------------------
+
+def load_model():
+    """Returns (PaddleOCR instance, None) or (None, error message)."""
+    try:
+        from paddleocr import PaddleOCR
+    except ImportError:
+        return None, "PaddleOCR not installed. Run: pip3 install paddlepaddle paddleocr"
+    try:
+        return PaddleOCR(use_angle_cls=True, lang="en", show_log=False), None
+    except Exception as e:
+        return None, f"PaddleOCR failed to load: {e}"
+
+
+def ocr_image(ocr, image_path: str) -> dict:
+    """OCR one image with a loaded model; the JSON shape paddleOCR.py has always printed."""
+    try:
+        result = ocr.ocr(image_path, cls=True)
+
+        lines = []
+        full_text_parts = []
+
+        if result and result[0]:
+            for line in result[0]:
+                bbox = line[0]
+                text = line[1][0]
+                confidence = float(line[1][1])
+                lines.append({
+                    "text": text,
+                    "confidence": round(confidence, 4),
+                    "bbox": [[int(p[0]), int(p[1])] for p in bbox],
+                })
+                full_text_parts.append(text)
+
+        return {
+            "success": True,
+            "text": "\n".join(full_text_parts),
+            "lines": lines,
+            "lineCount": len(lines),
+            "avgConfidence": round(
+                sum(l["confidence"] for l in lines) / len(lines), 4
+            ) if lines else 0,
+        }
+    except Exception as e:
+        return {"success": False, "error": str(e), "text": "", "lines": []}
+
+
+def error_result(message: str, **extra) -> dict:
+    return {"success": False, "error": message, "text": "", "lines": [], **extra}
+
+
+def worker_main(conn, worker_id: int) -> None:
+    """Worker process: load the model once, then answer jobs on conn one at a time."""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # the server shuts workers down
+    ocr, load_error = load_model()
+    conn.send({"ready": True, "error": load_error})
+    while True:
+        try:
+            job = conn.recv()
+        except EOFError:
+            return
+        if job is None:
+            return
+        if job.get("op") == "ping":
+            conn.send({"pong": worker_id})
+        elif ocr is None:
+            conn.send(error_result(load_error))
+        else:
+            conn.send(ocr_image(ocr, job["image_path"]))
+
+
+# ---------------------------------------------------------------------------
+# Worker supervision (server process)
+# ---------------------------------------------------------------------------
+
+class Worker:
+    """One OCR process and the parent end of its pipe; used by one job at a time."""
+
+    def __init__(self, worker_id: int, ctx):
+        self.worker_id = worker_id
+        self.ctx = ctx
+        self.process = None
+        self.conn = None
+        self.ready = False
+        self.load_error = None
+        self.busy = False
+        self.lock = asyncio.Lock()  # jobs and health pings share the pipe
+        self.jobs_done = 0
+        self.restarts = -1
+        self.started_at = 0.0
+
+    def start(self) -> None:
+        parent, child = self.ctx.Pipe()
+        self.process = self.ctx.Process(target=worker_main, args=(child, self.worker_id),
+                                        name=f"paddleocr-worker-{self.worker_id}", daemon=True)
+        self.process.start()
+        child.close()
+        self.conn = parent
+        self.ready = False
+        self.restarts += 1
+        self.started_at = time.time()
+
+    def kill(self) -> None:
+        if self.process is not None and self.process.is_alive():
+            self.process.kill()
+            self.process.join(5)
+        if self.conn is not None:
+            self.conn.close()
+
+    def restart(self, reason: str) -> None:
+        logger.warning(f"Restarting worker {self.worker_id}: {reason}")
+        self.kill()
+        self.start()
+
+    def call(self, message: dict, timeout: float) -> dict:
+        """Blocking send + receive (run in a thread); raises TimeoutError / EOFError."""
+        if not self.ready:
+            # First use after (re)start: wait for the model load
+            if not self.conn.poll(max(timeout, 300.0)):
+                raise TimeoutError("model load timed out")
+            hello = self.conn.recv()
+            self.ready, self.load_error = True, hello.get("error")
+        self.conn.send(message)
+        if not self.conn.poll(timeout):
+            raise TimeoutError(f"no answer within {timeout:g}s")
+        return self.conn.recv()
+
+    def status(self) -> dict:
+        return {
+            "id": self.worker_id,
+            "pid": self.process.pid if self.process else None,
+            "alive": bool(self.process and self.process.is_alive()),
+            "ready": self.ready,
+            "busy": self.busy,
+            "jobs_done": self.jobs_done,
+            "restarts": self.restarts,
+            "uptime_s": round(time.time() - self.started_at, 1),
+            "load_error": self.load_error,
+        }
+
+
+class OCRServer:
+    def __init__(self, socket_path: str, workers: int, max_queue: int, timeout_s: float, idle_exit_s: float):
+        self.socket_path = socket_path
+        self.timeout_s = timeout_s
+        self.idle_exit_s = idle_exit_s
+        ctx = multiprocessing.get_context("spawn")
+        self.workers = [Worker(i, ctx) for i in range(workers)]
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.last_request = time.time()
+        self.stopping = asyncio.Event()
+
+    async def run_job(self, worker: Worker, message: dict, timeout_s: float) -> dict:
+        """One exchange with a worker; a worker that fails it is replaced before the error propagates."""
+        async with worker.lock:
+            worker.busy = True
+            try:
+                return await asyncio.get_running_loop().run_in_executor(None, worker.call, message, timeout_s)
+            except (TimeoutError, EOFError, OSError) as e:
+                worker.restart(str(e) or type(e).__name__)
+                raise
+            finally:
+                worker.busy = False
+
+    async def worker_loop(self, worker: Worker) -> None:
+        while True:
+            job, future = await self.queue.get()
+            if future.cancelled():
+                continue
+            try:
+                result = await self.run_job(worker, job, self.timeout_s)
+                worker.jobs_done += 1
+                self.completed += 1
+            except (TimeoutError, EOFError, OSError) as e:
+                self.failed += 1
+                result = error_result(f"OCR worker failed: {e or type(e).__name__}")
+            if not future.done():
+                future.set_result(result)
+
+    async def health_loop(self) -> None:
+        """Pings idle workers; replaces dead or unresponsive ones."""
+        while True:
+            await asyncio.sleep(HEALTH_INTERVAL_S)
+            for worker in self.workers:
+                if not worker.process.is_alive():
+                    worker.restart("process exited")
+                elif worker.ready and not worker.lock.locked():
+                    try:
+                        await self.run_job(worker, {"op": "ping"}, PING_TIMEOUT_S)
+                    except (TimeoutError, EOFError, OSError):
+                        pass  # already replaced
+            if self.idle_exit_s and time.time() - self.last_request > self.idle_exit_s and self.queue.empty():
+                logger.info(f"Idle for {self.idle_exit_s:g}s, exiting")
+                self.stopping.set()
+
+    def health(self) -> dict:
+        return {
+            "success": True,
+            "workers": [w.status() for w in self.workers],
+            "queued": self.queue.qsize(),
+            "max_queue": self.queue.maxsize,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+        }
+
+    async def handle_request(self, request: dict) -> dict:
+        self.last_request = time.time()
+        if request.get("op") == "health":
+            return self.health()
+        if not request.get("image_path"):
+            return error_result("No image_path provided")
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self.queue.put_nowait(({"image_path": request["image_path"]}, future))
+        except asyncio.QueueFull:
+            self.rejected += 1
+            return error_result(f"OCR queue full ({self.queue.maxsize} waiting)", busy=True)
+        return await future
+
+    async def handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        write_lock = asyncio.Lock()
+        pending = set()
+
+        async def answer(line: bytes) -> None:
+            try:
+                request = json.loads(line)
+                reply = await self.handle_request(request)
+                reply = {"id": request.get("id"), **reply}
+            except json.JSONDecodeError as e:
+                reply = error_result(f"Invalid JSON: {e}")
+            async with write_lock:
+                writer.write(json.dumps(reply).encode() + b"\n")
+                await writer.drain()
+
+        try:
+            while line := await reader.readline():
+                if line.strip():
+                    task = asyncio.create_task(answer(line))
+                    pending.add(task)
+                    task.add_done_callback(pending.discard)
+            await asyncio.gather(*pending, return_exceptions=True)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self) -> None:
+        for worker in self.workers:
+            worker.start()
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)  # stale: the startup lock says no other server owns it
+        server = await asyncio.start_unix_server(self.handle_client, path=self.socket_path)
+        os.chmod(self.socket_path, 0o600)
+        loops = [asyncio.create_task(self.worker_loop(w)) for w in self.workers]
+        loops.append(asyncio.create_task(self.health_loop()))
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, self.stopping.set)
+        logger.info(f"Listening on {self.socket_path} with {len(self.workers)} workers")
+        async with server:
+            await self.stopping.wait()
+        for task in loops:
+            task.cancel()
+        for worker in self.workers:
+            worker.kill()
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+        logger.info("Stopped")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="PaddleOCR worker service")
+    parser.add_argument("--socket", default=os.getenv("PADDLE_OCR_SOCKET", DEFAULT_SOCKET))
+    parser.add_argument("--workers", type=int, default=int(os.getenv("PADDLE_OCR_WORKERS", "2")))
+    parser.add_argument("--queue", type=int, default=int(os.getenv("PADDLE_OCR_QUEUE", "32")))
+    parser.add_argument("--timeout", type=float, default=float(os.getenv("PADDLE_OCR_TIMEOUT_S", "60")))
+    parser.add_argument("--idle-exit", type=float, default=float(os.getenv("PADDLE_OCR_IDLE_EXIT_S", "0")))
+    args = parser.parse_args()
+
+    # One server per socket: concurrent on-demand starts race for this lock
+    lock = open(args.socket + ".lock", "w")
+    try:
+        fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        logger.info(f"Another server owns {args.socket}")
+        sys.exit(0)
+
+    server = OCRServer(args.socket, args.workers, args.queue, args.timeout, args.idle_exit)
+    asyncio.run(server.serve())
+
+
+if __name__ == "__main__":
+    main()
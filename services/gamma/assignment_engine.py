@@ -0,0 +1,278 @@
+"""
+Assignment Engine (Load Optimization Service)
+
+One-to-one load/driver assignment for EsangAI.matchLoadsToDrivers. The score
+matrix is built with NumPy broadcasting from the same three signals the
+original greedy matcher used:
+
+    certification   50 points; a hazmat load is infeasible for a driver
+                    without its class (the greedy matcher's 50-point floor
+                    made this a hard requirement already)
+    safety rating   30 points x rating
+    proximity       20 points, falling linearly to 0 at DEADHEAD_SCALE_KM of
+                    haversine deadhead (driver -> load origin)
+
+and solved as a rectangular maximum-weight matching with
+scipy.optimize.linear_sum_assignment. Pairs that are infeasible, beyond
+max_deadhead_km or not above min_score score 0, so the solver may leave loads
+or drivers unmatched (partial matching).
+
+Scoring every pair is O(loads x drivers), so match_loads first generates
+candidates: DriverIndex keeps one KD-tree of driver positions (unit-sphere
+xyz, where chord length is monotonic in great-circle distance) per hazmat
+class, and each load origin pulls only its k nearest certified drivers within
+max_deadhead_km. The scorer then runs on that sparse candidate graph and
+scipy.sparse.csgraph.min_weight_full_bipartite_matching solves it, with one
+zero-score dummy driver per load so unmatched loads stay feasible.
+"""
+
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import min_weight_full_bipartite_matching
+from scipy.spatial import cKDTree
+
+EARTH_RADIUS_KM = 6371.0088
+CERT_WEIGHT = 50.0
+SAFETY_WEIGHT = 30.0
+PROXIMITY_WEIGHT = 20.0
+DEADHEAD_SCALE_KM = 800.0
+DEFAULT_MIN_SCORE = 50.0
+DEFAULT_CANDIDATES_K = 32  # nearest certified drivers considered per load; 0 scores every pair
+
+# hazmat_class values that do not require a certification
+NON_HAZMAT_CLASSES = frozenset({"", "NONE", "NON-HAZMAT", "NON_HAZMAT", "N/A"})
+
+_ROW_BLOCK = 1024  # load rows per broadcast block, bounds temporaries for large problems
+
+
+def normalize_class(hazmat_class: Optional[str]) -> str:
+    return (hazmat_class or "").strip().upper()
+
+
+def haversine_km_matrix(lat1: np.ndarray, lon1: np.ndarray, lat2: np.ndarray, lon2: np.ndarray) -> np.ndarray:
+    """(len(lat1), len(lat2)) great-circle distances in km; inputs in degrees."""
+    p1, l1 = np.radians(lat1)[:, None], np.radians(lon1)[:, None]
+    p2, l2 = np.radians(lat2)[None, :], np.radians(lon2)[None, :]
+    a = np.sin((p2 - p1) / 2.0) ** 2 + np.cos(p1) * np.cos(p2) * np.sin((l2 - l1) / 2.0) ** 2
+    return 2.0 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def certification_mask(load_classes: Sequence[str], driver_certs: Sequence[Iterable[str]]) -> np.ndarray:
+    """(L, D) bool: driver d may haul load l. Built from a (classes x drivers) table, one row per distinct class."""
+    classes = [normalize_class(c) for c in load_classes]
+    distinct = sorted(set(classes))
+    col = {c: i for i, c in enumerate(distinct)}
+    table = np.zeros((len(distinct), len(driver_certs)), dtype=bool)
+    for d, certs in enumerate(driver_certs):
+        for cert in certs:
+            i = col.get(normalize_class(cert))
+            if i is not None:
+                table[i, d] = True
+    for c, i in col.items():
+        if c in NON_HAZMAT_CLASSES:
+            table[i, :] = True
+    return table[np.array([col[c] for c in classes], dtype=np.int64)] if classes else np.zeros((0, len(driver_certs)), bool)
+
+
+def score_pairs(deadhead_km: np.ndarray, safety: np.ndarray) -> np.ndarray:
+    """Score of eligible pairs; deadhead_km and safety broadcast against each other."""
+    proximity = np.maximum(0.0, 1.0 - deadhead_km / DEADHEAD_SCALE_KM)
+    return CERT_WEIGHT + SAFETY_WEIGHT * safety + PROXIMITY_WEIGHT * proximity
+
+
+def unit_xyz(lat: np.ndarray, lon: np.ndarray) -> np.ndarray:
+    """(n, 3) points on the unit sphere; inputs in degrees."""
+    p, l = np.radians(lat), np.radians(lon)
+    cos_p = np.cos(p)
+    return np.column_stack((cos_p * np.cos(l), cos_p * np.sin(l), np.sin(p)))
+
+
+class DriverIndex:
+    """
+    Driver positions indexed for candidate generation: drivers are grouped by
+    hazmat certification once, and a KD-tree is built per class on first use.
+    Non-hazmat loads search a tree over every driver.
+    """
+
+    def __init__(self, driver_lat: np.ndarray, driver_lon: np.ndarray, driver_certs: Sequence[Iterable[str]]):
+        self.n_drivers = len(driver_lat)
+        self._xyz = unit_xyz(np.asarray(driver_lat, np.float64), np.asarray(driver_lon, np.float64))
+        by_class: Dict[str, List[int]] = {}
+        for d, certs in enumerate(driver_certs):
+            for cert in {normalize_class(c) for c in certs}:
+                by_class.setdefault(cert, []).append(d)
+        self._by_class = {c: np.array(ids, dtype=np.int64) for c, ids in by_class.items()}
+        self._trees: Dict[Optional[str], Optional[Tuple[cKDTree, np.ndarray]]] = {}
+
+    def drivers_for(self, hazmat_class: str) -> np.ndarray:
+        """Indices of drivers allowed to haul this (normalized) class."""
+        if hazmat_class in NON_HAZMAT_CLASSES:
+            return np.arange(self.n_drivers, dtype=np.int64)
+        return self._by_class.get(hazmat_class, np.zeros(0, dtype=np.int64))
+
+    def _tree(self, hazmat_class: str) -> Optional[Tuple[cKDTree, np.ndarray]]:
+        key = None if hazmat_class in NON_HAZMAT_CLASSES else hazmat_class
+        if key not in self._trees:
+            ids = self.drivers_for(hazmat_class)
+            self._trees[key] = (cKDTree(self._xyz[ids]), ids) if len(ids) else None
+        return self._trees[key]
+
+    def candidates(
+        self, load_lat: np.ndarray, load_lon: np.ndarray, load_classes: Sequence[str],
+        k: int = DEFAULT_CANDIDATES_K, max_deadhead_km: Optional[float] = None,
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Returns (load_idx, driver_idx, deadhead_km) for up to k nearest certified
+        drivers per load within max_deadhead_km.
+        """
+        xyz = unit_xyz(np.asarray(load_lat, np.float64), np.asarray(load_lon, np.float64))
+        classes = np.array([normalize_class(c) for c in load_classes], dtype=object)
+        bound = np.inf
+        if max_deadhead_km is not None:
+            # chord length of the deadhead arc; a hair of slack so the boundary is inclusive
+            bound = 2.0 * np.sin(min(max_deadhead_km / EARTH_RADIUS_KM, np.pi) / 2.0) * (1.0 + 1e-9) + 1e-12
+        rows, cols, dists = [], [], []
+        for cls in set(classes.tolist()):
+            entry = self._tree(cls)
+            if entry is None:
+                continue
+            tree, ids = entry
+            members = np.flatnonzero(classes == cls)
+            kk = min(k, len(ids))
+            chord, nn = tree.query(xyz[members], k=kk, distance_upper_bound=bound)
+            chord, nn = chord.reshape(len(members), kk), nn.reshape(len(members), kk)
+            found = nn < len(ids)
+            rows.append(np.broadcast_to(members[:, None], found.shape)[found])
+            cols.append(ids[nn[found]])
+            dists.append(chord[found])
+        if not rows:
+            empty = np.zeros(0, dtype=np.int64)
+            return empty, empty, np.zeros(0, dtype=np.float64)
+        chord = np.minimum(np.concatenate(dists), 2.0)
+        return np.concatenate(rows), np.concatenate(cols), 2.0 * EARTH_RADIUS_KM * np.arcsin(chord / 2.0)
+
+
+def score_matrix(
+    load_lat: np.ndarray, load_lon: np.ndarray, load_classes: Sequence[str],
+    driver_lat: np.ndarray, driver_lon: np.ndarray, driver_certs: Sequence[Iterable[str]],
+    safety: np.ndarray, max_deadhead_km: Optional[float] = None, min_score: float = DEFAULT_MIN_SCORE,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Returns (scores, deadhead_km), both (L, D). Scores of pairs that cannot be
+    matched (certification, deadhead limit, not above min_score) are 0.
+    """
+    n_loads, n_drivers = len(load_lat), len(driver_lat)
+    scores = np.zeros((n_loads, n_drivers), dtype=np.float64)
+    deadhead = np.empty((n_loads, n_drivers), dtype=np.float64)
+    eligible = certification_mask(load_classes, driver_certs)
+    safety = np.asarray(safety, dtype=np.float64)[None, :]
+    for start in range(0, n_loads, _ROW_BLOCK):
+        rows = slice(start, start + _ROW_BLOCK)
+        dh = haversine_km_matrix(load_lat[rows], load_lon[rows], driver_lat, driver_lon)
+        s = score_pairs(dh, safety)
+        ok = eligible[rows] & (s > min_score)
+        if max_deadhead_km is not None:
+            ok &= dh <= max_deadhead_km
+        scores[rows] = np.where(ok, s, 0.0)
+        deadhead[rows] = dh
+    return scores, deadhead
+
+
+def solve_assignment(scores: np.ndarray) -> List[Tuple[int, int]]:
+    """Maximum-weight one-to-one matching; pairs with score 0 are left unmatched."""
+    if scores.size == 0:
+        return []
+    rows, cols = linear_sum_assignment(scores, maximize=True)
+    keep = scores[rows, cols] > 0.0
+    return list(zip(rows[keep].tolist(), cols[keep].tolist()))
+
+
+def solve_sparse_assignment(
+    n_loads: int, n_drivers: int, rows: np.ndarray, cols: np.ndarray, scores: np.ndarray,
+) -> List[Tuple[int, int]]:
+    """
+    Maximum-weight one-to-one matching over candidate edges (rows[i], cols[i]) with
+    positive scores. Every load also gets a private dummy driver worth 0, so a full
+    matching of the loads always exists; dummy matches are returned as unmatched.
+    """
+    if len(scores) == 0:
+        return []
+    # Costs must be strictly positive: stored zeros would read as missing edges.
+    offset = float(scores.max()) + 1.0
+    load_ids = np.arange(n_loads, dtype=np.int64)
+    graph = csr_matrix(
+        (np.concatenate((offset - scores, np.full(n_loads, offset))),
+         (np.concatenate((rows, load_ids)), np.concatenate((cols, n_drivers + load_ids)))),
+        shape=(n_loads, n_drivers + n_loads),
+    )
+    r, c = min_weight_full_bipartite_matching(graph)
+    real = c < n_drivers
+    return list(zip(r[real].tolist(), c[real].tolist()))
+
+
+def match_loads(
+    loads: Sequence[Any], drivers: Sequence[Any],
+    max_deadhead_km: Optional[float] = None, min_score: float = DEFAULT_MIN_SCORE,
+    candidates_k: int = DEFAULT_CANDIDATES_K,
+) -> List[Dict[str, Any]]:
+    """
+    Assignment for Load/Driver models (or objects with the same fields), optimal
+    over each load's candidates_k nearest certified drivers (every driver when
+    candidates_k is 0). Returns dicts with load, driver, score and deadhead_km,
+    ordered by load.
+    """
+    if not loads or not drivers:
+        return []
+    if candidates_k > 0:
+        return _match_candidates(loads, drivers, max_deadhead_km, min_score, candidates_k)
+    scores, deadhead = score_matrix(
+        np.array([l.origin_lat for l in loads], dtype=np.float64),
+        np.array([l.origin_lon for l in loads], dtype=np.float64),
+        [l.hazmat_class for l in loads],
+        np.array([d.current_lat for d in drivers], dtype=np.float64),
+        np.array([d.current_lon for d in drivers], dtype=np.float64),
+        [d.hazmat_certifications for d in drivers],
+        np.array([d.safety_rating for d in drivers], dtype=np.float64),
+        max_deadhead_km=max_deadhead_km,
+        min_score=min_score,
+    )
+    return [
+        {"load": loads[r], "driver": drivers[c], "score": float(scores[r, c]), "deadhead_km": float(deadhead[r, c])}
+        for r, c in solve_assignment(scores)
+    ]
+
+
+def _match_candidates(
+    loads: Sequence[Any], drivers: Sequence[Any],
+    max_deadhead_km: Optional[float], min_score: float, k: int,
+) -> List[Dict[str, Any]]:
+    index = DriverIndex(
+        np.array([d.current_lat for d in drivers], dtype=np.float64),
+        np.array([d.current_lon for d in drivers], dtype=np.float64),
+        [d.hazmat_certifications for d in drivers],
+    )
+    rows, cols, deadhead = index.candidates(
+        np.array([l.origin_lat for l in loads], dtype=np.float64),
+        np.array([l.origin_lon for l in loads], dtype=np.float64),
+        [l.hazmat_class for l in loads],
+        k=k, max_deadhead_km=max_deadhead_km,
+    )
+    safety = np.array([d.safety_rating for d in drivers], dtype=np.float64)
+    scores = score_pairs(deadhead, safety[cols])
+    keep = scores > min_score
+    rows, cols, scores, deadhead = rows[keep], cols[keep], scores[keep], deadhead[keep]
+    pairs = sorted(solve_sparse_assignment(len(loads), len(drivers), rows, cols, scores))
+    if not pairs:
+        return []
+    # Locate each matched pair's candidate edge to report its score and deadhead.
+    keys = rows * len(drivers) + cols
+    order = np.argsort(keys)
+    matched = np.array(pairs, dtype=np.int64)
+    edges = order[np.searchsorted(keys[order], matched[:, 0] * len(drivers) + matched[:, 1])]
+    return [
+        {"load": loads[r], "driver": drivers[c], "score": float(scores[i]), "deadhead_km": float(deadhead[i])}
+        for (r, c), i in zip(pairs, edges.tolist())
+    ]
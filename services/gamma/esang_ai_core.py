@@ -36,7 +36,7 @@ class ESANGAICore:
         Returns:
             A dictionary containing the processed data and AI decision.
         """
-        logger.info(f"Processing data for service: {service_name}")
+        logger.debug("Processing data for service: %s", service_name)
         
         # Simple decision logic based on service
         if service_name == "HAZMAT_ERG":
@@ -0,0 +1,295 @@
+"""
+Geofence Engine (Geolocation Intelligence Service)
+
+Circle and polygon geofences indexed in a uniform lat/lon grid. Each fence is
+registered in every cell its bounding box touches, so a ping only tests the
+fences of its own cell: a binary search over the sorted cell keys, then an
+exact haversine (circles) or even-odd ray casting (polygons). The grid is
+stored CSR-style (sorted cell keys, offsets, flat fence indices) so a whole
+batch expands into (ping, fence) candidate pairs and is tested with NumPy.
+
+GeofenceStateTracker keeps the set of fences each vehicle is inside, so alerts
+fire on enter/exit transitions instead of on every ping.
+
+Fence sources (GEOFENCE_FILE environment variable, JSON):
+    {"fences": [{"id": "...", "type": "...", "lat": .., "lon": .., "radius_km": ..},
+                {"id": "...", "type": "...", "polygon": [[lat, lon], ...]}]}
+    a GeoJSON FeatureCollection (Polygon / MultiPolygon, or Point with a
+    "radius_km" property), or the legacy {name: {"lat", "lon", "radius_km", "type"}} map.
+"""
+
+import json
+import logging
+import math
+import os
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+logger = logging.getLogger('GEOFENCE_ENGINE')
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEG_LAT = 111.195
+DEFAULT_CELL_DEG = 0.25
+_KEY_STRIDE = 1_000_000  # row multiplier for packing (row, col) cell coordinates into one int64
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """Great-circle distance in km between points given in degrees (broadcasts)."""
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(v, dtype=np.float64)) for v in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2.0) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2.0) ** 2
+    return 2.0 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def points_in_rings(lat: np.ndarray, lon: np.ndarray, rings: List[np.ndarray]) -> np.ndarray:
+    """Even-odd point-in-polygon test of many points against one polygon (outer ring and holes)."""
+    inside = np.zeros(len(lat), dtype=bool)
+    py, px = lat[:, None], lon[:, None]
+    for ring in rings:
+        y0, x0 = ring[:, 0], ring[:, 1]
+        y1, x1 = np.roll(y0, -1), np.roll(x0, -1)
+        spans = (y0 > py) != (y1 > py)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            x_cross = (x1 - x0) * (py - y0) / (y1 - y0) + x0
+        inside ^= (np.count_nonzero(spans & (px < x_cross), axis=1) & 1).astype(bool)
+    return inside
+
+
+def _parse_fences(data: Any) -> List[Dict[str, Any]]:
+    """Normalize any supported fence document into a list of raw fence dicts."""
+    if isinstance(data, dict) and data.get("type") == "FeatureCollection":
+        fences = []
+        for i, feature in enumerate(data.get("features", [])):
+            props = dict(feature.get("properties") or {})
+            geom = feature.get("geometry") or {}
+            fence_id = props.pop("id", None) or feature.get("id") or f"fence_{i}"
+            if geom.get("type") == "Point":
+                lon, lat = geom["coordinates"][:2]
+                fences.append({"id": fence_id, "lat": lat, "lon": lon, **props})
+            elif geom.get("type") in ("Polygon", "MultiPolygon"):
+                polys = geom["coordinates"] if geom["type"] == "MultiPolygon" else [geom["coordinates"]]
+                # GeoJSON is [lon, lat]; every ring of every part joins the even-odd test.
+                rings = [[[pt[1], pt[0]] for pt in ring] for poly in polys for ring in poly]
+                fences.append({"id": fence_id, "rings": rings, **props})
+        return fences
+    if isinstance(data, dict) and "fences" in data:
+        return list(data["fences"])
+    if isinstance(data, dict):
+        return [{"id": name, **fence} for name, fence in data.items()]
+    return list(data)
+
+
+class GeofenceEngine:
+    """Grid-indexed circle/polygon geofences. Reads are lock-free; load() swaps the index atomically."""
+
+    def __init__(self, fences: Optional[Any] = None, cell_deg: float = DEFAULT_CELL_DEG):
+        self.cell_deg = cell_deg
+        self._fences: List[Dict[str, Any]] = []
+        self._by_id: Dict[str, Dict[str, Any]] = {}
+        self._index: Optional[Dict[str, np.ndarray]] = None
+        if fences is not None:
+            self.load(fences)
+
+    def __len__(self) -> int:
+        return len(self._fences)
+
+    @classmethod
+    def from_env(cls, default: Any) -> "GeofenceEngine":
+        """Fences from GEOFENCE_FILE when set, otherwise from default."""
+        path = os.getenv("GEOFENCE_FILE")
+        engine = cls()
+        if path:
+            engine.load_file(path)
+        else:
+            engine.load(default)
+        return engine
+
+    def load_file(self, path: str) -> int:
+        with open(path, "r") as f:
+            return self.load(json.load(f))
+
+    def load(self, data: Any) -> int:
+        fences: List[Dict[str, Any]] = []
+        cells: Dict[int, List[int]] = {}
+        for raw in _parse_fences(data):
+            fence = self._compile(raw)
+            if fence is None:
+                logger.warning(f"Skipping invalid geofence: {raw.get('id')}")
+                continue
+            idx = len(fences)
+            fences.append(fence)
+            lat_lo, lat_hi, lon_lo, lon_hi = fence["bbox"]
+            r0, c0 = self._cell(lat_lo, lon_lo)
+            r1, c1 = self._cell(lat_hi, lon_hi)
+            for r in range(r0, r1 + 1):
+                for c in range(c0, c1 + 1):
+                    cells.setdefault(r * _KEY_STRIDE + c, []).append(idx)
+
+        keys = sorted(cells)
+        counts = np.array([len(cells[k]) for k in keys], dtype=np.int64)
+        is_circle = np.array([f["shape"] == "circle" for f in fences], dtype=bool)
+        index = {
+            "keys": np.array(keys, dtype=np.int64),
+            "offsets": np.concatenate(([0], np.cumsum(counts))).astype(np.int64),
+            "members": np.array([i for k in keys for i in cells[k]], dtype=np.int64),
+            "is_circle": is_circle,
+            "lat": np.array([f.get("lat", np.nan) if c else np.nan for f, c in zip(fences, is_circle)]),
+            "lon": np.array([f.get("lon", np.nan) if c else np.nan for f, c in zip(fences, is_circle)]),
+            "radius_km": np.array([f["radius_km"] if c else np.nan for f, c in zip(fences, is_circle)]),
+            "bbox": np.array([f["bbox"] for f in fences], dtype=np.float64).reshape(-1, 4),
+        }
+        self._fences, self._by_id, self._index = fences, {f["id"]: f for f in fences}, index
+        logger.info(f"Loaded {len(fences)} geofences into {len(keys)} grid cells")
+        return len(fences)
+
+    def _cell(self, lat: float, lon: float) -> Tuple[int, int]:
+        return int(math.floor(lat / self.cell_deg)), int(math.floor(lon / self.cell_deg))
+
+    def _compile(self, raw: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        fence = {k: v for k, v in raw.items() if k not in ("polygon", "rings")}
+        fence["id"] = str(raw.get("id") or raw.get("name"))
+        fence.setdefault("type", "Generic")
+        rings = raw.get("rings") or ([raw["polygon"]] if raw.get("polygon") else None)
+        if rings:
+            arrays = [np.asarray(r, dtype=np.float64) for r in rings if len(r) >= 3]
+            if not arrays:
+                return None
+            pts = np.vstack(arrays)
+            fence.update(
+                shape="polygon",
+                rings=arrays,
+                vertices=int(len(pts)),
+                bbox=(pts[:, 0].min(), pts[:, 0].max(), pts[:, 1].min(), pts[:, 1].max()),
+            )
+            return fence
+        try:
+            lat, lon, radius = float(raw["lat"]), float(raw["lon"]), float(raw["radius_km"])
+        except (KeyError, TypeError, ValueError):
+            return None
+        dlat = radius / KM_PER_DEG_LAT
+        dlon = min(dlat / max(math.cos(math.radians(min(abs(lat) + dlat, 89.9))), 1e-6), 180.0)
+        fence.update(shape="circle", lat=lat, lon=lon, radius_km=radius,
+                     bbox=(lat - dlat, lat + dlat, lon - dlon, lon + dlon))
+        return fence
+
+    def fence(self, idx: int) -> Dict[str, Any]:
+        return self._fences[idx]
+
+    def get(self, fence_id: str) -> Optional[Dict[str, Any]]:
+        return self._by_id.get(fence_id)
+
+    def fence_ids(self, fence_idx: np.ndarray) -> List[str]:
+        fences = self._fences
+        return [fences[i]["id"] for i in fence_idx.tolist()]
+
+    def describe(self) -> Dict[str, Dict[str, Any]]:
+        """JSON-safe listing of the loaded fences (polygons report their vertex count)."""
+        out = {}
+        for f in self._fences:
+            out[f["id"]] = {k: v for k, v in f.items() if k not in ("id", "rings", "bbox")}
+        return out
+
+    def hits(self, latitude: Iterable[float], longitude: Iterable[float]) -> Tuple[np.ndarray, np.ndarray]:
+        """Return (ping_index, fence_index) for every (ping, fence) containment, ping-ordered."""
+        lat = np.asarray(latitude, dtype=np.float64)
+        lon = np.asarray(longitude, dtype=np.float64)
+        empty = np.zeros(0, dtype=np.int64)
+        fences, index = self._fences, self._index
+        if not len(lat) or index is None or not len(index["keys"]):
+            return empty, empty
+
+        # Cell of each ping -> position in the sorted key array (binary search).
+        keys = np.floor(lat / self.cell_deg).astype(np.int64) * _KEY_STRIDE + np.floor(lon / self.cell_deg).astype(np.int64)
+        pos = np.searchsorted(index["keys"], keys)
+        pos_clip = np.minimum(pos, len(index["keys"]) - 1)
+        found = index["keys"][pos_clip] == keys
+        if not found.any():
+            return empty, empty
+        pings = np.nonzero(found)[0]
+        cells = pos_clip[pings]
+
+        # Expand to (ping, fence) candidate pairs from the CSR rows.
+        starts = index["offsets"][cells]
+        counts = index["offsets"][cells + 1] - starts
+        pair_ping = np.repeat(pings, counts)
+        run_start = np.repeat(np.cumsum(counts) - counts, counts)
+        pair_fence = index["members"][np.repeat(starts, counts) + np.arange(len(pair_ping)) - run_start]
+
+        p_lat, p_lon = lat[pair_ping], lon[pair_ping]
+        bbox = index["bbox"][pair_fence]
+        inside = (p_lat >= bbox[:, 0]) & (p_lat <= bbox[:, 1]) & (p_lon >= bbox[:, 2]) & (p_lon <= bbox[:, 3])
+
+        circle = inside & index["is_circle"][pair_fence]
+        if circle.any():
+            c = np.nonzero(circle)[0]
+            fc = pair_fence[c]
+            inside[c] = haversine_km(p_lat[c], p_lon[c], index["lat"][fc], index["lon"][fc]) <= index["radius_km"][fc]
+
+        polygon = inside & ~index["is_circle"][pair_fence]
+        if polygon.any():
+            cand = np.nonzero(polygon)[0]
+            by_fence = cand[np.argsort(pair_fence[cand], kind="stable")]
+            fence_sorted = pair_fence[by_fence]
+            bounds = np.flatnonzero(np.diff(fence_sorted)) + 1
+            for group in np.split(by_fence, bounds):
+                rings = fences[int(pair_fence[group[0]])]["rings"]
+                inside[group] = points_in_rings(p_lat[group], p_lon[group], rings)
+
+        return pair_ping[inside], pair_fence[inside]
+
+
+class GeofenceStateTracker:
+    """Per-vehicle inside/outside state; only vehicles currently inside a fence are stored."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._inside: Dict[str, Set[str]] = {}
+
+    def __len__(self) -> int:
+        return len(self._inside)
+
+    def inside(self, vehicle_id: str) -> Set[str]:
+        with self._lock:
+            return set(self._inside.get(vehicle_id, ()))
+
+    def transitions(
+        self, vehicle_ids: List[Any], ping_idx: np.ndarray, fence_ids: List[str]
+    ) -> List[Tuple[int, str, str, str]]:
+        """
+        Advance state through a chronologically ordered batch.
+
+        ping_idx/fence_ids are the containment hits of the batch. Returns
+        (ping_index, vehicle_id, fence_id, "enter" | "exit") events in ping order.
+        """
+        hits_by_ping: Dict[int, Set[str]] = {}
+        for p, fid in zip(ping_idx.tolist(), fence_ids):
+            hits_by_ping.setdefault(p, set()).add(fid)
+
+        events: List[Tuple[int, str, str, str]] = []
+        with self._lock:
+            state = self._inside
+            # Only vehicles currently inside a fence, or hitting one in this batch, can
+            # transition; every ping of those vehicles is walked so an enter can be
+            # followed by its exit within the batch.
+            hit_vehicles = {vehicle_ids[i] for i in hits_by_ping}
+            for i, vid in enumerate(vehicle_ids):
+                if vid not in hit_vehicles and vid not in state:
+                    continue
+                now = hits_by_ping.get(i, set())
+                before = state.get(vid, set())
+                if now == before:
+                    continue
+                for fid in sorted(now - before):
+                    events.append((i, vid, fid, "enter"))
+                for fid in sorted(before - now):
+                    events.append((i, vid, fid, "exit"))
+                if now:
+                    state[vid] = now
+                else:
+                    state.pop(vid, None)
+        return events
+
+    def clear(self) -> None:
+        with self._lock:
+            self._inside.clear()
@@ -1,12 +1,18 @@
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Depends, Request
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
 from typing import Optional, Dict, Any, List
+import json
 import logging
+import os
 from datetime import datetime
-import random
+
+import numpy as np
 
 # Import the ESANG AI Core for decision support
 from esang_ai_core import esang_core
+from geofence_engine import GeofenceEngine, GeofenceStateTracker
+from route_deviation import DEFAULT_BUFFER_KM, RouteDeviationEngine, fetch_route_polyline
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
@@ -31,6 +37,14 @@ class GeofenceAlert(BaseModel):
     message: str
     confidence: float
 
+class PlannedRouteRequest(BaseModel):
+    route_id: str
+    polyline: Optional[str] = None  # OSRM/Google encoded polyline (precision 5)
+    coordinates: Optional[List[List[float]]] = None  # [[lat, lon], ...]
+    origin: Optional[Dict[str, float]] = None  # {"lat", "lng"}; fetched from the AI sidecar when no geometry is given
+    destination: Optional[Dict[str, float]] = None
+    buffer_km: float = DEFAULT_BUFFER_KM
+
 # --- 2. Geolocation Logic Simulation ---
 
 # Simulated Geofence Database (e.g., Refinery, Restricted Zone)
@@ -39,31 +53,77 @@ GEOFENCES = {
     "RESTRICTED_ZONE_LA": {"lat": 34.0522, "lon": -118.2437, "radius_km": 2.0, "type": "Restricted"},
 }
 
-def check_geofence_violation(location: Location) -> Optional[GeofenceAlert]:
-    """Simulates checking for geofence violations (e.g., unauthorized entry or deviation)."""
+MAX_BATCH_PINGS = 500_000
+
+# Grid-indexed fences (GEOFENCE_FILE overrides the defaults above) and per-load enter/exit state
+geofence_engine = GeofenceEngine.from_env(default=GEOFENCES)
+geofence_state = GeofenceStateTracker()
+
+
+def _fence_alert_type(fence_type: str, event: str) -> str:
+    if event == "exit":
+        return "Geofence Exit"
+    return "Geofence Violation" if fence_type == "Restricted" else "Geofence Entry"
+
+
+def _fence_type(fence_id: str) -> str:
+    fence = geofence_engine.get(fence_id)
+    return fence["type"] if fence else "Generic"
+
+
+def check_geofence_violation(location: Location, load_id: Optional[str] = None) -> List[GeofenceAlert]:
+    """
+    Checks a ping against the geofence index. With a load_id, only enter/exit
+    transitions alert. Returns every alert, restricted-zone violations first.
+    """
     
-    # Simple distance check simulation
-    for name, fence in GEOFENCES.items():
-        # In a real system, this would be a complex Haversine distance calculation
-        # For simulation, we check if the location is near the restricted zone LA
-        if name == "RESTRICTED_ZONE_LA" and abs(location.latitude - fence["lat"]) < 0.01 and abs(location.longitude - fence["lon"]) < 0.01:
-            return GeofenceAlert(
-                alert_type="Geofence Violation",
-                location=location,
-                message=f"Unauthorized entry into {name} (Restricted Zone LA).",
-                confidence=0.99
-            )
-            
-    # Simulate a random route deviation alert for demonstration
-    if random.random() < 0.05:
-        return GeofenceAlert(
-            alert_type="Route Deviation Alert",
+    pings, fences = geofence_engine.hits([location.latitude], [location.longitude])
+    fence_ids = geofence_engine.fence_ids(fences)
+    if load_id is not None:
+        events = [(fid, event) for _, _, fid, event in geofence_state.transitions([load_id], pings, fence_ids)]
+    else:
+        events = [(fid, "enter") for fid in fence_ids]
+    alerts = []
+    for fid, event in events:
+        fence_type = _fence_type(fid)
+        if event == "exit":
+            message = f"Exited {fid} ({fence_type})."
+        elif fence_type == "Restricted":
+            message = f"Unauthorized entry into {fid} (Restricted Zone)."
+        else:
+            message = f"Entered {fid} ({fence_type})."
+        alerts.append(GeofenceAlert(
+            alert_type=_fence_alert_type(fence_type, event),
             location=location,
-            message=f"Significant route deviation detected for load {location.latitude}. ESANG AI is re-optimizing.",
-            confidence=0.85
-        )
-        
-    return None
+            message=message,
+            confidence=0.99
+        ))
+    # The transitions are already committed to geofence_state, so none may be dropped
+    alerts.sort(key=lambda a: a.alert_type != "Geofence Violation")
+    return alerts
+
+
+# Planned-route corridors (cached by route id) and per-load deviation state
+route_engine = RouteDeviationEngine()
+
+
+def check_route_deviation(update: RouteCheck) -> Dict[str, Any]:
+    """Tests the ping against the planned route corridor; returns the deviation status."""
+    loc = update.current_location
+    return route_engine.check(update.load_id, update.planned_route_id, loc.latitude, loc.longitude)
+
+
+def deviation_alert(location: Location, load_id: str, deviation: Dict[str, Any]) -> Optional[GeofenceAlert]:
+    if deviation.get("event") != "deviation":
+        return None
+    off_by = deviation["distance_km"]
+    distance = f"{off_by} km" if off_by is not None else f"more than {deviation['buffer_km']} km"
+    return GeofenceAlert(
+        alert_type="Route Deviation Alert",
+        location=location,
+        message=f"Load {load_id} is {distance} off planned route {deviation['route_id']}. ESANG AI is re-optimizing.",
+        confidence=0.9
+    )
 
 # --- 3. FastAPI Application ---
 
@@ -87,7 +147,8 @@ async def get_service_status():
         "service_name": "Geolocation Intelligence Service",
         "status": "Operational",
         "last_update": datetime.now().isoformat(),
-        "geofences_monitored": len(GEOFENCES)
+        "geofences_monitored": len(geofence_engine),
+        "planned_routes_cached": len(route_engine)
     }
 
 @app.post("/geolocation/track-update", response_model=Dict[str, Any])
@@ -101,25 +162,145 @@ async def track_update(update: RouteCheck, db=Depends(get_db_connection)):
     ai_response = esang_core.process_data(ai_data, "GEOLOCATION_INTELLIGENCE")
     
     # 2. Geofence/Deviation Check
-    alert = check_geofence_violation(update.current_location)
+    deviation = check_route_deviation(update)
+    alerts = check_geofence_violation(update.current_location, update.load_id)
+    deviation_event = deviation_alert(update.current_location, update.load_id, deviation)
+    if deviation_event:
+        alerts.append(deviation_event)
     
     response = {
         "load_id": update.load_id,
         "timestamp": datetime.now().isoformat(),
         "ai_status": ai_response.get("ai_status"),
-        "geofence_alert": alert.dict() if alert else None
+        "geofence_alert": alerts[0].dict() if alerts else None,
+        "geofence_alerts": [alert.dict() for alert in alerts],
+        "route_deviation": deviation
     }
     
-    if alert:
+    for alert in alerts:
         logger.warning(f"ALERT: {alert.message} at {update.current_location.latitude}, {update.current_location.longitude}")
         # Here, we would send the alert back to Team Alpha's core API for logging and notification
         
     return response
 
+def parse_ping_batch(body: bytes, content_type: str) -> Dict[str, Any]:
+    """
+    Parses a telematics batch into columns. Accepts NDJSON (one ping object per line)
+    or a columnar JSON object: {"load_id": [...], "latitude": [...], "longitude": [...],
+    "timestamp": [...], "speed_kph": [...]} (timestamp and speed_kph optional).
+    """
+    if content_type.startswith("application/x-ndjson"):
+        rows = [json.loads(line) for line in body.splitlines() if line.strip()]
+        columns = {
+            "load_id": [r["load_id"] for r in rows],
+            "latitude": [r["latitude"] for r in rows],
+            "longitude": [r["longitude"] for r in rows],
+            "timestamp": [r.get("timestamp") for r in rows],
+        }
+    else:
+        columns = json.loads(body)
+        if not isinstance(columns, dict):
+            raise ValueError("Columnar batch must be a JSON object of arrays")
+
+    load_ids = list(columns["load_id"])
+    n = len(load_ids)
+    timestamps = columns.get("timestamp") or [None] * n
+    lat = np.asarray(columns["latitude"], dtype=np.float64)
+    lon = np.asarray(columns["longitude"], dtype=np.float64)
+    if lat.shape != (n,) or lon.shape != (n,) or len(timestamps) != n:
+        raise ValueError("All columns must have the same length")
+    return {"load_id": load_ids, "latitude": lat, "longitude": lon, "timestamp": timestamps}
+
+
+def evaluate_ping_batch(batch: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    Geofence check for a whole batch (pings in chronological order per load).
+    Returns one alert per enter/exit transition; pings that stay inside or
+    outside a fence produce nothing.
+    """
+    pings, fences = geofence_engine.hits(batch["latitude"], batch["longitude"])
+    events = geofence_state.transitions(batch["load_id"], pings, geofence_engine.fence_ids(fences))
+    alerts = []
+    for p, load_id, fence_id, event in events:
+        fence_type = _fence_type(fence_id)
+        alerts.append({
+            "load_id": load_id,
+            "event": event,
+            "alert_type": _fence_alert_type(fence_type, event),
+            "geofence": fence_id,
+            "geofence_type": fence_type,
+            "latitude": float(batch["latitude"][p]),
+            "longitude": float(batch["longitude"][p]),
+            "timestamp": batch["timestamp"][p],
+        })
+    return alerts
+
+
+@app.post("/geolocation/track-batch", response_model=Dict[str, Any])
+async def track_batch(request: Request, db=Depends(get_db_connection)):
+    """
+    Bulk telematics ingest (ELD pings). Body is NDJSON (Content-Type: application/x-ndjson)
+    or a columnar JSON object. Only alerts are returned.
+    """
+    body = await request.body()
+    # Parsing and evaluating a batch is CPU-bound: keep it off the event loop
+    try:
+        batch = await run_in_threadpool(parse_ping_batch, body, request.headers.get("content-type", ""))
+    except (ValueError, KeyError, TypeError) as e:
+        raise HTTPException(status_code=400, detail=f"Malformed ping batch: {e}")
+    if len(batch["load_id"]) > MAX_BATCH_PINGS:
+        raise HTTPException(status_code=413, detail=f"Batch exceeds {MAX_BATCH_PINGS} pings")
+
+    alerts = await run_in_threadpool(evaluate_ping_batch, batch)
+    if alerts:
+        logger.warning(f"{len(alerts)} geofence alerts in batch of {len(batch['load_id'])} pings")
+    return {
+        "received": len(batch["load_id"]),
+        "timestamp": datetime.now().isoformat(),
+        "alerts": alerts,
+    }
+
+@app.post("/geolocation/routes", response_model=Dict[str, Any])
+async def register_planned_route(req: PlannedRouteRequest):
+    """
+    Registers a planned route corridor for deviation checks. Accepts the polyline
+    from the AI sidecar's /route/directions, raw coordinates, or an origin and
+    destination to plan through the sidecar.
+    """
+    polyline = req.polyline
+    if not polyline and not req.coordinates:
+        if not (req.origin and req.destination):
+            raise HTTPException(status_code=400, detail="Provide polyline, coordinates, or origin and destination")
+        try:
+            # Blocking HTTP call (up to its timeout): keep it off the event loop
+            polyline = await run_in_threadpool(fetch_route_polyline, req.origin, req.destination)
+        except Exception as e:
+            raise HTTPException(status_code=502, detail=f"Route planning failed: {e}")
+    try:
+        route = route_engine.register(req.route_id, polyline=polyline, coordinates=req.coordinates, buffer_km=req.buffer_km)
+    except (ValueError, IndexError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid route geometry: {e}")
+    return {
+        "route_id": route.route_id,
+        "segments": len(route.a),
+        "length_km": round(route.length_km, 2),
+        "buffer_km": route.buffer_km,
+    }
+
 @app.get("/geolocation/geofences", response_model=Dict[str, Any])
 async def get_geofence_list():
     """Returns the list of currently monitored geofences."""
-    return {"geofences": GEOFENCES}
+    return {"geofences": geofence_engine.describe()}
+
+@app.post("/geolocation/geofences/reload", response_model=Dict[str, Any])
+async def reload_geofences():
+    """Reloads the geofence index from GEOFENCE_FILE (or the built-in defaults)."""
+    path = os.getenv("GEOFENCE_FILE")
+    try:
+        count = geofence_engine.load_file(path) if path else geofence_engine.load(GEOFENCES)
+    except (OSError, ValueError) as e:
+        raise HTTPException(status_code=500, detail=f"Failed to load geofences: {e}")
+    return {"geofences_loaded": count, "source": path or "built-in"}
 
 # To run: uvicorn geolocation_intelligence_service:app --host 0.0.0.0 --port 8003
 
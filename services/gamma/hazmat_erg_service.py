@@ -9,13 +9,14 @@ import math
 import re
 from datetime import datetime
 
-from sqlalchemy import create_engine, text
+from sqlalchemy import text
 from sqlalchemy.orm import sessionmaker
 
 from dotenv import load_dotenv
 
 # Import the ESANG AI Core for decision support
 from esang_ai_core import esang_core
+from db_pool import build_engine, pool_stats
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
@@ -66,11 +67,7 @@ def _get_engine():
     if _ENGINE is not None:
         return _ENGINE
 
-    db_url = _get_db_url()
-    connect_args = {}
-    if db_url.startswith("sqlite"):
-        connect_args = {"check_same_thread": False}
-    _ENGINE = create_engine(db_url, connect_args=connect_args)
+    _ENGINE = build_engine(_get_db_url())
     return _ENGINE
 
 
@@ -315,6 +312,13 @@ async def get_service_status():
         "esang_ai_status": ai_status['erg_ai_model']
     }
 
+@app.get("/metrics/db_pool")
+async def db_pool_metrics():
+    """Connection pool occupancy, overflow and checkout wait histogram for the ERG database."""
+    if _ENGINE is None:
+        return {"engine": None}
+    return {"engine": pool_stats(_ENGINE)}
+
 @app.post("/hazmat/check", response_model=HazmatCheckResponse)
 async def hazmat_identification(query: HazmatQuery, db=Depends(get_db_connection)):
     """
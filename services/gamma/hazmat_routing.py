@@ -0,0 +1,655 @@
+"""
+Hazmat Routing Engine (Load Optimization Service)
+
+Offline road-graph router behind EsangAI.calculateHazmatRoute. The road graph
+is held as a CSR adjacency array (indptr / head per directed edge) with edge
+length, travel time and a restriction bitmask:
+
+    bits 0-3    ADR tunnel category B, C, D, E
+    bits 4-12   class-specific bans (classes 1-9)
+    bit 13      hazmat=no, closed to all dangerous goods
+
+A hazmat class maps to a forbidden mask (forbidden_mask) and every search
+skips edges whose mask intersects it. Routes minimise travel time with one of
+
+    astar           A*, heuristic = great-circle distance at the fastest edge speed
+    bidirectional   bidirectional Dijkstra
+    ch              contraction hierarchy, preprocessed once per forbidden mask
+
+Graphs load from the JSON format of data/road_graph_sample.json or from an
+OSM XML extract (.osm). Nothing is fetched over the network.
+
+Environment:
+    ROAD_GRAPH_FILE     graph to load. Unset means no graph, and callers keep
+                        their estimate; "sample" loads the small Houston Ship
+                        Channel graph in data/ (tests and development only)
+    ROUTING_CONTRACT    "1" builds the contraction hierarchy of every hazmat
+                        profile at startup (about 0.8 ms per node in pure
+                        Python, so minutes on a metro extract); "0" (default)
+                        builds each one on its first ?method=ch query
+"""
+
+import heapq
+import json
+import logging
+import math
+import os
+import re
+import threading
+import xml.etree.ElementTree as ET
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+from assignment_engine import EARTH_RADIUS_KM, NON_HAZMAT_CLASSES, normalize_class, unit_xyz
+
+logger = logging.getLogger('HAZMAT_ROUTING')
+
+SAMPLE_GRAPH_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "road_graph_sample.json")
+MAX_SNAP_KM = 25.0  # origin/destination farther than this from any graph node are rejected
+
+# --- Restriction bitmask ---
+
+TUNNEL_CATEGORIES = ("B", "C", "D", "E")  # ADR order: B restricts the fewest goods, E all of them
+TUNNEL_BIT = {cat: 1 << i for i, cat in enumerate(TUNNEL_CATEGORIES)}
+CLASS_BIT = {str(c): 1 << (3 + c) for c in range(1, 10)}
+HAZMAT_BAN = 1 << 13
+
+# Tunnel restriction code per class, simplified from ADR 1.9.5 / 3.2 (the real
+# code depends on the UN number and packaging): a class is barred from tunnels
+# of its code's category and every more restrictive one.
+CLASS_TUNNEL_CODE = {"1": "B", "2": "C", "3": "D", "4": "D", "5": "D", "6": "D", "7": "E", "8": "E", "9": "E"}
+
+_CLASS_KEYWORDS = (
+    ("EXPLOSIVE", "1"), ("GAS", "2"), ("FLAMMABLE SOLID", "4"), ("FLAMMABLE", "3"),
+    ("OXIDIZ", "5"), ("PEROXIDE", "5"), ("TOXIC", "6"), ("POISON", "6"), ("INFECTIOUS", "6"),
+    ("RADIOACTIVE", "7"), ("CORROSIVE", "8"), ("MISC", "9"),
+)
+
+
+def class_key(hazmat_class: Optional[str]) -> Optional[str]:
+    """'3', 'Class 3', '2.1', 'FLAMMABLE' -> primary class digit; None for non-hazmat; '?' if unrecognised."""
+    value = normalize_class(hazmat_class)
+    if value in NON_HAZMAT_CLASSES:
+        return None
+    m = re.search(r"[1-9]", value)
+    if m:
+        return m.group(0)
+    for keyword, cls in _CLASS_KEYWORDS:
+        if keyword in value:
+            return cls
+    return "?"
+
+
+def forbidden_mask(hazmat_class: Optional[str]) -> int:
+    """Restriction bits a load of this class may not traverse."""
+    cls = class_key(hazmat_class)
+    if cls is None:
+        return 0
+    if cls == "?":
+        # Unknown dangerous goods: treat as the most restricted.
+        return HAZMAT_BAN | sum(TUNNEL_BIT.values())
+    code = TUNNEL_CATEGORIES.index(CLASS_TUNNEL_CODE[cls])
+    return HAZMAT_BAN | CLASS_BIT[cls] | sum(TUNNEL_BIT[c] for c in TUNNEL_CATEGORIES[code:])
+
+
+def describe_mask(mask: int) -> List[str]:
+    labels = [f"Tunnel category {c}" for c in TUNNEL_CATEGORIES if mask & TUNNEL_BIT[c]]
+    labels += [f"Class {c} ban" for c, bit in CLASS_BIT.items() if mask & bit]
+    if mask & HAZMAT_BAN:
+        labels.append("Hazmat prohibited")
+    return labels
+
+
+def restriction_mask(tunnel: Optional[str] = None, hazmat: Optional[str] = None,
+                     banned_classes: Iterable[str] = ()) -> int:
+    """Edge bitmask from a tunnel category, a hazmat=no flag and banned classes."""
+    mask = 0
+    tunnel = (tunnel or "").strip().upper()
+    if tunnel in TUNNEL_BIT:
+        mask |= TUNNEL_BIT[tunnel]
+    if (hazmat or "").strip().lower() == "no":
+        mask |= HAZMAT_BAN
+    for cls in banned_classes:
+        key = class_key(cls)
+        if key in CLASS_BIT:
+            mask |= CLASS_BIT[key]
+    return mask
+
+
+def _haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    a = math.sin((p2 - p1) / 2.0) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(math.radians(lon2 - lon1) / 2.0) ** 2
+    return 2.0 * EARTH_RADIUS_KM * math.asin(math.sqrt(min(a, 1.0)))
+
+
+# --- Road graph (CSR) ---
+
+class RoadGraph:
+    """Directed road graph in CSR form. Edges are sorted by tail node."""
+
+    def __init__(self, lat: Sequence[float], lon: Sequence[float],
+                 tail: Sequence[int], head: Sequence[int], length_km: Sequence[float],
+                 speed_kph: Sequence[float], mask: Sequence[int],
+                 edge_name: Sequence[int], names: List[str], node_ids: Optional[List[str]] = None):
+        self.lat = np.asarray(lat, dtype=np.float64)
+        self.lon = np.asarray(lon, dtype=np.float64)
+        n = len(self.lat)
+        tail = np.asarray(tail, dtype=np.int64)
+        order = np.argsort(tail, kind="stable")
+        self.tail = tail[order]
+        self.head = np.asarray(head, dtype=np.int64)[order]
+        self.length_km = np.asarray(length_km, dtype=np.float64)[order]
+        self.time_h = self.length_km / np.asarray(speed_kph, dtype=np.float64)[order]
+        self.mask = np.asarray(mask, dtype=np.uint32)[order]
+        self.edge_name = np.asarray(edge_name, dtype=np.int32)[order]
+        self.names = names
+        self.node_ids = node_ids or [str(i) for i in range(n)]
+        self.indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(self.tail, minlength=n), out=self.indptr[1:])
+        # Incoming edges by head node, for backward searches.
+        self.rev_edge = np.argsort(self.head, kind="stable")
+        self.rev_indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(self.head, minlength=n), out=self.rev_indptr[1:])
+        # Restriction bits present anywhere in the graph; profiles differing only elsewhere route identically.
+        self.present_mask = int(np.bitwise_or.reduce(self.mask)) if len(self.mask) else 0
+        self.max_speed_kph = float(np.max(self.length_km / self.time_h)) if len(self.head) else 1.0
+        self._tree = cKDTree(unit_xyz(self.lat, self.lon)) if n else None
+        # Plain lists: element access in the search loops is far cheaper than on ndarrays.
+        self._ptr = self.indptr.tolist()
+        self._head = self.head.tolist()
+        self._time = self.time_h.tolist()
+        self._mask = self.mask.tolist()
+        self._rptr = self.rev_indptr.tolist()
+        self._redge = self.rev_edge.tolist()
+        self._tail = self.tail.tolist()
+        self._lat = self.lat.tolist()
+        self._lon = self.lon.tolist()
+
+    @property
+    def n_nodes(self) -> int:
+        return len(self.lat)
+
+    @property
+    def n_edges(self) -> int:
+        return len(self.head)
+
+    def nearest_node(self, lat: float, lon: float) -> Tuple[int, float]:
+        """(node, distance_km) of the graph node closest to the point."""
+        chord, node = self._tree.query(unit_xyz(np.array([lat]), np.array([lon]))[0])
+        return int(node), 2.0 * EARTH_RADIUS_KM * math.asin(min(chord / 2.0, 1.0))
+
+    # -- searches; each returns (travel_time_h, [edge ids]) or None --
+
+    def _path_from_parents(self, parent_edge: Dict[int, int], node: int, source: int) -> List[int]:
+        edges = []
+        while node != source:
+            e = parent_edge[node]
+            edges.append(e)
+            node = self._tail[e]
+        edges.reverse()
+        return edges
+
+    def astar(self, source: int, target: int, forbidden: int = 0) -> Optional[Tuple[float, List[int]]]:
+        ptr, head, time_h, mask = self._ptr, self._head, self._time, self._mask
+        lat, lon = self._lat, self._lon
+        tlat, tlon, vmax = lat[target], lon[target], self.max_speed_kph
+
+        def h(v: int) -> float:
+            return _haversine_km(lat[v], lon[v], tlat, tlon) / vmax
+
+        dist = {source: 0.0}
+        parent: Dict[int, int] = {}
+        heap = [(h(source), source)]
+        closed = set()
+        while heap:
+            _, u = heapq.heappop(heap)
+            if u in closed:
+                continue
+            if u == target:
+                return dist[u], self._path_from_parents(parent, u, source)
+            closed.add(u)
+            du = dist[u]
+            for e in range(ptr[u], ptr[u + 1]):
+                if mask[e] & forbidden:
+                    continue
+                v = head[e]
+                nd = du + time_h[e]
+                if nd < dist.get(v, math.inf):
+                    dist[v] = nd
+                    parent[v] = e
+                    heapq.heappush(heap, (nd + h(v), v))
+        return None
+
+    def bidirectional_dijkstra(self, source: int, target: int, forbidden: int = 0) -> Optional[Tuple[float, List[int]]]:
+        if source == target:
+            return 0.0, []
+        ptr, head, time_h, mask = self._ptr, self._head, self._time, self._mask
+        rptr, redge, tail = self._rptr, self._redge, self._tail
+        dist = ({source: 0.0}, {target: 0.0})
+        parent: Tuple[Dict[int, int], Dict[int, int]] = ({}, {})
+        heaps = ([(0.0, source)], [(0.0, target)])
+        settled = (set(), set())
+        best, meet = math.inf, -1
+        while heaps[0] and heaps[1]:
+            if heaps[0][0][0] + heaps[1][0][0] >= best:
+                break
+            side = 0 if heaps[0][0][0] <= heaps[1][0][0] else 1
+            d, u = heapq.heappop(heaps[side])
+            if u in settled[side]:
+                continue
+            settled[side].add(u)
+            own, other = dist[side], dist[1 - side]
+            if side == 0:
+                edges = ((e, head[e]) for e in range(ptr[u], ptr[u + 1]))
+            else:
+                edges = ((e, tail[e]) for e in (redge[i] for i in range(rptr[u], rptr[u + 1])))
+            for e, v in edges:
+                if mask[e] & forbidden:
+                    continue
+                nd = d + time_h[e]
+                if nd < own.get(v, math.inf):
+                    own[v] = nd
+                    parent[side][v] = e
+                    heapq.heappush(heaps[side], (nd, v))
+                if v in other and nd + other[v] < best:
+                    best, meet = nd + other[v], v
+        if meet < 0:
+            return None
+        forward = self._path_from_parents(parent[0], meet, source)
+        backward = []
+        node = meet
+        while node != target:
+            e = parent[1][node]
+            backward.append(e)
+            node = head[e]
+        return best, forward + backward
+
+
+# --- Contraction hierarchies ---
+
+class ContractionHierarchy:
+    """
+    Contraction hierarchy of the sub-graph allowed under one forbidden mask.
+    Nodes are contracted in lazy edge-difference order with bounded witness
+    searches; queries run a bidirectional upward Dijkstra and unpack shortcuts.
+    """
+
+    WITNESS_SETTLE_LIMIT = 60
+    PRIORITY_SETTLE_LIMIT = 10  # cheaper witness searches when only estimating a node's priority
+
+    def __init__(self, graph: RoadGraph, forbidden: int = 0):
+        self.graph = graph
+        self.forbidden = forbidden
+        n = graph.n_nodes
+        out: List[Dict[int, float]] = [dict() for _ in range(n)]
+        inc: List[Dict[int, float]] = [dict() for _ in range(n)]
+        # (u, w) -> contracted middle node (>= 0) or -(edge id) - 1 for an original edge
+        self._via: Dict[Tuple[int, int], int] = {}
+        time_h, mask = graph._time, graph._mask
+        for e, (u, v) in enumerate(zip(graph._tail, graph._head)):
+            if u == v or mask[e] & forbidden:
+                continue
+            if time_h[e] < out[u].get(v, math.inf):
+                out[u][v] = inc[v][u] = time_h[e]
+                self._via[(u, v)] = -e - 1
+
+        rank = [0] * n
+        deleted_neighbours = [0] * n
+        up: List[List[Tuple[int, float]]] = [[] for _ in range(n)]
+        down: List[List[Tuple[int, float]]] = [[] for _ in range(n)]
+
+        def shortcuts(v: int, settle_limit: int = self.WITNESS_SETTLE_LIMIT) -> List[Tuple[int, int, float]]:
+            found = []
+            for u, w_uv in inc[v].items():
+                targets = {w: w_uv + w_vw for w, w_vw in out[v].items() if w != u}
+                if not targets:
+                    continue
+                dist = self._witness(out, u, v, targets, max(targets.values()), settle_limit)
+                found.extend((u, w, need) for w, need in targets.items() if dist.get(w, math.inf) > need)
+            return found
+
+        def priority(v: int) -> int:
+            edge_difference = len(shortcuts(v, self.PRIORITY_SETTLE_LIMIT)) - len(inc[v]) - len(out[v])
+            return 2 * edge_difference + deleted_neighbours[v]
+
+        heap = [(priority(v), v) for v in range(n)]
+        heapq.heapify(heap)
+        contracted = [False] * n
+        level = 0
+        while heap:
+            _, v = heapq.heappop(heap)
+            if contracted[v]:
+                continue
+            p = priority(v)
+            if heap and p > heap[0][0]:
+                heapq.heappush(heap, (p, v))
+                continue
+            for u, w, need in shortcuts(v):
+                if need < out[u].get(w, math.inf):
+                    out[u][w] = inc[w][u] = need
+                    self._via[(u, w)] = v
+            contracted[v] = True
+            rank[v] = level
+            level += 1
+            # Remaining neighbours all rank above v.
+            for w, t in out[v].items():
+                up[v].append((w, t))
+                del inc[w][v]
+                deleted_neighbours[w] += 1
+            for u, t in inc[v].items():
+                down[v].append((u, t))
+                del out[u][v]
+                deleted_neighbours[u] += 1
+            out[v], inc[v] = {}, {}
+
+        self.rank = rank
+        self.n_shortcuts = sum(1 for via in self._via.values() if via >= 0)
+        self._up, self._down = up, down
+
+    def _witness(self, out: List[Dict[int, float]], source: int, skip: int,
+                 targets: Dict[int, float], limit: float, settle_limit: int) -> Dict[int, float]:
+        dist = {source: 0.0}
+        heap = [(0.0, source)]
+        remaining = set(targets)
+        settled = 0
+        while heap and remaining and settled < settle_limit:
+            d, x = heapq.heappop(heap)
+            if d > dist[x]:
+                continue
+            if d > limit:
+                break
+            remaining.discard(x)
+            settled += 1
+            for y, t in out[x].items():
+                if y == skip:
+                    continue
+                nd = d + t
+                if nd < dist.get(y, math.inf):
+                    dist[y] = nd
+                    heapq.heappush(heap, (nd, y))
+        return dist
+
+    def query(self, source: int, target: int) -> Optional[Tuple[float, List[int]]]:
+        if source == target:
+            return 0.0, []
+        graphs = (self._up, self._down)
+        dist = ({source: 0.0}, {target: 0.0})
+        parent: Tuple[Dict[int, int], Dict[int, int]] = ({}, {})
+        heaps = ([(0.0, source)], [(0.0, target)])
+        best, meet = math.inf, -1
+        while heaps[0] or heaps[1]:
+            side = 0 if heaps[0] and (not heaps[1] or heaps[0][0][0] <= heaps[1][0][0]) else 1
+            d, u = heapq.heappop(heaps[side])
+            if d > dist[side][u]:
+                continue
+            if d >= best:
+                # Upward searches cannot stop at the first meeting; only once both queues pass best.
+                heaps[side].clear()
+                continue
+            other = dist[1 - side]
+            if u in other and d + other[u] < best:
+                best, meet = d + other[u], u
+            for v, t in graphs[side][u]:
+                nd = d + t
+                if nd < dist[side].get(v, math.inf):
+                    dist[side][v] = nd
+                    parent[side][v] = u
+                    heapq.heappush(heaps[side], (nd, v))
+        if meet < 0:
+            return None
+        nodes = [meet]
+        while nodes[-1] != source:
+            nodes.append(parent[0][nodes[-1]])
+        nodes.reverse()
+        node = meet
+        while node != target:
+            node = parent[1][node]
+            nodes.append(node)
+        edges: List[int] = []
+        for u, w in zip(nodes, nodes[1:]):
+            self._unpack(u, w, edges)
+        return best, edges
+
+    def _unpack(self, u: int, w: int, edges: List[int]) -> None:
+        stack = [(u, w)]
+        while stack:
+            a, b = stack.pop()
+            via = self._via[(a, b)]
+            if via < 0:
+                edges.append(-via - 1)
+            else:
+                stack.append((via, b))
+                stack.append((a, via))
+
+
+# --- Loaders ---
+
+def load_graph_json(data: Dict[str, Any]) -> RoadGraph:
+    """
+    {"nodes": [{"id", "lat", "lon"}], "edges": [{"from", "to", "name", "speed_kph",
+    "length_km"?, "oneway"?, "tunnel"?: "B".."E", "hazmat"?: "no", "hazmat_banned"?: ["1", ...]}]}
+    """
+    index = {str(n["id"]): i for i, n in enumerate(data["nodes"])}
+    lat = [float(n["lat"]) for n in data["nodes"]]
+    lon = [float(n["lon"]) for n in data["nodes"]]
+    names: List[str] = []
+    name_ix: Dict[str, int] = {}
+    cols: Tuple[List[Any], ...] = ([], [], [], [], [], [])
+    for edge in data["edges"]:
+        u, v = index[str(edge["from"])], index[str(edge["to"])]
+        length = float(edge.get("length_km") or _haversine_km(lat[u], lon[u], lat[v], lon[v]))
+        mask = restriction_mask(edge.get("tunnel"), edge.get("hazmat"), edge.get("hazmat_banned", ()))
+        name = edge.get("name", "")
+        ix = name_ix.setdefault(name, len(names))
+        if ix == len(names):
+            names.append(name)
+        pairs = [(u, v)] if edge.get("oneway") else [(u, v), (v, u)]
+        for a, b in pairs:
+            for col, value in zip(cols, (a, b, length, float(edge.get("speed_kph", 80.0)), mask, ix)):
+                col.append(value)
+    return RoadGraph(lat, lon, *cols, names, node_ids=[str(n["id"]) for n in data["nodes"]])
+
+
+# Default speeds (km/h) for OSM highway types that trucks may use.
+OSM_SPEED_KPH = {
+    "motorway": 105, "trunk": 90, "primary": 75, "secondary": 65, "tertiary": 55,
+    "motorway_link": 60, "trunk_link": 50, "primary_link": 45, "secondary_link": 40,
+    "tertiary_link": 35, "unclassified": 45, "residential": 35, "service": 20,
+}
+# hazmat:<key>=no on a way bans the matching class
+OSM_CLASS_KEYS = {"explosive": "1", "gas": "2", "flammable": "3", "toxic": "6", "radioactive": "7", "corrosive": "8"}
+
+
+def _osm_speed(tags: Dict[str, str]) -> float:
+    m = re.match(r"\s*(\d+(?:\.\d+)?)\s*(mph)?", tags.get("maxspeed", ""))
+    if m:
+        return float(m.group(1)) * (1.609344 if m.group(2) else 1.0)
+    return float(OSM_SPEED_KPH[tags["highway"]])
+
+
+def _osm_mask(tags: Dict[str, str]) -> int:
+    tunnel = tags.get("hazmat:adr_tunnel_cat") or tags.get("tunnel:hazmat")
+    banned = [cls for key, cls in OSM_CLASS_KEYS.items() if tags.get(f"hazmat:{key}") == "no"]
+    mask = restriction_mask(tunnel, tags.get("hazmat"), banned)
+    for cat in TUNNEL_CATEGORIES:
+        if tags.get(f"hazmat:{cat}") == "no":
+            mask |= TUNNEL_BIT[cat]
+    return mask
+
+
+def load_graph_osm(path: str) -> RoadGraph:
+    """
+    Drivable ways of an OSM XML extract. Every way node becomes a graph node;
+    restrictions come from hazmat=no, hazmat:adr_tunnel_cat, hazmat:<B..E>=no
+    and hazmat:<explosive|gas|flammable|...>=no tags.
+    """
+    coords: Dict[str, Tuple[float, float]] = {}
+    ways: List[Tuple[List[str], Dict[str, str]]] = []
+    for _, elem in ET.iterparse(path, events=("end",)):
+        if elem.tag == "node":
+            coords[elem.get("id")] = (float(elem.get("lat")), float(elem.get("lon")))
+            elem.clear()
+        elif elem.tag == "way":
+            tags = {t.get("k"): t.get("v") for t in elem.iter("tag")}
+            if tags.get("highway") in OSM_SPEED_KPH and tags.get("access") not in ("no", "private"):
+                ways.append(([nd.get("ref") for nd in elem.iter("nd")], tags))
+            elem.clear()
+
+    index: Dict[str, int] = {}
+    lat: List[float] = []
+    lon: List[float] = []
+    names: List[str] = []
+    name_ix: Dict[str, int] = {}
+    cols: Tuple[List[Any], ...] = ([], [], [], [], [], [])
+    for refs, tags in ways:
+        refs = [r for r in refs if r in coords]
+        for r in refs:
+            if r not in index:
+                index[r] = len(lat)
+                lat.append(coords[r][0])
+                lon.append(coords[r][1])
+        speed, mask = _osm_speed(tags), _osm_mask(tags)
+        name = tags.get("name") or tags.get("ref") or ""
+        ix = name_ix.setdefault(name, len(names))
+        if ix == len(names):
+            names.append(name)
+        oneway = tags.get("oneway")
+        for a, b in zip(refs, refs[1:]):
+            u, v = index[a], index[b]
+            length = _haversine_km(lat[u], lon[u], lat[v], lon[v])
+            pairs = [(v, u)] if oneway == "-1" else [(u, v)] if oneway in ("yes", "true", "1") else [(u, v), (v, u)]
+            for x, y in pairs:
+                for col, value in zip(cols, (x, y, length, speed, mask, ix)):
+                    col.append(value)
+    logger.info(f"Loaded OSM extract {path}: {len(lat)} nodes, {len(cols[0])} directed edges")
+    return RoadGraph(lat, lon, *cols, names, node_ids=list(index))
+
+
+# --- Router ---
+
+class HazmatRouter:
+    """Road graph plus contraction hierarchies cached per forbidden mask. Thread-safe."""
+
+    METHODS = ("auto", "astar", "bidirectional", "ch")
+
+    def __init__(self, graph: RoadGraph):
+        self.graph = graph
+        self._ch: Dict[int, ContractionHierarchy] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_file(cls, path: str) -> "HazmatRouter":
+        if path.endswith((".osm", ".xml")):
+            return cls(load_graph_osm(path))
+        with open(path, "r") as f:
+            return cls(load_graph_json(json.load(f)))
+
+    @classmethod
+    def from_env(cls) -> Optional["HazmatRouter"]:
+        """The router for ROAD_GRAPH_FILE, or None when no graph is configured."""
+        path = os.getenv("ROAD_GRAPH_FILE")
+        if not path:
+            logger.warning("ROAD_GRAPH_FILE not set: hazmat routes fall back to the estimate")
+            return None
+        router = cls.from_file(SAMPLE_GRAPH_FILE if path == "sample" else path)
+        if os.getenv("ROUTING_CONTRACT", "0") == "1":
+            router.prepare()
+        return router
+
+    def profiles(self, hazmat_classes: Optional[Iterable[Optional[str]]] = None) -> List[int]:
+        classes = [None, *CLASS_TUNNEL_CODE] if hazmat_classes is None else hazmat_classes
+        return sorted({forbidden_mask(c) & self.graph.present_mask for c in classes})
+
+    def hierarchy(self, forbidden: int) -> ContractionHierarchy:
+        forbidden &= self.graph.present_mask
+        ch = self._ch.get(forbidden)
+        if ch is not None:
+            # Built hierarchies are read-only; only a build holds the lock
+            return ch
+        with self._lock:
+            ch = self._ch.get(forbidden)
+            if ch is None:
+                ch = self._ch[forbidden] = ContractionHierarchy(self.graph, forbidden)
+                logger.info(f"Contracted profile {forbidden:#06x}: {ch.n_shortcuts} shortcuts")
+            return ch
+
+    def prepare(self, hazmat_classes: Optional[Iterable[Optional[str]]] = None) -> int:
+        """Builds the contraction hierarchy for each distinct profile (all classes by default)."""
+        for forbidden in self.profiles(hazmat_classes):
+            self.hierarchy(forbidden)
+        return len(self._ch)
+
+    def shortest_path(self, source: int, target: int, forbidden: int,
+                      method: str = "auto") -> Optional[Tuple[float, List[int]]]:
+        forbidden &= self.graph.present_mask
+        if method == "auto":
+            # Only an already built hierarchy: auto never contracts on the request path
+            ch = self._ch.get(forbidden)
+            if ch is not None:
+                return ch.query(source, target)
+            method = "astar"
+        if method == "ch":
+            return self.hierarchy(forbidden).query(source, target)
+        if method == "bidirectional":
+            return self.graph.bidirectional_dijkstra(source, target, forbidden)
+        if method == "astar":
+            return self.graph.astar(source, target, forbidden)
+        raise ValueError(f"Unknown routing method: {method}")
+
+    def _summary(self, edges: List[int], travel_h: float) -> Dict[str, Any]:
+        g = self.graph
+        mask = int(np.bitwise_or.reduce(g.mask[edges])) if edges else 0
+        return {
+            "distance_km": float(g.length_km[edges].sum()) if edges else 0.0,
+            "duration_hrs": travel_h,
+            "restriction_mask": mask,
+            "edges": edges,
+        }
+
+    def route(self, origin: Tuple[float, float], destination: Tuple[float, float],
+              hazmat_class: Optional[str], method: str = "auto") -> Dict[str, Any]:
+        """
+        Fastest route for the class. Returns distance_km, duration_hrs,
+        is_hazmat_compliant, restrictions_avoided (restricted roads on the
+        unrestricted fastest route that this route detours around), roads and
+        coordinates. Raises ValueError if an endpoint is off the graph or no
+        road path exists at all.
+        """
+        g = self.graph
+        source, snap_o = g.nearest_node(*origin)
+        target, snap_d = g.nearest_node(*destination)
+        if max(snap_o, snap_d) > MAX_SNAP_KM:
+            raise ValueError(f"Origin or destination is more than {MAX_SNAP_KM} km from the road graph")
+        forbidden = forbidden_mask(hazmat_class)
+        fastest = self.shortest_path(source, target, 0, method)
+        if fastest is None:
+            raise ValueError("No road path between origin and destination")
+        compliant = self.shortest_path(source, target, forbidden, method) if forbidden else fastest
+
+        if compliant is None:
+            # Every path crosses a restriction; report the fastest one as non-compliant.
+            result = self._summary(fastest[1], fastest[0])
+            result.update(is_hazmat_compliant=False, restrictions_avoided=[],
+                          restrictions_violated=self._restricted_roads(fastest[1], forbidden))
+        else:
+            result = self._summary(compliant[1], compliant[0])
+            result.update(is_hazmat_compliant=True, restrictions_violated=[],
+                          restrictions_avoided=self._restricted_roads(fastest[1], forbidden))
+        edges = result.pop("edges")
+        nodes = [source] + g.head[edges].tolist()
+        result["roads"] = [g.names[i] for i in dict.fromkeys(g.edge_name[edges].tolist()) if g.names[i]]
+        result["coordinates"] = [[g._lat[v], g._lon[v]] for v in nodes]
+        return result
+
+    def _restricted_roads(self, edges: List[int], forbidden: int) -> List[str]:
+        g = self.graph
+        labels = []
+        for e in edges:
+            hit = int(g.mask[e]) & forbidden
+            if hit:
+                label = f"{', '.join(describe_mask(hit))}: {g.names[g.edge_name[e]] or 'unnamed road'}"
+                if label not in labels:
+                    labels.append(label)
+        return labels
@@ -1,12 +1,18 @@
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Depends, Query
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Literal
 import logging
+import math
+import os
 from datetime import datetime
 import random
 
 # Import the ESANG AI Core for decision support
 from esang_ai_core import esang_core
+from assignment_engine import DEFAULT_CANDIDATES_K, DEFAULT_MIN_SCORE, match_loads
+from matching_session import MatchingSession
+from hazmat_routing import HazmatRouter
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
@@ -37,6 +43,16 @@ class LoadMatch(BaseModel):
     match_score: float
     reasoning: str
 
+class MatchingEvent(BaseModel):
+    op: Literal["upsert", "remove"]
+    entity: Literal["load", "driver"]
+    data: Optional[Dict[str, Any]] = None  # Load / Driver fields for upsert
+    id: Optional[str] = None  # load_id / driver_id for remove
+
+class MatchingEventBatch(BaseModel):
+    events: List[MatchingEvent]
+    full_resolve: bool = False
+
 class Route(BaseModel):
     route_id: str
     distance_km: float
@@ -47,59 +63,66 @@ class Route(BaseModel):
 
 # --- 2. Load Optimization Logic Simulation ---
 
-def simulate_load_matching(loads: List[Load], drivers: List[Driver]) -> List[LoadMatch]:
+def simulate_load_matching(loads: List[Load], drivers: List[Driver],
+                           max_deadhead_km: Optional[float] = None,
+                           min_score: float = DEFAULT_MIN_SCORE,
+                           candidates_k: int = DEFAULT_CANDIDATES_K) -> List[LoadMatch]:
     """
-    Simulates the EsangAI.matchLoadsToDrivers function from fuel-loading-algorithm.txt.
-    Logic: Prioritize drivers with matching certifications and high safety ratings.
+    Implements the EsangAI.matchLoadsToDrivers function from fuel-loading-algorithm.txt.
+    Logic: Prioritize drivers with matching certifications, high safety ratings and low
+    deadhead, solved as an optimal one-to-one assignment (each driver gets at most one load)
+    over each load's candidates_k nearest certified drivers.
     """
     matches = []
-    
-    for load in loads:
-        best_match_score = -1.0
-        best_driver = None
-        
-        for driver in drivers:
-            score = 0.0
-            
-            # 1. Certification Match (High Weight)
-            if load.hazmat_class in driver.hazmat_certifications:
-                score += 50.0
-            
-            # 2. Safety Rating (Medium Weight)
-            score += driver.safety_rating * 30.0
-            
-            # 3. Proximity to Origin (Low Weight - simplified)
-            distance_score = 20.0 * (1 - (abs(driver.current_lat - load.origin_lat) + abs(driver.current_lon - load.origin_lon)) / 100)
-            score += max(0, distance_score)
-            
-            if score > best_match_score:
-                best_match_score = score
-                best_driver = driver
-        
-        if best_driver and best_match_score > 50.0:
-            matches.append(LoadMatch(
-                load_id=load.load_id,
-                driver_id=best_driver.driver_id,
-                match_score=round(best_match_score, 2),
-                reasoning=f"High match due to {load.hazmat_class} certification and safety rating of {best_driver.safety_rating}."
-            ))
-            
+    for m in match_loads(loads, drivers, max_deadhead_km=max_deadhead_km, min_score=min_score,
+                         candidates_k=candidates_k):
+        load, driver = m["load"], m["driver"]
+        matches.append(LoadMatch(
+            load_id=load.load_id,
+            driver_id=driver.driver_id,
+            match_score=round(m["score"], 2),
+            reasoning=f"Optimal assignment: {load.hazmat_class} certification, safety rating of {driver.safety_rating}, {m['deadhead_km']:.0f} km deadhead."
+        ))
     return matches
 
-def simulate_hazmat_route_calculation(load: Load) -> Route:
+def simulate_hazmat_route_calculation(load: Load, method: str = "auto") -> Route:
+    """
+    Implements the EsangAI.calculateHazmatRoute function from fuel-loading-algorithm.txt.
+    Logic: Fastest route on the offline road graph (hazmat_routing.py) with every edge the
+    load's hazmat class may not use (tunnel categories, class bans, hazmat=no) masked out.
+    Raises ValueError when the origin/destination is off the graph or unreachable.
+    Without a configured graph (ROAD_GRAPH_FILE unset) it keeps the previous estimate.
+    """
+    if hazmat_router is None:
+        return estimate_hazmat_route(load)
+    result = hazmat_router.route(
+        (load.origin_lat, load.origin_lon),
+        (load.destination_lat, load.destination_lon),
+        load.hazmat_class,
+        method=method,
+    )
+    restrictions = result["restrictions_avoided"] if result["is_hazmat_compliant"] else result["restrictions_violated"]
+    return Route(
+        route_id=f"ROUTE-{load.load_id}-{random.randint(1000, 9999)}",
+        distance_km=round(result["distance_km"], 2),
+        duration_hrs=round(result["duration_hrs"], 2),
+        is_hazmat_compliant=result["is_hazmat_compliant"],
+        hazmat_restrictions_avoided=restrictions,
+        optimal_fuel_stops=max(0, math.ceil(result["distance_km"] / FUEL_RANGE_KM) - 1)
+    )
+
+def estimate_hazmat_route(load: Load) -> Route:
     """
-    Simulates the EsangAI.calculateHazmatRoute function from fuel-loading-algorithm.txt.
+    The route estimate used before the road graph router, for deployments without a graph.
     Logic: Calculates an optimal, compliant route.
     """
-    
-    # Simulate a compliant route calculation
     is_compliant = "FLAMMABLE" not in load.hazmat_class
-    
+
     restrictions = []
     if not is_compliant:
         restrictions.append("Tunnel Avoidance (Hazmat Class 3)")
         restrictions.append("Population Density Restriction")
-        
+
     return Route(
         route_id=f"ROUTE-{load.load_id}-{random.randint(1000, 9999)}",
         distance_km=random.uniform(500, 2000),
@@ -117,6 +140,14 @@ app = FastAPI(
     version="1.0.0"
 )
 
+# Live matching board for incremental dispatch (see matching_session.py)
+_max_deadhead = os.getenv("MATCHING_MAX_DEADHEAD_KM")
+matching_session = MatchingSession(max_deadhead_km=float(_max_deadhead) if _max_deadhead else None)
+
+# Offline road graph for hazmat routing (ROAD_GRAPH_FILE; None when unset, see estimate_hazmat_route)
+hazmat_router = HazmatRouter.from_env()
+FUEL_RANGE_KM = float(os.getenv("FUEL_RANGE_KM", "800"))
+
 # Dependency to simulate database connection
 def get_db_connection():
     """Simulates a dependency for database access (DynamoDB/PostgreSQL)."""
@@ -135,9 +166,15 @@ async def get_service_status():
     }
 
 @app.post("/optimization/match-loads", response_model=List[LoadMatch])
-async def match_loads_to_drivers(data: Dict[str, List[Dict[str, Any]]], db=Depends(get_db_connection)):
+async def match_loads_to_drivers(data: Dict[str, List[Dict[str, Any]]],
+                                 max_deadhead_km: Optional[float] = None,
+                                 min_score: float = DEFAULT_MIN_SCORE,
+                                 candidates_k: int = Query(DEFAULT_CANDIDATES_K, ge=0),
+                                 db=Depends(get_db_connection)):
     """
     Implements EsangAI.matchLoadsToDrivers for intelligent load assignment.
+    Loads and drivers may differ in number; unmatched loads are omitted.
+    candidates_k=0 scores every load/driver pair instead of the nearest candidates.
     """
     try:
         loads = [Load(**l) for l in data.get("loads", [])]
@@ -149,23 +186,72 @@ async def match_loads_to_drivers(data: Dict[str, List[Dict[str, Any]]], db=Depen
     ai_data = {"loads_count": len(loads), "drivers_count": len(drivers)}
     ai_response = esang_core.process_data(ai_data, "LOAD_MATCHING_AI")
     
-    matches = simulate_load_matching(loads, drivers)
+    matches = simulate_load_matching(loads, drivers, max_deadhead_km=max_deadhead_km, min_score=min_score,
+                                     candidates_k=candidates_k)
     
     logger.info(f"Load matching completed. Found {len(matches)} matches. AI Status: {ai_response.get('ai_status')}")
     
     return matches
 
+@app.post("/optimization/matching/snapshot", response_model=Dict[str, Any])
+async def load_matching_snapshot(data: Dict[str, List[Dict[str, Any]]]):
+    """
+    Replaces the live matching board with a full set of loads and drivers and solves it.
+    Returns only the assignments that changed relative to the previous board.
+    """
+    try:
+        loads = [Load(**l).dict() for l in data.get("loads", [])]
+        drivers = [Driver(**d).dict() for d in data.get("drivers", [])]
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Invalid input data format: {e}")
+    return matching_session.load_snapshot(loads, drivers)
+
+@app.post("/optimization/matching/events", response_model=Dict[str, Any])
+async def apply_matching_events(batch: MatchingEventBatch):
+    """
+    Applies incremental load/driver add, update and remove events to the live board,
+    rescoring only the affected rows/columns, and returns the changed assignments.
+    """
+    events = []
+    try:
+        for e in batch.events:
+            if e.op == "upsert":
+                model = Load if e.entity == "load" else Driver
+                events.append({"op": e.op, "entity": e.entity, "data": model(**(e.data or {})).dict()})
+            else:
+                events.append({"op": e.op, "entity": e.entity, "id": e.id})
+        return matching_session.apply(events, full=batch.full_resolve)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Invalid matching event: {e}")
+
+@app.get("/optimization/matching/assignments", response_model=Dict[str, Any])
+async def get_matching_assignments():
+    """Returns the full current assignment of the live board and its version."""
+    return matching_session.assignments()
+
+@app.get("/optimization/matching/changes", response_model=Dict[str, Any])
+async def get_matching_changes(since: int = 0):
+    """Returns assignment changes after version `since` (resync=true means fetch /assignments instead)."""
+    return matching_session.changes_since(since)
+
 @app.post("/optimization/calculate-route", response_model=Route)
-async def calculate_hazmat_route(load: Load, db=Depends(get_db_connection)):
+async def calculate_hazmat_route(load: Load,
+                                 method: str = Query("auto", pattern="^(auto|astar|bidirectional|ch)$"),
+                                 db=Depends(get_db_connection)):
     """
     Implements EsangAI.calculateHazmatRoute for hazmat-compliant route planning.
+    method selects the search (auto uses the contraction hierarchy when it is built).
     """
     
     # Simulate ESANG AI decision support processing
     ai_data = {"load_id": load.load_id, "hazmat_class": load.hazmat_class}
     ai_response = esang_core.process_data(ai_data, "HAZMAT_ROUTE_AI")
     
-    route = simulate_hazmat_route_calculation(load)
+    try:
+        # Searches (and a first ?method=ch contraction) are CPU-bound: keep them off the event loop
+        route = await run_in_threadpool(simulate_hazmat_route_calculation, load, method)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
     
     logger.info(f"Route calculated for load {load.load_id}. Compliant: {route.is_hazmat_compliant}. AI Status: {ai_response.get('ai_status')}")
     
@@ -0,0 +1,448 @@
+"""
+Incremental Matching Session (Load Optimization Service)
+
+Holds the live load x driver score matrix and the current assignment so that
+dispatch events (a driver comes online, a load is posted, cancelled or
+updated) only rescore the affected row or column and re-solve a small
+subproblem instead of the whole board.
+
+Re-solve strategy (linear_sum_assignment has no warm start, so the current
+assignment is the warm start):
+    1. Keep every assignment that the events did not touch.
+    2. Free the touched rows/columns plus the matched pairs of the top
+       `expand_k` alternatives of each touched row/column, so swaps are possible.
+    3. Solve freed rows x free columns (restricted to pairs with a positive
+       score). Unmatched rows and columns cannot improve against each other
+       after an optimal solve, so only the newly freed ones are revisited.
+    4. Every `full_every` events (or on demand) the whole board is re-solved
+       to remove any drift from the local repairs.
+
+Only changed assignments are returned and appended to a versioned change log.
+"""
+
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+
+from assignment_engine import (
+    DEFAULT_MIN_SCORE,
+    EARTH_RADIUS_KM,
+    NON_HAZMAT_CLASSES,
+    normalize_class,
+    score_pairs,
+)
+
+CHANGELOG_SIZE = 10000
+
+
+def _haversine_km(lat1, lon1, lat2, lon2):
+    p1, l1, p2, l2 = (np.radians(v) for v in (lat1, lon1, lat2, lon2))
+    a = np.sin((p2 - p1) / 2.0) ** 2 + np.cos(p1) * np.cos(p2) * np.sin((l2 - l1) / 2.0) ** 2
+    return 2.0 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def _top_k(ids: np.ndarray, scores: np.ndarray, k: int) -> np.ndarray:
+    """ids of the k highest positive scores."""
+    if len(scores) > k:
+        idx = np.argpartition(-scores, k)[:k]
+    else:
+        idx = np.arange(len(scores))
+    return ids[idx[scores[idx] > 0]]
+
+
+class _Slots:
+    """Stable slot allocation for ids, with free-list reuse."""
+
+    def __init__(self):
+        self.slot_of: Dict[str, int] = {}
+        self.id_of: Dict[int, str] = {}
+        self.free: List[int] = []
+        self.size = 0
+
+    def acquire(self, key: str) -> Tuple[int, bool]:
+        if key in self.slot_of:
+            return self.slot_of[key], False
+        slot = self.free.pop() if self.free else self.size
+        if slot == self.size:
+            self.size += 1
+        self.slot_of[key] = slot
+        self.id_of[slot] = key
+        return slot, True
+
+    def release(self, key: str) -> Optional[int]:
+        slot = self.slot_of.pop(key, None)
+        if slot is not None:
+            del self.id_of[slot]
+            self.free.append(slot)
+        return slot
+
+    def active(self) -> np.ndarray:
+        return np.fromiter(sorted(self.id_of), dtype=np.int64, count=len(self.id_of))
+
+
+class MatchingSession:
+    """Stateful load/driver assignment with incremental events. Thread-safe."""
+
+    def __init__(self, max_deadhead_km: Optional[float] = None, min_score: float = DEFAULT_MIN_SCORE,
+                 expand_k: int = 8, full_every: int = 500):
+        self.max_deadhead_km = max_deadhead_km
+        self.min_score = min_score
+        self.expand_k = expand_k
+        self.full_every = full_every
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self) -> None:
+        self._loads = _Slots()
+        self._drivers = _Slots()
+        self._scores = np.zeros((0, 0), dtype=np.float32)
+        # Per-slot attributes
+        self._load_lat = np.zeros(0)
+        self._load_lon = np.zeros(0)
+        self._load_class: List[str] = []
+        self._driver_lat = np.zeros(0)
+        self._driver_lon = np.zeros(0)
+        self._driver_safety = np.zeros(0)
+        self._driver_certs: List[Set[str]] = []
+        # class -> bool mask over driver slots (certified drivers)
+        self._certified: Dict[str, np.ndarray] = {}
+        self._row_match: Dict[int, int] = {}
+        self._col_match: Dict[int, int] = {}
+        self._events_since_full = 0
+        self.version = 0
+        self._changelog: Deque[Dict[str, Any]] = deque(maxlen=CHANGELOG_SIZE)
+
+    # -- storage -------------------------------------------------------------
+
+    def _grow(self) -> None:
+        rows, cols = self._scores.shape
+        need_r, need_c = self._loads.size, self._drivers.size
+        if need_r <= rows and need_c <= cols:
+            return
+        new_r = max(rows, need_r if need_r <= rows else max(64, rows * 2, need_r))
+        new_c = max(cols, need_c if need_c <= cols else max(64, cols * 2, need_c))
+        scores = np.zeros((new_r, new_c), dtype=np.float32)
+        scores[:rows, :cols] = self._scores
+        self._scores = scores
+        if new_r > rows:
+            self._load_lat = np.concatenate([self._load_lat, np.full(new_r - rows, np.nan)])
+            self._load_lon = np.concatenate([self._load_lon, np.full(new_r - rows, np.nan)])
+            self._load_class.extend([""] * (new_r - rows))
+        if new_c > cols:
+            self._driver_lat = np.concatenate([self._driver_lat, np.full(new_c - cols, np.nan)])
+            self._driver_lon = np.concatenate([self._driver_lon, np.full(new_c - cols, np.nan)])
+            self._driver_safety = np.concatenate([self._driver_safety, np.zeros(new_c - cols)])
+            self._driver_certs.extend(set() for _ in range(new_c - cols))
+            for cls, mask in self._certified.items():
+                self._certified[cls] = np.concatenate([mask, np.zeros(new_c - cols, dtype=bool)])
+
+    def _certified_mask(self, cls: str) -> np.ndarray:
+        if cls in NON_HAZMAT_CLASSES:
+            return np.ones(self._scores.shape[1], dtype=bool)
+        mask = self._certified.get(cls)
+        if mask is None:
+            mask = np.array([cls in certs for certs in self._driver_certs], dtype=bool)
+            self._certified[cls] = mask
+        return mask
+
+    def _finalize(self, s: np.ndarray, deadhead: np.ndarray, eligible: np.ndarray) -> np.ndarray:
+        ok = eligible & (s > self.min_score)
+        if self.max_deadhead_km is not None:
+            ok &= deadhead <= self.max_deadhead_km
+        return np.where(ok, s, 0.0)
+
+    def _score_row(self, row: int) -> None:
+        dh = _haversine_km(self._load_lat[row], self._load_lon[row], self._driver_lat, self._driver_lon)
+        s = score_pairs(dh, self._driver_safety)
+        self._scores[row, :] = self._finalize(s, dh, self._certified_mask(self._load_class[row]))
+
+    def _score_col(self, col: int) -> None:
+        dh = _haversine_km(self._load_lat, self._load_lon, self._driver_lat[col], self._driver_lon[col])
+        s = score_pairs(dh, self._driver_safety[col])
+        certs = self._driver_certs[col]
+        eligible = np.array([c in NON_HAZMAT_CLASSES or c in certs for c in self._load_class], dtype=bool)
+        self._scores[:, col] = self._finalize(s, dh, eligible)
+
+    # -- events ----------------------------------------------------------------
+
+    def _unmatch_row(self, row: int) -> Optional[int]:
+        col = self._row_match.pop(row, None)
+        if col is not None:
+            del self._col_match[col]
+        return col
+
+    def _unmatch_col(self, col: int) -> Optional[int]:
+        row = self._col_match.pop(col, None)
+        if row is not None:
+            del self._row_match[row]
+        return row
+
+    def _upsert_load(self, load: Dict[str, Any], dirty_rows: Set[int]) -> None:
+        row, _ = self._loads.acquire(str(load["load_id"]))
+        self._grow()
+        self._load_lat[row] = float(load["origin_lat"])
+        self._load_lon[row] = float(load["origin_lon"])
+        self._load_class[row] = normalize_class(load.get("hazmat_class"))
+        self._score_row(row)
+        dirty_rows.add(row)
+
+    def _remove_load(self, load_id: str, dirty_cols: Set[int]) -> None:
+        row = self._loads.release(str(load_id))
+        if row is None:
+            return
+        col = self._unmatch_row(row)
+        if col is not None:
+            dirty_cols.add(col)
+        self._scores[row, :] = 0.0
+        self._load_lat[row] = self._load_lon[row] = np.nan
+        self._load_class[row] = ""
+
+    def _upsert_driver(self, driver: Dict[str, Any], dirty_cols: Set[int]) -> None:
+        col, _ = self._drivers.acquire(str(driver["driver_id"]))
+        self._grow()
+        certs = {normalize_class(c) for c in driver.get("hazmat_certifications") or []}
+        for cls, mask in self._certified.items():
+            mask[col] = cls in certs
+        self._driver_lat[col] = float(driver["current_lat"])
+        self._driver_lon[col] = float(driver["current_lon"])
+        self._driver_safety[col] = float(driver.get("safety_rating", 0.0))
+        self._driver_certs[col] = certs
+        self._score_col(col)
+        dirty_cols.add(col)
+
+    def _remove_driver(self, driver_id: str, dirty_rows: Set[int]) -> None:
+        col = self._drivers.release(str(driver_id))
+        if col is None:
+            return
+        row = self._unmatch_col(col)
+        if row is not None:
+            dirty_rows.add(row)
+        self._scores[:, col] = 0.0
+        self._driver_lat[col] = self._driver_lon[col] = np.nan
+        self._driver_safety[col] = 0.0
+        self._driver_certs[col] = set()
+        for mask in self._certified.values():
+            mask[col] = False
+
+    # -- solving ---------------------------------------------------------------
+
+    def _snapshot(self) -> Dict[str, Tuple[str, float]]:
+        return {
+            self._loads.id_of[r]: (self._drivers.id_of[c], float(self._scores[r, c]))
+            for r, c in self._row_match.items()
+        }
+
+    def _assign(self, rows: np.ndarray, cols: np.ndarray) -> None:
+        if not len(rows) or not len(cols):
+            return
+        sub = self._scores[np.ix_(rows, cols)].astype(np.float64)
+        r, c = linear_sum_assignment(sub, maximize=True)
+        keep = sub[r, c] > 0.0
+        for row, col in zip(rows[r[keep]].tolist(), cols[c[keep]].tolist()):
+            self._row_match[row] = col
+            self._col_match[col] = row
+
+    def _solve_full(self) -> Tuple[int, int]:
+        self._row_match.clear()
+        self._col_match.clear()
+        rows, cols = self._loads.active(), self._drivers.active()
+        # Drop all-zero rows/columns before the dense solve.
+        if len(rows) and len(cols):
+            sub = self._scores[np.ix_(rows, cols)]
+            rows = rows[sub.any(axis=1)]
+            cols = cols[sub.any(axis=0)]
+        self._assign(rows, cols)
+        self._events_since_full = 0
+        return len(rows), len(cols)
+
+    def _solve_incremental(self, dirty_rows: Set[int], dirty_cols: Set[int]) -> Tuple[int, int]:
+        active_rows, active_cols = self._loads.active(), self._drivers.active()
+        if not len(active_rows) or not len(active_cols):
+            return 0, 0
+        k = self.expand_k
+        freed_rows = {r for r in dirty_rows if r in self._loads.id_of}
+        new_cols = {c for c in dirty_cols if c in self._drivers.id_of}
+
+        # Alternatives of touched rows: their best matched drivers give up their loads.
+        for r in list(freed_rows):
+            for c in _top_k(active_cols, self._scores[r, active_cols], k).tolist():
+                if c in self._col_match:
+                    freed_rows.add(self._col_match[c])
+        # Touched columns release their own load and the best matched alternatives.
+        for c in list(new_cols):
+            if c in self._col_match:
+                freed_rows.add(self._col_match[c])
+            for r in _top_k(active_rows, self._scores[active_rows, c], k).tolist():
+                if r in self._row_match:
+                    freed_rows.add(r)
+        for r in freed_rows:
+            col = self._unmatch_row(r)
+            if col is not None:
+                new_cols.add(col)
+
+        # Unmatched loads only matter if a newly available driver can take them.
+        unmatched_rows = np.array([r for r in active_rows.tolist() if r not in self._row_match and r not in freed_rows],
+                                  dtype=np.int64)
+        if len(unmatched_rows) and new_cols:
+            nc = np.fromiter(new_cols, dtype=np.int64, count=len(new_cols))
+            reach = self._scores[np.ix_(unmatched_rows, nc)].any(axis=1)
+            freed_rows.update(unmatched_rows[reach].tolist())
+
+        rows = np.fromiter(sorted(freed_rows), dtype=np.int64, count=len(freed_rows))
+        free_cols = np.array([c for c in active_cols.tolist() if c not in self._col_match], dtype=np.int64)
+        if len(rows) and len(free_cols):
+            free_cols = free_cols[self._scores[np.ix_(rows, free_cols)].any(axis=0)]
+        self._assign(rows, free_cols)
+        return len(rows), len(free_cols)
+
+    def _diff(self, before: Dict[str, Tuple[str, float]]) -> List[Dict[str, Any]]:
+        after = self._snapshot()
+        changes = []
+        for load_id in sorted(set(before) | set(after)):
+            old, new = before.get(load_id), after.get(load_id)
+            if old is not None and new is not None and old[0] == new[0] and abs(old[1] - new[1]) < 1e-6:
+                continue
+            if new is None:
+                action = "unassigned"
+            elif old is None:
+                action = "assigned"
+            elif old[0] != new[0]:
+                action = "reassigned"
+            else:
+                action = "rescored"
+            changes.append({
+                "load_id": load_id,
+                "driver_id": new[0] if new else None,
+                "previous_driver_id": old[0] if old else None,
+                "match_score": round(new[1], 2) if new else None,
+                "action": action,
+            })
+        return changes
+
+    def _publish(self, changes: List[Dict[str, Any]]) -> None:
+        if changes:
+            self.version += 1
+            for change in changes:
+                change["version"] = self.version
+                self._changelog.append(change)
+
+    @staticmethod
+    def _check_event(event: Dict[str, Any]) -> None:
+        """Raises ValueError for an event apply() could not carry out in full."""
+        op, entity = event.get("op"), event.get("entity")
+        if op not in ("upsert", "remove") or entity not in ("load", "driver"):
+            raise ValueError(f"Unsupported event: op={op!r} entity={entity!r}")
+        if op == "remove":
+            if event.get("id") is None:
+                raise ValueError(f"remove {entity} event needs an id")
+            return
+        data = event.get("data")
+        if not isinstance(data, dict):
+            raise ValueError(f"upsert {entity} event needs data")
+        keys = ("load_id", "origin_lat", "origin_lon") if entity == "load" else ("driver_id", "current_lat", "current_lon")
+        missing = [key for key in keys if data.get(key) is None]
+        if missing:
+            raise ValueError(f"upsert {entity} event is missing {', '.join(missing)}")
+        try:
+            for key in keys[1:]:
+                float(data[key])
+            if entity == "driver":
+                float(data.get("safety_rating", 0.0))
+        except (TypeError, ValueError):
+            raise ValueError(f"upsert {entity} event has non-numeric coordinates") from None
+
+    # -- public API ------------------------------------------------------------
+
+    def apply(self, events: Iterable[Dict[str, Any]], full: bool = False) -> Dict[str, Any]:
+        """
+        Applies a batch of events and re-solves once. Events:
+            {"op": "upsert", "entity": "load", "data": {...Load fields...}}
+            {"op": "upsert", "entity": "driver", "data": {...Driver fields...}}
+            {"op": "remove", "entity": "load" | "driver", "id": "..."}
+        Returns the new version, the changed assignments and solve statistics.
+        """
+        start = time.perf_counter()
+        with self._lock:
+            before = self._snapshot()
+            dirty_rows: Set[int] = set()
+            dirty_cols: Set[int] = set()
+            # Validate the whole batch before touching any state, so a bad event
+            # cannot leave earlier ones applied without a re-solve or a publish
+            events = list(events)
+            for event in events:
+                self._check_event(event)
+            for event in events:
+                op, entity = event["op"], event["entity"]
+                if op == "upsert" and entity == "load":
+                    self._upsert_load(event["data"], dirty_rows)
+                elif op == "upsert":
+                    self._upsert_driver(event["data"], dirty_cols)
+                elif entity == "load":
+                    self._remove_load(event["id"], dirty_cols)
+                else:
+                    self._remove_driver(event["id"], dirty_rows)
+            n_events = len(events)
+
+            self._events_since_full += n_events
+            if full or self._events_since_full >= self.full_every:
+                mode = "full"
+                rows, cols = self._solve_full()
+            else:
+                mode = "incremental"
+                rows, cols = self._solve_incremental(dirty_rows, dirty_cols)
+            changes = self._diff(before)
+            self._publish(changes)
+            return {
+                "version": self.version,
+                "changes": changes,
+                "solve": {
+                    "mode": mode,
+                    "events": n_events,
+                    "rows": rows,
+                    "cols": cols,
+                    "elapsed_ms": round((time.perf_counter() - start) * 1000.0, 2),
+                },
+            }
+
+    def load_snapshot(self, loads: List[Dict[str, Any]], drivers: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Replaces the whole board and solves it from scratch."""
+        load_ids = {str(l["load_id"]) for l in loads}
+        driver_ids = {str(d["driver_id"]) for d in drivers}
+        with self._lock:
+            stale_loads = [i for i in self._loads.slot_of if i not in load_ids]
+            stale_drivers = [i for i in self._drivers.slot_of if i not in driver_ids]
+        events = [{"op": "remove", "entity": "load", "id": i} for i in stale_loads]
+        events += [{"op": "remove", "entity": "driver", "id": i} for i in stale_drivers]
+        events += [{"op": "upsert", "entity": "load", "data": l} for l in loads]
+        events += [{"op": "upsert", "entity": "driver", "data": d} for d in drivers]
+        return self.apply(events, full=True)
+
+    def assignments(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "version": self.version,
+                "loads": len(self._loads.slot_of),
+                "drivers": len(self._drivers.slot_of),
+                "assignments": [
+                    {"load_id": load_id, "driver_id": driver_id, "match_score": round(score, 2)}
+                    for load_id, (driver_id, score) in sorted(self._snapshot().items())
+                ],
+            }
+
+    def changes_since(self, version: int) -> Dict[str, Any]:
+        """Changes after `version`; resync is True when the log no longer reaches back that far."""
+        with self._lock:
+            oldest = self._changelog[0]["version"] if self._changelog else self.version + 1
+            return {
+                "version": self.version,
+                "resync": version + 1 < oldest and version < self.version,
+                "changes": [c for c in self._changelog if c["version"] > version],
+            }
+
+    def objective(self) -> float:
+        with self._lock:
+            return float(sum(self._scores[r, c] for r, c in self._row_match.items()))
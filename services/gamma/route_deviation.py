@@ -0,0 +1,210 @@
+"""
+Route Deviation Engine (Geolocation Intelligence Service)
+
+A planned route is an OSRM polyline (as returned by the AI sidecar's
+/route/directions). On registration it is decoded into segments, and every
+segment is written into the cells of a uniform lat/lon grid that its bounding
+box touches, buffered by the corridor width. A ping then only measures its
+cross-track distance to the few segments of its own cell, which is amortized
+O(1) regardless of route length.
+
+Deviation state is kept per load with hysteresis: a load is flagged off-route
+after `confirm_pings` consecutive pings outside the corridor and cleared only
+once it is back inside a tighter `clear_ratio * buffer_km` band, so GPS jitter
+near the corridor edge does not flap alerts.
+
+Environment:
+    ROUTE_BUFFER_KM      default corridor half-width (default 1.0)
+    ROUTE_CACHE_SIZE     planned routes kept in the LRU cache (default 2048)
+    AI_SIDECAR_URL       sidecar base URL used to fetch polylines (default http://localhost:8091)
+"""
+
+import json
+import logging
+import math
+import os
+import threading
+import urllib.request
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger('ROUTE_DEVIATION')
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEG = math.pi * EARTH_RADIUS_KM / 180.0
+DEFAULT_BUFFER_KM = float(os.getenv("ROUTE_BUFFER_KM", "1.0"))
+ROUTE_CACHE_SIZE = int(os.getenv("ROUTE_CACHE_SIZE", "2048"))
+AI_SIDECAR_URL = os.getenv("AI_SIDECAR_URL", "http://localhost:8091")
+GRID_CELL_DEG = 0.05  # ~5.5 km of latitude
+_KEY_STRIDE = 1_000_000
+
+
+def decode_polyline(encoded: str, precision: int = 5) -> np.ndarray:
+    """Decodes a Google/OSRM encoded polyline into an (n, 2) array of [lat, lon]."""
+    coords: List[Tuple[float, float]] = []
+    index = lat = lon = 0
+    factor = 10 ** precision
+    length = len(encoded)
+    while index < length:
+        deltas = []
+        for _ in range(2):
+            shift = result = 0
+            while True:
+                b = ord(encoded[index]) - 63
+                index += 1
+                result |= (b & 0x1F) << shift
+                shift += 5
+                if b < 0x20:
+                    break
+            deltas.append(~(result >> 1) if result & 1 else result >> 1)
+        lat += deltas[0]
+        lon += deltas[1]
+        coords.append((lat / factor, lon / factor))
+    return np.array(coords, dtype=np.float64).reshape(-1, 2)
+
+
+class PlannedRoute:
+    """Segments of one planned route plus their grid index."""
+
+    def __init__(self, route_id: str, points: np.ndarray, buffer_km: float = DEFAULT_BUFFER_KM):
+        if len(points) < 2:
+            raise ValueError("A route needs at least two points")
+        self.route_id = route_id
+        self.buffer_km = buffer_km
+        self.a = points[:-1]
+        self.b = points[1:]
+        self.length_km = float(np.sum(self._seg_length_km()))
+
+        margin = buffer_km / KM_PER_DEG
+        lat_lo = np.minimum(self.a[:, 0], self.b[:, 0]) - margin
+        lat_hi = np.maximum(self.a[:, 0], self.b[:, 0]) + margin
+        coslat = np.maximum(np.cos(np.radians(np.maximum(np.abs(lat_lo), np.abs(lat_hi)))), 1e-6)
+        lon_lo = np.minimum(self.a[:, 1], self.b[:, 1]) - margin / coslat
+        lon_hi = np.maximum(self.a[:, 1], self.b[:, 1]) + margin / coslat
+
+        cells: Dict[int, List[int]] = {}
+        r0 = np.floor(lat_lo / GRID_CELL_DEG).astype(np.int64)
+        r1 = np.floor(lat_hi / GRID_CELL_DEG).astype(np.int64)
+        c0 = np.floor(lon_lo / GRID_CELL_DEG).astype(np.int64)
+        c1 = np.floor(lon_hi / GRID_CELL_DEG).astype(np.int64)
+        for seg, (ra, rb, ca, cb) in enumerate(zip(r0.tolist(), r1.tolist(), c0.tolist(), c1.tolist())):
+            for r in range(ra, rb + 1):
+                for c in range(ca, cb + 1):
+                    cells.setdefault(r * _KEY_STRIDE + c, []).append(seg)
+        self._grid = {k: np.array(v, dtype=np.int64) for k, v in cells.items()}
+
+    def _seg_length_km(self) -> np.ndarray:
+        dy = (self.b[:, 0] - self.a[:, 0]) * KM_PER_DEG
+        dx = (self.b[:, 1] - self.a[:, 1]) * KM_PER_DEG * np.cos(np.radians((self.a[:, 0] + self.b[:, 0]) / 2.0))
+        return np.hypot(dx, dy)
+
+    def distance_km(self, lat: float, lon: float) -> float:
+        """Cross-track distance from the ping to the nearest route segment (inf if outside every buffered cell)."""
+        key = math.floor(lat / GRID_CELL_DEG) * _KEY_STRIDE + math.floor(lon / GRID_CELL_DEG)
+        segs = self._grid.get(key)
+        if segs is None:
+            return math.inf
+        # Local tangent plane at the ping: exact enough for segments a few km long.
+        kx = KM_PER_DEG * math.cos(math.radians(lat))
+        ax = (self.a[segs, 1] - lon) * kx
+        ay = (self.a[segs, 0] - lat) * KM_PER_DEG
+        bx = (self.b[segs, 1] - lon) * kx
+        by = (self.b[segs, 0] - lat) * KM_PER_DEG
+        dx, dy = bx - ax, by - ay
+        seg_len2 = dx * dx + dy * dy
+        with np.errstate(divide="ignore", invalid="ignore"):
+            t = np.where(seg_len2 > 0, -(ax * dx + ay * dy) / seg_len2, 0.0)
+        t = np.clip(t, 0.0, 1.0)
+        return float(np.min(np.hypot(ax + t * dx, ay + t * dy)))
+
+
+class RouteDeviationEngine:
+    """LRU cache of planned routes and per-load on/off-route state with hysteresis. Thread-safe."""
+
+    def __init__(self, cache_size: int = ROUTE_CACHE_SIZE, confirm_pings: int = 2, clear_ratio: float = 0.6):
+        self.cache_size = cache_size
+        self.confirm_pings = confirm_pings
+        self.clear_ratio = clear_ratio
+        self._lock = threading.Lock()
+        self._routes: "OrderedDict[str, PlannedRoute]" = OrderedDict()
+        # load_id -> [off_route, consecutive pings outside the corridor]
+        self._state: Dict[str, List[Any]] = {}
+
+    def __len__(self) -> int:
+        return len(self._routes)
+
+    def register(self, route_id: str, polyline: Optional[str] = None,
+                 coordinates: Optional[List[List[float]]] = None,
+                 buffer_km: float = DEFAULT_BUFFER_KM, precision: int = 5) -> PlannedRoute:
+        """Decodes and indexes a route (polyline or [[lat, lon], ...]) and caches it by id."""
+        points = decode_polyline(polyline, precision) if polyline else np.asarray(coordinates, dtype=np.float64)
+        route = PlannedRoute(route_id, points.reshape(-1, 2), buffer_km)
+        with self._lock:
+            self._routes[route_id] = route
+            self._routes.move_to_end(route_id)
+            while len(self._routes) > self.cache_size:
+                evicted, _ = self._routes.popitem(last=False)
+                logger.debug(f"Evicted planned route {evicted} from cache")
+        return route
+
+    def get(self, route_id: str) -> Optional[PlannedRoute]:
+        with self._lock:
+            route = self._routes.get(route_id)
+            if route is not None:
+                self._routes.move_to_end(route_id)
+            return route
+
+    def check(self, load_id: str, route_id: str, lat: float, lon: float) -> Dict[str, Any]:
+        """
+        Tests one ping against the route corridor. event is "deviation" when the
+        load is newly confirmed off-route, "returned" when it is back on it, else None.
+        """
+        route = self.get(route_id)
+        if route is None:
+            return {"route_id": route_id, "status": "unknown_route", "event": None}
+
+        distance = route.distance_km(lat, lon)
+        event = None
+        with self._lock:
+            state = self._state.setdefault(load_id, [False, 0])
+            if not state[0]:
+                state[1] = state[1] + 1 if distance > route.buffer_km else 0
+                if state[1] >= self.confirm_pings:
+                    state[0], event = True, "deviation"
+            elif distance <= route.buffer_km * self.clear_ratio:
+                state[0], state[1], event = False, 0, "returned"
+            off_route = state[0]
+            if not off_route and state[1] == 0:
+                del self._state[load_id]
+        return {
+            "route_id": route_id,
+            "status": "off_route" if off_route else "on_route",
+            "distance_km": None if math.isinf(distance) else round(distance, 3),
+            "buffer_km": route.buffer_km,
+            "event": event,
+        }
+
+    def forget(self, load_id: str) -> None:
+        with self._lock:
+            self._state.pop(load_id, None)
+
+
+def fetch_route_polyline(origin: Dict[str, float], destination: Dict[str, float], timeout: float = 15.0) -> str:
+    """Plans a route through the AI sidecar's /route/directions and returns its polyline geometry."""
+    body = json.dumps({
+        "origin": {"lat": origin["lat"], "lng": origin.get("lng", origin.get("lon"))},
+        "destination": {"lat": destination["lat"], "lng": destination.get("lng", destination.get("lon"))},
+    }).encode()
+    req = urllib.request.Request(
+        AI_SIDECAR_URL.rstrip("/") + "/route/directions",
+        data=body,
+        headers={"Content-Type": "application/json"},
+        method="POST",
+    )
+    with urllib.request.urlopen(req, timeout=timeout) as resp:
+        data = json.loads(resp.read())
+    if not data.get("success") or not data.get("geometry"):
+        raise ValueError(data.get("error") or "No route geometry returned")
+    return data["geometry"]
@@ -0,0 +1,111 @@
+"""
+Telematics load generator for the Geolocation Intelligence service.
+
+Simulates a fleet of ELD units emitting pings and pushes them through the
+batched ingest path, reporting sustained pings/second.
+
+    # In-process: parse + geofence evaluation only, one core
+    python telematics_loadgen.py --trucks 20000 --batch 5000 --seconds 10
+
+    # Against a running service
+    python telematics_loadgen.py --url http://localhost:8003 --format ndjson
+"""
+
+import argparse
+import json
+import time
+import urllib.request
+from typing import List
+
+import numpy as np
+
+from geolocation_intelligence_service import GEOFENCES, evaluate_ping_batch, parse_ping_batch
+
+
+def make_batches(trucks: int, batch_size: int, n_batches: int, fmt: str, seed: int = 7) -> List[bytes]:
+    """Pre-encode request bodies so generator cost is not counted against ingest."""
+    rng = np.random.default_rng(seed)
+    lat = rng.uniform(25.0, 49.0, trucks)
+    lon = rng.uniform(-124.0, -67.0, trucks)
+    # Park a few trucks inside each geofence so the alert path is exercised.
+    for i, fence in enumerate(GEOFENCES.values()):
+        lat[i * 10:(i + 1) * 10] = fence["lat"]
+        lon[i * 10:(i + 1) * 10] = fence["lon"]
+
+    bodies = []
+    t0 = 1_700_000_000
+    for b in range(n_batches):
+        idx = rng.integers(0, trucks, batch_size)
+        lat[idx] += rng.normal(0.0, 0.0005, batch_size)
+        lon[idx] += rng.normal(0.0, 0.0005, batch_size)
+        ts = [t0 + b] * batch_size
+        load_ids = [f"LOAD-{i}" for i in idx.tolist()]
+        if fmt == "ndjson":
+            body = "\n".join(
+                json.dumps({"load_id": l, "latitude": a, "longitude": o, "timestamp": t})
+                for l, a, o, t in zip(load_ids, lat[idx].tolist(), lon[idx].tolist(), ts)
+            )
+        else:
+            body = json.dumps({
+                "load_id": load_ids,
+                "latitude": lat[idx].tolist(),
+                "longitude": lon[idx].tolist(),
+                "timestamp": ts,
+            })
+        bodies.append(body.encode())
+    return bodies
+
+
+def run_inprocess(bodies: List[bytes], content_type: str, seconds: float) -> None:
+    pings = alerts = 0
+    start = time.perf_counter()
+    i = 0
+    while time.perf_counter() - start < seconds:
+        batch = parse_ping_batch(bodies[i % len(bodies)], content_type)
+        alerts += len(evaluate_ping_batch(batch))
+        pings += len(batch["load_id"])
+        i += 1
+    elapsed = time.perf_counter() - start
+    print(f"in-process: {pings} pings in {elapsed:.2f}s = {pings / elapsed:,.0f} pings/s ({i} batches, {alerts} alerts)")
+
+
+def run_http(url: str, bodies: List[bytes], content_type: str, seconds: float) -> None:
+    pings = alerts = 0
+    start = time.perf_counter()
+    i = 0
+    while time.perf_counter() - start < seconds:
+        req = urllib.request.Request(
+            url.rstrip("/") + "/geolocation/track-batch",
+            data=bodies[i % len(bodies)],
+            headers={"Content-Type": content_type},
+            method="POST",
+        )
+        with urllib.request.urlopen(req) as resp:
+            result = json.loads(resp.read())
+        pings += result["received"]
+        alerts += len(result["alerts"])
+        i += 1
+    elapsed = time.perf_counter() - start
+    print(f"http: {pings} pings in {elapsed:.2f}s = {pings / elapsed:,.0f} pings/s ({i} requests, {alerts} alerts)")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Telematics ping load generator")
+    parser.add_argument("--trucks", type=int, default=20000)
+    parser.add_argument("--batch", type=int, default=5000, help="pings per request")
+    parser.add_argument("--batches", type=int, default=20, help="distinct pre-encoded bodies to cycle")
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--format", choices=("columnar", "ndjson"), default="columnar")
+    parser.add_argument("--url", help="service base URL; omit to benchmark in-process")
+    args = parser.parse_args()
+
+    content_type = "application/x-ndjson" if args.format == "ndjson" else "application/json"
+    bodies = make_batches(args.trucks, args.batch, args.batches, args.format)
+    if args.url:
+        run_http(args.url, bodies, content_type, args.seconds)
+    else:
+        run_inprocess(bodies, content_type, args.seconds)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+"""
+Tests for the geofence engine — grid-indexed containment and enter/exit state.
+"""
+
+import numpy as np
+
+from geofence_engine import GeofenceEngine, GeofenceStateTracker
+
+FENCES = {"fences": [
+    {"id": "A", "type": "yard", "lat": 29.76, "lon": -95.37, "radius_km": 1.0},
+    {"id": "B", "type": "yard", "lat": 29.80, "lon": -95.37, "radius_km": 1.0},
+]}
+IN_A = (29.76, -95.37)
+IN_B = (29.80, -95.37)
+OUTSIDE = (30.50, -96.00)
+
+
+def run_batch(engine, tracker, pings):
+    vehicles = [v for v, _ in pings]
+    lat = np.array([p[0] for _, p in pings])
+    lon = np.array([p[1] for _, p in pings])
+    ping_idx, fence_idx = engine.hits(lat, lon)
+    return tracker.transitions(vehicles, ping_idx, engine.fence_ids(fence_idx))
+
+
+class TestGeofenceStateTracker:
+    def test_enter_and_exit_in_one_batch(self):
+        engine, tracker = GeofenceEngine(FENCES), GeofenceStateTracker()
+        events = run_batch(engine, tracker, [("v1", IN_A), ("v1", OUTSIDE)])
+        assert events == [(0, "v1", "A", "enter"), (1, "v1", "A", "exit")]
+        assert tracker.inside("v1") == set()
+        assert len(tracker) == 0
+
+    def test_other_vehicles_pings_do_not_move_state(self):
+        engine, tracker = GeofenceEngine(FENCES), GeofenceStateTracker()
+        events = run_batch(engine, tracker, [("v2", OUTSIDE), ("v1", IN_A), ("v2", OUTSIDE), ("v1", IN_A)])
+        assert events == [(1, "v1", "A", "enter")]
+        assert tracker.inside("v1") == {"A"}
+
+    def test_exit_and_enter_on_one_ping(self):
+        engine, tracker = GeofenceEngine(FENCES), GeofenceStateTracker()
+        run_batch(engine, tracker, [("v1", IN_A)])
+        events = run_batch(engine, tracker, [("v1", IN_B)])
+        assert events == [(0, "v1", "B", "enter"), (0, "v1", "A", "exit")]
+        assert tracker.inside("v1") == {"B"}
@@ -0,0 +1,65 @@
+"""
+Tests for the geolocation service — per-ping geofence alerts.
+"""
+
+import pytest
+from fastapi.testclient import TestClient
+
+import geolocation_intelligence_service as geo
+from geofence_engine import GeofenceEngine, GeofenceStateTracker
+
+client = TestClient(geo.app)
+
+
+@pytest.fixture
+def fences(monkeypatch):
+    """Two overlapping yards and a restricted zone inside the second."""
+    monkeypatch.setattr(geo, "geofence_engine", GeofenceEngine({"fences": [
+        {"id": "A", "type": "Yard", "lat": 29.760, "lon": -95.370, "radius_km": 1.0},
+        {"id": "B", "type": "Restricted", "lat": 29.770, "lon": -95.370, "radius_km": 1.0},
+    ]}))
+    monkeypatch.setattr(geo, "geofence_state", GeofenceStateTracker())
+
+
+def track(lat, lon):
+    return client.post("/geolocation/track-update", json={
+        "load_id": "L1", "planned_route_id": "none",
+        "current_location": {"latitude": lat, "longitude": lon, "timestamp": "2026-01-01T00:00:00Z"},
+    }).json()
+
+
+class TestTrackUpdate:
+    def test_every_transition_of_a_ping_is_returned(self, fences):
+        assert track(29.752, -95.370)["geofence_alerts"][0]["alert_type"] == "Geofence Entry"
+        data = track(29.778, -95.370)
+        # One ping leaves A and enters the restricted zone B: both alerts, the violation first
+        assert [a["alert_type"] for a in data["geofence_alerts"]] == ["Geofence Violation", "Geofence Exit"]
+        assert data["geofence_alert"]["alert_type"] == "Geofence Violation"
+        assert geo.geofence_state.inside("L1") == {"B"}
+
+    def test_no_transition_no_alert(self, fences):
+        track(29.752, -95.370)
+        data = track(29.752, -95.370)
+        assert data["geofence_alerts"] == [] and data["geofence_alert"] is None
+
+
+class TestTrackBatch:
+    def test_ndjson_batch_alerts_on_transitions(self, fences):
+        body = "\n".join([
+            '{"load_id": "L1", "latitude": 29.752, "longitude": -95.370}',
+            '{"load_id": "L2", "latitude": 30.500, "longitude": -96.000}',
+            '{"load_id": "L1", "latitude": 30.500, "longitude": -96.000}',
+        ])
+        resp = client.post("/geolocation/track-batch", content=body,
+                           headers={"content-type": "application/x-ndjson"})
+        assert resp.status_code == 200
+        data = resp.json()
+        assert data["received"] == 3
+        assert [(a["load_id"], a["geofence"], a["event"]) for a in data["alerts"]] == [
+            ("L1", "A", "enter"), ("L1", "A", "exit"),
+        ]
+
+    def test_malformed_batch(self, fences):
+        resp = client.post("/geolocation/track-batch", content=b'{"load_id": [1, 2], "latitude": [1]}',
+                           headers={"content-type": "application/json"})
+        assert resp.status_code == 400